@@ -12,6 +12,14 @@ class Settings(BaseSettings):
     NEO4J_URI: str = "bolt://localhost:7687"
     NEO4J_USER: str = "neo4j"
     NEO4J_PASSWORD: str = "mysecretpassword"
+    NEO4J_DATABASE: Optional[str] = None           # 数据库名（默认使用服务器默认库）
+
+    # Neo4j 连接池配置（URI 使用 neo4j:// 时启用路由，读会话分发到只读副本）
+    NEO4J_MAX_POOL_SIZE: int = 100                 # 每个服务器地址的最大连接数
+    NEO4J_ACQUISITION_TIMEOUT: float = 60.0        # 连接池耗尽时等待空闲连接的超时时间（秒）
+    NEO4J_MAX_CONNECTION_LIFETIME: int = 3600      # 连接最长存活时间（秒），应小于防火墙 / 负载均衡的空闲断开时间
+    NEO4J_MAX_TRANSACTION_RETRY_TIME: float = 30.0 # 托管事务遇到瞬时错误时的最长重试时间（秒）
+    NEO4J_FETCH_SIZE: int = 1000                   # 每次从服务器拉取的记录数
     
     # 应用配置
     APP_NAME: str = "情报研判系统 API"
@@ -20,8 +28,82 @@ class Settings(BaseSettings):
     
     # 文件上传配置
     UPLOAD_DIR: str = "./uploads"
-    MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
-    
+    MAX_UPLOAD_SIZE: int = 4 * 1024 * 1024 * 1024  # 4GB（上传流式落盘、导入分块读取，内存占用与文件大小无关）
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024    # 上传落盘的分块大小（1MB）
+
+    # 批量导入配置
+    INGEST_BATCH_SIZE: int = 5000         # 每个写事务的行数
+    INGEST_WORKERS: int = 1               # 并行写入线程数（按关系端点分区，互不争锁）
+    INGEST_MAX_RETRIES: int = 5           # 瞬时错误（死锁等）最大重试次数
+    INGEST_RETRY_BACKOFF: float = 0.5     # 重试退避基数（秒）
+    IMPORT_CHUNK_ROWS: int = 50000        # 文件流式读取的分块行数
+
+    # 后台导入任务配置
+    DATA_DIR: str = "./data"                          # 本地状态文件目录
+    JOB_DB_PATH: str = "./data/ingest_jobs.sqlite3"   # 任务状态库（重启后可恢复）
+    INGEST_JOB_WORKERS: int = 2                       # 同时执行的导入任务数
+    INGEST_JOB_EXECUTOR: str = "thread"               # thread | process
+
+    # 导入清单配置（文件内容哈希与行指纹，重复上传的文件跳过、重叠的行不重复累加）
+    INGEST_MANIFEST_ENABLED: bool = True
+    INGEST_MANIFEST_PATH: str = "./data/ingest_manifest.sqlite3"
+
+    # 离线批量导入配置（python -m app.services.bulk_import）
+    BULK_IMPORT_DIR: str = "./neo4j_import"                     # 生成 CSV 的本地目录（docker-compose 中挂载为 Neo4j 的 import 目录）
+    BULK_IMPORT_URL: str = "file:///"                           # LOAD CSV 中该目录的地址
+    BULK_IMPORT_SERVER_DIR: str = "/var/lib/neo4j/import"       # Neo4j 服务器上该目录的路径（neo4j-admin 导入使用）
+    BULK_IMPORT_BATCH_ROWS: int = 50000                         # LOAD CSV 每个事务的行数
+
+    # 本地通话事件存储配置（原始话单按天分区保存，时间线与通话模式分析从这里读取）
+    EVENT_STORE_ENABLED: bool = True              # 关闭后不保存原始话单，通话模式分析改为读取 Neo4j 分桶
+    EVENT_STORE_DIR: str = "./data/events"        # 存储目录
+    EVENT_STORE_FLUSH_ROWS: int = 100000          # 导入时每追加多少行写入一次
+    EVENT_STORE_MAX_SEGMENTS: int = 32            # 每天的段数超过该值时合并
+
+    # 跨源名称匹配配置（通讯录姓名 <-> 微信昵称）
+    NAME_MATCH_THRESHOLD: float = 0.5     # 分词集合 Jaccard 相似度阈值
+    NAME_MATCH_PINYIN: bool = False       # 加入整名拼音分词（需安装 pypinyin）
+    NAME_MATCH_MAX_TOKEN_FREQ: int = 1000 # 出现在过多名称中的分词不参与匹配
+
+    # 内存图投影配置（中心性、社区发现及邻域查询在进程内计算）
+    PROJECTION_ENABLED: bool = True                # 关闭后邻域查询走 Cypher，中心性/社区发现不可用
+    PROJECTION_LOAD_ON_STARTUP: bool = True        # 启动时在后台加载快照
+    PROJECTION_VERSION_CHECK_INTERVAL: float = 1.0 # 图版本号的检查间隔（秒）
+    CENTRALITY_BETWEENNESS_SAMPLES: int = 64       # 近似介数中心性的抽样源点数
+
+    # 路径分析配置
+    PATH_MAX_DEPTH: int = 10              # 最大跳数上限
+    PATH_MAX_DEGREE: int = 1000           # 度数超过该值的中间节点（超级节点）不参与路径，0 表示不限制
+    PATH_MAX_K: int = 10                  # 最多返回的备选路径条数
+    PATH_TIMEOUT_MS: int = 2000           # 单次路径查询的时间预算，超时返回已找到的路径
+
+    # 批量目标分析配置
+    BATCH_ANALYSIS_MAX_TARGETS: int = 5000   # 单次请求的目标数上限
+    BATCH_ANALYSIS_PAIR_LIMIT: int = 50      # 每个目标最多返回的机主关系对数
+
+    # 网络扩展配置
+    EXPAND_MAX_NODES: int = 2000             # 扩展结果的总节点数上限
+    EXPAND_MAX_PER_LEVEL: int = 500          # 每层新增节点上限（保留联系最紧密的）
+    EXPAND_HUB_DEGREE: int = 200             # 度数超过该值的节点视为枢纽，只展示不继续扩展，0 表示不限制
+    EXPAND_MAX_EDGES_PER_LEVEL: int = 50000  # 每层读取的关系数上限
+
+    # 分析结果缓存配置（按图版本号失效）
+    CACHE_ENABLED: bool = True                # 缓存目标分析、碰撞分析、中心节点和统计接口的结果
+    CACHE_MAX_ENTRIES: int = 256              # 进程内缓存条目数上限（LRU）
+    CACHE_TTL: float = 3600.0                 # 条目有效期（秒）
+    CACHE_DISK_PATH: Optional[str] = None     # 磁盘缓存（SQLite）路径，如 ./data/result_cache.sqlite3；为空时只用进程内缓存
+    GRAPH_VERSION_BUMP_INTERVAL: float = 5.0  # 导入期间递增图版本号的最小间隔（秒），首个批次提交后立即递增
+
+    # 查询监控配置（/metrics）
+    QUERY_METRICS_ENABLED: bool = True        # 按查询名称记录耗时、服务器统计、行数和参数大小
+    SLOW_QUERY_MS: float = 1000.0             # 慢查询阈值（毫秒），0 表示不记录慢查询
+    SLOW_QUERY_LOG: Optional[str] = None      # 慢查询日志文件（JSON Lines），如 ./data/slow_queries.log；为空时写入应用日志
+
+    # Schema 迁移配置
+    SCHEMA_AUTO_MIGRATE: bool = True      # 启动时自动执行未应用的迁移
+    SCHEMA_INDEX_WAIT_TIMEOUT: int = 600  # 等待索引上线的超时时间（秒）
+    SCHEMA_MIGRATION_WAIT_TIMEOUT: int = 7200  # 等待其他进程执行中的迁移版本的超时时间（秒）
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,33 +1,187 @@
 """
 Neo4j 数据库连接管理
+
+连接池大小、获取连接超时、连接最长存活时间、fetch size 和托管事务重试时间均来自配置；
+读写会话分离：execute_read 使用读会话（neo4j:// 路由模式下分发到只读副本），
+execute_write 使用写会话，两者都是托管事务，瞬时错误由驱动自动重试。
+
+所有查询经 run_instrumented 执行，按查询名称记录耗时、服务器统计和行数（见 app.query_metrics）
 """
-from neo4j import GraphDatabase
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from neo4j import READ_ACCESS, WRITE_ACCESS, AsyncGraphDatabase, GraphDatabase, Query
+from neo4j.exceptions import ClientError
+
 from app.config import settings
-from typing import Optional
+from app.query_metrics import metrics as query_metrics
+from app.query_metrics import name_of
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def driver_config() -> Dict:
+    """连接池与驱动配置（同步、异步驱动共用）"""
+    return {
+        "max_connection_pool_size": settings.NEO4J_MAX_POOL_SIZE,
+        "connection_acquisition_timeout": settings.NEO4J_ACQUISITION_TIMEOUT,
+        "max_connection_lifetime": settings.NEO4J_MAX_CONNECTION_LIFETIME,
+        "max_transaction_retry_time": settings.NEO4J_MAX_TRANSACTION_RETRY_TIME,
+        "fetch_size": settings.NEO4J_FETCH_SIZE,
+    }
+
+
+def _is_acquisition_timeout(exc: BaseException) -> bool:
+    """连接池耗尽：在 NEO4J_ACQUISITION_TIMEOUT 内没有拿到空闲连接"""
+    return isinstance(exc, ClientError) and "failed to obtain a connection from the pool" in str(exc)
+
+
+class PoolMetrics:
+    """会话与连接池统计（供健康检查和监控读取）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sessions_open = 0
+        self.sessions_peak = 0
+        self.sessions_total = 0
+        self.reads = 0
+        self.writes = 0
+        self.retries = 0
+        self.acquisition_timeouts = 0
+        self.acquire_seconds = 0.0
+
+    def session_opened(self):
+        with self._lock:
+            self.sessions_open += 1
+            self.sessions_total += 1
+            self.sessions_peak = max(self.sessions_peak, self.sessions_open)
+
+    def session_closed(self):
+        with self._lock:
+            self.sessions_open -= 1
+
+    def transaction(self, access_mode: str, attempts: int, acquire_seconds: float):
+        with self._lock:
+            if access_mode == READ_ACCESS:
+                self.reads += 1
+            else:
+                self.writes += 1
+            self.retries += max(attempts - 1, 0)
+            self.acquire_seconds += acquire_seconds
+
+    def acquisition_timeout(self):
+        with self._lock:
+            self.acquisition_timeouts += 1
+
+    def to_dict(self, driver) -> Dict:
+        with self._lock:
+            metrics = {
+                "max_pool_size": settings.NEO4J_MAX_POOL_SIZE,
+                "sessions_open": self.sessions_open,
+                "sessions_peak": self.sessions_peak,
+                "sessions_total": self.sessions_total,
+                "read_transactions": self.reads,
+                "write_transactions": self.writes,
+                "transaction_retries": self.retries,
+                "acquisition_timeouts": self.acquisition_timeouts,
+                "acquire_seconds_total": round(self.acquire_seconds, 3),
+            }
+        metrics["connections"] = _pool_connections(driver)
+        return metrics
+
+
+def _pool_connections(driver) -> Dict[str, Dict]:
+    """
+    每个服务器地址的连接数（使用中 / 空闲）
+
+    驱动没有公开连接池状态的接口，这里读取驱动内部的连接池对象；
+    驱动版本变化导致读取失败时返回空，不影响其他统计
+    """
+    pool = getattr(driver, "_pool", None)
+    if pool is None:
+        return {}
+    try:
+        stats = {}
+        for address, connections in list(pool.connections.items()):
+            in_use = sum(1 for connection in list(connections) if connection.in_use)
+            stats[str(address)] = {"in_use": in_use, "idle": len(connections) - in_use}
+        return stats
+    except Exception:
+        return {}
+
+
+def _profiled(query: str, profile: bool, timeout: Optional[float] = None):
+    text = "PROFILE " + query if profile else query
+    return Query(text, timeout=timeout) if timeout is not None else text
+
+
+def run_instrumented(runner, query: str, parameters: Optional[dict] = None, profile: bool = True,
+                     timeout: Optional[float] = None) -> List[Dict]:
+    """
+    在事务或会话上执行查询并记录统计，返回全部结果行
+
+    Args:
+        runner: 托管事务 tx 或会话 session（自动提交）
+        profile: 是否允许按需 PROFILE（Schema 变更、CALL {} IN TRANSACTIONS 等语句传 False）
+        timeout: 服务器端事务超时（秒），只对自动提交的会话有效
+    """
+    name = name_of(query)
+    profiled = profile and query_metrics.take_profile(name)
+    started = time.perf_counter()
+    try:
+        result = runner.run(_profiled(query, profiled, timeout), parameters or {})
+        rows = [record.data() for record in result]
+        summary = result.consume()
+    except Exception:
+        query_metrics.record_error(name)
+        raise
+    query_metrics.record(name, query, parameters, time.perf_counter() - started, len(rows), summary)
+    return rows
+
+
+async def run_instrumented_async(runner, query: str, parameters: Optional[dict] = None,
+                                 profile: bool = True) -> List[Dict]:
+    """run_instrumented 的异步版本（AsyncManagedTransaction / AsyncSession）"""
+    name = name_of(query)
+    profiled = profile and query_metrics.take_profile(name)
+    started = time.perf_counter()
+    try:
+        result = await runner.run(_profiled(query, profiled), parameters or {})
+        rows = [record.data() async for record in result]
+        summary = await result.consume()
+    except Exception:
+        query_metrics.record_error(name)
+        raise
+    query_metrics.record(name, query, parameters, time.perf_counter() - started, len(rows), summary)
+    return rows
+
+
 class Neo4jDriver:
     """Neo4j 驱动单例模式"""
-    
+
     def __init__(self):
         self.uri = settings.NEO4J_URI
         self.user = settings.NEO4J_USER
         self.password = settings.NEO4J_PASSWORD
         self.driver: Optional[GraphDatabase.driver] = None
+        self.metrics = PoolMetrics()
 
     def connect(self):
         """建立数据库连接"""
         try:
             self.driver = GraphDatabase.driver(
-                self.uri, 
-                auth=(self.user, self.password)
+                self.uri,
+                auth=(self.user, self.password),
+                **driver_config()
             )
             # 验证连接
             self.driver.verify_connectivity()
-            logger.info("✅ Connected to Neo4j at %s", self.uri)
+            logger.info(
+                "✅ Connected to Neo4j at %s (pool size %d)", self.uri, settings.NEO4J_MAX_POOL_SIZE
+            )
         except Exception as e:
             logger.error("❌ Failed to connect to Neo4j: %s", str(e))
             raise
@@ -38,18 +192,219 @@ class Neo4jDriver:
             self.driver.close()
             logger.info("🛑 Disconnected from Neo4j")
 
-    def get_session(self):
-        """获取数据库会话"""
+    @contextmanager
+    def get_session(self, access_mode: str = WRITE_ACCESS, fetch_size: Optional[int] = None):
+        """
+        获取数据库会话（with 语句中使用）
+
+        Args:
+            access_mode: READ_ACCESS / WRITE_ACCESS，路由模式下决定连接到只读副本还是主节点
+            fetch_size: 每次从服务器拉取的记录数（默认 NEO4J_FETCH_SIZE）
+        """
         if not self.driver:
             self.connect()
-        return self.driver.session()
-    
+        config = {"database": settings.NEO4J_DATABASE, "default_access_mode": access_mode}
+        if fetch_size is not None:
+            config["fetch_size"] = fetch_size
+        self.metrics.session_opened()
+        try:
+            with self.driver.session(**config) as session:
+                yield session
+        except ClientError as e:
+            if _is_acquisition_timeout(e):
+                self.metrics.acquisition_timeout()
+            raise
+        finally:
+            self.metrics.session_closed()
+
+    def _execute(self, access_mode: str, query: str, parameters: Optional[dict]) -> List[Dict]:
+        attempts = 0
+        started = time.perf_counter()
+        acquired: List[float] = []
+
+        def work(tx):
+            nonlocal attempts
+            attempts += 1
+            if not acquired:
+                acquired.append(time.perf_counter() - started)
+            return run_instrumented(tx, query, parameters)
+
+        with self.get_session(access_mode) as session:
+            if access_mode == READ_ACCESS:
+                results = session.execute_read(work)
+            else:
+                results = session.execute_write(work)
+        self.metrics.transaction(access_mode, attempts, acquired[0] if acquired else 0.0)
+        return results
+
+    def execute_read(self, query: str, parameters: dict = None) -> List[Dict]:
+        """在托管读事务中执行查询（瞬时错误自动重试）"""
+        return self._execute(READ_ACCESS, query, parameters)
+
+    def execute_write(self, query: str, parameters: dict = None) -> List[Dict]:
+        """在托管写事务中执行查询（瞬时错误自动重试）"""
+        return self._execute(WRITE_ACCESS, query, parameters)
+
+    def stream(self, query: str, parameters: dict = None, access_mode: str = READ_ACCESS,
+               fetch_size: Optional[int] = None) -> Iterator[Dict]:
+        """
+        逐条产出查询结果（自动提交事务）
+
+        驱动每次从服务器拉取 fetch_size 条记录（默认 NEO4J_FETCH_SIZE），消费完再拉下一批，
+        内存占用与 fetch_size 成正比而不是与结果行数成正比；迭代结束或中途停止时关闭会话。
+        记录的耗时包含调用方处理每一行的时间；中途停止时没有服务器统计
+        """
+        name = name_of(query)
+        profiled = query_metrics.take_profile(name)
+        started = time.perf_counter()
+        rows = 0
+        summary = None
+        failed = False
+        try:
+            with self.get_session(access_mode, fetch_size) as session:
+                result = session.run(_profiled(query, profiled), parameters or {})
+                for record in result:
+                    rows += 1
+                    yield record.data()
+                summary = result.consume()
+        except Exception:
+            failed = True
+            query_metrics.record_error(name)
+            raise
+        finally:
+            # 调用方中途停止迭代时也记录已读取的部分
+            if not failed and (summary is not None or rows):
+                query_metrics.record(name, query, parameters, time.perf_counter() - started, rows, summary)
+
     def execute_query(self, query: str, parameters: dict = None):
-        """执行查询并返回结果"""
+        """
+        在写会话中以自动提交事务执行查询并返回结果
+
+        不会重试；用于不能放在托管事务里的语句（Schema 变更、CALL {} IN TRANSACTIONS 等）
+        """
         with self.get_session() as session:
-            result = session.run(query, parameters or {})
-            return [record.data() for record in result]
+            return run_instrumented(session, query, parameters, profile=False)
+
+    def pool_metrics(self) -> Dict:
+        return self.metrics.to_dict(self.driver)
+
+
+class AsyncNeo4jDriver:
+    """
+    Neo4j 异步驱动单例
+
+    与 Neo4jDriver 使用相同的连接配置，供 async 接口在事件循环中直接查询，
+    不占用线程池；同一请求内的多个查询可以用 asyncio.gather 并发执行（每个查询独立会话）
+    """
+
+    def __init__(self):
+        self.uri = settings.NEO4J_URI
+        self.user = settings.NEO4J_USER
+        self.password = settings.NEO4J_PASSWORD
+        self.driver = None
+        self.metrics = PoolMetrics()
+
+    async def connect(self):
+        """建立数据库连接"""
+        try:
+            self.driver = AsyncGraphDatabase.driver(
+                self.uri,
+                auth=(self.user, self.password),
+                **driver_config()
+            )
+            await self.driver.verify_connectivity()
+            logger.info("✅ Connected to Neo4j (async) at %s", self.uri)
+        except Exception as e:
+            logger.error("❌ Failed to connect to Neo4j (async): %s", str(e))
+            raise
+
+    async def close(self):
+        """关闭数据库连接"""
+        if self.driver:
+            await self.driver.close()
+            logger.info("🛑 Disconnected from Neo4j (async)")
+
+    @asynccontextmanager
+    async def get_session(self, access_mode: str = WRITE_ACCESS, fetch_size: Optional[int] = None):
+        """获取异步会话（async with 语句中使用），参数见 Neo4jDriver.get_session"""
+        if not self.driver:
+            await self.connect()
+        config = {"database": settings.NEO4J_DATABASE, "default_access_mode": access_mode}
+        if fetch_size is not None:
+            config["fetch_size"] = fetch_size
+        self.metrics.session_opened()
+        try:
+            async with self.driver.session(**config) as session:
+                yield session
+        except ClientError as e:
+            if _is_acquisition_timeout(e):
+                self.metrics.acquisition_timeout()
+            raise
+        finally:
+            self.metrics.session_closed()
+
+    async def _execute(self, access_mode: str, query: str, parameters: Optional[dict]) -> List[Dict]:
+        attempts = 0
+        started = time.perf_counter()
+        acquired: List[float] = []
+
+        async def work(tx):
+            nonlocal attempts
+            attempts += 1
+            if not acquired:
+                acquired.append(time.perf_counter() - started)
+            return await run_instrumented_async(tx, query, parameters)
+
+        async with self.get_session(access_mode) as session:
+            if access_mode == READ_ACCESS:
+                results = await session.execute_read(work)
+            else:
+                results = await session.execute_write(work)
+        self.metrics.transaction(access_mode, attempts, acquired[0] if acquired else 0.0)
+        return results
+
+    async def execute_read(self, query: str, parameters: dict = None) -> List[Dict]:
+        """在托管读事务中执行查询（瞬时错误自动重试）"""
+        return await self._execute(READ_ACCESS, query, parameters)
+
+    async def execute_write(self, query: str, parameters: dict = None) -> List[Dict]:
+        """在托管写事务中执行查询（瞬时错误自动重试）"""
+        return await self._execute(WRITE_ACCESS, query, parameters)
+
+    async def stream(self, query: str, parameters: dict = None, access_mode: str = READ_ACCESS,
+                     fetch_size: Optional[int] = None) -> AsyncIterator[Dict]:
+        """逐条产出查询结果，见 Neo4jDriver.stream"""
+        name = name_of(query)
+        profiled = query_metrics.take_profile(name)
+        started = time.perf_counter()
+        rows = 0
+        summary = None
+        failed = False
+        try:
+            async with self.get_session(access_mode, fetch_size) as session:
+                result = await session.run(_profiled(query, profiled), parameters or {})
+                async for record in result:
+                    rows += 1
+                    yield record.data()
+                summary = await result.consume()
+        except Exception:
+            failed = True
+            query_metrics.record_error(name)
+            raise
+        finally:
+            # 调用方中途停止迭代时也记录已读取的部分
+            if not failed and (summary is not None or rows):
+                query_metrics.record(name, query, parameters, time.perf_counter() - started, rows, summary)
+
+    async def execute_query(self, query: str, parameters: dict = None):
+        """在写会话中以自动提交事务执行查询并返回结果（不重试）"""
+        async with self.get_session() as session:
+            return await run_instrumented_async(session, query, parameters, profile=False)
+
+    def pool_metrics(self) -> Dict:
+        return self.metrics.to_dict(self.driver)
 
 
 # 全局数据库实例
 db = Neo4jDriver()
+async_db = AsyncNeo4jDriver()
@@ -2,19 +2,25 @@
 FastAPI 应用入口
 提供数据导入、研判分析等 RESTful API
 """
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from contextlib import asynccontextmanager
+import json
+from datetime import date, datetime, timedelta
 import logging
-import os
 from pathlib import Path
 
-from app.database import db
+from app.database import async_db, db
 from app.config import settings
-from app.services import ingest_service, analysis_service
+from app import query_metrics, schema
+from app.streaming import json_list_response
+from app.services import ingest_service, analysis_service, job_service, graph_projection, expansion
+from app.services import async_analysis_service, async_ingest_service, ingest_manifest, result_cache
+from app.services.upload_service import save_upload, safe_filename, UploadTooLargeError
 
 # 配置日志
 logging.basicConfig(
@@ -48,11 +54,20 @@ class AnalysisRequest(BaseModel):
     node_type: Optional[str] = Field("Phone", description="节点类型 (Phone/WeChat)")
 
 
+class TargetsRequest(BaseModel):
+    """批量目标分析请求模型"""
+    targets: List[str] = Field(..., description="目标电话号码列表", min_length=1)
+
+
 class NetworkExpansionRequest(BaseModel):
     """网络扩展请求模型"""
     target_id: str = Field(..., description="目标 ID")
     depth: int = Field(2, description="扩展深度", ge=1, le=5)
     node_type: Optional[str] = Field("Phone", description="节点类型")
+    rel_types: Optional[List[str]] = Field(None, description="扩展经过的关系类型（默认 CALL / FRIEND / HAS_CONTACT）")
+    max_nodes: Optional[int] = Field(None, description="总节点数上限", ge=1)
+    max_per_level: Optional[int] = Field(None, description="每层新增节点上限", ge=1)
+    hub_degree: Optional[int] = Field(None, description="枢纽节点度数阈值（超过则不再扩展，0 不限制）", ge=0)
 
 
 # ==================== 应用生命周期 ====================
@@ -62,16 +77,35 @@ async def lifespan(app: FastAPI):
     """应用启动和关闭管理"""
     # 启动
     logger.info("🚀 Starting application...")
+    query_metrics.configure_slow_log()
     db.connect()
+    # 异步驱动：async 接口直接在事件循环中查询，不占用线程池
+    await async_db.connect()
+    
+    # 创建约束和索引（索引上线和数据回填在后台进行，完成前 /ready 返回 503）
+    if settings.SCHEMA_AUTO_MIGRATE:
+        schema.bootstrap()
+    else:
+        schema.state["ready"] = True
     
     # 创建上传目录
     upload_dir = Path(settings.UPLOAD_DIR)
     upload_dir.mkdir(exist_ok=True)
     
+    # 后台导入任务（恢复上次未完成的排队任务）；导入清单中被打断的导入只保留已提交的行
+    if settings.INGEST_MANIFEST_ENABLED:
+        ingest_manifest.start()
+    job_service.start()
+    
+    # 在后台加载内存图投影（加载完成前邻域查询走 Cypher）
+    graph_projection.start()
+    
     yield
     
     # 关闭
     logger.info("🛑 Shutting down application...")
+    job_service.shutdown()
+    await async_db.close()
     db.close()
 
 
@@ -94,10 +128,25 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """请求体声明的长度已超过上限时直接拒绝，不必等待整个文件上传并解析完"""
+    if request.url.path.startswith("/ingest/upload"):
+        content_length = request.headers.get("content-length")
+        # 预留 1MB 给 multipart 边界和表单字段
+        if content_length and content_length.isdigit() and \
+                int(content_length) > settings.MAX_UPLOAD_SIZE + 1024 * 1024:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"文件过大，最大支持 {settings.MAX_UPLOAD_SIZE / 1024 / 1024:.0f}MB"}
+            )
+    return await call_next(request)
+
+
 # ==================== 数据导入接口 ====================
 
 @app.post("/ingest/cdr", tags=["数据导入"])
-def ingest_cdr(records: List[CallRecord]):
+async def ingest_cdr(records: List[CallRecord]):
     """
     导入话单数据（JSON 格式）
     
@@ -107,14 +156,14 @@ def ingest_cdr(records: List[CallRecord]):
     - **timestamp**: 通话时间（可选）
     """
     try:
-        result = ingest_service.import_cdr_data([r.model_dump() for r in records])
+        result = await async_ingest_service.import_cdr_data([r.model_dump() for r in records])
         return JSONResponse(content=result, status_code=200)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/ingest/wechat", tags=["数据导入"])
-def ingest_wechat(friends: List[WeChatFriend]):
+async def ingest_wechat(friends: List[WeChatFriend]):
     """
     导入微信好友关系（JSON 格式）
     
@@ -123,12 +172,30 @@ def ingest_wechat(friends: List[WeChatFriend]):
     - **nickname**: 好友昵称（可选）
     """
     try:
-        result = ingest_service.import_wechat_friends([f.model_dump() for f in friends])
+        result = await async_ingest_service.import_wechat_friends([f.model_dump() for f in friends])
         return JSONResponse(content=result, status_code=200)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _queue_upload(file: UploadFile, data_type: str) -> JSONResponse:
+    """上传文件流式落盘后登记为后台导入任务，立即返回任务 ID"""
+    try:
+        file_path = await save_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    try:
+        file_format = file_path.suffix.lstrip(".")
+        job = await run_in_threadpool(
+            job_service.submit_job, file_path, file_format, data_type, safe_filename(file.filename)
+        )
+        return JSONResponse(content=job, status_code=202)
+    except Exception as e:
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/ingest/upload/excel", tags=["数据导入"])
 async def upload_excel(
     file: UploadFile = File(...),
@@ -140,6 +207,8 @@ async def upload_excel(
     - **file**: Excel 文件 (.xlsx)
     - **data_type**: 数据类型 (cdr=话单, wechat=微信好友)
     
+    返回 202 和任务信息，导入在后台执行，进度通过 `/ingest/jobs/{job_id}` 查询
+    
     **话单 Excel 格式要求**：
     - caller（主叫号码）
     - callee（被叫号码）
@@ -154,34 +223,7 @@ async def upload_excel(
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="仅支持 Excel 文件 (.xlsx, .xls)")
     
-    # 检查文件大小
-    content = await file.read()
-    if len(content) > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"文件过大，最大支持 {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    # 保存文件
-    upload_dir = Path(settings.UPLOAD_DIR)
-    file_path = upload_dir / file.filename
-    
-    try:
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        # 导入数据
-        result = ingest_service.import_from_excel(str(file_path), data_type)
-        
-        # 删除临时文件
-        os.remove(file_path)
-        
-        return JSONResponse(content=result, status_code=200)
-    except Exception as e:
-        # 清理临时文件
-        if file_path.exists():
-            os.remove(file_path)
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _queue_upload(file, data_type)
 
 
 @app.post("/ingest/upload/csv", tags=["数据导入"])
@@ -195,33 +237,51 @@ async def upload_csv(
     - **file**: CSV 文件
     - **data_type**: 数据类型 (cdr=话单, wechat=微信好友)
     
-    字段要求同 Excel 接口
+    字段要求同 Excel 接口，同样以后台任务方式执行
     """
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="仅支持 CSV 文件")
     
-    content = await file.read()
-    if len(content) > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"文件过大，最大支持 {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    upload_dir = Path(settings.UPLOAD_DIR)
-    file_path = upload_dir / file.filename
+    return await _queue_upload(file, data_type)
+
+
+@app.get("/ingest/jobs", tags=["数据导入"])
+def list_ingest_jobs(limit: int = 50):
+    """最近的导入任务列表"""
+    return {"jobs": job_service.list_jobs(limit)}
+
+
+@app.get("/ingest/manifest", tags=["数据导入"])
+def list_ingest_manifest(limit: int = 50):
+    """
+    导入清单：最近的文件导入记录
+
+    每条记录包含文件内容的 SHA-256、状态、新写入行数和与以前导入重复而跳过的行数；
+    内容相同的文件再次上传时任务结果为 skipped
+    """
+    return {"imports": ingest_manifest.list_imports(limit)}
+
+
+@app.get("/ingest/jobs/{job_id}", tags=["数据导入"])
+def get_ingest_job(job_id: str):
+    """
+    查询导入任务状态
     
-    try:
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        result = ingest_service.import_from_csv(str(file_path), data_type)
-        os.remove(file_path)
-        
-        return JSONResponse(content=result, status_code=200)
-    except Exception as e:
-        if file_path.exists():
-            os.remove(file_path)
-        raise HTTPException(status_code=500, detail=str(e))
+    返回已解析/已写入/被剔除的行数、吞吐量（行/秒）、进度百分比和预计剩余时间（秒）
+    """
+    job = job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@app.post("/ingest/jobs/{job_id}/cancel", tags=["数据导入"])
+def cancel_ingest_job(job_id: str):
+    """取消导入任务（运行中的任务在当前批次提交后停止，已写入的批次保留）"""
+    job = job_service.cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
 
 
 @app.delete("/ingest/clear", tags=["数据导入"])
@@ -238,7 +298,7 @@ def clear_all_data():
 # ==================== 研判分析接口 ====================
 
 @app.get("/analysis/auto-collision", tags=["研判分析"])
-def auto_collision_analysis():
+async def auto_collision_analysis():
     """
     🔥 自动碰撞分析（一键分析所有数据）
     
@@ -249,16 +309,18 @@ def auto_collision_analysis():
     - 热点号码：被多人共同联系的号码（可能是重要节点）
     - 跨源关联：手机通讯录和微信好友的交叉匹配
     - 人物关系：基于共同联系人推断的人物关系网络
+    
+    四个分析阶段互不依赖，并发执行
     """
     try:
-        result = analysis_service.auto_collision_analysis()
+        result = await async_analysis_service.auto_collision_analysis()
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/analysis/target/{target_number}", tags=["研判分析"])
-def analyze_target(target_number: str):
+async def analyze_target(target_number: str):
     """
     🎯 目标分析（以某个号码为中心）
     
@@ -273,41 +335,56 @@ def analyze_target(target_number: str):
     - 可直接用于图谱可视化的节点和边数据
     """
     try:
-        result = analysis_service.analyze_target(target_number)
+        result = await async_analysis_service.analyze_target(target_number)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/analysis/targets", tags=["研判分析"])
+async def analyze_targets(request: TargetsRequest):
+    """
+    🎯 批量目标分析
+    
+    一次提交多个号码（如 200~2000 个嫌疑号码），每个分析阶段只执行一条批量查询，各阶段并发执行。
+    
+    **返回数据**：
+    - results: 每个目标的分析结果（与单目标分析结构相同）
+    - nodes / edges: 所有目标合并去重后的图谱
+    """
+    try:
+        return await async_analysis_service.analyze_targets(request.targets)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/analysis/common-contacts", tags=["研判分析"])
-def analyze_common_contacts(request: AnalysisRequest):
+async def analyze_common_contacts(request: AnalysisRequest):
     """
     分析两个目标的共同联系人
     
     - **target_a**: 目标 A 的 ID（电话号码或微信号）
     - **target_b**: 目标 B 的 ID
     - **node_type**: 节点类型 (Phone 或 WeChat)
+    
+    结果边查询边流式输出
     """
-    try:
-        results = analysis_service.find_common_contacts(
-            request.target_a, 
-            request.target_b, 
-            request.node_type
-        )
-        return {
-            "target_a": request.target_a,
-            "target_b": request.target_b,
-            "common_contacts": results,
-            "count": len(results)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await json_list_response(
+        {"target_a": request.target_a, "target_b": request.target_b},
+        "common_contacts",
+        async_analysis_service.iter_common_contacts(request.target_a, request.target_b, request.node_type)
+    )
 
 
 @app.get("/analysis/path", tags=["研判分析"])
 def analyze_shortest_path(
     source: str,
     target: str,
-    max_depth: int = 5
+    max_depth: int = 5,
+    rel_types: Optional[str] = None,
+    max_degree: Optional[int] = None,
+    k: int = 1,
+    timeout_ms: Optional[int] = None
 ):
     """
     分析两个目标之间的最短关联路径
@@ -315,16 +392,23 @@ def analyze_shortest_path(
     - **source**: 起点 ID
     - **target**: 终点 ID
     - **max_depth**: 最大搜索深度（默认 5）
+    - **rel_types**: 允许经过的关系类型，逗号分隔（如 CALL,FRIEND，默认全部）
+    - **max_degree**: 跳过度数超过该值的中间节点（默认使用配置 PATH_MAX_DEGREE，0 不限制）
+    - **k**: 返回前 k 条不同路径（默认 1）
+    - **timeout_ms**: 时间预算，超时返回已找到的路径并标记 partial
     """
     try:
-        result = analysis_service.find_shortest_path(source, target, max_depth)
+        types = [t.strip() for t in rel_types.split(",") if t.strip()] if rel_types else None
+        result = analysis_service.find_shortest_path(source, target, max_depth, types, max_degree, k, timeout_ms)
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/analysis/frequent-contacts", tags=["研判分析"])
-def analyze_frequent_contacts(
+async def analyze_frequent_contacts(
     target_id: str,
     node_type: str = "Phone",
     top_n: int = 10
@@ -335,35 +419,39 @@ def analyze_frequent_contacts(
     - **target_id**: 目标 ID
     - **node_type**: 节点类型
     - **top_n**: 返回前 N 个结果（默认 10）
+    
+    结果边查询边流式输出
     """
-    try:
-        results = analysis_service.find_frequent_contacts(target_id, node_type, top_n)
-        return {
-            "target": target_id,
-            "frequent_contacts": results,
-            "count": len(results)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await json_list_response(
+        {"target": target_id},
+        "frequent_contacts",
+        async_analysis_service.iter_frequent_contacts(target_id, node_type, top_n)
+    )
 
 
 @app.get("/analysis/central-nodes", tags=["研判分析"])
 def analyze_central_nodes(
     node_type: str = "Phone",
-    top_n: int = 10
+    top_n: int = 10,
+    metric: str = "degree"
 ):
     """
-    查找中心节点（度中心性分析）
+    查找中心节点（中心性分析）
     
     - **node_type**: 节点类型
     - **top_n**: 返回前 N 个结果（默认 10）
+    - **metric**: 排序指标：degree（度）、weighted_degree（通话次数）、total_duration（通话时长）、
+      pagerank、betweenness（近似介数）
     """
     try:
-        results = analysis_service.find_central_nodes(node_type, top_n)
+        results = analysis_service.find_central_nodes(node_type, top_n, metric)
         return {
             "central_nodes": results,
+            "metric": metric,
             "count": len(results)
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -371,20 +459,31 @@ def analyze_central_nodes(
 @app.get("/analysis/communities", tags=["研判分析"])
 def analyze_communities(
     node_type: str = "Phone",
-    min_size: int = 3
+    min_size: int = 3,
+    algorithm: str = "louvain",
+    weighted: bool = True,
+    seed: int = 0,
+    limit: int = 20
 ):
     """
     社区发现（团伙挖掘）
     
     - **node_type**: 节点类型
     - **min_size**: 最小社区规模（默认 3）
+    - **algorithm**: louvain（模块度优化，默认）或 label_propagation（标签传播）
+    - **weighted**: 是否以通话次数作为边权
+    - **seed**: 随机种子，相同种子结果可复现
+    - **limit**: 最多返回的社区数
     """
     try:
-        results = analysis_service.find_communities(node_type, min_size)
+        results = analysis_service.find_communities(node_type, min_size, algorithm, weighted, seed, limit)
         return {
             "communities": results,
+            "algorithm": algorithm,
             "count": len(results)
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -402,15 +501,58 @@ def expand_contact_network(request: NetworkExpansionRequest):
         result = analysis_service.expand_network(
             request.target_id, 
             request.depth, 
-            request.node_type
+            request.node_type,
+            request.rel_types,
+            request.max_nodes,
+            request.max_per_level,
+            request.hub_degree
         )
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/analysis/expand-network/stream", tags=["研判分析"])
+def expand_contact_network_stream(request: NetworkExpansionRequest):
+    """
+    扩展联系网络（NDJSON 流式返回）
+    
+    每扩展完一层输出一行 {"type": "level", "level": n, "nodes": [...], "relationships": [...]}，
+    最后一行为 {"type": "done", ...} 汇总；前端可以在深层仍在计算时先渲染浅层
+    """
+    events = expansion.iter_expansion(
+        request.target_id,
+        request.depth,
+        request.node_type,
+        request.rel_types,
+        request.max_nodes,
+        request.max_per_level,
+        request.hub_degree
+    )
+    try:
+        # 先取第一行，参数错误等在开始输出前以正常的 HTTP 错误返回
+        first = next(events)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    def _ndjson():
+        yield json.dumps(first, ensure_ascii=False, default=str) + "\n"
+        try:
+            for event in events:
+                yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        except Exception as e:
+            logger.error(f"❌ Network expansion stream failed: {str(e)}")
+            yield json.dumps({"type": "error", "detail": str(e)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
+
+
 @app.get("/analysis/call-pattern", tags=["研判分析"])
-def analyze_call_pattern(
+async def analyze_call_pattern(
     target_id: str,
     time_window_days: int = 30
 ):
@@ -419,12 +561,52 @@ def analyze_call_pattern(
     
     - **target_id**: 目标电话号码
     - **time_window_days**: 分析时间窗口（天数，默认 30）
+    
+    数据来自本地通话事件存储（未启用时为按天分桶的通话聚合 CALL_DAY）；通话对象列表流式输出，
+    汇总字段（total_calls、hour_of_day、day_of_week、night_call_ratio 等）在列表之后输出
     """
-    try:
-        result = analysis_service.analyze_call_pattern(target_id, time_window_days)
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    totals = {}
+    return await json_list_response(
+        {"target": target_id, "time_window_days": time_window_days},
+        "contacts",
+        async_analysis_service.iter_call_pattern(target_id, time_window_days, totals),
+        tail=lambda count: totals
+    )
+
+
+@app.get("/analysis/timeline", tags=["研判分析"])
+async def call_timeline(
+    target_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    peer: Optional[str] = None,
+    limit: int = 1000,
+    order: str = "asc"
+):
+    """
+    通话时间线（逐条通话事件）
+
+    - **target_id**: 目标电话号码
+    - **start** / **end**: 时间范围 [start, end)，本地时间，默认最近 30 天
+    - **peer**: 只看与该号码之间的通话
+    - **limit**: 最多返回的事件数（默认 1000）
+    - **order**: asc（按时间升序）| desc（最新的在前）
+
+    读取本地通话事件存储，不访问 Neo4j；每个事件包含 time、caller、callee、duration、direction
+    """
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order 只能是 asc 或 desc")
+    start = start.replace(tzinfo=None) if start else None
+    end = end.replace(tzinfo=None) if end else None
+    if start is None and end is None:
+        start = datetime.combine(date.today() - timedelta(days=30), datetime.min.time())
+    state = {}
+    return await json_list_response(
+        {"target": target_id, "start": start and start.isoformat(), "end": end and end.isoformat(), "peer": peer},
+        "events",
+        async_analysis_service.iter_timeline(target_id, start, end, peer, limit, order == "desc", state),
+        tail=lambda count: {"count": count, **state}
+    )
 
 
 # ==================== 系统接口 ====================
@@ -441,22 +623,88 @@ def root():
 
 
 @app.get("/health", tags=["系统"])
-def health_check():
+async def health_check():
     """健康检查"""
     try:
         # 测试数据库连接
-        with db.get_session() as session:
-            session.run("RETURN 1")
-        return {"status": "healthy", "database": "connected"}
+        await async_db.execute_read("RETURN 1")
+        return {
+            "status": "healthy",
+            "database": "connected",
+            "schema_version": schema.state["version"],
+            "schema_ready": schema.state["ready"],
+            "projection": graph_projection.status(),
+            "connection_pool": {"sync": db.pool_metrics(), "async": async_db.pool_metrics()},
+            "cache": result_cache.cache.stats()
+        }
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
 
 
+@app.get("/metrics", tags=["系统"], response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus 指标：按查询名称的耗时与服务器统计、连接池和结果缓存计数"""
+    lines = query_metrics.metrics.render()
+    lines += query_metrics.render_gauges("graph_neo4j_pool", [
+        ({"driver": "sync"}, db.pool_metrics()),
+        ({"driver": "async"}, async_db.pool_metrics()),
+    ])
+    lines += query_metrics.render_gauges("graph_result_cache", [({}, result_cache.cache.stats())])
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/queries", tags=["系统"])
+def query_statistics():
+    """按查询名称的累计统计（含最近一次 PROFILE 的执行计划）"""
+    return {
+        "slow_query_ms": settings.SLOW_QUERY_MS,
+        "pending_profiles": query_metrics.metrics.pending_profiles(),
+        "queries": query_metrics.metrics.snapshot()
+    }
+
+
+@app.post("/metrics/profile/{query_name}", tags=["系统"])
+def request_query_profile(query_name: str, runs: int = 1):
+    """
+    按需 PROFILE：该查询接下来的 runs 次执行加 PROFILE 前缀，
+    db hits 计入统计，执行计划写入慢查询日志和 /metrics/queries
+    """
+    if runs < 1:
+        raise HTTPException(status_code=400, detail="runs must be >= 1")
+    query_metrics.metrics.request_profile(query_name, runs)
+    return {"query_name": query_name, "pending": query_metrics.metrics.pending_profiles().get(query_name, 0)}
+
+
+@app.get("/ready", tags=["系统"])
+def readiness_check():
+    """就绪检查：所有约束和索引上线、迁移的数据回填完成后才返回 200"""
+    if schema.state["ready"]:
+        return {"status": "ready", "schema_version": schema.state["version"]}
+    try:
+        indexes = schema.index_status()
+    except Exception as e:
+        indexes = []
+        schema.state["error"] = schema.state["error"] or str(e)
+    return JSONResponse(
+        status_code=503,
+        content={
+            "status": "not_ready",
+            "schema_version": schema.state["version"],
+            "stage": schema.state["stage"],
+            "error": schema.state["error"],
+            "pending_indexes": [
+                {"name": i["name"], "state": i["state"], "progress": i["populationPercent"]}
+                for i in indexes if i["state"] != "ONLINE"
+            ]
+        }
+    )
+
+
 @app.get("/statistics", tags=["系统"])
-def get_statistics():
+async def get_statistics():
     """获取数据库统计信息"""
     try:
-        stats = analysis_service.get_statistics()
+        stats = await async_analysis_service.get_statistics()
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
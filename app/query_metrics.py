@@ -0,0 +1,324 @@
+"""
+Cypher 查询监控
+
+按查询名称汇总每次执行的耗时和服务器端统计：
+- 客户端墙钟时间（直方图）、服务器 result_available_after / result_consumed_after
+- 返回行数、参数大小（JSON 字节数，长列表参数抽样估算；慢查询日志中为精确值）、错误次数
+- db hits：只有 PROFILE 执行才有，通过 request_profile 按需开启，执行计划保存在查询统计里
+
+查询名称来自 register / register_queries 登记的语句文本，未登记的语句以文本摘要命名。
+超过 SLOW_QUERY_MS 的查询写入慢查询日志（SLOW_QUERY_LOG，JSON Lines）；
+QueryMetrics.render / render_gauges 输出 Prometheus 文本格式，供 /metrics 接口抓取
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger("app.slow_query")
+
+# 耗时直方图的桶上界（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_names: Dict[str, str] = {}
+
+
+def register(name: str, query: str) -> str:
+    """登记命名查询并原样返回语句（动态拼接的语句在构造时登记）"""
+    _names[query] = name
+    return query
+
+
+def register_queries(module_name: str, namespace: Dict):
+    """把模块中以 _QUERY 结尾的字符串常量登记为命名查询，名称为 "模块名.常量名" 的小写形式"""
+    prefix = module_name.rsplit(".", 1)[-1]
+    for attr, value in namespace.items():
+        if attr.endswith("_QUERY") and isinstance(value, str):
+            register(f"{prefix}.{attr[:-len('_QUERY')].lower()}", value)
+
+
+def name_of(query: str) -> str:
+    name = _names.get(query)
+    if name is None:
+        name = "adhoc." + hashlib.sha1(query.encode("utf-8")).hexdigest()[:10]
+    return name
+
+
+# 估算参数大小时，列表参数（如导入的 $batch）最多抽样序列化的元素数
+PARAMETER_SAMPLE = 16
+
+
+def _json_bytes(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def parameter_bytes(parameters: Optional[Dict], exact: bool = False) -> int:
+    """
+    参数的 JSON 字节数
+
+    默认为估算值：长列表只等间隔抽样 PARAMETER_SAMPLE 个元素序列化后按长度放大，
+    每次执行的开销与批次大小无关；exact=True 时完整序列化（只用于慢查询日志）
+    """
+    if not parameters:
+        return 0
+    try:
+        if exact:
+            return _json_bytes(parameters)
+        total = 0
+        for key, value in parameters.items():
+            total += len(key) + 4
+            if isinstance(value, (list, tuple)) and len(value) > PARAMETER_SAMPLE:
+                step = len(value) / PARAMETER_SAMPLE
+                sample = [value[int(i * step)] for i in range(PARAMETER_SAMPLE)]
+                total += int(_json_bytes(sample) * len(value) / PARAMETER_SAMPLE)
+            else:
+                total += _json_bytes(value)
+        return total
+    except (TypeError, ValueError):
+        return 0
+
+
+def _plan(profile: Dict) -> Dict:
+    """精简 PROFILE 执行计划：算子、db hits、行数及子算子"""
+    args = profile.get("args") or {}
+    return {
+        "operator": profile.get("operatorType"),
+        "details": args.get("Details"),
+        "db_hits": profile.get("dbHits", 0),
+        "rows": profile.get("rows", 0),
+        "children": [_plan(child) for child in profile.get("children") or []],
+    }
+
+
+def _db_hits(profile: Dict) -> int:
+    return profile.get("dbHits", 0) + sum(_db_hits(child) for child in profile.get("children") or [])
+
+
+class QueryStats:
+    """单个命名查询的累计统计"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.slow = 0
+        self.wall_seconds = 0.0
+        self.wall_max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.available_seconds = 0.0
+        self.consumed_seconds = 0.0
+        self.rows = 0
+        self.parameter_bytes = 0
+        self.profiled = 0
+        self.db_hits = 0
+        self.last_plan: Optional[Dict] = None
+
+    def observe(self, wall: float, rows: int, param_bytes: int,
+                available_ms: Optional[int], consumed_ms: Optional[int]):
+        self.calls += 1
+        self.wall_seconds += wall
+        self.wall_max = max(self.wall_max, wall)
+        for i, bound in enumerate(BUCKETS):
+            if wall <= bound:
+                self.buckets[i] += 1
+        self.rows += rows
+        self.parameter_bytes += param_bytes
+        self.available_seconds += (available_ms or 0) / 1000
+        self.consumed_seconds += (consumed_ms or 0) / 1000
+
+    def to_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "slow": self.slow,
+            "wall_seconds_total": round(self.wall_seconds, 6),
+            "wall_seconds_avg": round(self.wall_seconds / self.calls, 6) if self.calls else 0.0,
+            "wall_seconds_max": round(self.wall_max, 6),
+            "server_available_seconds_total": round(self.available_seconds, 6),
+            "server_consumed_seconds_total": round(self.consumed_seconds, 6),
+            "rows_total": self.rows,
+            "parameter_bytes_total": self.parameter_bytes,
+            "profiled": self.profiled,
+            "db_hits_total": self.db_hits,
+            "last_plan": self.last_plan,
+        }
+
+
+class QueryMetrics:
+    """全部命名查询的统计与按需 PROFILE 开关（同步、异步驱动共用，线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, QueryStats] = {}
+        self._profile_requests: Dict[str, int] = defaultdict(int)
+
+    def _get(self, name: str) -> QueryStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = QueryStats(name)
+        return stats
+
+    def request_profile(self, name: str, runs: int = 1):
+        """该查询接下来的 runs 次执行加 PROFILE 前缀，记录 db hits 和执行计划"""
+        with self._lock:
+            self._profile_requests[name] += runs
+
+    def take_profile(self, name: str) -> bool:
+        with self._lock:
+            if self._profile_requests.get(name, 0) <= 0:
+                return False
+            self._profile_requests[name] -= 1
+            if not self._profile_requests[name]:
+                del self._profile_requests[name]
+            return True
+
+    def pending_profiles(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._profile_requests)
+
+    def record(self, name: str, query: str, parameters: Optional[Dict], wall: float,
+               rows: int, summary=None):
+        """记录一次成功执行；summary 为驱动的 ResultSummary（流式读取中途停止时为 None）"""
+        if not settings.QUERY_METRICS_ENABLED:
+            return
+        param_bytes = parameter_bytes(parameters)
+        available = getattr(summary, "result_available_after", None)
+        consumed = getattr(summary, "result_consumed_after", None)
+        profile = getattr(summary, "profile", None)
+        plan = _plan(profile) if profile else None
+        threshold = settings.SLOW_QUERY_MS / 1000
+        slow = settings.SLOW_QUERY_MS > 0 and wall >= threshold
+        with self._lock:
+            stats = self._get(name)
+            stats.observe(wall, rows, param_bytes, available, consumed)
+            if profile:
+                stats.profiled += 1
+                stats.db_hits += _db_hits(profile)
+                stats.last_plan = plan
+            if slow:
+                stats.slow += 1
+        if slow or plan is not None:
+            self._log_slow(name, query, wall, rows, parameter_bytes(parameters, exact=True), available, consumed, plan)
+
+    def record_error(self, name: str):
+        if not settings.QUERY_METRICS_ENABLED:
+            return
+        with self._lock:
+            self._get(name).errors += 1
+
+    def _log_slow(self, name: str, query: str, wall: float, rows: int, param_bytes: int,
+                  available: Optional[int], consumed: Optional[int], plan: Optional[Dict]):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "query_name": name,
+            "wall_ms": round(wall * 1000, 1),
+            "server_available_ms": available,
+            "server_consumed_ms": consumed,
+            "rows": rows,
+            "parameter_bytes": param_bytes,
+            "query": " ".join(query.split()),
+        }
+        if plan is not None:
+            entry["plan"] = plan
+        slow_logger.warning(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in sorted(self._stats.items())}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def render(self) -> List[str]:
+        """查询统计的 Prometheus 文本行"""
+        with self._lock:
+            stats = sorted(self._stats.values(), key=lambda s: s.name)
+            lines = [
+                "# HELP graph_query_duration_seconds Client wall time per named Cypher query.",
+                "# TYPE graph_query_duration_seconds histogram",
+            ]
+            for s in stats:
+                label = _labels(query=s.name)
+                for bound, count in zip(BUCKETS, s.buckets):
+                    lines.append(f'graph_query_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'graph_query_duration_seconds_bucket{{{label},le="+Inf"}} {s.calls}')
+                lines.append(f"graph_query_duration_seconds_sum{{{label}}} {s.wall_seconds:.6f}")
+                lines.append(f"graph_query_duration_seconds_count{{{label}}} {s.calls}")
+            for metric, attr, help_text in _COUNTERS:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for s in stats:
+                    lines.append(f"{metric}{{{_labels(query=s.name)}}} {_number(getattr(s, attr))}")
+        return lines
+
+
+_COUNTERS = [
+    ("graph_query_server_available_seconds_total", "available_seconds",
+     "Server time until the first record was available (result_available_after)."),
+    ("graph_query_server_consumed_seconds_total", "consumed_seconds",
+     "Server time to consume all records (result_consumed_after)."),
+    ("graph_query_rows_total", "rows", "Records returned."),
+    ("graph_query_parameter_bytes_total", "parameter_bytes", "JSON size of query parameters."),
+    ("graph_query_db_hits_total", "db_hits", "Database hits of PROFILE executions."),
+    ("graph_query_profiled_total", "profiled", "PROFILE executions."),
+    ("graph_query_slow_total", "slow", "Executions slower than SLOW_QUERY_MS."),
+    ("graph_query_errors_total", "errors", "Failed executions."),
+]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def _number(value) -> str:
+    return f"{value:.6f}" if isinstance(value, float) else str(int(value))
+
+
+def render_gauges(prefix: str, groups: List[Tuple[Dict[str, str], Dict]]) -> List[str]:
+    """
+    把统计字典中的数值字段输出为 Prometheus gauge（非数值字段忽略）
+
+    Args:
+        groups: [(标签, 统计字典)]，如 [({"driver": "sync"}, pool_metrics), ({"driver": "async"}, ...)]
+    """
+    series: Dict[str, List[str]] = {}
+    for labels, values in groups:
+        label = _labels(**labels)
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            metric = f"{prefix}_{key}"
+            sample = f"{metric}{{{label}}}" if label else metric
+            series.setdefault(metric, []).append(f"{sample} {_number(value)}")
+    lines = []
+    for metric, samples in series.items():
+        lines.append(f"# TYPE {metric} gauge")
+        lines.extend(samples)
+    return lines
+
+
+def configure_slow_log():
+    """SLOW_QUERY_LOG 配置了文件路径时，慢查询日志单独写入该文件"""
+    if not settings.SLOW_QUERY_LOG:
+        return
+    Path(settings.SLOW_QUERY_LOG).parent.mkdir(parents=True, exist_ok=True)
+    handler = logging.FileHandler(settings.SLOW_QUERY_LOG, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    slow_logger.addHandler(handler)
+    slow_logger.propagate = False
+    logger.info(f"📝 Slow query log: {settings.SLOW_QUERY_LOG} (>= {settings.SLOW_QUERY_MS} ms)")
+
+
+metrics = QueryMetrics()
@@ -0,0 +1,349 @@
+"""
+图数据库 Schema 迁移
+为所有 MERGE 键创建唯一约束和索引，按版本号顺序执行并记录已应用的版本
+
+多个进程（uvicorn worker、命令行工具）可能同时执行迁移：每个版本执行前先在 SchemaMigration.version
+唯一约束的保护下认领（MERGE 版本节点并标记 running），同一版本只由认领成功的进程执行，
+其他进程等待其完成后继续下一个版本
+
+服务启动时只同步执行约束和索引语句（migrate(backfill=False)），全图数据回填在等待索引上线的后台线程中执行，
+回填完成前 /ready 返回 503；命令行 migrate 同时执行两者
+
+命令行用法:
+    python -m app.schema migrate     # 执行未应用的迁移
+    python -m app.schema status      # 查看迁移版本和索引状态
+    python -m app.schema wait        # 等待所有索引上线
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Union
+
+from app.config import settings
+from app.database import db
+from app.services import call_buckets, collision_service, graph_stats, name_match
+
+logger = logging.getLogger(__name__)
+
+# 迁移步骤：Cypher 语句（约束、索引），或接收 session 的可调用对象（全图数据回填）
+Step = Union[str, Callable]
+
+
+@dataclass
+class Migration:
+    """一个版本的 Schema 变更"""
+    version: int
+    description: str
+    steps: List[Step]
+
+    @property
+    def ddl(self) -> List[str]:
+        return [step for step in self.steps if not callable(step)]
+
+    @property
+    def backfills(self) -> List[Callable]:
+        return [step for step in self.steps if callable(step)]
+
+
+# ==================== 迁移清单（只追加，不修改已发布的版本） ====================
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "MERGE 键唯一约束及常用查询索引", [
+        "CREATE CONSTRAINT phone_number_unique IF NOT EXISTS FOR (p:Phone) REQUIRE p.number IS UNIQUE",
+        "CREATE CONSTRAINT wechat_wxid_unique IF NOT EXISTS FOR (u:WeChat) REQUIRE u.wxid IS UNIQUE",
+        "CREATE CONSTRAINT person_name_unique IF NOT EXISTS FOR (p:Person) REQUIRE p.name IS UNIQUE",
+        "CREATE INDEX wechat_nickname IF NOT EXISTS FOR (u:WeChat) ON (u.nickname)",
+        "CREATE INDEX phone_name IF NOT EXISTS FOR (p:Phone) ON (p.name)",
+        "CREATE INDEX call_last_call IF NOT EXISTS FOR ()-[r:CALL]-() ON (r.last_call)",
+    ]),
+    Migration(2, "碰撞分析物化：热点计数与共同联系人关系", [
+        "CREATE INDEX phone_hot_owner_count IF NOT EXISTS FOR (p:Phone) ON (p.hot_owner_count)",
+        "CREATE INDEX shares_contact_count IF NOT EXISTS FOR ()-[s:SHARES_CONTACT]-() ON (s.count)",
+        collision_service.rebuild_all,
+    ]),
+    Migration(3, "跨源名称匹配：名称分词查找索引", [
+        "CREATE CONSTRAINT name_token_value_unique IF NOT EXISTS FOR (t:NameToken) REQUIRE t.value IS UNIQUE",
+        "CREATE INDEX phone_name_key IF NOT EXISTS FOR (p:Phone) ON (p.name_key)",
+        "CREATE INDEX wechat_name_key IF NOT EXISTS FOR (u:WeChat) ON (u.name_key)",
+        name_match.backfill,
+    ]),
+    Migration(4, "图版本号节点（内存图投影失效判断）", [
+        "CREATE CONSTRAINT graph_meta_key_unique IF NOT EXISTS FOR (m:GraphMeta) REQUIRE m.key IS UNIQUE",
+    ]),
+    Migration(5, "统计计数器分片节点", [
+        "CREATE CONSTRAINT graph_stats_shard_unique IF NOT EXISTS FOR (s:GraphStats) REQUIRE s.shard IS UNIQUE",
+        graph_stats.rebuild,
+    ]),
+    Migration(6, "通话按天分桶聚合，CALL.last_call 统一为时间值", [
+        "CREATE INDEX call_day_day IF NOT EXISTS FOR ()-[d:CALL_DAY]-() ON (d.day)",
+        call_buckets.normalize_last_call,
+    ]),
+]
+
+
+# 迁移记录节点的版本唯一约束（在执行任何迁移之前创建，认领版本依赖它）
+MIGRATION_CONSTRAINT = """
+CREATE CONSTRAINT schema_migration_version_unique IF NOT EXISTS
+FOR (m:SchemaMigration) REQUIRE m.version IS UNIQUE
+"""
+
+# 没有唯一约束时并发迁移可能留下重复的版本节点，创建约束前每个版本只保留一个
+DEDUPE_MIGRATIONS_QUERY = """
+MATCH (m:SchemaMigration)
+WITH m.version AS version, collect(m) AS nodes
+WHERE size(nodes) > 1
+UNWIND tail(nodes) AS duplicate
+DELETE duplicate
+"""
+
+# 认领一个版本：MERGE 版本节点后先加写锁再读取状态，同一版本只有一个进程把它改为 running。
+# 迁移记录的 status：new（刚创建）/ running（执行中，phase 为 ddl 或 backfill）/
+# indexed（约束和索引已创建，数据回填未执行）/ applied；旧版本写入的记录没有 status，视为 applied
+CLAIM_MIGRATION_QUERY = """
+MERGE (m:SchemaMigration {version: $version})
+ON CREATE SET m.status = 'new', m.description = $description
+SET m._lock = true
+REMOVE m._lock
+WITH m, m.status AS status
+FOREACH (_ IN CASE WHEN status = 'new' OR (status = 'indexed' AND $backfill) THEN [1] ELSE [] END |
+    SET m.status = 'running', m.phase = CASE status WHEN 'new' THEN 'ddl' ELSE 'backfill' END,
+        m.claimed_by = $owner, m.claimed_at = datetime()
+)
+RETURN status, m.phase AS phase, m.status = 'running' AND m.claimed_by = $owner AS claimed
+"""
+
+# 等待其他进程执行中的版本时的轮询间隔（秒）
+CLAIM_POLL_INTERVAL = 2.0
+
+# 启动后的 Schema 就绪状态（索引全部 ONLINE 且数据回填完成后 ready 置为 True，stage 为当前阶段）
+state: Dict = {"ready": False, "version": 0, "error": None, "stage": None}
+
+
+def get_current_version() -> int:
+    """读取数据库中已应用的最高迁移版本"""
+    results = db.execute_query(
+        """
+        MATCH (m:SchemaMigration) WHERE m.status IS NULL OR m.status = 'applied'
+        RETURN COALESCE(max(m.version), 0) as version
+        """
+    )
+    return results[0]["version"] if results else 0
+
+
+def applied_versions() -> Set[int]:
+    """已完整应用的迁移版本（只创建了约束和索引、尚未回填数据的版本不在其中）"""
+    rows = db.execute_query(
+        "MATCH (m:SchemaMigration) WHERE m.status IS NULL OR m.status = 'applied' RETURN m.version as version"
+    )
+    return {row["version"] for row in rows}
+
+
+def _ensure_migration_constraint():
+    with db.get_session() as session:
+        session.run(DEDUPE_MIGRATIONS_QUERY).consume()
+        session.run(MIGRATION_CONSTRAINT).consume()
+
+
+def _claim(migration: Migration, owner: str, backfill: bool, timeout: float) -> Optional[str]:
+    """
+    认领一个版本，返回本进程要执行的阶段（ddl / backfill），不需要执行时返回 None
+
+    其他进程正在执行该版本时轮询等待：对方完成后返回 None，对方失败（认领被释放）后重新认领；
+    只执行约束和索引时（backfill=False），对方已在执行数据回填则不必等待
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        with db.get_session() as session:
+            row = session.run(
+                CLAIM_MIGRATION_QUERY, version=migration.version, description=migration.description,
+                owner=owner, backfill=backfill
+            ).single()
+        if row["claimed"]:
+            return row["phase"]
+        if row["status"] != "running" or (not backfill and row["phase"] == "backfill"):
+            return None
+        if time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"Schema 迁移 v{migration.version} 正由其他进程执行，等待超时；若该进程已退出，"
+                f"删除 (:SchemaMigration {{version: {migration.version}, status: 'running'}}) 后重试"
+            )
+        logger.info(f"⏳ Schema migration v{migration.version} is being applied by another process, waiting")
+        time.sleep(CLAIM_POLL_INTERVAL)
+
+
+def migrate(backfill: bool = True, timeout: float = None) -> Dict:
+    """
+    依次执行所有未应用的迁移（每个版本先认领，并发执行的进程不会重复执行同一版本）
+
+    Args:
+        backfill: False 时只执行约束和索引语句，版本记录为 indexed，数据回填留给之后的 migrate()
+        timeout: 等待其他进程执行中的版本的超时时间（秒），默认 SCHEMA_MIGRATION_WAIT_TIMEOUT
+
+    Returns:
+        迁移结果（起止版本、本次完整应用的版本列表、只创建了约束和索引的版本列表）
+    """
+    timeout = settings.SCHEMA_MIGRATION_WAIT_TIMEOUT if timeout is None else timeout
+    _ensure_migration_constraint()
+    owner = uuid.uuid4().hex
+    done = applied_versions()
+    applied, indexed = [], []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        phase = _claim(migration, owner, backfill, timeout)
+        if phase is None:
+            continue
+        logger.info(f"🔧 Applying schema migration v{migration.version} ({phase}): {migration.description}")
+        try:
+            # Schema 语句不能与数据写入共用事务，每一步单独以自动提交方式执行
+            with db.get_session() as session:
+                if phase == "ddl":
+                    for step in migration.ddl:
+                        session.run(step).consume()
+                if phase == "backfill" or backfill:
+                    for step in migration.backfills:
+                        step(session)
+                status = "applied" if phase == "backfill" or backfill or not migration.backfills else "indexed"
+                session.run(
+                    """
+                    MATCH (m:SchemaMigration {version: $version})
+                    SET m.status = $status, m.applied_at = datetime()
+                    REMOVE m.phase
+                    """,
+                    version=migration.version,
+                    status=status
+                ).consume()
+        except Exception as e:
+            # 释放认领（约束和索引已创建的版本回到 indexed），其他进程或下次启动时重新执行
+            with db.get_session() as session:
+                session.run(
+                    """
+                    MATCH (m:SchemaMigration {version: $version})
+                    FOREACH (_ IN CASE WHEN $phase = 'ddl' THEN [1] ELSE [] END | DELETE m)
+                    FOREACH (_ IN CASE WHEN $phase = 'backfill' THEN [1] ELSE [] END |
+                        SET m.status = 'indexed' REMOVE m.phase)
+                    """,
+                    version=migration.version,
+                    phase=phase
+                ).consume()
+            logger.error(
+                f"❌ Schema migration v{migration.version} failed: {str(e)}"
+                f"（若为唯一约束创建失败，请先清理重复节点）"
+            )
+            raise
+        (applied if status == "applied" else indexed).append(migration.version)
+
+    current = get_current_version()
+
+    state["version"] = current
+    if applied or indexed:
+        logger.info(f"✅ Schema migrated to v{current}, applied: {applied}, backfill pending: {indexed}")
+    else:
+        logger.info(f"✅ Schema is up to date (v{current})")
+    return {"version": current, "applied": applied, "backfill_pending": indexed}
+
+
+def index_status() -> List[Dict]:
+    """列出所有索引（含约束背后的索引）及其上线状态"""
+    return db.execute_query(
+        """
+        SHOW INDEXES
+        YIELD name, type, entityType, labelsOrTypes, properties, state, populationPercent
+        WHERE type <> 'LOOKUP'
+        RETURN name, type, entityType, labelsOrTypes, properties, state, populationPercent
+        ORDER BY name
+        """
+    )
+
+
+def wait_for_indexes(timeout: float = None, poll_interval: float = 1.0) -> List[Dict]:
+    """
+    阻塞等待所有索引进入 ONLINE 状态
+
+    Raises:
+        RuntimeError: 有索引构建失败
+        TimeoutError: 超时仍有索引未上线
+    """
+    timeout = settings.SCHEMA_INDEX_WAIT_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    while True:
+        indexes = index_status()
+        failed = [i["name"] for i in indexes if i["state"] == "FAILED"]
+        if failed:
+            raise RuntimeError(f"索引构建失败: {failed}")
+        pending = [i for i in indexes if i["state"] != "ONLINE"]
+        if not pending:
+            return indexes
+        if time.monotonic() >= deadline:
+            raise TimeoutError(
+                "索引未在规定时间内上线: "
+                + ", ".join(f"{i['name']}({i['populationPercent']:.0f}%)" for i in pending)
+            )
+        logger.info(
+            "⏳ Waiting for indexes: "
+            + ", ".join(f"{i['name']} {i['populationPercent']:.0f}%" for i in pending)
+        )
+        time.sleep(poll_interval)
+
+
+def bootstrap():
+    """
+    启动时的 Schema 初始化：同步执行约束和索引语句（不回填数据，启动不被全图回填阻塞），
+    然后在后台线程等待索引上线、执行数据回填。
+    两者完成前 state["ready"] 为 False，/ready 接口返回 503
+    """
+    state.update({"ready": False, "error": None, "stage": "ddl"})
+    migrate(backfill=False)
+
+    def _wait():
+        try:
+            state["stage"] = "indexes"
+            wait_for_indexes()
+            logger.info("✅ All indexes are online")
+            state["stage"] = "backfill"
+            migrate()
+            state.update({"ready": True, "stage": None})
+        except Exception as e:
+            state["error"] = str(e)
+            logger.error(f"❌ Schema not ready: {str(e)}")
+
+    threading.Thread(target=_wait, name="schema-bootstrap", daemon=True).start()
+
+
+# ==================== 命令行入口 ====================
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.schema", description="图数据库 Schema 迁移工具")
+    parser.add_argument("command", choices=["migrate", "status", "wait"], help="要执行的操作")
+    parser.add_argument("--timeout", type=float, default=None, help="等待索引上线的超时时间（秒）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    db.connect()
+    try:
+        if args.command == "migrate":
+            result = migrate()
+            result["indexes"] = wait_for_indexes(args.timeout)
+        elif args.command == "wait":
+            result = {"indexes": wait_for_indexes(args.timeout)}
+        else:
+            current = get_current_version()
+            latest = max(m.version for m in MIGRATIONS)
+            done = applied_versions()
+            result = {
+                "version": current,
+                "latest": latest,
+                "pending": [m.version for m in MIGRATIONS if m.version not in done],
+                "indexes": index_status()
+            }
+        print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,5 +3,8 @@
 """
 from . import ingest_service
 from . import analysis_service
+from . import job_service
+from . import async_ingest_service
+from . import async_analysis_service
 
-__all__ = ["ingest_service", "analysis_service"]
+__all__ = ["ingest_service", "analysis_service", "job_service", "async_ingest_service", "async_analysis_service"]
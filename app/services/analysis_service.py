@@ -3,13 +3,85 @@
 包含多种图算法：共同联系人、路径分析、团伙挖掘、中心节点分析等
 """
 from typing import List, Dict, Optional
+from app import query_metrics
+from app.config import settings
 from app.database import db
+from app.services import (
+    call_buckets, centrality, community, event_store, expansion, graph_projection, graph_stats, name_match,
+    path_engine
+)
+from app.services.graph_projection import GraphProjection
+from app.services.result_cache import cached
 import logging
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
 
+# ==================== 目标分析 ====================
+
+TARGET_INFO_QUERY = """
+MATCH (phone:Phone {number: $number})
+OPTIONAL MATCH (person:Person)-[:HAS_CONTACT]->(phone)
+RETURN phone.number as number, 
+       phone.name as name,
+       collect(DISTINCT person.name) as in_contacts_of
+"""
+
+# 通过号码或姓名匹配
+TARGET_OWNER_QUERY = """
+MATCH (owner:Person)-[:HAS_CONTACT]->(contact:Phone)
+WHERE owner.name = $number OR contact.number = $number
+WITH owner, collect({number: contact.number, name: contact.name}) as contacts
+RETURN owner.name as owner_name, contacts
+LIMIT 1
+"""
+
+TARGET_RELATION_QUERY = """
+MATCH (p1:Person)-[:HAS_CONTACT]->(phone:Phone)<-[:HAS_CONTACT]-(p2:Person)
+WHERE p1.name IN $owners AND p2.name IN $owners AND p1 <> p2 AND id(p1) < id(p2)
+WITH p1.name as person1, p2.name as person2, 
+     collect(DISTINCT phone.number) as common_phones,
+     count(DISTINCT phone) as common_count
+RETURN person1, person2, common_phones, common_count
+ORDER BY common_count DESC
+"""
+
+
+def _new_target_result(target_number: str) -> Dict:
+    return {
+        "target": target_number,
+        "target_info": None,        # 目标号码信息
+        "owners": [],               # 谁的通讯录里有这个号码
+        "contacts": [],             # 如果目标是机主，他的联系人
+        "related_persons": [],      # 相关人物之间的关系
+        "nodes": [],                # 图谱节点
+        "edges": [],                # 图谱边
+        "summary": {}
+    }
+
+
+def _apply_target_info(result: Dict, r: Dict):
+    result["target_info"] = {
+        "number": r["number"],
+        "name": r["name"] or "未知",
+        "in_contacts_of": r["in_contacts_of"] or []
+    }
+    result["owners"] = r["in_contacts_of"] or []
+
+
+def _related_person(r: Dict) -> Dict:
+    return {
+        "person1": r["person1"],
+        "person2": r["person2"],
+        "common_phones": r["common_phones"][:5],
+        "common_count": r["common_count"]
+    }
+
+
+@cached("analyze_target")
 def analyze_target(target_number: str) -> Dict:
     """
     以目标为中心的关系分析
@@ -25,155 +97,26 @@ def analyze_target(target_number: str) -> Dict:
     Returns:
         包含节点和关系的图谱数据，可直接用于可视化
     """
-    result = {
-        "target": target_number,
-        "target_info": None,        # 目标号码信息
-        "owners": [],               # 谁的通讯录里有这个号码
-        "contacts": [],             # 如果目标是机主，他的联系人
-        "related_persons": [],      # 相关人物之间的关系
-        "nodes": [],                # 图谱节点
-        "edges": [],                # 图谱边
-        "summary": {}
-    }
+    result = _new_target_result(target_number)
     
     try:
         # ==================== 1. 查找目标号码信息 ====================
-        target_query = """
-        MATCH (phone:Phone {number: $number})
-        OPTIONAL MATCH (person:Person)-[:HAS_CONTACT]->(phone)
-        RETURN phone.number as number, 
-               phone.name as name,
-               collect(DISTINCT person.name) as in_contacts_of
-        """
-        target_results = db.execute_query(target_query, {"number": target_number})
-        
+        target_results = db.execute_read(TARGET_INFO_QUERY, {"number": target_number})
         if target_results:
-            r = target_results[0]
-            result["target_info"] = {
-                "number": r["number"],
-                "name": r["name"] or "未知",
-                "in_contacts_of": r["in_contacts_of"] or []
-            }
-            result["owners"] = r["in_contacts_of"] or []
+            _apply_target_info(result, target_results[0])
         
         # ==================== 2. 查找目标是否是某个机主 ====================
-        # 通过号码或姓名匹配
-        owner_query = """
-        MATCH (owner:Person)-[:HAS_CONTACT]->(contact:Phone)
-        WHERE owner.name = $number OR contact.number = $number
-        WITH owner, collect({number: contact.number, name: contact.name}) as contacts
-        RETURN owner.name as owner_name, contacts
-        LIMIT 1
-        """
-        owner_results = db.execute_query(owner_query, {"number": target_number})
-        
+        owner_results = db.execute_read(TARGET_OWNER_QUERY, {"number": target_number})
         if owner_results and owner_results[0]["contacts"]:
             result["contacts"] = owner_results[0]["contacts"][:20]  # 限制数量
         
         # ==================== 3. 查找相关人物之间的关系（通过共同联系人）====================
         if result["owners"]:
-            # 查找这些人之间的关系
-            relation_query = """
-            MATCH (p1:Person)-[:HAS_CONTACT]->(phone:Phone)<-[:HAS_CONTACT]-(p2:Person)
-            WHERE p1.name IN $owners AND p2.name IN $owners AND p1 <> p2 AND id(p1) < id(p2)
-            WITH p1.name as person1, p2.name as person2, 
-                 collect(DISTINCT phone.number) as common_phones,
-                 count(DISTINCT phone) as common_count
-            RETURN person1, person2, common_phones, common_count
-            ORDER BY common_count DESC
-            """
-            relation_results = db.execute_query(relation_query, {"owners": result["owners"]})
-            result["related_persons"] = [
-                {
-                    "person1": r["person1"],
-                    "person2": r["person2"],
-                    "common_phones": r["common_phones"][:5],
-                    "common_count": r["common_count"]
-                }
-                for r in relation_results
-            ]
-        
-        # ==================== 4. 构建图谱数据 ====================
-        nodes = []
-        edges = []
-        node_ids = set()
-        
-        # 添加目标节点
-        target_node_id = f"target_{target_number}"
-        nodes.append({
-            "id": target_node_id,
-            "label": result["target_info"]["name"] if result["target_info"] else target_number,
-            "type": "Target",
-            "number": target_number,
-            "size": 40
-        })
-        node_ids.add(target_node_id)
-        
-        # 添加机主节点（谁的通讯录有目标号码）
-        for owner in result["owners"]:
-            owner_id = f"person_{owner}"
-            if owner_id not in node_ids:
-                nodes.append({
-                    "id": owner_id,
-                    "label": owner,
-                    "type": "Person",
-                    "size": 30
-                })
-                node_ids.add(owner_id)
-            
-            # 添加边：机主 -> 目标
-            edges.append({
-                "from": owner_id,
-                "to": target_node_id,
-                "label": "HAS_CONTACT",
-                "type": "contact"
-            })
-        
-        # 添加目标的联系人（如果目标是机主）
-        for contact in result["contacts"][:15]:
-            contact_id = f"phone_{contact['number']}"
-            if contact_id not in node_ids and contact["number"] != target_number:
-                nodes.append({
-                    "id": contact_id,
-                    "label": contact["name"] or contact["number"],
-                    "type": "Phone",
-                    "number": contact["number"],
-                    "size": 20
-                })
-                node_ids.add(contact_id)
-                
-                # 添加边：目标 -> 联系人
-                edges.append({
-                    "from": target_node_id,
-                    "to": contact_id,
-                    "label": "KNOWS",
-                    "type": "knows"
-                })
-        
-        # 添加人物之间的关系边
-        for rel in result["related_persons"]:
-            p1_id = f"person_{rel['person1']}"
-            p2_id = f"person_{rel['person2']}"
-            edges.append({
-                "from": p1_id,
-                "to": p2_id,
-                "label": f"{rel['common_count']}个共同联系人",
-                "type": "common",
-                "strength": rel["common_count"]
-            })
+            relation_results = db.execute_read(TARGET_RELATION_QUERY, {"owners": result["owners"]})
+            result["related_persons"] = [_related_person(r) for r in relation_results]
         
-        result["nodes"] = nodes
-        result["edges"] = edges
-        
-        # ==================== 5. 汇总 ====================
-        result["summary"] = {
-            "target": target_number,
-            "target_name": result["target_info"]["name"] if result["target_info"] else "未知",
-            "owner_count": len(result["owners"]),
-            "contact_count": len(result["contacts"]),
-            "node_count": len(nodes),
-            "edge_count": len(edges)
-        }
+        # ==================== 4. 构建图谱数据 / 5. 汇总 ====================
+        _build_target_graph(result)
         
         logger.info(f"🔍 Target analysis completed for {target_number}: {result['summary']}")
         return result
@@ -183,125 +126,377 @@ def analyze_target(target_number: str) -> Dict:
         raise
 
 
-def auto_collision_analysis() -> Dict:
+def _build_target_graph(result: Dict) -> Dict:
+    """由目标分析的查询结果构建图谱节点、边和汇总（单目标与批量分析共用）"""
+    target_number = result["target"]
+    nodes = []
+    edges = []
+    node_ids = set()
+    
+    # 添加目标节点
+    target_node_id = f"target_{target_number}"
+    nodes.append({
+        "id": target_node_id,
+        "label": result["target_info"]["name"] if result["target_info"] else target_number,
+        "type": "Target",
+        "number": target_number,
+        "size": 40
+    })
+    node_ids.add(target_node_id)
+    
+    # 添加机主节点（谁的通讯录有目标号码）
+    for owner in result["owners"]:
+        owner_id = f"person_{owner}"
+        if owner_id not in node_ids:
+            nodes.append({
+                "id": owner_id,
+                "label": owner,
+                "type": "Person",
+                "size": 30
+            })
+            node_ids.add(owner_id)
+        
+        # 添加边：机主 -> 目标
+        edges.append({
+            "from": owner_id,
+            "to": target_node_id,
+            "label": "HAS_CONTACT",
+            "type": "contact"
+        })
+    
+    # 添加目标的联系人（如果目标是机主）
+    for contact in result["contacts"][:15]:
+        contact_id = f"phone_{contact['number']}"
+        if contact_id not in node_ids and contact["number"] != target_number:
+            nodes.append({
+                "id": contact_id,
+                "label": contact["name"] or contact["number"],
+                "type": "Phone",
+                "number": contact["number"],
+                "size": 20
+            })
+            node_ids.add(contact_id)
+            
+            # 添加边：目标 -> 联系人
+            edges.append({
+                "from": target_node_id,
+                "to": contact_id,
+                "label": "KNOWS",
+                "type": "knows"
+            })
+    
+    # 添加人物之间的关系边
+    for rel in result["related_persons"]:
+        p1_id = f"person_{rel['person1']}"
+        p2_id = f"person_{rel['person2']}"
+        edges.append({
+            "from": p1_id,
+            "to": p2_id,
+            "label": f"{rel['common_count']}个共同联系人",
+            "type": "common",
+            "strength": rel["common_count"]
+        })
+    
+    result["nodes"] = nodes
+    result["edges"] = edges
+    
+    result["summary"] = {
+        "target": target_number,
+        "target_name": result["target_info"]["name"] if result["target_info"] else "未知",
+        "owner_count": len(result["owners"]),
+        "contact_count": len(result["contacts"]),
+        "node_count": len(nodes),
+        "edge_count": len(edges)
+    }
+    return result
+
+
+# ==================== 批量目标分析（每个阶段一条 UNWIND 查询） ====================
+
+BATCH_TARGET_INFO_QUERY = """
+UNWIND $numbers AS number
+OPTIONAL MATCH (phone:Phone {number: number})
+OPTIONAL MATCH (person:Person)-[:HAS_CONTACT]->(phone)
+RETURN number,
+       phone IS NOT NULL as found,
+       phone.name as name,
+       collect(DISTINCT person.name) as in_contacts_of
+"""
+
+# 目标作为机主（姓名匹配）时的联系人；否则取通讯录里有该号码的任一机主（与单目标分析一致）
+BATCH_OWNER_CONTACTS_QUERY = """
+UNWIND $numbers AS number
+CALL {
+    WITH number
+    OPTIONAL MATCH (by_name:Person {name: number})
+    OPTIONAL MATCH (by_contact:Person)-[:HAS_CONTACT]->(:Phone {number: number})
+    WITH COALESCE(by_name, by_contact) as owner
+    WHERE owner IS NOT NULL
+    RETURN owner
+    LIMIT 1
+}
+MATCH (owner)-[:HAS_CONTACT]->(contact:Phone)
+WITH number, collect({number: contact.number, name: contact.name}) as contacts
+RETURN number, contacts[..20] as contacts
+"""
+
+# 通讯录里都有目标号码的机主两两之间的共同联系人（读取物化的 SHARES_CONTACT 关系）
+BATCH_RELATED_PERSONS_QUERY = """
+UNWIND $numbers AS number
+CALL {
+    WITH number
+    MATCH (p1:Person)-[:HAS_CONTACT]->(:Phone {number: number})<-[:HAS_CONTACT]-(p2:Person)
+    WHERE p1.name < p2.name
+    MATCH (p1)-[s:SHARES_CONTACT]->(p2)
+    RETURN p1, p2, s.count as common_count
+    ORDER BY common_count DESC
+    LIMIT $pair_limit
+}
+CALL {
+    WITH p1, p2
+    MATCH (p1)-[:HAS_CONTACT]->(phone:Phone)<-[:HAS_CONTACT]-(p2)
+    RETURN collect(phone.number)[..5] as common_phones
+}
+RETURN number, p1.name as person1, p2.name as person2, common_phones, common_count
+ORDER BY number, common_count DESC
+"""
+
+
+def _batch_target_results(numbers: List[str], info_rows: List[Dict],
+                          contact_rows: List[Dict], relation_rows: List[Dict]) -> Dict[str, Dict]:
+    """把三个批量阶段的查询结果按目标拆分"""
+    results = {number: _new_target_result(number) for number in numbers}
+    for r in info_rows:
+        if r["found"]:
+            _apply_target_info(results[r["number"]], r)
+    for r in contact_rows:
+        results[r["number"]]["contacts"] = r["contacts"]
+    for r in relation_rows:
+        results[r["number"]]["related_persons"].append(_related_person(r))
+    return results
+
+
+def _merge_target_graphs(numbers: List[str], results: Dict[str, Dict]):
     """
-    自动碰撞分析：从所有数据中自动发现关联关系
+    合并图谱：节点按 ID 去重，边按 (起点, 终点, 标签) 去重；
+    其他目标的联系人里出现的目标号码合并到对应的目标节点
+    """
+    targets = set(numbers)
+    merged_nodes = {}
+    merged_edges = {}
+    for number in numbers:
+        graph = _build_target_graph(results[number])
+        for node in graph["nodes"]:
+            if node["type"] == "Phone" and node["number"] in targets:
+                continue
+            merged_nodes.setdefault(node["id"], node)
+        for edge in graph["edges"]:
+            edge = dict(edge)
+            if edge["to"].startswith("phone_") and edge["to"][len("phone_"):] in targets:
+                edge["to"] = f"target_{edge['to'][len('phone_'):]}"
+            merged_edges.setdefault((edge["from"], edge["to"], edge["label"]), edge)
+    return merged_nodes, merged_edges
+
+
+def _batch_summary(numbers: List[str], results: Dict[str, Dict], merged_nodes: Dict, merged_edges: Dict) -> Dict:
+    summary = {
+        "target_count": len(numbers),
+        "found_count": sum(1 for r in results.values() if r["target_info"]),
+        "node_count": len(merged_nodes),
+        "edge_count": len(merged_edges)
+    }
+    return {
+        "targets": numbers,
+        "results": [results[number] for number in numbers],
+        "nodes": list(merged_nodes.values()),
+        "edges": list(merged_edges.values()),
+        "summary": summary
+    }
+
+
+def normalize_targets(target_numbers: List[str]) -> List[str]:
+    """去空白、去重（保持顺序），并检查数量上限"""
+    numbers = list(dict.fromkeys(str(n).strip() for n in target_numbers if n and str(n).strip()))
+    if len(numbers) > settings.BATCH_ANALYSIS_MAX_TARGETS:
+        raise ValueError(f"目标数量超过上限 {settings.BATCH_ANALYSIS_MAX_TARGETS}")
+    return numbers
+
+
+def batch_target_stages(numbers: List[str]) -> Dict[str, tuple]:
+    """批量目标分析的三个独立查询阶段：{阶段名: (语句, 参数)}"""
+    return {
+        "info": (BATCH_TARGET_INFO_QUERY, {"numbers": numbers}),
+        "contacts": (BATCH_OWNER_CONTACTS_QUERY, {"numbers": numbers}),
+        "relations": (BATCH_RELATED_PERSONS_QUERY, {"numbers": numbers, "pair_limit": settings.BATCH_ANALYSIS_PAIR_LIMIT}),
+    }
+
+
+def analyze_targets(target_numbers: List[str]) -> Dict:
+    """
+    批量目标分析
     
-    分析内容：
-    1. 共同联系人：查找所有人之间的共同联系人
-    2. 跨源关联：手机通讯录和微信好友的交叉
-    3. 热点号码：被多人共同联系的号码
+    三个查询阶段（目标信息、机主联系人、机主间关系）各只执行一条 UNWIND 查询，
+    彼此独立，并发执行；返回每个目标的分析结果（结构与单目标分析相同），
+    以及去重合并后的整体图谱
+    
+    Args:
+        target_numbers: 目标电话号码列表
     
     Returns:
-        碰撞分析结果
+        {"targets", "results", "nodes", "edges", "summary"}
     """
-    results = {
-        "common_contacts": [],      # 共同联系人
-        "cross_source_links": [],   # 跨数据源关联
-        "hot_numbers": [],          # 热点号码（被多人共同联系）
-        "person_relations": [],     # 人物之间的间接关系
-        "summary": {}
-    }
+    numbers = normalize_targets(target_numbers)
+    stages = batch_target_stages(numbers)
     
     try:
-        # ==================== 1. 查找所有人的共同联系人 ====================
-        common_query = """
-        MATCH (p1:Person)-[:HAS_CONTACT]->(phone:Phone)<-[:HAS_CONTACT]-(p2:Person)
-        WHERE p1 <> p2 AND id(p1) < id(p2)
-        WITH p1.name as person1, p2.name as person2, collect(DISTINCT phone.number) as common_phones, count(phone) as common_count
-        WHERE common_count >= 1
-        RETURN person1, person2, common_phones, common_count
-        ORDER BY common_count DESC
-        LIMIT 50
-        """
-        common_results = db.execute_query(common_query)
-        results["common_contacts"] = [
+        # 每个阶段在独立线程中使用独立会话
+        with ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix="batch-analysis") as executor:
+            futures = {name: executor.submit(db.execute_read, query, params) for name, (query, params) in stages.items()}
+            rows = {name: future.result() for name, future in futures.items()}
+        
+        results = _batch_target_results(numbers, rows["info"], rows["contacts"], rows["relations"])
+        merged_nodes, merged_edges = _merge_target_graphs(numbers, results)
+        
+        response = _batch_summary(numbers, results, merged_nodes, merged_edges)
+        logger.info(f"🔍 Batch target analysis completed: {response['summary']}")
+        return response
+    except Exception as e:
+        logger.error(f"❌ Failed to analyze {len(numbers)} targets: {str(e)}")
+        raise
+
+
+# ==================== 自动碰撞分析 ====================
+
+# 读取导入时物化的 SHARES_CONTACT 关系，只对排名前 50 的人物对展开共同号码
+COLLISION_COMMON_QUERY = """
+MATCH (p1:Person)-[s:SHARES_CONTACT]->(p2:Person)
+WHERE s.count >= 1
+WITH p1, p2, s.count as common_count
+ORDER BY common_count DESC
+LIMIT 50
+CALL {
+    WITH p1, p2
+    MATCH (p1)-[:HAS_CONTACT]->(phone:Phone)<-[:HAS_CONTACT]-(p2)
+    RETURN collect(DISTINCT phone.number) as common_phones
+}
+RETURN p1.name as person1, p2.name as person2, common_phones, common_count
+ORDER BY common_count DESC
+"""
+
+# 读取导入时维护的 hot_owner_count，只对前 30 个号码收集机主
+COLLISION_HOT_QUERY = """
+MATCH (phone:Phone)
+WHERE phone.hot_owner_count >= 2
+WITH phone
+ORDER BY phone.hot_owner_count DESC
+LIMIT 30
+CALL {
+    WITH phone
+    MATCH (p:Person)-[:HAS_CONTACT]->(phone)
+    RETURN collect(DISTINCT p.name) as owners
+}
+RETURN phone.number as number, phone.name as name, owners, phone.hot_owner_count as owner_count
+ORDER BY owner_count DESC
+"""
+
+COLLISION_RELATION_QUERY = """
+MATCH (p1:Person)-[s:SHARES_CONTACT]->(p2:Person)
+WHERE s.count >= 1
+RETURN p1.name as person1, p2.name as person2, s.count as shared_contacts
+ORDER BY shared_contacts DESC
+LIMIT 20
+"""
+
+
+def collision_stages() -> Dict[str, tuple]:
+    """
+    碰撞分析的四个独立查询阶段：{阶段名: (语句, 参数)}
+    
+    微信-电话交叉分析：通讯录姓名与微信昵称通过导入时建立的名称分词索引做键连接，
+    按分词集合的 Jaccard 相似度过滤（阈值 NAME_MATCH_THRESHOLD）
+    """
+    return {
+        "common": (COLLISION_COMMON_QUERY, None),
+        "hot": (COLLISION_HOT_QUERY, None),
+        "cross": (name_match.CROSS_SOURCE_QUERY, {
+            "threshold": settings.NAME_MATCH_THRESHOLD,
+            "max_token_freq": settings.NAME_MATCH_MAX_TOKEN_FREQ,
+            "limit": 30
+        }),
+        "relations": (COLLISION_RELATION_QUERY, None),
+    }
+
+
+def _collision_result(rows: Dict[str, List[Dict]]) -> Dict:
+    """把四个阶段的查询结果整理为碰撞分析结果"""
+    results = {
+        "common_contacts": [        # 共同联系人
             {
                 "person1": r["person1"],
                 "person2": r["person2"],
                 "common_phones": r["common_phones"],
                 "common_count": r["common_count"]
             }
-            for r in common_results
-        ]
-        
-        # ==================== 2. 热点号码分析 ====================
-        hot_query = """
-        MATCH (p:Person)-[:HAS_CONTACT]->(phone:Phone)
-        WITH phone.number as number, phone.name as name, collect(DISTINCT p.name) as owners, count(DISTINCT p) as owner_count
-        WHERE owner_count >= 2
-        RETURN number, name, owners, owner_count
-        ORDER BY owner_count DESC
-        LIMIT 30
-        """
-        hot_results = db.execute_query(hot_query)
-        results["hot_numbers"] = [
+            for r in rows["common"]
+        ],
+        "cross_source_links": [     # 跨数据源关联
+            {
+                "owner": r["owner"],
+                "phone": r["phone"],
+                "contact_name": r["contact_name"],
+                "matched_wxids": r["matched_wxids"],
+                "score": round(r["score"], 3)
+            }
+            for r in rows["cross"]
+        ],
+        "hot_numbers": [            # 热点号码（被多人共同联系）
             {
                 "number": r["number"],
                 "name": r["name"],
                 "owners": r["owners"],
                 "owner_count": r["owner_count"]
             }
-            for r in hot_results
-        ]
-        
-        # ==================== 3. 微信-电话交叉分析 ====================
-        # 查找同一个人（通过名字模糊匹配）在微信和通讯录中都出现
-        cross_query = """
-        MATCH (p:Person)-[:HAS_CONTACT]->(phone:Phone)
-        WHERE phone.name IS NOT NULL AND phone.name <> ''
-        OPTIONAL MATCH (owner:WeChat)-[:FRIEND]-(friend:WeChat)
-        WHERE friend.nickname = phone.name OR friend.nickname CONTAINS phone.name
-        WITH p.name as owner, phone.number as phone, phone.name as contact_name, 
-             collect(DISTINCT friend.wxid) as matched_wxids
-        WHERE size(matched_wxids) > 0
-        RETURN owner, phone, contact_name, matched_wxids
-        LIMIT 30
-        """
-        try:
-            cross_results = db.execute_query(cross_query)
-            results["cross_source_links"] = [
-                {
-                    "owner": r["owner"],
-                    "phone": r["phone"],
-                    "contact_name": r["contact_name"],
-                    "matched_wxids": r["matched_wxids"]
-                }
-                for r in cross_results
-            ]
-        except:
-            results["cross_source_links"] = []
-        
-        # ==================== 4. 人物关系网络 ====================
-        relation_query = """
-        MATCH (p1:Person)-[:HAS_CONTACT]->(phone:Phone)<-[:HAS_CONTACT]-(p2:Person)
-        WHERE p1 <> p2
-        WITH p1.name as person1, p2.name as person2, count(DISTINCT phone) as shared_contacts
-        WHERE shared_contacts >= 1
-        RETURN person1, person2, shared_contacts
-        ORDER BY shared_contacts DESC
-        LIMIT 20
-        """
-        relation_results = db.execute_query(relation_query)
-        results["person_relations"] = [
+            for r in rows["hot"]
+        ],
+        "person_relations": [       # 人物之间的间接关系
             {
                 "person1": r["person1"],
                 "person2": r["person2"],
                 "shared_contacts": r["shared_contacts"],
                 "relation_strength": "强" if r["shared_contacts"] >= 5 else ("中" if r["shared_contacts"] >= 2 else "弱")
             }
-            for r in relation_results
-        ]
-        
-        # ==================== 5. 汇总统计 ====================
-        results["summary"] = {
-            "common_contact_pairs": len(results["common_contacts"]),
-            "hot_numbers_count": len(results["hot_numbers"]),
-            "cross_links_count": len(results["cross_source_links"]),
-            "person_pairs": len(results["person_relations"]),
-            "analysis_status": "completed"
-        }
-        
+            for r in rows["relations"]
+        ],
+    }
+    results["summary"] = {
+        "common_contact_pairs": len(results["common_contacts"]),
+        "hot_numbers_count": len(results["hot_numbers"]),
+        "cross_links_count": len(results["cross_source_links"]),
+        "person_pairs": len(results["person_relations"]),
+        "analysis_status": "completed"
+    }
+    return results
+
+
+@cached("auto_collision_analysis")
+def auto_collision_analysis() -> Dict:
+    """
+    自动碰撞分析：从所有数据中自动发现关联关系
+    
+    共同联系人与热点号码读取导入时增量维护的物化结果（见 collision_service），
+    不再在请求时做全局模式匹配。
+    
+    分析内容：
+    1. 共同联系人：查找所有人之间的共同联系人
+    2. 跨源关联：手机通讯录和微信好友的交叉
+    3. 热点号码：被多人共同联系的号码
+    
+    Returns:
+        碰撞分析结果
+    """
+    try:
+        rows = {name: db.execute_read(query, params) for name, (query, params) in collision_stages().items()}
+        results = _collision_result(rows)
         logger.info(f"🔍 Auto collision analysis completed: {results['summary']}")
         return results
         
@@ -310,6 +505,19 @@ def auto_collision_analysis() -> Dict:
         raise
 
 
+def common_contacts_query(label: str) -> str:
+    """共同联系人的 Cypher 查询（投影过期时使用）"""
+    id_prop = graph_projection.LABEL_KEYS[label]
+    return query_metrics.register(f"analysis_service.common_contacts_{label.lower()}", f"""
+    MATCH (a:{label} {{{id_prop}: $id_a}})-[r1:CALL|FRIEND]-(common)-[r2:CALL|FRIEND]-(b:{label} {{{id_prop}: $id_b}})
+    WHERE a <> b AND common <> a AND common <> b
+    RETURN DISTINCT common.{id_prop} as common_id, 
+           labels(common)[0] as type,
+           COUNT(DISTINCT r1) + COUNT(DISTINCT r2) as contact_strength
+    ORDER BY contact_strength DESC
+    """)
+
+
 def find_common_contacts(id_a: str, id_b: str, node_type: str = "Phone") -> List[Dict]:
     """
     查找 A 和 B 的共同联系人
@@ -323,19 +531,17 @@ def find_common_contacts(id_a: str, id_b: str, node_type: str = "Phone") -> List
         共同联系人列表，包含联系次数统计
     """
     label = "Phone" if node_type == "Phone" else "WeChat"
-    id_prop = "number" if node_type == "Phone" else "wxid"
     
-    query = f"""
-    MATCH (a:{label} {{{id_prop}: $id_a}})-[r1:CALL|FRIEND]-(common)-[r2:CALL|FRIEND]-(b:{label} {{{id_prop}: $id_b}})
-    WHERE a <> b AND common <> a AND common <> b
-    RETURN DISTINCT common.{id_prop} as common_id, 
-           labels(common)[0] as type,
-           COUNT(DISTINCT r1) + COUNT(DISTINCT r2) as contact_strength
-    ORDER BY contact_strength DESC
-    """
+    projection = graph_projection.fresh_projection()
+    if projection is not None:
+        results = _common_contacts_in_memory(projection, id_a, id_b, label)
+        logger.info(f"🔍 Found {len(results)} common contacts between {id_a} and {id_b} (projection)")
+        return results
+    
+    query = common_contacts_query(label)
     
     try:
-        results = db.execute_query(query, {"id_a": id_a, "id_b": id_b})
+        results = db.execute_read(query, {"id_a": id_a, "id_b": id_b})
         logger.info(f"🔍 Found {len(results)} common contacts between {id_a} and {id_b}")
         return results
     except Exception as e:
@@ -343,7 +549,43 @@ def find_common_contacts(id_a: str, id_b: str, node_type: str = "Phone") -> List
         raise
 
 
-def find_shortest_path(source_id: str, target_id: str, max_depth: int = 5) -> Dict:
+def _relationship_counts(projection: GraphProjection, node: int, rel_types: List[str]) -> Dict[int, int]:
+    """节点与每个邻居之间的关系条数（不含自环）"""
+    neighbors, _ = projection.incident(node, rel_types)
+    neighbors = neighbors[neighbors != node]
+    values, counts = np.unique(neighbors, return_counts=True)
+    return dict(zip(values.tolist(), counts.tolist()))
+
+
+def _common_contacts_in_memory(projection: GraphProjection, id_a: str, id_b: str, label: str) -> List[Dict]:
+    """共同联系人（内存投影版，结果与 Cypher 版一致）"""
+    a, b = projection.lookup(id_a, label), projection.lookup(id_b, label)
+    if a is None or b is None or a == b:
+        return []
+    counts_a = _relationship_counts(projection, a, ["CALL", "FRIEND"])
+    counts_b = _relationship_counts(projection, b, ["CALL", "FRIEND"])
+    common = (counts_a.keys() & counts_b.keys()) - {a, b}
+    results = [
+        {
+            "common_id": projection.keys[node],
+            "type": projection.label_of(node),
+            "contact_strength": counts_a[node] + counts_b[node]
+        }
+        for node in common
+    ]
+    results.sort(key=lambda item: (-item["contact_strength"], item["common_id"]))
+    return results
+
+
+def find_shortest_path(
+    source_id: str,
+    target_id: str,
+    max_depth: int = 5,
+    rel_types: Optional[List[str]] = None,
+    max_degree: Optional[int] = None,
+    k: int = 1,
+    timeout_ms: Optional[int] = None
+) -> Dict:
     """
     查找两个目标之间的最短关联路径
     
@@ -351,34 +593,47 @@ def find_shortest_path(source_id: str, target_id: str, max_depth: int = 5) -> Di
         source_id: 起点 ID
         target_id: 终点 ID
         max_depth: 最大搜索深度
+        rel_types: 允许经过的关系类型（CALL / FRIEND / HAS_CONTACT，默认全部）
+        max_degree: 跳过度数超过该值的中间节点（超级节点）
+        k: 返回前 k 条不同路径
+        timeout_ms: 时间预算，超时返回已找到的路径（partial=True）
     
     Returns:
-        路径信息（节点列表和跳数）
+        路径信息（节点列表和跳数，以及备选路径）
     """
-    query = f"""
-    MATCH (start), (end)
-    WHERE (start.number = $source OR start.wxid = $source)
-      AND (end.number = $target OR end.wxid = $target)
-    MATCH path = shortestPath((start)-[*1..{max_depth}]-(end))
-    RETURN [n in nodes(path) | COALESCE(n.number, n.wxid)] as path_nodes,
-           [r in relationships(path) | type(r)] as relationship_types,
-           length(path) as hops
-    LIMIT 1
-    """
-    
     try:
-        results = db.execute_query(query, {"source": source_id, "target": target_id})
-        if results:
-            logger.info(f"🔍 Found path from {source_id} to {target_id} with {results[0]['hops']} hops")
-            return results[0]
+        result = path_engine.find_paths(source_id, target_id, max_depth, rel_types, max_degree, k, timeout_ms)
+        if result["paths"]:
+            logger.info(
+                f"🔍 Found {len(result['paths'])} path(s) from {source_id} to {target_id}, "
+                f"shortest {result['hops']} hops ({result['engine']}, {result['elapsed_ms']}ms)"
+            )
         else:
-            logger.info(f"❌ No path found between {source_id} and {target_id}")
-            return {"message": "No path found", "path_nodes": [], "hops": -1}
+            logger.info(f"❌ No path found between {source_id} and {target_id} ({result['message']})")
+        return result
     except Exception as e:
         logger.error(f"❌ Failed to find shortest path: {str(e)}")
         raise
 
 
+def frequent_contacts_query(label: str) -> str:
+    """频繁联系人的 Cypher 查询（投影过期时使用）"""
+    id_prop = graph_projection.LABEL_KEYS[label]
+    return query_metrics.register(f"analysis_service.frequent_contacts_{label.lower()}", f"""
+    MATCH (target:{label} {{{id_prop}: $target_id}})-[r:CALL|FRIEND]-(contact)
+    WITH contact, 
+         COALESCE(contact.{id_prop}, contact.number, contact.wxid) as contact_id,
+         CASE WHEN type(r) = 'CALL' THEN r.count ELSE 1 END as contact_count,
+         CASE WHEN type(r) = 'CALL' THEN r.total_duration ELSE NULL END as total_duration
+    RETURN contact_id,
+           labels(contact)[0] as type,
+           SUM(contact_count) as total_contacts,
+           SUM(total_duration) as total_duration_seconds
+    ORDER BY total_contacts DESC
+    LIMIT $top_n
+    """)
+
+
 def find_frequent_contacts(target_id: str, node_type: str = "Phone", top_n: int = 10) -> List[Dict]:
     """
     查找某个目标的频繁联系人（按联系次数排序）
@@ -392,24 +647,17 @@ def find_frequent_contacts(target_id: str, node_type: str = "Phone", top_n: int
         频繁联系人列表
     """
     label = "Phone" if node_type == "Phone" else "WeChat"
-    id_prop = "number" if node_type == "Phone" else "wxid"
     
-    query = f"""
-    MATCH (target:{label} {{{id_prop}: $target_id}})-[r:CALL|FRIEND]-(contact)
-    WITH contact, 
-         COALESCE(contact.{id_prop}, contact.number, contact.wxid) as contact_id,
-         CASE WHEN type(r) = 'CALL' THEN r.count ELSE 1 END as contact_count,
-         CASE WHEN type(r) = 'CALL' THEN r.total_duration ELSE NULL END as total_duration
-    RETURN contact_id,
-           labels(contact)[0] as type,
-           SUM(contact_count) as total_contacts,
-           SUM(total_duration) as total_duration_seconds
-    ORDER BY total_contacts DESC
-    LIMIT $top_n
-    """
+    projection = graph_projection.fresh_projection()
+    if projection is not None:
+        results = _frequent_contacts_in_memory(projection, target_id, label, top_n)
+        logger.info(f"🔍 Found {len(results)} frequent contacts for {target_id} (projection)")
+        return results
+    
+    query = frequent_contacts_query(label)
     
     try:
-        results = db.execute_query(query, {"target_id": target_id, "top_n": top_n})
+        results = db.execute_read(query, {"target_id": target_id, "top_n": top_n})
         logger.info(f"🔍 Found {len(results)} frequent contacts for {target_id}")
         return results
     except Exception as e:
@@ -417,220 +665,354 @@ def find_frequent_contacts(target_id: str, node_type: str = "Phone", top_n: int
         raise
 
 
-def find_central_nodes(node_type: str = "Phone", top_n: int = 10) -> List[Dict]:
+def _frequent_contacts_in_memory(projection: GraphProjection, target_id: str, label: str, top_n: int) -> List[Dict]:
+    """频繁联系人（内存投影版）：CALL 按通话次数计，FRIEND 每条计 1"""
+    target = projection.lookup(target_id, label)
+    if target is None:
+        return []
+    neighbors, edges = projection.incident(target, ["CALL", "FRIEND"])
+    keep = neighbors != target
+    neighbors, edges = neighbors[keep], edges[keep]
+    if len(neighbors) == 0:
+        return []
+    contacts, inverse = np.unique(neighbors, return_inverse=True)
+    totals = np.bincount(inverse, weights=projection.weight[edges])
+    durations = np.bincount(inverse, weights=projection.duration[edges])
+    order = np.lexsort((contacts, -totals))[:top_n]
+    return [
+        {
+            "contact_id": projection.keys[contacts[i]],
+            "type": projection.label_of(contacts[i]),
+            "total_contacts": int(totals[i]),
+            "total_duration_seconds": int(durations[i])
+        }
+        for i in order
+    ]
+
+
+@cached("find_central_nodes")
+def find_central_nodes(node_type: str = "Phone", top_n: int = 10, metric: str = "degree") -> List[Dict]:
     """
-    查找中心节点（按度中心性排序）
+    查找中心节点
+    在内存图投影上计算度、加权度（通话次数）、通话总时长、PageRank 和近似介数中心性
     
     Args:
         node_type: 节点类型
         top_n: 返回前 N 个结果
+        metric: 排序指标（degree / weighted_degree / total_duration / pagerank / betweenness）
     
     Returns:
         中心节点列表
     """
     label = "Phone" if node_type == "Phone" else "WeChat"
-    id_prop = "number" if node_type == "Phone" else "wxid"
-    
-    query = f"""
-    MATCH (n:{label})
-    WITH n, SIZE([(n)-[]-(neighbor) | neighbor]) as degree
-    WHERE degree > 0
-    RETURN n.{id_prop} as node_id,
-           degree,
-           degree * 1.0 / (SELECT COUNT(*) FROM (MATCH (m:{label}) RETURN m)) as centrality_score
-    ORDER BY degree DESC
-    LIMIT $top_n
-    """
     
     try:
-        results = db.execute_query(query, {"top_n": top_n})
-        logger.info(f"🔍 Found {len(results)} central nodes")
+        results = centrality.top_nodes(label, top_n, metric)
+        logger.info(f"🔍 Found {len(results)} central nodes by {metric}")
         return results
     except Exception as e:
         logger.error(f"❌ Failed to find central nodes: {str(e)}")
         raise
 
 
-def find_communities(node_type: str = "Phone", min_size: int = 3) -> List[Dict]:
+def find_communities(
+    node_type: str = "Phone",
+    min_size: int = 3,
+    algorithm: str = "louvain",
+    weighted: bool = True,
+    seed: int = 0,
+    limit: int = 20
+) -> List[Dict]:
     """
     社区发现（团伙挖掘）- 查找紧密联系的群组
-    使用标签传播算法（Label Propagation）
+    在内存图投影（CALL / FRIEND / HAS_CONTACT）上运行 Louvain 模块度优化或标签传播，
+    同一图快照、同一参数的结果会被缓存
     
     Args:
         node_type: 节点类型
-        min_size: 最小社区规模
+        min_size: 最小社区规模（按该类型的成员数计）
+        algorithm: louvain / label_propagation
+        weighted: 是否以通话次数作为边权
+        seed: 随机种子（相同种子结果可复现）
+        limit: 最多返回的社区数（按规模降序）
     
     Returns:
         社区列表
     """
     label = "Phone" if node_type == "Phone" else "WeChat"
-    id_prop = "number" if node_type == "Phone" else "wxid"
-    
-    # 简化版社区检测：查找连通子图
-    query = f"""
-    CALL {{
-        MATCH (n:{label})
-        WITH collect(n) as nodes
-        UNWIND nodes as node
-        MATCH path = (node)-[*1..2]-(neighbor:{label})
-        WITH node, collect(DISTINCT neighbor) as neighbors
-        WHERE SIZE(neighbors) >= $min_size - 1
-        RETURN node.{id_prop} as member, 
-               [n in neighbors | n.{id_prop}] as community_members,
-               SIZE(neighbors) as community_size
-        ORDER BY community_size DESC
-    }}
-    RETURN member, community_members, community_size
-    LIMIT 10
-    """
     
     try:
-        results = db.execute_query(query, {"min_size": min_size})
-        logger.info(f"🔍 Found {len(results)} potential communities")
+        results = community.list_communities(
+            label, min_size, limit, algorithm=algorithm, weighted=weighted, seed=seed
+        )
+        logger.info(f"🔍 Found {len(results)} communities by {algorithm}")
         return results
     except Exception as e:
         logger.error(f"❌ Failed to find communities: {str(e)}")
         raise
 
 
-def expand_network(target_id: str, depth: int = 2, node_type: str = "Phone") -> Dict:
+def expand_network(
+    target_id: str,
+    depth: int = 2,
+    node_type: str = "Phone",
+    rel_types: Optional[List[str]] = None,
+    max_nodes: Optional[int] = None,
+    max_per_level: Optional[int] = None,
+    hub_degree: Optional[int] = None
+) -> Dict:
     """
     扩展联系网络（N 度关系）
+    逐层扩展并去重，受每层 / 总节点数上限约束，枢纽节点标记为 collapsed 不再扩展
     
     Args:
         target_id: 目标 ID
         depth: 扩展深度（1=直接联系人，2=二度关系，等等）
         node_type: 节点类型
+        rel_types: 扩展经过的关系类型
+        max_nodes: 总节点数上限
+        max_per_level: 每层新增节点上限
+        hub_degree: 枢纽节点的度数阈值
     
     Returns:
-        网络扩展结果
-    """
-    label = "Phone" if node_type == "Phone" else "WeChat"
-    id_prop = "number" if node_type == "Phone" else "wxid"
-    
-    query = f"""
-    MATCH path = (target:{label} {{{id_prop}: $target_id}})-[*1..{depth}]-(contact)
-    WITH target, contact, length(path) as distance
-    WHERE target <> contact
-    RETURN DISTINCT COALESCE(contact.{id_prop}, contact.number, contact.wxid) as contact_id,
-           labels(contact)[0] as type,
-           MIN(distance) as degree,
-           COUNT(*) as path_count
-    ORDER BY degree, path_count DESC
+        网络扩展结果（按度数分组的联系人，以及供图谱渲染的 nodes / relationships）
     """
-    
     try:
-        results = db.execute_query(query, {"target_id": target_id})
-        
-        # 按度数分组
         network = {}
-        for item in results:
-            degree = item["degree"]
-            if degree not in network:
-                network[degree] = []
-            network[degree].append({
-                "contact_id": item["contact_id"],
-                "type": item["type"],
-                "path_count": item["path_count"]
-            })
+        nodes = []
+        relationships = []
+        summary = {}
+        for event in expansion.iter_expansion(
+            target_id, depth, node_type, rel_types, max_nodes, max_per_level, hub_degree
+        ):
+            if event["type"] == "done":
+                summary = event
+                continue
+            nodes.extend(event["nodes"])
+            relationships.extend(event["relationships"])
+            if event["level"] == 0:
+                continue
+            # 按度数分组
+            network[event["level"]] = [
+                {
+                    "contact_id": node["id"],
+                    "type": node["type"],
+                    "connections": node["degree"],
+                    "collapsed": node["collapsed"]
+                }
+                for node in event["nodes"]
+            ]
         
-        logger.info(f"🔍 Expanded network for {target_id} to depth {depth}, found {len(results)} contacts")
         return {
             "target": target_id,
             "depth": depth,
-            "total_contacts": len(results),
-            "network": network
+            "total_contacts": max(len(nodes) - 1, 0),
+            "network": network,
+            "nodes": nodes,
+            "relationships": relationships,
+            "truncated": summary.get("truncated", False),
+            "collapsed": summary.get("collapsed", 0)
         }
     except Exception as e:
         logger.error(f"❌ Failed to expand network: {str(e)}")
         raise
 
 
+# 通话模式：读取目标号码时间窗口内的按天分桶（CALL_DAY），按通话对象汇总
+CALL_PATTERN_QUERY = """
+MATCH (target:Phone {number: $target_id})-[d:CALL_DAY]-(contact:Phone)
+WHERE d.day >= date() - duration({days: $time_window_days})
+WITH target, contact,
+     collect(d) as days,
+     sum(d.count) as call_count,
+     sum(d.duration) as total_duration,
+     sum(CASE WHEN startNode(d) = target THEN d.count ELSE 0 END) as outgoing_calls,
+     min(d.first_call) as first_call_time,
+     max(d.last_call) as last_call_time
+RETURN contact.number as contact_id,
+       call_count,
+       outgoing_calls,
+       call_count - outgoing_calls as incoming_calls,
+       total_duration,
+       size(days) as active_days,
+       first_call_time,
+       last_call_time,
+       [h IN range(0, 23) | reduce(s = 0, d IN days | s + d.hours[h])] as hours,
+       [w IN range(1, 7) | reduce(s = 0, d IN days | s + CASE WHEN d.day.dayOfWeek = w THEN d.count ELSE 0 END)] as weekdays,
+       CASE 
+           WHEN total_duration / call_count < 60 THEN 'short'
+           WHEN total_duration / call_count < 300 THEN 'medium'
+           ELSE 'long'
+       END as avg_duration_category
+ORDER BY call_count DESC
+"""
+
+
+def _iso(value):
+    """Neo4j 时间值转为 ISO 文本（JSON 响应、结果缓存均可序列化）"""
+    return value.to_native().isoformat() if hasattr(value, "to_native") else value
+
+
+def new_call_pattern_totals() -> Dict:
+    return {
+        "total_contacts": 0,
+        "total_calls": 0,
+        "total_duration_seconds": 0,
+        "night_calls": 0,
+        "night_call_ratio": 0.0,
+        "first_seen": None,
+        "last_seen": None,
+        "hour_of_day": [0] * 24,
+        "day_of_week": [0] * 7,
+    }
+
+
+def add_call_pattern_row(totals: Dict, row: Dict) -> Dict:
+    """整理一个通话对象（时间值转文本、补充夜间通话数），并累加到汇总中"""
+    row["first_call_time"] = _iso(row["first_call_time"])
+    row["last_call_time"] = _iso(row["last_call_time"])
+    row["night_calls"] = sum(row["hours"][h] for h in call_buckets.NIGHT_HOURS)
+
+    totals["total_contacts"] += 1
+    totals["total_calls"] += row["call_count"]
+    totals["total_duration_seconds"] += row["total_duration"] or 0
+    totals["night_calls"] += row["night_calls"]
+    totals["hour_of_day"] = [a + b for a, b in zip(totals["hour_of_day"], row["hours"])]
+    totals["day_of_week"] = [a + b for a, b in zip(totals["day_of_week"], row["weekdays"])]
+    if row["first_call_time"] and (totals["first_seen"] is None or row["first_call_time"] < totals["first_seen"]):
+        totals["first_seen"] = row["first_call_time"]
+    if row["last_call_time"] and (totals["last_seen"] is None or row["last_call_time"] > totals["last_seen"]):
+        totals["last_seen"] = row["last_call_time"]
+    if totals["total_calls"]:
+        totals["night_call_ratio"] = round(totals["night_calls"] / totals["total_calls"], 4)
+    return row
+
+
+def _call_pattern_result(target_id: str, time_window_days: int, results: List[Dict]) -> Dict:
+    totals = new_call_pattern_totals()
+    contacts = [add_call_pattern_row(totals, row) for row in results]
+    return {
+        "target": target_id,
+        "time_window_days": time_window_days,
+        **totals,
+        "contacts": contacts
+    }
+
+
+def call_pattern_rows(target_id: str, time_window_days: int) -> List[Dict]:
+    """按通话对象汇总的原始结果：事件存储启用时扫描本地事件，否则读取按天分桶"""
+    if settings.EVENT_STORE_ENABLED:
+        return event_store.store.call_pattern(target_id, time_window_days)
+    return db.execute_read(CALL_PATTERN_QUERY, {
+        "target_id": target_id,
+        "time_window_days": time_window_days
+    })
+
+
 def analyze_call_pattern(target_id: str, time_window_days: int = 30) -> Dict:
     """
     通话模式分析（时间分布、通话时长统计）
     
+    事件存储启用时从本地通话事件汇总，不访问 Neo4j；关闭时读取按天分桶聚合，
+    只访问目标号码在时间窗口内的分桶关系。两种来源的结果相同：
+    每个通话对象的通话次数、主叫 / 被叫次数、活跃天数、首次 / 末次通话时间，
+    以及整体的小时分布（hour_of_day）、星期分布（day_of_week，周一到周日）和夜间通话占比
+    
     Args:
         target_id: 目标电话号码
-        time_window_days: 分析时间窗口（天）
+        time_window_days: 分析时间窗口（天，截至今天）
     
     Returns:
         通话模式统计
     """
-    query = """
-    MATCH (target:Phone {number: $target_id})-[r:CALL]-(contact)
-    WHERE r.last_call >= datetime() - duration({days: $time_window_days})
-    WITH target, contact, r
-    RETURN COALESCE(contact.number, contact.wxid) as contact_id,
-           r.count as call_count,
-           r.total_duration as total_duration,
-           r.last_call as last_call_time,
-           CASE 
-               WHEN r.total_duration / r.count < 60 THEN 'short'
-               WHEN r.total_duration / r.count < 300 THEN 'medium'
-               ELSE 'long'
-           END as avg_duration_category
-    ORDER BY call_count DESC
-    """
-    
     try:
-        results = db.execute_query(query, {
-            "target_id": target_id,
-            "time_window_days": time_window_days
-        })
-        
-        # 统计分析
-        total_calls = sum(r["call_count"] for r in results)
-        total_duration = sum(r["total_duration"] or 0 for r in results)
-        
+        results = call_pattern_rows(target_id, time_window_days)
         logger.info(f"🔍 Analyzed call pattern for {target_id}")
-        return {
-            "target": target_id,
-            "time_window_days": time_window_days,
-            "total_contacts": len(results),
-            "total_calls": total_calls,
-            "total_duration_seconds": total_duration,
-            "contacts": results
-        }
+        return _call_pattern_result(target_id, time_window_days, results)
     except Exception as e:
         logger.error(f"❌ Failed to analyze call pattern: {str(e)}")
         raise
 
 
+# 标签、关系类型清单（读取 schema 目录，不扫描数据）
+CATALOG_QUERY = """
+CALL db.labels() YIELD label
+WITH collect(label) AS labels
+CALL db.relationshipTypes() YIELD relationshipType
+RETURN labels, collect(relationshipType) AS types
+"""
+
+# 内部元数据节点，不计入统计
+INTERNAL_LABELS = {"SchemaMigration", "GraphMeta", "GraphStats"}
+
+# 查找索引和派生数据（名称分词、碰撞物化、按天分桶），单独列在 derived_by_type 中，不计入总数
+DERIVED_LABELS = {"NameToken"}
+DERIVED_TYPES = {"HAS_NAME_TOKEN", "SHARES_CONTACT", "CALL_DAY"}
+
+
+def _quote(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
+
+
+def count_stages(labels: List[str], types: List[str]) -> Dict[str, tuple]:
+    """
+    按标签、关系类型拼出计数查询，返回 {阶段名: (查询, 参数)}
+
+    每个分支都是单标签 / 单关系类型的 count()，由计数存储直接给出，代价与数据量无关
+    """
+    labels = [l for l in labels if l not in INTERNAL_LABELS]
+    stages = {}
+    if labels:
+        stages["nodes"] = (query_metrics.register("analysis_service.node_counts", "\nUNION ALL\n".join(
+            f"MATCH (n:{_quote(l)}) RETURN $labels[{i}] as label, count(n) as node_count"
+            for i, l in enumerate(labels)
+        )), {"labels": labels})
+    if types:
+        stages["relationships"] = (query_metrics.register("analysis_service.relationship_counts", "\nUNION ALL\n".join(
+            f"MATCH ()-[r:{_quote(t)}]->() RETURN $types[{i}] as rel_type, count(r) as rel_count"
+            for i, t in enumerate(types)
+        )), {"types": types})
+    stages["derived"] = (graph_stats.STATS_QUERY, None)
+    return stages
+
+
+def _statistics_result(rows: Dict[str, List[Dict]]) -> Dict:
+    nodes = sorted((n for n in rows.get("nodes", []) if n["node_count"]), key=lambda n: -n["node_count"])
+    relationships = sorted((r for r in rows.get("relationships", []) if r["rel_count"]), key=lambda r: -r["rel_count"])
+    derived = rows["derived"][0] if rows.get("derived") else {}
+    data_nodes = [n for n in nodes if n["label"] not in DERIVED_LABELS]
+    data_relationships = [r for r in relationships if r["rel_type"] not in DERIVED_TYPES]
+    return {
+        "total_nodes": sum(n["node_count"] for n in data_nodes),
+        "total_relationships": sum(r["rel_count"] for r in data_relationships),
+        "nodes_by_type": data_nodes,
+        "relationships_by_type": data_relationships,
+        "derived": derived,
+        "derived_by_type": {
+            "nodes": [n for n in nodes if n["label"] in DERIVED_LABELS],
+            "relationships": [r for r in relationships if r["rel_type"] in DERIVED_TYPES],
+        }
+    }
+
+
+@cached("get_statistics")
 def get_statistics() -> Dict:
     """
     获取数据库统计信息
     
+    节点、关系数来自计数存储，派生统计（主叫号码数、通话次数等）来自导入时维护的计数器，
+    均不扫描全图；名称分词、共同联系人、按天分桶等派生数据的计数列在 derived_by_type 中，不计入总数
+    
     Returns:
         统计数据
     """
-    query = """
-    MATCH (n)
-    WITH labels(n)[0] as label, COUNT(n) as node_count
-    RETURN label, node_count
-    ORDER BY node_count DESC
-    """
-    
-    rel_query = """
-    MATCH ()-[r]->()
-    WITH type(r) as rel_type, COUNT(r) as rel_count
-    RETURN rel_type, rel_count
-    ORDER BY rel_count DESC
-    """
-    
     try:
-        nodes = db.execute_query(query)
-        relationships = db.execute_query(rel_query)
-        
-        total_nodes = sum(n["node_count"] for n in nodes)
-        total_relationships = sum(r["rel_count"] for r in relationships)
-        
-        return {
-            "total_nodes": total_nodes,
-            "total_relationships": total_relationships,
-            "nodes_by_type": nodes,
-            "relationships_by_type": relationships
-        }
+        catalog = db.execute_read(CATALOG_QUERY)[0]
+        stages = count_stages(catalog["labels"], catalog["types"])
+        return _statistics_result({name: db.execute_read(*stage) for name, stage in stages.items()})
     except Exception as e:
         logger.error(f"❌ Failed to get statistics: {str(e)}")
         raise
+
+
+query_metrics.register_queries(__name__, globals())
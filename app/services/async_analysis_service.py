@@ -0,0 +1,229 @@
+"""
+研判分析服务（异步版）
+供 async 接口在事件循环中直接调用：查询通过 async_db 执行，不占用线程池；
+同一请求内互不依赖的查询阶段用 asyncio.gather 并发执行（每个查询独立会话）。
+查询语句和结果整理与 analysis_service 共用，两者返回结构完全一致
+"""
+import asyncio
+import logging
+from datetime import datetime
+from itertools import islice
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.database import async_db
+from app.services import analysis_service as sync
+from app.services import event_store, graph_projection
+from app.services.result_cache import cached_async
+
+logger = logging.getLogger(__name__)
+
+
+async def _run_stages(stages: Dict[str, Tuple[str, Optional[Dict]]]) -> Dict[str, List[Dict]]:
+    """并发执行多个独立查询，返回 {阶段名: 结果行}"""
+    names = list(stages)
+    rows = await asyncio.gather(*(async_db.execute_read(*stages[name]) for name in names))
+    return dict(zip(names, rows))
+
+
+@cached_async("analyze_target")
+async def analyze_target(target_number: str) -> Dict:
+    """
+    以目标为中心的关系分析，见 analysis_service.analyze_target
+
+    目标信息和机主联系人两个阶段并发执行，相关人物关系依赖第一阶段的结果
+    """
+    result = sync._new_target_result(target_number)
+
+    try:
+        rows = await _run_stages({
+            "info": (sync.TARGET_INFO_QUERY, {"number": target_number}),
+            "owner": (sync.TARGET_OWNER_QUERY, {"number": target_number}),
+        })
+        if rows["info"]:
+            sync._apply_target_info(result, rows["info"][0])
+        if rows["owner"] and rows["owner"][0]["contacts"]:
+            result["contacts"] = rows["owner"][0]["contacts"][:20]  # 限制数量
+
+        if result["owners"]:
+            relation_results = await async_db.execute_read(sync.TARGET_RELATION_QUERY, {"owners": result["owners"]})
+            result["related_persons"] = [sync._related_person(r) for r in relation_results]
+
+        sync._build_target_graph(result)
+
+        logger.info(f"🔍 Target analysis completed for {target_number}: {result['summary']}")
+        return result
+
+    except Exception as e:
+        logger.error(f"❌ Failed to analyze target {target_number}: {str(e)}")
+        raise
+
+
+async def analyze_targets(target_numbers: List[str]) -> Dict:
+    """批量目标分析，见 analysis_service.analyze_targets（三个阶段并发执行）"""
+    numbers = sync.normalize_targets(target_numbers)
+
+    try:
+        rows = await _run_stages(sync.batch_target_stages(numbers))
+        results = sync._batch_target_results(numbers, rows["info"], rows["contacts"], rows["relations"])
+        merged_nodes, merged_edges = sync._merge_target_graphs(numbers, results)
+        response = sync._batch_summary(numbers, results, merged_nodes, merged_edges)
+        logger.info(f"🔍 Batch target analysis completed: {response['summary']}")
+        return response
+    except Exception as e:
+        logger.error(f"❌ Failed to analyze {len(numbers)} targets: {str(e)}")
+        raise
+
+
+@cached_async("auto_collision_analysis")
+async def auto_collision_analysis() -> Dict:
+    """自动碰撞分析，见 analysis_service.auto_collision_analysis（四个阶段并发执行）"""
+    try:
+        results = sync._collision_result(await _run_stages(sync.collision_stages()))
+        logger.info(f"🔍 Auto collision analysis completed: {results['summary']}")
+        return results
+    except Exception as e:
+        logger.error(f"❌ Failed to perform collision analysis: {str(e)}")
+        raise
+
+
+async def iter_common_contacts(id_a: str, id_b: str, node_type: str = "Phone") -> AsyncIterator[Dict]:
+    """逐条产出 A 和 B 的共同联系人（投影最新时在内存中计算，否则流式读取 Cypher 结果）"""
+    label = "Phone" if node_type == "Phone" else "WeChat"
+
+    projection = await graph_projection.fresh_projection_async()
+    if projection is not None:
+        results = sync._common_contacts_in_memory(projection, id_a, id_b, label)
+        logger.info(f"🔍 Found {len(results)} common contacts between {id_a} and {id_b} (projection)")
+        for item in results:
+            yield item
+        return
+
+    count = 0
+    try:
+        async for row in async_db.stream(sync.common_contacts_query(label), {"id_a": id_a, "id_b": id_b}):
+            count += 1
+            yield row
+    except Exception as e:
+        logger.error(f"❌ Failed to find common contacts: {str(e)}")
+        raise
+    logger.info(f"🔍 Found {count} common contacts between {id_a} and {id_b}")
+
+
+async def find_common_contacts(id_a: str, id_b: str, node_type: str = "Phone") -> List[Dict]:
+    """查找 A 和 B 的共同联系人"""
+    return [item async for item in iter_common_contacts(id_a, id_b, node_type)]
+
+
+async def iter_frequent_contacts(target_id: str, node_type: str = "Phone", top_n: int = 10) -> AsyncIterator[Dict]:
+    """逐条产出某个目标的频繁联系人（投影最新时在内存中计算，否则流式读取 Cypher 结果）"""
+    label = "Phone" if node_type == "Phone" else "WeChat"
+
+    projection = await graph_projection.fresh_projection_async()
+    if projection is not None:
+        results = sync._frequent_contacts_in_memory(projection, target_id, label, top_n)
+        logger.info(f"🔍 Found {len(results)} frequent contacts for {target_id} (projection)")
+        for item in results:
+            yield item
+        return
+
+    count = 0
+    try:
+        async for row in async_db.stream(
+            sync.frequent_contacts_query(label), {"target_id": target_id, "top_n": top_n}
+        ):
+            count += 1
+            yield row
+    except Exception as e:
+        logger.error(f"❌ Failed to find frequent contacts: {str(e)}")
+        raise
+    logger.info(f"🔍 Found {count} frequent contacts for {target_id}")
+
+
+async def find_frequent_contacts(target_id: str, node_type: str = "Phone", top_n: int = 10) -> List[Dict]:
+    """查找某个目标的频繁联系人"""
+    return [item async for item in iter_frequent_contacts(target_id, node_type, top_n)]
+
+
+async def iter_call_pattern(target_id: str, time_window_days: int = 30,
+                            totals: Optional[Dict] = None) -> AsyncIterator[Dict]:
+    """
+    逐条产出时间窗口内的通话对象
+
+    Args:
+        totals: 传入时在迭代过程中累计汇总字段（total_calls、hour_of_day、night_call_ratio 等，
+                见 analysis_service.new_call_pattern_totals）
+    """
+    totals = {} if totals is None else totals
+    totals.update(sync.new_call_pattern_totals())
+    try:
+        if settings.EVENT_STORE_ENABLED:
+            # 本地事件在线程中汇总，不访问 Neo4j
+            for row in await asyncio.to_thread(event_store.store.call_pattern, target_id, time_window_days):
+                yield sync.add_call_pattern_row(totals, row)
+        else:
+            async for row in async_db.stream(sync.CALL_PATTERN_QUERY, {
+                "target_id": target_id,
+                "time_window_days": time_window_days
+            }):
+                yield sync.add_call_pattern_row(totals, row)
+    except Exception as e:
+        logger.error(f"❌ Failed to analyze call pattern: {str(e)}")
+        raise
+    logger.info(f"🔍 Analyzed call pattern for {target_id}")
+
+
+async def analyze_call_pattern(target_id: str, time_window_days: int = 30) -> Dict:
+    """通话模式分析，见 analysis_service.analyze_call_pattern"""
+    if settings.EVENT_STORE_ENABLED:
+        results = await asyncio.to_thread(event_store.store.call_pattern, target_id, time_window_days)
+    else:
+        results = await async_db.execute_read(sync.CALL_PATTERN_QUERY, {
+            "target_id": target_id,
+            "time_window_days": time_window_days
+        })
+    return sync._call_pattern_result(target_id, time_window_days, results)
+
+
+async def iter_timeline(target_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        peer: Optional[str] = None, limit: int = 1000, descending: bool = False,
+                        state: Optional[Dict] = None) -> AsyncIterator[Dict]:
+    """
+    逐条产出目标号码在 [start, end) 内的通话事件（读取本地事件存储，不访问 Neo4j）
+
+    Args:
+        peer: 只返回与该号码之间的通话
+        limit: 最多返回的事件数
+        state: 传入时记录是否因 limit 截断（truncated）
+    """
+    if not settings.EVENT_STORE_ENABLED:
+        raise ValueError("通话事件存储未启用（EVENT_STORE_ENABLED）")
+    if limit <= 0:
+        raise ValueError("limit 必须大于 0")
+    state = {} if state is None else state
+    state["truncated"] = False
+
+    def _read() -> List[Dict]:
+        # 多取一条用于判断是否截断
+        events = event_store.store.scan(target_id, start, end, peer, descending)
+        return list(islice(events, limit + 1))
+
+    events = await asyncio.to_thread(_read)
+    if len(events) > limit:
+        state["truncated"] = True
+        events = events[:limit]
+    for event in events:
+        yield event
+    logger.info(f"🔍 Read {len(events)} call events for {target_id}")
+
+
+@cached_async("get_statistics")
+async def get_statistics() -> Dict:
+    """数据库统计信息（读取标签清单后，节点、关系、派生计数器三个查询并发执行）"""
+    try:
+        catalog = (await async_db.execute_read(sync.CATALOG_QUERY))[0]
+        rows = await _run_stages(sync.count_stages(catalog["labels"], catalog["types"]))
+        return sync._statistics_result(rows)
+    except Exception as e:
+        logger.error(f"❌ Failed to get statistics: {str(e)}")
+        raise
@@ -0,0 +1,414 @@
+"""
+批量写入引擎
+将导入数据切分为固定大小的批次，逐批通过托管写事务提交，
+对死锁、锁超时等瞬时错误自动重试，并统计每个批次的吞吐量
+"""
+import asyncio
+import inspect
+import logging
+import queue
+import random
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from neo4j.exceptions import DriverError, Neo4jError
+
+from app.config import settings
+from app.database import async_db, db, run_instrumented, run_instrumented_async
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChunkStats:
+    """单个批次的写入统计"""
+    index: int
+    partition: int
+    rows: int
+    seconds: float
+    retries: int = 0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "index": self.index,
+            "partition": self.partition,
+            "rows": self.rows,
+            "seconds": round(self.seconds, 4),
+            "retries": self.retries,
+            "rows_per_sec": round(self.rows_per_sec, 1)
+        }
+
+
+@dataclass
+class IngestReport:
+    """一次批量写入的汇总报告"""
+    label: str
+    rows: int = 0
+    seconds: float = 0.0
+    retries: int = 0
+    chunks: List[ChunkStats] = field(default_factory=list)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self, include_chunks: bool = False) -> Dict:
+        summary = {
+            "count": self.rows,
+            "chunks": len(self.chunks),
+            "retries": self.retries,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.rows_per_sec, 1)
+        }
+        if include_chunks:
+            summary["chunk_stats"] = [c.to_dict() for c in self.chunks]
+        return summary
+
+
+def iter_chunks(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    """将任意行迭代器切分为固定大小的批次（不会一次性物化全部数据）"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def partition_of(key: Tuple, partitions: int) -> int:
+    """根据分区键计算稳定的分区号（跨进程一致，不受 PYTHONHASHSEED 影响）"""
+    raw = "\x1f".join("" if k is None else str(k) for k in key)
+    return zlib.crc32(raw.encode("utf-8")) % partitions
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """判断异常是否属于可重试的瞬时错误（死锁、锁超时、连接中断、集群切主等）"""
+    if isinstance(exc, (Neo4jError, DriverError)):
+        return exc.is_retryable()
+    return False
+
+
+class BatchWriter:
+    """
+    分批写入器
+
+    - 按 batch_size 切分输入，每个批次一个托管写事务（session.execute_write）；
+      query 为多条语句时在同一事务内依次执行（如写入后增量维护派生数据）
+    - 批次失败且为瞬时错误时按指数退避重试，最多 max_retries 次
+    - workers > 1 时并行写入；提供 partition_key 时同一分区键的行
+      总是落在同一个 worker 上串行执行，避免并行事务争抢同一条关系的锁
+    - on_commit：每个批次提交后以该批次的行调用（写入 Neo4j 之外的派生存储，如本地事件存储），
+      并行写入时在各 worker 中调用
+    """
+
+    def __init__(
+        self,
+        query: Union[str, Sequence[str]],
+        label: str = "batch",
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        partition_key: Optional[Callable[[Dict], Tuple]] = None,
+        on_commit: Optional[Callable[[List[Dict]], None]] = None
+    ):
+        self.queries = [query] if isinstance(query, str) else list(query)
+        self.label = label
+        self.batch_size = max(1, batch_size or settings.INGEST_BATCH_SIZE)
+        self.workers = max(1, workers or settings.INGEST_WORKERS)
+        self.max_retries = settings.INGEST_MAX_RETRIES if max_retries is None else max_retries
+        self.partition_key = partition_key
+        self.on_commit = on_commit
+        self._lock = threading.Lock()
+
+    # ==================== 对外接口 ====================
+
+    def write(
+        self,
+        rows: Iterable[Dict],
+        on_chunk: Optional[Callable[[ChunkStats], None]] = None
+    ) -> IngestReport:
+        """
+        写入全部数据
+
+        Args:
+            rows: 行迭代器（列表或生成器均可）
+            on_chunk: 每个批次提交成功后的回调，参数为该批次统计
+
+        Returns:
+            写入汇总报告
+        """
+        report = IngestReport(label=self.label)
+        started = time.perf_counter()
+        if self.workers == 1:
+            for index, chunk in enumerate(iter_chunks(rows, self.batch_size)):
+                self._write_chunk(index, 0, chunk, report, on_chunk)
+        else:
+            self._write_parallel(rows, report, on_chunk)
+        report.seconds = time.perf_counter() - started
+
+        logger.info(
+            f"📦 [{self.label}] wrote {report.rows} rows in {len(report.chunks)} chunks, "
+            f"{report.seconds:.2f}s ({report.rows_per_sec:.0f} rows/s, {report.retries} retries)"
+        )
+        return report
+
+    # ==================== 单批次写入 ====================
+
+    def _write_chunk(
+        self,
+        index: int,
+        partition: int,
+        chunk: List[Dict],
+        report: IngestReport,
+        on_chunk: Optional[Callable[[ChunkStats], None]]
+    ):
+        started = time.perf_counter()
+        retries = self._run_with_retry(chunk)
+        if self.on_commit:
+            self.on_commit(chunk)
+        stats = ChunkStats(
+            index=index,
+            partition=partition,
+            rows=len(chunk),
+            seconds=time.perf_counter() - started,
+            retries=retries
+        )
+        logger.debug(
+            f"[{self.label}] chunk #{index} (partition {partition}): {stats.rows} rows, "
+            f"{stats.seconds:.3f}s, {stats.rows_per_sec:.0f} rows/s, {retries} retries"
+        )
+        with self._lock:
+            report.rows += stats.rows
+            report.retries += retries
+            report.chunks.append(stats)
+            if on_chunk:
+                on_chunk(stats)
+
+    def _run_with_retry(self, chunk: List[Dict]) -> int:
+        """在托管写事务中执行一个批次，返回重试次数"""
+        def work(tx):
+            for query in self.queries:
+                run_instrumented(tx, query, {"batch": chunk})
+
+        attempt = 0
+        while True:
+            try:
+                with db.get_session() as session:
+                    session.execute_write(work)
+                return attempt
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                delay = settings.INGEST_RETRY_BACKOFF * (2 ** (attempt - 1)) * (1 + random.random())
+                logger.warning(
+                    f"⚠️  [{self.label}] transient error, retry {attempt}/{self.max_retries} "
+                    f"in {delay:.2f}s: {str(e)}"
+                )
+                time.sleep(delay)
+
+    # ==================== 并行写入 ====================
+
+    def _iter_partitioned_chunks(self, rows: Iterable[Dict]) -> Iterator[Tuple[int, List[Dict]]]:
+        """按分区键把行分发到各分区缓冲区，缓冲区满即产出 (分区号, 批次)"""
+        if self.partition_key is None:
+            for index, chunk in enumerate(iter_chunks(rows, self.batch_size)):
+                yield index % self.workers, chunk
+            return
+
+        buffers: List[List[Dict]] = [[] for _ in range(self.workers)]
+        for row in rows:
+            pid = partition_of(self.partition_key(row), self.workers)
+            buffers[pid].append(row)
+            if len(buffers[pid]) >= self.batch_size:
+                yield pid, buffers[pid]
+                buffers[pid] = []
+        for pid, buffer in enumerate(buffers):
+            if buffer:
+                yield pid, buffer
+
+    def _write_parallel(
+        self,
+        rows: Iterable[Dict],
+        report: IngestReport,
+        on_chunk: Optional[Callable[[ChunkStats], None]]
+    ):
+        # 每个分区一个有界队列 + 一个 worker 线程：同一分区的批次严格串行，
+        # 有界队列对上游读取形成背压，内存占用与 workers * batch_size 成正比
+        queues = [queue.Queue(maxsize=2) for _ in range(self.workers)]
+        stop = threading.Event()
+        errors: List[BaseException] = []
+
+        def worker(pid: int):
+            while True:
+                item = queues[pid].get()
+                if item is None or stop.is_set():
+                    return
+                index, chunk = item
+                try:
+                    self._write_chunk(index, pid, chunk, report, on_chunk)
+                except BaseException as e:
+                    errors.append(e)
+                    stop.set()
+                    return
+
+        threads = [
+            threading.Thread(target=worker, args=(pid,), name=f"{self.label}-writer-{pid}", daemon=True)
+            for pid in range(self.workers)
+        ]
+        for t in threads:
+            t.start()
+
+        try:
+            for index, (pid, chunk) in enumerate(self._iter_partitioned_chunks(rows)):
+                if stop.is_set():
+                    break
+                self._put(queues[pid], (index, chunk), stop)
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            for q in queues:
+                self._put(q, None, stop)
+            for t in threads:
+                t.join()
+
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    def _put(q: queue.Queue, item, stop: threading.Event):
+        """向队列投递；worker 已因错误退出时放弃投递，避免生产者永久阻塞"""
+        while True:
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if stop.is_set():
+                    return
+
+
+class AsyncBatchWriter(BatchWriter):
+    """
+    BatchWriter 的异步版本（async_db）
+
+    切分、分区、重试策略与 BatchWriter 相同；并行写入时每个分区一个协程和一个有界队列，
+    同一分区的批次严格串行，整个写入过程不占用线程
+    """
+
+    async def write(
+        self,
+        rows: Iterable[Dict],
+        on_chunk: Optional[Callable[[ChunkStats], None]] = None
+    ) -> IngestReport:
+        report = IngestReport(label=self.label)
+        started = time.perf_counter()
+        if self.workers == 1:
+            for index, chunk in enumerate(iter_chunks(rows, self.batch_size)):
+                await self._write_chunk(index, 0, chunk, report, on_chunk)
+        else:
+            await self._write_parallel(rows, report, on_chunk)
+        report.seconds = time.perf_counter() - started
+
+        logger.info(
+            f"📦 [{self.label}] wrote {report.rows} rows in {len(report.chunks)} chunks, "
+            f"{report.seconds:.2f}s ({report.rows_per_sec:.0f} rows/s, {report.retries} retries)"
+        )
+        return report
+
+    async def _write_chunk(
+        self,
+        index: int,
+        partition: int,
+        chunk: List[Dict],
+        report: IngestReport,
+        on_chunk: Optional[Callable[[ChunkStats], None]]
+    ):
+        started = time.perf_counter()
+        retries = await self._run_with_retry(chunk)
+        if self.on_commit:
+            result = self.on_commit(chunk)
+            if inspect.isawaitable(result):
+                await result
+        stats = ChunkStats(
+            index=index,
+            partition=partition,
+            rows=len(chunk),
+            seconds=time.perf_counter() - started,
+            retries=retries
+        )
+        report.rows += stats.rows
+        report.retries += retries
+        report.chunks.append(stats)
+        if on_chunk:
+            # 回调可以是 async 函数（如在事件循环中递增图版本号）
+            result = on_chunk(stats)
+            if inspect.isawaitable(result):
+                await result
+
+    async def _run_with_retry(self, chunk: List[Dict]) -> int:
+        """在异步托管写事务中执行一个批次，返回重试次数"""
+        async def work(tx):
+            for query in self.queries:
+                await run_instrumented_async(tx, query, {"batch": chunk})
+
+        attempt = 0
+        while True:
+            try:
+                async with async_db.get_session() as session:
+                    await session.execute_write(work)
+                return attempt
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                delay = settings.INGEST_RETRY_BACKOFF * (2 ** (attempt - 1)) * (1 + random.random())
+                logger.warning(
+                    f"⚠️  [{self.label}] transient error, retry {attempt}/{self.max_retries} "
+                    f"in {delay:.2f}s: {str(e)}"
+                )
+                await asyncio.sleep(delay)
+
+    async def _write_parallel(
+        self,
+        rows: Iterable[Dict],
+        report: IngestReport,
+        on_chunk: Optional[Callable[[ChunkStats], None]]
+    ):
+        queues = [asyncio.Queue(maxsize=2) for _ in range(self.workers)]
+
+        async def worker(pid: int):
+            while True:
+                item = await queues[pid].get()
+                if item is None:
+                    return
+                index, chunk = item
+                await self._write_chunk(index, pid, chunk, report, on_chunk)
+
+        tasks = [asyncio.ensure_future(worker(pid)) for pid in range(self.workers)]
+        try:
+            for index, (pid, chunk) in enumerate(self._iter_partitioned_chunks(rows)):
+                # 队列满时等待对应 worker 消费（背压）；任一 worker 失败立即停止投递
+                put = asyncio.ensure_future(queues[pid].put((index, chunk)))
+                done, _ = await asyncio.wait([put, *tasks], return_when=asyncio.FIRST_COMPLETED)
+                failed = [t for t in tasks if t in done and t.exception() is not None]
+                if failed:
+                    put.cancel()
+                    raise failed[0].exception()
+                if put not in done:
+                    await put
+            for q in queues:
+                await q.put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
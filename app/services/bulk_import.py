@@ -0,0 +1,708 @@
+"""
+离线批量导入（首次装载大规模数据）
+
+逐条事务 MERGE 的写入方式适合增量导入，首次装载上亿条话单时太慢。批量导入分三步：
+
+1. prepare：分块读取话单 / 微信好友 / 通讯录文件，沿用 ingest_service 的清洗逻辑，
+   在 pandas 中先去重、按 (主叫, 被叫) 汇总通话次数和时长、按天汇总分桶（见 call_buckets），
+   生成节点、关系 CSV
+   （表头为 neo4j-admin import 格式，写入 BULK_IMPORT_DIR，即 Neo4j 的 import 目录）。
+   启用导入清单时，已成功导入过的文件跳过，清洗后的行先与清单反连接（只读），以前导入过的行不进入 CSV；
+   原始话单暂存到输出目录下的事件存储（events/），新行的指纹保存在 fingerprints/
+2. load：LOAD CSV + CALL { } IN TRANSACTIONS 分批写入；库中还没有业务数据时关系直接 CREATE。
+   也可以停库后用 admin_command 给出的 neo4j-admin database import 命令导入空库
+3. finalize：执行 Schema 迁移，重建碰撞物化结果、名称分词和统计计数器，递增图版本号；
+   指定目录名时把暂存的原始话单追加到本地事件存储，并把源文件和新行登记到导入清单（见 ingest_manifest），
+   之后同样的文件和重叠的行不会再次导入，同一目录也不能再次装载
+
+每一步都输出吞吐报告（行数、耗时、行/秒）。命令行：python -m app.services.bulk_import --help
+"""
+import argparse
+import json
+import logging
+import time
+from itertools import chain
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app import query_metrics
+from app.config import settings
+from app.database import db
+from app.services import (
+    collision_service, event_store, graph_projection, graph_stats, ingest_manifest, ingest_service, name_match
+)
+from app.services.file_reader import iter_frames
+
+logger = logging.getLogger(__name__)
+
+# 分块汇总结果累积到该行数后合并一次，控制内存占用
+COMPACT_ROWS = 2_000_000
+
+# 输出文件：文件名 -> (节点标签 / 关系类型, 是否为关系, neo4j-admin 表头)
+OUTPUTS: Dict[str, Tuple[str, bool, List[str]]] = {
+    "phones.csv": ("Phone", False, ["number:ID(Phone)", "name", "is_caller:boolean"]),
+    "persons.csv": ("Person", False, ["name:ID(Person)"]),
+    "wechat.csv": ("WeChat", False, ["wxid:ID(WeChat)", "nickname"]),
+    "calls.csv": ("CALL", True, [":START_ID(Phone)", ":END_ID(Phone)", "count:long", "total_duration:long",
+                                 "last_call:localdatetime"]),
+    "call_days.csv": ("CALL_DAY", True, [":START_ID(Phone)", ":END_ID(Phone)", "day:date", "count:long", "duration:long",
+                                         "hours:long[]", "first_call:localdatetime", "last_call:localdatetime"]),
+    "friends.csv": ("FRIEND", True, [":START_ID(WeChat)", ":END_ID(WeChat)"]),
+    "contacts.csv": ("HAS_CONTACT", True, [":START_ID(Person)", ":END_ID(Phone)", "remark"]),
+}
+
+MANIFEST = "manifest.json"
+
+# 输出目录下的暂存事件存储、新行指纹
+EVENTS_DIR = "events"
+FINGERPRINTS_DIR = "fingerprints"
+
+
+# ==================== prepare：清洗、去重、汇总 ====================
+
+class _Accumulator:
+    """分块 groupby 汇总：每块先局部汇总，累积过多时再合并一次"""
+
+    def __init__(self, keys: List[str], agg: Dict[str, str]):
+        self.keys = keys
+        self.agg = agg
+        self.parts: List[pd.DataFrame] = []
+        self.pending = 0
+
+    def add(self, frame: pd.DataFrame):
+        if frame.empty:
+            return
+        self.parts.append(frame)
+        self.pending += len(frame)
+        if self.pending >= COMPACT_ROWS:
+            self.parts = [self._combine()]
+            self.pending = len(self.parts[0])
+
+    def _combine(self) -> pd.DataFrame:
+        frame = pd.concat(self.parts, ignore_index=True)
+        if not self.agg:
+            return frame.drop_duplicates(self.keys)
+        return frame.groupby(self.keys, as_index=False, sort=False).agg(self.agg)
+
+    def result(self, columns: List[str]) -> pd.DataFrame:
+        if not self.parts:
+            return pd.DataFrame(columns=columns)
+        return self._combine()[columns]
+
+
+def _blank_to_na(series: pd.Series) -> pd.Series:
+    """空字符串视为缺失，groupby 的 first / last 会跳过"""
+    return series.where(series.astype(str).str.strip() != "", None)
+
+
+class BulkPreparer:
+    """
+    把清洗后的分块汇总为去重的节点、关系表
+
+    指定 out 时原始话单暂存到 out/events，启用导入清单时新行的指纹保存到 out/fingerprints
+    """
+
+    def __init__(self, out: Optional[Path] = None):
+        self.out = out
+        self.events = event_store.EventStore(str(out / EVENTS_DIR)) if out and settings.EVENT_STORE_ENABLED else None
+        self.sources: List[Dict] = []
+        self.skipped: List[Dict] = []
+        self.calls = _Accumulator(
+            ["caller", "callee"], {"count": "sum", "total_duration": "sum", "last_call": "max"}
+        )
+        # 按天分桶先汇总到 (号码对, 日期, 小时)，输出时再展开为 24 小时计数列表
+        self.hourly = _Accumulator(
+            ["caller", "callee", "day", "hour"],
+            {"count": "sum", "duration": "sum", "first_call": "min", "last_call": "max"}
+        )
+        self.friends = _Accumulator(["user", "friend"], {})
+        self.nicknames = _Accumulator(["friend"], {"nickname": "first"})
+        self.contacts = _Accumulator(["owner", "phone"], {"name": "last", "remark": "last"})
+        self.counters = {"files": 0, "rows_parsed": 0, "rows_rejected": 0, "rows_duplicate": 0, "events_staged": 0}
+
+    def add_cdr(self, df: pd.DataFrame):
+        ts = pd.to_datetime(df["timestamp"], errors="coerce") if "timestamp" in df.columns else pd.NaT
+        df = df.assign(timestamp=ts)
+        if self.events is not None:
+            # 原始话单不进入 CSV，先暂存，finalize 时再追加到本地事件存储
+            self.counters["events_staged"] += self.events.append(
+                df["caller"], df["callee"], df["timestamp"], df["duration"]
+            )
+        self.calls.add(
+            df.groupby(["caller", "callee"], as_index=False, sort=False)
+            .agg(count=("duration", "size"), total_duration=("duration", "sum"), last_call=("timestamp", "max"))
+        )
+        dated = df[df["timestamp"].notna()]
+        if not dated.empty:
+            dated = dated.assign(day=dated["timestamp"].dt.normalize(), hour=dated["timestamp"].dt.hour)
+            self.hourly.add(
+                dated.groupby(["caller", "callee", "day", "hour"], as_index=False, sort=False)
+                .agg(count=("duration", "size"), duration=("duration", "sum"),
+                     first_call=("timestamp", "min"), last_call=("timestamp", "max"))
+            )
+
+    def add_wechat(self, df: pd.DataFrame):
+        # FRIEND 为无向关系（导入语句用无向 MERGE），两个方向只保留一条
+        swap = df["user"] > df["friend"]
+        pairs = pd.DataFrame({
+            "user": df["user"].where(~swap, df["friend"]),
+            "friend": df["friend"].where(~swap, df["user"]),
+        })
+        self.friends.add(pairs.drop_duplicates())
+        # 与 WECHAT_QUERY 一致：好友节点首次出现时的昵称，缺失时用 wxid
+        nickname = _blank_to_na(df["nickname"]) if "nickname" in df.columns else pd.Series(None, index=df.index)
+        self.nicknames.add(pd.DataFrame({"friend": df["friend"], "nickname": nickname.fillna(df["friend"])}))
+
+    def add_contacts(self, df: pd.DataFrame):
+        remark = df["remark"] if "remark" in df.columns else pd.Series("", index=df.index)
+        self.contacts.add(pd.DataFrame({
+            "owner": df["owner"],
+            "phone": df["phone"],
+            "name": _blank_to_na(df["name"]),
+            "remark": remark.fillna(""),
+        }))
+
+    def add_file(self, file_path: str, data_type: str = "auto", source_name: Optional[str] = None) -> str:
+        """分块读取并汇总一个文件，返回数据类型"""
+        source_name = source_name or file_path
+        frames = iter_frames(file_path, settings.IMPORT_CHUNK_ROWS)
+        first = next(frames, None)
+        if first is None:
+            logger.info(f"📊 {source_name} is empty, skipped")
+            return data_type
+        if data_type == "auto":
+            data_type = ingest_service.detect_data_type(first, source_name)
+            logger.info(f"🔍 Auto-detected data type of {source_name}: {data_type}")
+        if data_type not in ingest_service.IMPORTERS:
+            raise ValueError(f"无法识别 {source_name} 的数据类型，检测到的列: {list(first.columns)}")
+        clean = ingest_service.IMPORTERS[data_type][0]
+        add = {"cdr": self.add_cdr, "wechat": self.add_wechat, "contacts": self.add_contacts}[data_type]
+
+        tracked = self.out is not None and settings.INGEST_MANIFEST_ENABLED
+        source = {"source": source_name, "data_type": data_type}
+        if tracked:
+            source.update(sha256=ingest_manifest.file_sha256(file_path), file_size=Path(file_path).stat().st_size)
+            previous = ingest_manifest.find_import(source["sha256"], data_type)
+            if previous is not None:
+                logger.info(f"⏭️  {source_name} was already imported as {previous['source_name']}, skipped")
+                self.skipped.append({**source, "duplicate_of": previous["source_name"]})
+                return data_type
+
+        rows_parsed = rows_duplicate = 0
+        fresh_fps = []
+        for frame in chain([first], frames):
+            cleaned = clean(frame, source_name)
+            rows_parsed += len(frame)
+            self.counters["rows_rejected"] += len(frame) - len(cleaned)
+            if tracked:
+                fps = ingest_manifest.fingerprints(cleaned, data_type)
+                fresh = ~ingest_manifest.known(fps)
+                rows_duplicate += int(len(fps) - fresh.sum())
+                fresh_fps.append(fps[fresh])
+                cleaned = cleaned[fresh]
+            add(cleaned)
+        self.counters["rows_parsed"] += rows_parsed
+        self.counters["rows_duplicate"] += rows_duplicate
+        self.counters["files"] += 1
+
+        if tracked:
+            fingerprints = self.out / FINGERPRINTS_DIR / f"{len(self.sources)}.npy"
+            fingerprints.parent.mkdir(parents=True, exist_ok=True)
+            np.save(fingerprints, np.concatenate(fresh_fps) if fresh_fps else np.empty(0, dtype=np.int64))
+            self.sources.append({**source, "rows_parsed": rows_parsed, "rows_duplicate": rows_duplicate,
+                                 "fingerprints": fingerprints.relative_to(self.out).as_posix()})
+        return data_type
+
+    def tables(self) -> Dict[str, pd.DataFrame]:
+        """最终的节点、关系表，列顺序与 OUTPUTS 的表头一致"""
+        calls = self.calls.result(["caller", "callee", "count", "total_duration", "last_call"])
+        calls["last_call"] = _local_datetime(calls["last_call"])
+        call_days = _call_days(self.hourly.result(
+            ["caller", "callee", "day", "hour", "count", "duration", "first_call", "last_call"]
+        ))
+        friends = self.friends.result(["user", "friend"])
+        nicknames = self.nicknames.result(["friend", "nickname"])
+        contacts = self.contacts.result(["owner", "phone", "name", "remark"])
+
+        # 号码节点：话单两端 + 通讯录号码；通讯录中的姓名（缺失时用号码，与 CONTACTS_QUERY 一致）
+        numbers = pd.concat([calls["caller"], calls["callee"], contacts["phone"]], ignore_index=True).drop_duplicates()
+        names = contacts.groupby("phone", sort=False)["name"].last()
+        names = names.fillna(pd.Series(names.index, index=names.index))
+        phones = pd.DataFrame({"number": numbers})
+        phones["name"] = phones["number"].map(names)
+        phones["is_caller"] = phones["number"].isin(calls["caller"]).map({True: "true", False: ""})
+
+        users = pd.concat([friends["user"], friends["friend"]], ignore_index=True).drop_duplicates()
+        wechat = pd.DataFrame({"wxid": users})
+        wechat["nickname"] = wechat["wxid"].map(nicknames.set_index("friend")["nickname"])
+
+        return {
+            "phones.csv": phones,
+            "persons.csv": pd.DataFrame({"name": contacts["owner"].drop_duplicates()}),
+            "wechat.csv": wechat,
+            "calls.csv": calls,
+            "call_days.csv": call_days,
+            "friends.csv": friends,
+            "contacts.csv": contacts[["owner", "phone", "remark"]],
+        }
+
+
+def _local_datetime(series: pd.Series) -> pd.Series:
+    """LocalDateTime 的 ISO 文本（LOAD CSV 的 localdatetime() 与 neo4j-admin 都能解析）"""
+    return pd.to_datetime(series, errors="coerce").dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _call_days(hourly: pd.DataFrame) -> pd.DataFrame:
+    """(号码对, 日期, 小时) 汇总展开为每天一行，hours 为 ";" 分隔的 24 个小时计数"""
+    columns = ["caller", "callee", "day", "count", "duration", "hours", "first_call", "last_call"]
+    if hourly.empty:
+        return pd.DataFrame(columns=columns)
+    keys = ["caller", "callee", "day"]
+    daily = hourly.groupby(keys, as_index=False, sort=False).agg(
+        count=("count", "sum"), duration=("duration", "sum"),
+        first_call=("first_call", "min"), last_call=("last_call", "max")
+    )
+    hours = (
+        hourly.pivot_table(index=keys, columns="hour", values="count", aggfunc="sum", fill_value=0)
+        .reindex(columns=range(24), fill_value=0)
+        .astype(int).astype(str)
+        .agg(";".join, axis=1)
+        .rename("hours")
+    )
+    daily = daily.merge(hours, left_on=keys, right_index=True, how="left")
+    daily["day"] = pd.to_datetime(daily["day"]).dt.strftime("%Y-%m-%d")
+    daily["first_call"] = _local_datetime(daily["first_call"])
+    daily["last_call"] = _local_datetime(daily["last_call"])
+    return daily[columns]
+
+
+def _rate(rows: int, seconds: float) -> float:
+    return round(rows / seconds, 1) if seconds > 0 else 0.0
+
+
+def output_dir(name: str) -> Path:
+    return Path(settings.BULK_IMPORT_DIR) / name
+
+
+def prepare(files: Sequence[str], data_type: str = "auto", name: Optional[str] = None) -> Dict:
+    """
+    把源文件转换为去重、汇总后的节点和关系 CSV
+
+    Args:
+        files: 源文件（CSV / Excel），机主、微信用户名同样取自文件名
+        data_type: 'auto' | 'cdr' | 'wechat' | 'contacts'，auto 时逐个文件检测
+        name: 输出子目录名（位于 BULK_IMPORT_DIR 下），默认按时间生成
+
+    Returns:
+        吞吐报告，同时写入输出目录的 manifest.json
+    """
+    name = name or time.strftime("bulk-%Y%m%d-%H%M%S")
+    out = output_dir(name)
+    out.mkdir(parents=True, exist_ok=True)
+
+    started = time.perf_counter()
+    preparer = BulkPreparer(out)
+    types = {}
+    for path in files:
+        types[str(path)] = preparer.add_file(str(path), data_type)
+    tables = preparer.tables()
+    read_seconds = time.perf_counter() - started
+
+    outputs = {}
+    for file_name, frame in tables.items():
+        header = OUTPUTS[file_name][2]
+        # 换行符会被 LOAD CSV / neo4j-admin 当作记录分隔，写出前替换为空格
+        frame = frame.replace({r"[\r\n]+": " "}, regex=True)
+        frame.to_csv(out / file_name, index=False, header=header)
+        outputs[file_name] = len(frame)
+    seconds = time.perf_counter() - started
+
+    rows = preparer.counters["rows_parsed"]
+    manifest = {
+        "name": name,
+        "sources": types,
+        "imports": preparer.sources,
+        "skipped": preparer.skipped,
+        **preparer.counters,
+        "outputs": outputs,
+        "read_seconds": round(read_seconds, 3),
+        "seconds": round(seconds, 3),
+        "rows_per_sec": _rate(rows, seconds),
+    }
+    _write_manifest(name, manifest)
+    logger.info(
+        f"✅ Prepared {name}: {rows} rows -> {outputs} in {seconds:.1f}s ({manifest['rows_per_sec']} rows/s)"
+    )
+    return manifest
+
+
+def read_manifest(name: str) -> Dict:
+    path = output_dir(name) / MANIFEST
+    if not path.exists():
+        raise ValueError(f"找不到批量导入目录 {output_dir(name)}，请先执行 prepare")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+# ==================== load：LOAD CSV + CALL { } IN TRANSACTIONS ====================
+
+def _in_transactions(body: str) -> str:
+    return f"""
+    LOAD CSV WITH HEADERS FROM $url AS row
+    CALL {{
+        WITH row
+        {body}
+    }} IN TRANSACTIONS OF {int(settings.BULK_IMPORT_BATCH_ROWS)} ROWS
+    """
+
+
+NODE_LOADS = {
+    "phones.csv": """
+        MERGE (p:Phone {number: row.`number:ID(Phone)`})
+        SET p.name = COALESCE(row.name, p.name),
+            p.is_caller = CASE WHEN row.`is_caller:boolean` = 'true' THEN true ELSE p.is_caller END
+    """,
+    "persons.csv": """
+        MERGE (:Person {name: row.`name:ID(Person)`})
+    """,
+    "wechat.csv": """
+        MERGE (u:WeChat {wxid: row.`wxid:ID(WeChat)`})
+        SET u.nickname = COALESCE(u.nickname, row.nickname)
+    """,
+}
+
+_CALL_MATCH = """
+        MATCH (p1:Phone {number: row.`:START_ID(Phone)`})
+        MATCH (p2:Phone {number: row.`:END_ID(Phone)`})
+"""
+
+# 关系写入：库中已有业务数据时 MERGE（通话次数、时长累加），空库时直接 CREATE
+RELATIONSHIP_LOADS = {
+    "calls.csv": (
+        _CALL_MATCH + """
+        MERGE (p1)-[r:CALL]->(p2)
+        ON CREATE SET r.count = toInteger(row.`count:long`),
+                      r.total_duration = toInteger(row.`total_duration:long`)
+        ON MATCH SET r.count = r.count + toInteger(row.`count:long`),
+                     r.total_duration = r.total_duration + toInteger(row.`total_duration:long`)
+        WITH r, localdatetime(row.`last_call:localdatetime`) AS last_call
+        SET r.last_call = CASE
+                WHEN last_call IS NULL THEN COALESCE(r.last_call, localdatetime())
+                WHEN r.last_call IS NULL OR last_call > r.last_call THEN last_call
+                ELSE r.last_call
+            END,
+            r.updated_at = datetime()
+        """,
+        _CALL_MATCH + """
+        CREATE (p1)-[:CALL {
+            count: toInteger(row.`count:long`),
+            total_duration: toInteger(row.`total_duration:long`),
+            last_call: COALESCE(localdatetime(row.`last_call:localdatetime`), localdatetime()),
+            updated_at: datetime()
+        }]->(p2)
+        """,
+    ),
+    "call_days.csv": (
+        _CALL_MATCH + """
+        WITH p1, p2, row, [x IN split(row.`hours:long[]`, ';') | toInteger(x)] AS hours,
+             localdatetime(row.`first_call:localdatetime`) AS first_call,
+             localdatetime(row.`last_call:localdatetime`) AS last_call
+        MERGE (p1)-[d:CALL_DAY {day: date(row.`day:date`)}]->(p2)
+        ON CREATE SET d.count = 0, d.duration = 0, d.hours = [h IN range(0, 23) | 0]
+        SET d.count = d.count + toInteger(row.`count:long`),
+            d.duration = d.duration + toInteger(row.`duration:long`),
+            d.hours = [h IN range(0, 23) | d.hours[h] + hours[h]],
+            d.first_call = CASE WHEN d.first_call IS NULL OR first_call < d.first_call THEN first_call ELSE d.first_call END,
+            d.last_call = CASE WHEN d.last_call IS NULL OR last_call > d.last_call THEN last_call ELSE d.last_call END
+        """,
+        _CALL_MATCH + """
+        CREATE (p1)-[:CALL_DAY {
+            day: date(row.`day:date`),
+            count: toInteger(row.`count:long`),
+            duration: toInteger(row.`duration:long`),
+            hours: [x IN split(row.`hours:long[]`, ';') | toInteger(x)],
+            first_call: localdatetime(row.`first_call:localdatetime`),
+            last_call: localdatetime(row.`last_call:localdatetime`)
+        }]->(p2)
+        """,
+    ),
+    "friends.csv": (
+        """
+        MATCH (u1:WeChat {wxid: row.`:START_ID(WeChat)`})
+        MATCH (u2:WeChat {wxid: row.`:END_ID(WeChat)`})
+        MERGE (u1)-[r:FRIEND]-(u2)
+        SET r.created_at = COALESCE(r.created_at, datetime())
+        """,
+        """
+        MATCH (u1:WeChat {wxid: row.`:START_ID(WeChat)`})
+        MATCH (u2:WeChat {wxid: row.`:END_ID(WeChat)`})
+        CREATE (u1)-[:FRIEND {created_at: datetime()}]->(u2)
+        """,
+    ),
+    "contacts.csv": (
+        """
+        MATCH (owner:Person {name: row.`:START_ID(Person)`})
+        MATCH (contact:Phone {number: row.`:END_ID(Phone)`})
+        MERGE (owner)-[r:HAS_CONTACT]->(contact)
+        SET r.remark = COALESCE(row.remark, ''),
+            r.updated_at = datetime()
+        """,
+        """
+        MATCH (owner:Person {name: row.`:START_ID(Person)`})
+        MATCH (contact:Phone {number: row.`:END_ID(Phone)`})
+        CREATE (owner)-[:HAS_CONTACT {remark: COALESCE(row.remark, ''), updated_at: datetime()}]->(contact)
+        """,
+    ),
+}
+
+HAS_DATA_QUERY = """
+RETURN COUNT { (:Phone) } + COUNT { (:WeChat) } + COUNT { (:Person) } > 0 as has_data
+"""
+
+
+def _file_url(name: str, file_name: str) -> str:
+    base = settings.BULK_IMPORT_URL
+    return (base if base.endswith("/") else base + "/") + f"{name}/{file_name}"
+
+
+def _write_manifest(name: str, manifest: Dict):
+    path = output_dir(name) / MANIFEST
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(path)
+
+
+def _set_load_state(name: str, manifest: Dict, file_name: str, state: Dict):
+    """每个文件开始、完成装载时写入 manifest.json 的 load 记录"""
+    manifest.setdefault("load", {})[file_name] = state
+    _write_manifest(name, manifest)
+
+
+def load(name: str) -> Dict:
+    """
+    用 LOAD CSV 把 prepare 生成的 CSV 写入在线数据库
+
+    先执行 Schema 迁移并等待唯一约束上线（MERGE / MATCH 依赖约束背后的索引），
+    节点全部写入后再写关系；每个文件一个自动提交事务，内部按 BULK_IMPORT_BATCH_ROWS 分批提交。
+
+    每个文件开始和完成时记录到输出目录的 manifest.json：再次执行时跳过已完成的文件；
+    有文件开始但未完成（中途失败，部分分批已提交）时拒绝执行，重新装载会重复累加这些分批的通话次数和时长。
+    恢复方法：清空数据库（或恢复装载前的备份），删除 manifest.json 中的 "load" 记录后重新装载
+    """
+    from app import schema
+
+    manifest = read_manifest(name)
+    if _registered(manifest):
+        raise ValueError(f"{name} 已经装载过（源文件已登记在导入清单中），再次装载会重复累加通话次数和时长")
+    unfinished = [f for f, state in manifest.get("load", {}).items() if state["status"] != "done"]
+    if unfinished:
+        raise ValueError(
+            f"{name} 上次装载中途失败，{unfinished} 的部分分批已提交，再次装载会重复累加。"
+            f"请清空数据库（或恢复装载前的备份），删除 {output_dir(name) / MANIFEST} 中的 \"load\" 记录后重新装载"
+        )
+    schema.migrate(backfill=False)
+    schema.wait_for_indexes()
+    create = not db.execute_read(HAS_DATA_QUERY)[0]["has_data"]
+    logger.info(f"📦 Loading {name} ({'empty graph, CREATE relationships' if create else 'MERGE into existing graph'})")
+
+    stages = []
+    started = time.perf_counter()
+    plan = [(f, NODE_LOADS[f]) for f in NODE_LOADS]
+    plan += [(f, queries[1] if create else queries[0]) for f, queries in RELATIONSHIP_LOADS.items()]
+    try:
+        for file_name, body in plan:
+            rows = manifest["outputs"].get(file_name, 0)
+            if not rows:
+                continue
+            if file_name in manifest.get("load", {}):
+                logger.info(f"⏭️  {file_name} was already loaded, skipped")
+                continue
+            stage_started = time.perf_counter()
+            _set_load_state(name, manifest, file_name, {"status": "started", "started_at": time.time()})
+            query = query_metrics.register(f"bulk_import.{file_name[:-4]}", _in_transactions(body))
+            with db.get_session() as session:
+                counters = session.run(query, url=_file_url(name, file_name)).consume().counters
+            seconds = time.perf_counter() - stage_started
+            _set_load_state(name, manifest, file_name, {"status": "done", "finished_at": time.time(),
+                                                        "mode": "create" if create else "merge"})
+            stages.append({
+                "file": file_name,
+                "rows": rows,
+                "nodes_created": counters.nodes_created,
+                "relationships_created": counters.relationships_created,
+                "properties_set": counters.properties_set,
+                "seconds": round(seconds, 3),
+                "rows_per_sec": _rate(rows, seconds),
+            })
+            logger.info(f"📦 Loaded {file_name}: {rows} rows in {seconds:.1f}s ({_rate(rows, seconds)} rows/s)")
+    finally:
+        # 中途失败时已提交的分批同样改变了图
+        graph_projection.bump_graph_version()
+
+    seconds = time.perf_counter() - started
+    rows = sum(stage["rows"] for stage in stages)
+    report = {
+        "name": name,
+        "mode": "create" if create else "merge",
+        "stages": stages,
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": _rate(rows, seconds),
+    }
+    logger.info(f"✅ Loaded {name}: {rows} rows in {seconds:.1f}s ({report['rows_per_sec']} rows/s)")
+    return report
+
+
+def admin_command(name: str, database: str = "neo4j") -> str:
+    """
+    neo4j-admin 离线导入命令（只能导入空库：先停库，导入后启动并执行 finalize）
+
+    路径为 Neo4j 服务器上的 import 目录（BULK_IMPORT_SERVER_DIR）
+    """
+    manifest = read_manifest(name)
+    base = settings.BULK_IMPORT_SERVER_DIR.rstrip("/") + f"/{name}"
+    args = []
+    for file_name, (label, is_relationship, _) in OUTPUTS.items():
+        if manifest["outputs"].get(file_name):
+            kind = "relationships" if is_relationship else "nodes"
+            args.append(f"--{kind}={label}={base}/{file_name}")
+    return " \\\n    ".join(
+        ["neo4j-admin database import full", "--overwrite-destination=true", *args, database]
+    )
+
+
+# ==================== finalize：派生数据重建 ====================
+
+# 迁移版本 -> 该版本负责的派生数据重建（本次迁移已执行过的不再重复）
+REBUILDS: Dict[int, Tuple[str, Callable]] = {
+    2: ("collision", lambda: collision_service.rebuild_all()),
+    3: ("name_tokens", lambda: name_match.backfill()),
+    5: ("graph_stats", lambda: _with_session(graph_stats.rebuild)),
+}
+
+
+def _with_session(step: Callable):
+    with db.get_session() as session:
+        return step(session)
+
+
+def _registered(manifest: Dict) -> bool:
+    """该目录的源文件是否已登记到导入清单（即已经装载过）"""
+    return settings.INGEST_MANIFEST_ENABLED and any(
+        ingest_manifest.find_import(source["sha256"], source["data_type"]) is not None
+        for source in manifest.get("imports", [])
+    )
+
+
+def _commit_sources(name: str) -> Dict:
+    """装载完成后：暂存的原始话单追加到本地事件存储，源文件和新行登记到导入清单"""
+    manifest = read_manifest(name)
+    if _registered(manifest):
+        logger.info(f"⏭️  Sources of {name} are already registered in the ingest manifest")
+        return {"events_stored": 0, "sources_registered": 0}
+
+    events_stored = 0
+    events_dir = output_dir(name) / EVENTS_DIR
+    if settings.EVENT_STORE_ENABLED and events_dir.is_dir():
+        staged = event_store.EventStore(str(events_dir))
+        for day, columns in staged.scan_days():
+            names = staged.numbers.resolve(np.unique(np.concatenate([columns["caller"], columns["callee"]])))
+            times = np.datetime64(day, "s") + columns["second"].astype("timedelta64[s]")
+            events_stored += event_store.store.append(
+                pd.Series(columns["caller"]).map(names), pd.Series(columns["callee"]).map(names),
+                pd.Series(times), columns["duration"]
+            )
+
+    if settings.INGEST_MANIFEST_ENABLED:
+        for source in manifest.get("imports", []):
+            ingest_manifest.register(
+                source["sha256"], source["data_type"], source["source"], source["file_size"],
+                np.load(output_dir(name) / source["fingerprints"]), source["rows_parsed"], source["rows_duplicate"]
+            )
+    logger.info(f"📝 {name}: {events_stored} events stored, {len(manifest.get('imports', []))} sources registered")
+    return {"events_stored": events_stored, "sources_registered": len(manifest.get("imports", []))}
+
+
+def finalize(name: Optional[str] = None) -> Dict:
+    """
+    装载后的收尾：Schema 迁移（neo4j-admin 导入的新库还没有约束和索引），
+    重建碰撞物化结果、名称分词和统计计数器，递增图版本号使投影和结果缓存失效
+
+    Args:
+        name: prepare 生成的子目录名；指定时同时追加暂存的原始话单、把源文件登记到导入清单
+    """
+    from app import schema
+
+    started = time.perf_counter()
+    migrated = schema.migrate()
+    stages = {}
+    for version, (label, rebuild) in sorted(REBUILDS.items()):
+        stage_started = time.perf_counter()
+        if version not in migrated["applied"]:
+            rebuild()
+        stages[label] = round(time.perf_counter() - stage_started, 3)
+    graph_projection.bump_graph_version()
+    report = {"schema": migrated, "stages_seconds": stages}
+    if name is not None:
+        report["sources"] = _commit_sources(name)
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"✅ Bulk import finalized in {report['seconds']:.1f}s")
+    return report
+
+
+# ==================== 命令行入口 ====================
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.services.bulk_import", description="离线批量导入工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("prepare", help="源文件 -> 去重汇总后的节点 / 关系 CSV")
+    p.add_argument("files", nargs="+", help="话单 / 微信好友 / 通讯录文件（CSV、Excel）")
+    p.add_argument("--type", default="auto", choices=["auto", "cdr", "wechat", "contacts"], help="数据类型")
+    p.add_argument("--name", default=None, help="输出子目录名（位于 BULK_IMPORT_DIR 下）")
+
+    p = sub.add_parser("load", help="LOAD CSV 写入在线数据库，并执行 finalize")
+    p.add_argument("name", help="prepare 生成的子目录名")
+
+    p = sub.add_parser("run", help="prepare + load + finalize")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--type", default="auto", choices=["auto", "cdr", "wechat", "contacts"])
+    p.add_argument("--name", default=None)
+
+    p = sub.add_parser("admin-command", help="输出 neo4j-admin 离线导入命令（导入空库）")
+    p.add_argument("name")
+    p.add_argument("--database", default="neo4j")
+
+    p = sub.add_parser("finalize", help="neo4j-admin 导入后：迁移 Schema、重建派生数据，追加事件并登记导入清单")
+    p.add_argument("name", nargs="?", help="prepare 生成的子目录名（不指定时只迁移和重建）")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.command == "prepare":
+        result = prepare(args.files, args.type, args.name)
+    elif args.command == "admin-command":
+        print(admin_command(args.name, args.database))
+        return
+    else:
+        db.connect()
+        try:
+            if args.command == "finalize":
+                result = finalize(args.name)
+            else:
+                name = args.name
+                result = {}
+                if args.command == "run":
+                    result["prepare"] = prepare(args.files, args.type, name)
+                    name = result["prepare"]["name"]
+                result["load"] = load(name)
+                result["finalize"] = finalize(name)
+        finally:
+            db.close()
+    print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+通话按天分桶聚合
+
+(p1:Phone)-[d:CALL_DAY {day}]->(p2:Phone)：每个号码对每天一条关系，记录
+- count / duration：当天通话次数、总时长（秒）
+- hours：长度 24 的整数列表，每小时的通话次数
+- first_call / last_call：当天最早、最晚一次通话（LocalDateTime）
+
+day、first_call、last_call 都是原生时间类型，时间窗口内的小时分布、星期分布、夜间通话占比、
+首次 / 末次联系时间都从目标号码的 CALL_DAY 关系直接汇总，不需要原始话单。
+没有通话时间的话单只累加到 CALL 关系上，不进入分桶
+"""
+import logging
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+import pandas as pd
+
+from app import query_metrics
+
+logger = logging.getLogger(__name__)
+
+# 夜间时段（22:00 - 06:00）
+NIGHT_HOURS = (22, 23, 0, 1, 2, 3, 4, 5)
+
+# 与话单写入语句在同一事务中执行：批次内先按 (主叫, 被叫, 日期) 汇总，再累加到分桶关系上
+CALL_DAY_QUERY = """
+UNWIND $batch AS row
+WITH row WHERE row.day IS NOT NULL
+WITH row.caller AS caller, row.callee AS callee, row.day AS day,
+     count(*) AS calls,
+     sum(COALESCE(row.duration, 0)) AS duration,
+     collect(row.hour) AS hours,
+     min(row.ts) AS first_call,
+     max(row.ts) AS last_call
+MATCH (p1:Phone {number: caller})
+MATCH (p2:Phone {number: callee})
+MERGE (p1)-[d:CALL_DAY {day: day}]->(p2)
+ON CREATE SET d.count = 0, d.duration = 0, d.hours = [h IN range(0, 23) | 0]
+SET d.count = d.count + calls,
+    d.duration = d.duration + duration,
+    d.hours = [h IN range(0, 23) | d.hours[h] + size([x IN hours WHERE x = h])],
+    d.first_call = CASE WHEN d.first_call IS NULL OR first_call < d.first_call THEN first_call ELSE d.first_call END,
+    d.last_call = CASE WHEN d.last_call IS NULL OR last_call > d.last_call THEN last_call ELSE d.last_call END
+"""
+
+
+NORMALIZE_LAST_CALL_QUERY = """
+UNWIND $batch AS row
+MATCH (:Phone {number: row.caller})-[r:CALL]->(:Phone {number: row.callee})
+SET r.last_call = row.ts
+"""
+
+
+def call_time(value) -> Optional[datetime]:
+    """通话时间转为本地时间（去掉时区），空值或无法解析时返回 None"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return None if pd.isna(value) else value.to_pydatetime().replace(tzinfo=None)
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    text = str(value).strip()
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text.replace("/", "-")).replace(tzinfo=None)
+    except ValueError:
+        parsed = pd.to_datetime(text, errors="coerce")
+        return None if pd.isna(parsed) else parsed.to_pydatetime().replace(tzinfo=None)
+
+
+def annotate(rows: Iterable[Dict]) -> Iterator[Dict]:
+    """为话单行补充原生时间字段：ts（LocalDateTime）、day（Date）、hour，原始 timestamp 字段不再写入"""
+    for row in rows:
+        ts = call_time(row.get("timestamp"))
+        yield {
+            **{key: value for key, value in row.items() if key != "timestamp"},
+            "ts": ts,
+            "day": ts.date() if ts else None,
+            "hour": ts.hour if ts else None,
+        }
+
+
+def normalize_last_call(session) -> Dict:
+    """
+    把 CALL.last_call 统一为 LocalDateTime（Schema 迁移 v6）
+
+    早期版本把原始时间字符串（或缺失时的带时区 datetime()）直接写入 last_call，
+    与时间值比较时结果为 null；带时区的值在 Cypher 中转换，字符串读出后在 Python 中解析再写回。
+    写入走批量写入引擎，迁移传入的会话只用于 Cypher 转换
+    """
+    from app.database import db
+    from app.services.batch_writer import BatchWriter
+
+    zoned = session.run("""
+    MATCH ()-[r:CALL]->() WHERE r.last_call IS :: ZONED DATETIME
+    CALL { WITH r SET r.last_call = localdatetime({datetime: r.last_call}) } IN TRANSACTIONS OF 10000 ROWS
+    """).consume().counters.properties_set
+
+    def rows():
+        # 无法解析的字符串保持原样
+        for row in db.stream(
+            "MATCH (p1:Phone)-[r:CALL]->(p2:Phone) WHERE r.last_call IS :: STRING "
+            "RETURN p1.number as caller, p2.number as callee, r.last_call as last_call"
+        ):
+            ts = call_time(row["last_call"])
+            if ts is not None:
+                yield {"caller": row["caller"], "callee": row["callee"], "ts": ts}
+
+    report = BatchWriter(NORMALIZE_LAST_CALL_QUERY, label="normalize-last-call").write(rows())
+    logger.info(f"✅ Normalized CALL.last_call ({zoned} zoned values, {report.rows} strings)")
+    return {"zoned": zoned, "strings": report.rows}
+
+
+query_metrics.register_queries(__name__, globals())
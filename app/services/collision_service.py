@@ -0,0 +1,102 @@
+"""
+碰撞分析物化服务
+将共同联系人、热点号码等全局碰撞结果物化到图中：
+- (p1:Person)-[:SHARES_CONTACT {count}]->(p2:Person)：两人通讯录中的共同号码数（p1.name < p2.name）
+- (phone:Phone).hot_owner_count：通讯录中存有该号码的机主数
+
+通讯录导入时按本批次新建的通讯录关系增量累加，碰撞分析接口直接读取物化结果
+"""
+import logging
+from typing import Dict
+
+from app import query_metrics
+from app.database import db
+from app.services import graph_stats
+
+logger = logging.getLogger(__name__)
+
+
+# 与通讯录写入语句在同一事务中执行，$batch 为通讯录写入批次。
+# 只处理本批次新建的 HAS_CONTACT 关系（CONTACTS_QUERY 在创建时标记 r.uncounted），按增量累加：
+# 先在 SET 中对号码加写锁并累加机主数，再计算共同联系人；并发导入同一号码时后拿到锁的事务
+# 能看到先提交的新关系，每个新增的（机主对, 号码）只计一次。同时按热点阈值的跨越情况增减热点号码计数器
+REFRESH_HOT_OWNER_COUNT_QUERY = """
+UNWIND $batch AS row
+WITH DISTINCT row.owner AS owner_name, row.phone AS number
+MATCH (:Person {name: owner_name})-[r:HAS_CONTACT]->(phone:Phone {number: number})
+WHERE r.uncounted
+WITH phone, count(r) AS added
+SET phone.hot_owner_count = COALESCE(phone.hot_owner_count, 0) + added
+WITH phone.hot_owner_count - added AS before, phone.hot_owner_count AS after
+""" + graph_stats.HOT_NUMBERS_DELTA
+
+# 新增的机主 a 与号码的其他机主 b 组成的机主对共同联系人数 +1；
+# a、b 都是本批次新增时只从名称较小的一侧计一次。复杂度为 新增关系数 × 该号码的机主数
+REFRESH_SHARES_CONTACT_QUERY = """
+UNWIND $batch AS row
+WITH DISTINCT row.owner AS owner_name, row.phone AS number
+MATCH (a:Person {name: owner_name})-[r:HAS_CONTACT]->(phone:Phone {number: number})
+WHERE r.uncounted
+REMOVE r.uncounted
+WITH phone, collect(a) AS added
+UNWIND added AS a
+MATCH (b:Person)-[:HAS_CONTACT]->(phone)
+WHERE b <> a AND NOT (b IN added AND b.name < a.name)
+WITH CASE WHEN a.name < b.name THEN a ELSE b END AS p1,
+     CASE WHEN a.name < b.name THEN b ELSE a END AS p2,
+     count(*) AS shared
+MERGE (p1)-[s:SHARES_CONTACT]->(p2)
+SET s.count = COALESCE(s.count, 0) + shared,
+    s.updated_at = datetime()
+"""
+
+REFRESH_QUERIES = [REFRESH_HOT_OWNER_COUNT_QUERY, REFRESH_SHARES_CONTACT_QUERY]
+
+
+def rebuild_all(session=None) -> Dict:
+    """
+    全量重建物化结果（已有数据首次启用物化时执行，见 Schema 迁移 v2）
+
+    使用 CALL { } IN TRANSACTIONS 分批提交，必须在自动提交事务中运行
+
+    Args:
+        session: 可选，复用调用方的会话（Schema 迁移中传入）
+    """
+    hot_query = """
+    MATCH (phone:Phone)
+    CALL {
+        WITH phone
+        SET phone.hot_owner_count = COUNT { (:Person)-[:HAS_CONTACT]->(phone) }
+    } IN TRANSACTIONS OF 10000 ROWS
+    """
+    pair_query = """
+    MATCH (p1:Person)-[:HAS_CONTACT]->(common:Phone)<-[:HAS_CONTACT]-(p2:Person)
+    WHERE p1.name < p2.name
+    WITH p1, p2, count(DISTINCT common) AS shared
+    CALL {
+        WITH p1, p2, shared
+        MERGE (p1)-[s:SHARES_CONTACT]->(p2)
+        SET s.count = shared,
+            s.updated_at = datetime()
+    } IN TRANSACTIONS OF 10000 ROWS
+    """
+
+    def _run(s):
+        hot = s.run(hot_query).consume().counters.properties_set
+        pairs = s.run(pair_query).consume().counters.properties_set
+        return hot, pairs
+
+    try:
+        if session is not None:
+            hot, pairs = _run(session)
+        else:
+            with db.get_session() as s:
+                hot, pairs = _run(s)
+        logger.info(f"✅ Rebuilt collision materialization ({hot} phones, {pairs // 2} person pairs)")
+        return {"status": "success", "phones": hot, "person_pairs": pairs // 2}
+    except Exception as e:
+        logger.error(f"❌ Failed to rebuild collision materialization: {str(e)}")
+        raise
+
+
+query_metrics.register_queries(__name__, globals())
@@ -0,0 +1,499 @@
+"""
+本地通话事件存储（按天分区的列式存储）
+
+原始话单逐条保存在本地，不写入 Neo4j：时间线、共现分析和通话模式统计直接扫描本地文件。
+
+目录结构（EVENT_STORE_DIR 下）：
+- numbers.sqlite3：号码字典，号码字符串与整数 ID 一一对应（ID 只增不改，清空数据时保留）
+- days/YYYY-MM-DD/<段>/：一次写入产生一个段，每列一个 .npy 文件，
+  second（当天第几秒）、caller、callee（号码 ID）、duration（秒），段内按 second 排序
+
+段先写入临时目录再改名发布，写入方之间互不加锁（导入任务可在多个进程中执行）；
+同一天的段数超过 EVENT_STORE_MAX_SEGMENTS 时合并为一个段，合并段的 meta.json 记录被替换的段，
+读取时忽略已被替换的段，合并与读取并发时结果不会重复。
+
+扫描时的谓词下推：
+- 时间范围先按分区目录裁剪日期，边界日在段内用二分查找定位秒数区间
+- 号码先查字典，不存在时不读取任何文件；按列读取（内存映射），只有命中行才读取通话时长
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from datetime import time as dtime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = {"second": np.uint32, "caller": np.uint32, "callee": np.uint32, "duration": np.uint32}
+
+# Windows 上被映射的文件无法删除（合并后要删除旧段），只在其他平台使用内存映射
+MMAP_MODE = None if os.name == "nt" else "r"
+
+# 每天的秒数、号码 ID 缓存上限
+DAY_SECONDS = 86400
+CACHE_SIZE = 1_000_000
+
+
+class NumberIndex:
+    """号码字典（SQLite），进程内缓存已查询过的映射"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._ids: Dict[str, int] = {}
+        self._numbers: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with closing(sqlite3.connect(str(self.path), timeout=30)) as conn, conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS numbers (id INTEGER PRIMARY KEY, number TEXT NOT NULL UNIQUE)")
+            self._ready = True
+        return sqlite3.connect(str(self.path), timeout=30)
+
+    def _remember(self, pairs: Iterable[Tuple[str, int]]):
+        if len(self._ids) > CACHE_SIZE:
+            self._ids.clear()
+            self._numbers.clear()
+        for number, number_id in pairs:
+            self._ids[number] = number_id
+            self._numbers[number_id] = number
+
+    def intern(self, values: Sequence[str]) -> np.ndarray:
+        """号码转为 ID（新号码写入字典），返回与输入等长的 uint32 数组"""
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        uniques = [str(value) for value in uniques]
+        with self._lock:
+            missing = [number for number in uniques if number not in self._ids]
+            if missing:
+                with closing(self.connect()) as conn, conn:
+                    conn.executemany("INSERT OR IGNORE INTO numbers (number) VALUES (?)", ((n,) for n in missing))
+                    for start in range(0, len(missing), 500):
+                        chunk = missing[start:start + 500]
+                        self._remember(conn.execute(
+                            f"SELECT number, id FROM numbers WHERE number IN ({','.join('?' * len(chunk))})", chunk
+                        ).fetchall())
+            ids = np.array([self._ids[number] for number in uniques], dtype=np.uint32)
+        return ids[codes]
+
+    def lookup(self, number: str) -> Optional[int]:
+        """号码的 ID，不在字典中时返回 None（不写入）"""
+        with self._lock:
+            if number in self._ids:
+                return self._ids[number]
+            with closing(self.connect()) as conn:
+                row = conn.execute("SELECT id FROM numbers WHERE number = ?", (number,)).fetchone()
+            if row is not None:
+                self._remember([(number, row[0])])
+            return row[0] if row else None
+
+    def resolve(self, ids: Iterable[int]) -> Dict[int, str]:
+        """ID 转回号码"""
+        ids = [int(i) for i in set(ids)]
+        with self._lock:
+            missing = [i for i in ids if i not in self._numbers]
+            if missing:
+                with closing(self.connect()) as conn:
+                    for start in range(0, len(missing), 500):
+                        chunk = missing[start:start + 500]
+                        self._remember(conn.execute(
+                            f"SELECT number, id FROM numbers WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                        ).fetchall())
+            return {i: self._numbers[i] for i in ids if i in self._numbers}
+
+
+def _empty() -> Dict[str, np.ndarray]:
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def _take(columns: Dict[str, np.ndarray], index) -> Dict[str, np.ndarray]:
+    return {name: np.asarray(values[index]) for name, values in columns.items()}
+
+
+def _concat(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    if not parts:
+        return _empty()
+    merged = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+    return _take(merged, np.argsort(merged["second"], kind="stable"))
+
+
+def _day_second(value: datetime) -> int:
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _timestamp(day_ordinal: int, second: int) -> str:
+    return (datetime.fromordinal(day_ordinal) + timedelta(seconds=second)).isoformat()
+
+
+class EventStore:
+    """按天分区的通话事件列存储"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.days_dir = self.root / "days"
+        self.numbers = NumberIndex(self.root / "numbers.sqlite3")
+
+    # ==================== 写入 ====================
+
+    def append(self, callers: Sequence, callees: Sequence, times: Sequence, durations: Sequence) -> int:
+        """
+        追加通话事件（无通话时间的记录跳过），按日期各写入一个新段
+
+        Args:
+            times: 本地时间（datetime / pandas 时间，带时区的去掉时区）
+
+        Returns:
+            写入的事件数
+        """
+        times = pd.to_datetime(pd.Series(list(times) if not isinstance(times, pd.Series) else times),
+                               errors="coerce", format="mixed")
+        if getattr(times.dt, "tz", None) is not None:
+            times = times.dt.tz_localize(None)
+        times = times.to_numpy("datetime64[s]")
+        valid = ~np.isnat(times)
+        if not valid.any():
+            return 0
+
+        callers = np.asarray(callers, dtype=object)[valid]
+        callees = np.asarray(callees, dtype=object)[valid]
+        times = times[valid]
+        durations = pd.to_numeric(pd.Series(np.asarray(durations, dtype=object)[valid]), errors="coerce")
+        durations = durations.fillna(0).clip(0, np.iinfo(np.uint32).max).to_numpy(np.uint32)
+
+        ids = self.numbers.intern(np.concatenate([callers, callees]))
+        days = times.astype("datetime64[D]")
+        order = np.lexsort(((times - days).astype(np.int64), days))
+        columns = {
+            "second": (times - days).astype(np.int64).astype(np.uint32)[order],
+            "caller": ids[:len(callers)][order],
+            "callee": ids[len(callers):][order],
+            "duration": durations[order],
+        }
+        days = days[order]
+
+        unique_days, starts = np.unique(days, return_index=True)
+        bounds = list(starts[1:]) + [len(days)]
+        for day, start, end in zip(unique_days, starts, bounds):
+            day = day.astype(date)
+            self._write_segment(day, {name: values[start:end] for name, values in columns.items()})
+            if len(self._segments(day)) > settings.EVENT_STORE_MAX_SEGMENTS:
+                self.compact(day)
+        return int(valid.sum())
+
+    def append_rows(self, rows: Sequence[Dict]) -> int:
+        """追加已补充 ts 字段的话单行（见 call_buckets.annotate）"""
+        return self.append(
+            [row["caller"] for row in rows],
+            [row["callee"] for row in rows],
+            [row.get("ts") for row in rows],
+            [row.get("duration") or 0 for row in rows],
+        )
+
+    def _write_segment(self, day: date, columns: Dict[str, np.ndarray], replaces: Sequence[str] = ()) -> Path:
+        """写入临时目录后改名发布，读取方只会看到完整的段"""
+        day_dir = self.days_dir / day.isoformat()
+        day_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        tmp = day_dir / f".{name}.tmp"
+        tmp.mkdir()
+        for column, values in columns.items():
+            np.save(tmp / f"{column}.npy", np.ascontiguousarray(values, dtype=COLUMNS[column]))
+        (tmp / "meta.json").write_text(json.dumps({"rows": int(len(columns["second"])), "replaces": list(replaces)}))
+        os.replace(tmp, day_dir / name)
+        return day_dir / name
+
+    # ==================== 段管理 ====================
+
+    def days(self, start: Optional[date] = None, end: Optional[date] = None) -> List[date]:
+        """有数据的日期分区（含 start、end）"""
+        if not self.days_dir.is_dir():
+            return []
+        result = []
+        for path in self.days_dir.iterdir():
+            try:
+                day = date.fromisoformat(path.name)
+            except ValueError:
+                continue
+            if (start is None or day >= start) and (end is None or day <= end):
+                result.append(day)
+        return sorted(result)
+
+    @staticmethod
+    def _meta(segment: Path) -> Dict:
+        return json.loads((segment / "meta.json").read_text())
+
+    def _segments(self, day: date) -> List[Path]:
+        """某天的有效段（去掉已被合并段替换的段）"""
+        day_dir = self.days_dir / day.isoformat()
+        if not day_dir.is_dir():
+            return []
+        segments = sorted(path for path in day_dir.iterdir() if not path.name.startswith("."))
+        replaced = set()
+        for segment in segments:
+            try:
+                replaced.update(self._meta(segment)["replaces"])
+            except FileNotFoundError:
+                continue
+        return [segment for segment in segments if segment.name not in replaced]
+
+    @staticmethod
+    def _column(segment: Path, name: str) -> np.ndarray:
+        return np.load(segment / f"{name}.npy", mmap_mode=MMAP_MODE)
+
+    def compact(self, day: date) -> int:
+        """
+        把某天的全部段合并为一个段，返回合并前的段数
+
+        合并期间持有号码字典的写锁，多个进程不会同时合并；旧段在合并段发布后删除
+        """
+        with closing(self.numbers.connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                segments = self._segments(day)
+                if len(segments) <= 1:
+                    return len(segments)
+                replaces = set()
+                parts = []
+                for segment in segments:
+                    replaces.add(segment.name)
+                    replaces.update(self._meta(segment)["replaces"])
+                    parts.append({name: np.load(segment / f"{name}.npy") for name in COLUMNS})
+                self._write_segment(day, _concat(parts), sorted(replaces))
+                for segment in segments:
+                    shutil.rmtree(segment, ignore_errors=True)
+            finally:
+                conn.rollback()
+        logger.info(f"📦 Compacted {len(segments)} event segments of {day.isoformat()}")
+        return len(segments)
+
+    def compact_all(self) -> Dict:
+        merged = {day.isoformat(): self.compact(day) for day in self.days()}
+        return {"days": len(merged), "segments_merged": sum(n for n in merged.values() if n > 1)}
+
+    def clear(self):
+        """删除全部事件（号码字典保留，其他进程缓存的 ID 仍然有效）"""
+        if self.days_dir.exists():
+            shutil.rmtree(self.days_dir)
+        logger.warning("⚠️  Call event store has been cleared")
+
+    def stats(self) -> Dict:
+        days = self.days()
+        segments = [segment for day in days for segment in self._segments(day)]
+        return {
+            "root": str(self.root),
+            "days": len(days),
+            "first_day": days[0].isoformat() if days else None,
+            "last_day": days[-1].isoformat() if days else None,
+            "segments": len(segments),
+            "events": sum(self._meta(segment)["rows"] for segment in segments),
+        }
+
+    # ==================== 扫描 ====================
+
+    def _read_day(self, day: date, number_id: Optional[int], peer_id: Optional[int],
+                  first_second: int, last_second: int) -> Dict[str, np.ndarray]:
+        """读取一天内 [first_second, last_second) 的事件，按 second 排序"""
+        for attempt in range(3):
+            try:
+                parts = []
+                for segment in self._segments(day):
+                    second = self._column(segment, "second")
+                    lo = int(np.searchsorted(second, first_second, "left"))
+                    hi = int(np.searchsorted(second, last_second, "left"))
+                    if lo >= hi:
+                        continue
+                    columns = {"second": second, "caller": self._column(segment, "caller"),
+                               "callee": self._column(segment, "callee")}
+                    if number_id is None:
+                        index = slice(lo, hi)
+                    else:
+                        caller = columns["caller"][lo:hi]
+                        callee = columns["callee"][lo:hi]
+                        mask = (caller == number_id) | (callee == number_id)
+                        if peer_id is not None:
+                            mask &= (caller == peer_id) | (callee == peer_id)
+                        index = np.flatnonzero(mask) + lo
+                        if not index.size:
+                            continue
+                    columns["duration"] = self._column(segment, "duration")
+                    parts.append(_take(columns, index))
+                return _concat(parts)
+            except FileNotFoundError:
+                # 读取期间该天的段被合并，重新读取
+                if attempt == 2:
+                    raise
+        return _empty()
+
+    def scan_days(self, number: Optional[str] = None, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None, peer: Optional[str] = None,
+                  descending: bool = False) -> Iterator[Tuple[date, Dict[str, np.ndarray]]]:
+        """
+        按天产出 [start, end) 内的事件列（只含有事件的日期）
+
+        Args:
+            number: 只返回该号码作为主叫或被叫的事件
+            peer: 同时指定 number 时，只返回两个号码之间的事件
+        """
+        number_id = peer_id = None
+        if number is not None:
+            number_id = self.numbers.lookup(number)
+            if number_id is None:
+                return
+        if peer is not None:
+            peer_id = self.numbers.lookup(peer)
+            if peer_id is None:
+                return
+        days = self.days(start.date() if start else None, end.date() if end else None)
+        for day in reversed(days) if descending else days:
+            first_second = _day_second(start) if start and day == start.date() else 0
+            last_second = _day_second(end) if end and day == end.date() else DAY_SECONDS
+            columns = self._read_day(day, number_id, peer_id, first_second, last_second)
+            if len(columns["second"]):
+                yield day, columns
+
+    def scan(self, number: Optional[str] = None, start: Optional[datetime] = None,
+             end: Optional[datetime] = None, peer: Optional[str] = None,
+             descending: bool = False) -> Iterator[Dict]:
+        """逐条产出事件（号码还原为字符串，指定 number 时附带方向 outgoing / incoming）"""
+        number_id = self.numbers.lookup(number) if number is not None else None
+        for day, columns in self.scan_days(number, start, end, peer, descending):
+            names = self.numbers.resolve(np.unique(np.concatenate([columns["caller"], columns["callee"]])))
+            order = range(len(columns["second"]) - 1, -1, -1) if descending else range(len(columns["second"]))
+            ordinal = day.toordinal()
+            for i in order:
+                caller = int(columns["caller"][i])
+                event = {
+                    "time": _timestamp(ordinal, int(columns["second"][i])),
+                    "caller": names.get(caller),
+                    "callee": names.get(int(columns["callee"][i])),
+                    "duration": int(columns["duration"][i]),
+                }
+                if number_id is not None:
+                    event["direction"] = "outgoing" if caller == number_id else "incoming"
+                yield event
+
+    def call_pattern(self, number: str, time_window_days: int) -> List[Dict]:
+        """
+        按通话对象汇总目标号码在时间窗口内的事件
+
+        返回行与 analysis_service.CALL_PATTERN_QUERY 的结果字段相同，按通话次数降序
+        """
+        start = datetime.combine(date.today() - timedelta(days=time_window_days), dtime.min)
+        parts = list(self.scan_days(number, start=start))
+        if not parts:
+            return []
+        target = self.numbers.lookup(number)
+        ordinal = np.concatenate([np.full(len(c["second"]), day.toordinal(), dtype=np.int64) for day, c in parts])
+        second = np.concatenate([c["second"] for _, c in parts]).astype(np.int64)
+        caller = np.concatenate([c["caller"] for _, c in parts])
+        callee = np.concatenate([c["callee"] for _, c in parts])
+        duration = np.concatenate([c["duration"] for _, c in parts]).astype(np.int64)
+
+        outgoing = caller == target
+        peers, inverse = np.unique(np.where(outgoing, callee, caller), return_inverse=True)
+        n = len(peers)
+        calls = np.bincount(inverse, minlength=n)
+        outgoing_calls = np.bincount(inverse, weights=outgoing, minlength=n).astype(np.int64)
+        total_duration = np.bincount(inverse, weights=duration, minlength=n).astype(np.int64)
+        hours = np.bincount(inverse * 24 + second // 3600, minlength=n * 24).reshape(n, 24)
+        # date.fromordinal(1) 是周一，与 Cypher 的 dayOfWeek（1 = 周一）顺序一致
+        weekdays = np.bincount(inverse * 7 + (ordinal - 1) % 7, minlength=n * 7).reshape(n, 7)
+        active_days = np.bincount(np.unique(inverse * 10_000_000 + ordinal) // 10_000_000, minlength=n)
+        moment = ordinal * DAY_SECONDS + second
+        first = np.full(n, np.iinfo(np.int64).max)
+        last = np.full(n, np.iinfo(np.int64).min)
+        np.minimum.at(first, inverse, moment)
+        np.maximum.at(last, inverse, moment)
+
+        names = self.numbers.resolve(peers)
+        rows = []
+        for i in np.argsort(-calls, kind="stable"):
+            count = int(calls[i])
+            average = int(total_duration[i]) // count
+            rows.append({
+                "contact_id": names.get(int(peers[i])),
+                "call_count": count,
+                "outgoing_calls": int(outgoing_calls[i]),
+                "incoming_calls": count - int(outgoing_calls[i]),
+                "total_duration": int(total_duration[i]),
+                "active_days": int(active_days[i]),
+                "first_call_time": _timestamp(*divmod(int(first[i]), DAY_SECONDS)),
+                "last_call_time": _timestamp(*divmod(int(last[i]), DAY_SECONDS)),
+                "hours": hours[i].tolist(),
+                "weekdays": weekdays[i].tolist(),
+                "avg_duration_category": "short" if average < 60 else "medium" if average < 300 else "long",
+            })
+        return rows
+
+
+store = EventStore(settings.EVENT_STORE_DIR)
+
+
+class Appender:
+    """
+    导入时追加事件：已提交到 Neo4j 的批次的话单行先缓冲，每 EVENT_STORE_FLUSH_ROWS 行写入一次，
+    导入结束（含失败）时调用 flush 写入剩余行
+
+    只接收已提交的批次（BatchWriter 的 on_commit），导入失败后重新导入时，
+    清单只重新写入未提交的行，事件不会重复追加；并行写入的多个 worker 共用一个实例
+    """
+
+    def __init__(self):
+        self._buffer: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, rows: Iterable[Dict]):
+        if not settings.EVENT_STORE_ENABLED:
+            return
+        with self._lock:
+            self._buffer.extend(row for row in rows if row.get("ts") is not None)
+            if len(self._buffer) < settings.EVENT_STORE_FLUSH_ROWS:
+                return
+            rows, self._buffer = self._buffer, []
+        store.append_rows(rows)
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if rows:
+            store.append_rows(rows)
+
+    async def add_async(self, rows: Iterable[Dict]):
+        """异步导入使用：追加（号码字典、写段、合并）在线程池中执行，不阻塞事件循环"""
+        await asyncio.to_thread(self.add, list(rows))
+
+    async def flush_async(self):
+        await asyncio.to_thread(self.flush)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.services.event_store", description="本地通话事件存储")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="分区、段和事件数")
+    commands.add_parser("compact", help="合并每天的段")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    result = store.stats() if args.command == "stats" else store.compact_all()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
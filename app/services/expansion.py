@@ -0,0 +1,216 @@
+"""
+网络扩展引擎（N 度关系）
+按层扩展前沿节点并去重，每层和总节点数都有上限；度数超过阈值的枢纽节点（呼叫中心、大群成员等）
+标记为 collapsed，只展示不继续扩展。逐层产出结果，供 NDJSON 流式接口边算边返回。
+
+邻居来源：内存图投影最新时直接在 CSR 上取，否则每层执行一次有界的 Cypher 查询
+"""
+import logging
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.database import db
+from app.services import graph_projection
+from app.services.graph_projection import EDGE_TYPES, GraphProjection, _gather
+from app.services.path_engine import parse_rel_types
+
+logger = logging.getLogger(__name__)
+
+
+class Hop(NamedTuple):
+    """前沿节点的一条邻接关系"""
+    from_key: object
+    to_key: object
+    to_id: str
+    to_type: str
+    to_degree: int
+    edge_key: object
+    source: str
+    target: str
+    rel_type: str
+    count: int
+    total_duration: int
+
+
+class _ProjectionSource:
+    """在内存图投影上取邻居"""
+    engine = "projection"
+
+    def __init__(self, projection: GraphProjection, rel_types: List[str]):
+        self.projection = projection
+        self.edge_ok = projection.edge_mask(rel_types)
+        cache_key = ("degrees", tuple(rel_types))
+        if cache_key not in projection.cache:
+            projection.cache[cache_key] = projection.degrees(rel_types)
+        self.degree = projection.cache[cache_key]
+
+    def resolve(self, target_id: str, label: str) -> Optional[Tuple[object, int]]:
+        node = self.projection.lookup(target_id, label)
+        return None if node is None else (node, int(self.degree[node]))
+
+    def expand(self, frontier: List[object], limit: int) -> Tuple[List[Hop], bool]:
+        p = self.projection
+        parents, children, offsets = _gather(p.indptr, p.indices, np.array(frontier, dtype=np.int64))
+        edges = p.adj_edge[offsets]
+        keep = self.edge_ok[edges] & (children != parents)
+        parents, children, edges = parents[keep][:limit], children[keep][:limit], edges[keep][:limit]
+        hops = [
+            Hop(int(a), int(b), p.keys[b], p.label_of(b), int(self.degree[b]), int(e),
+                p.keys[p.src[e]], p.keys[p.dst[e]], EDGE_TYPES[p.etype[e]],
+                int(p.weight[e]), int(p.duration[e]))
+            for a, b, e in zip(parents.tolist(), children.tolist(), edges.tolist())
+        ]
+        return hops, int(keep.sum()) > limit
+
+
+class _CypherSource:
+    """每层一次有界 Cypher 查询（投影过期或未启用时使用）"""
+    engine = "cypher"
+
+    def __init__(self, rel_types: List[str]):
+        self.types = "|".join(rel_types)
+
+    def resolve(self, target_id: str, label: str) -> Optional[Tuple[object, int]]:
+        id_prop = graph_projection.LABEL_KEYS[label]
+        results = db.execute_read(
+            f"""
+            MATCH (n:{label} {{{id_prop}: $id}})
+            RETURN elementId(n) as key, COUNT {{ (n)-[:{self.types}]-() }} as degree
+            """,
+            {"id": target_id}
+        )
+        return (results[0]["key"], results[0]["degree"]) if results else None
+
+    def expand(self, frontier: List[object], limit: int) -> Tuple[List[Hop], bool]:
+        query = f"""
+        UNWIND $frontier AS key
+        MATCH (n) WHERE elementId(n) = key
+        MATCH (n)-[r:{self.types}]-(m)
+        WHERE m <> n
+        RETURN key as from_key,
+               elementId(m) as to_key,
+               COALESCE(m.number, m.wxid, m.name) as to_id,
+               labels(m)[0] as to_type,
+               COUNT {{ (m)-[:{self.types}]-() }} as to_degree,
+               elementId(r) as edge_key,
+               COALESCE(startNode(r).number, startNode(r).wxid, startNode(r).name) as source,
+               COALESCE(endNode(r).number, endNode(r).wxid, endNode(r).name) as target,
+               type(r) as rel_type,
+               COALESCE(r.count, 1) as count,
+               COALESCE(r.total_duration, 0) as total_duration
+        LIMIT $limit
+        """
+        # 逐条转换为 Hop，不保留中间的结果字典列表
+        hops = [Hop(**row) for row in db.stream(query, {"frontier": frontier, "limit": limit + 1})]
+        return hops[:limit], len(hops) > limit
+
+
+def iter_expansion(
+    target_id: str,
+    depth: int = 2,
+    node_type: str = "Phone",
+    rel_types: Optional[Sequence[str]] = None,
+    max_nodes: Optional[int] = None,
+    max_per_level: Optional[int] = None,
+    hub_degree: Optional[int] = None
+) -> Iterator[Dict]:
+    """
+    逐层扩展联系网络
+
+    Args:
+        target_id: 目标 ID
+        depth: 扩展深度
+        node_type: 目标节点类型
+        rel_types: 扩展经过的关系类型（默认 CALL / FRIEND / HAS_CONTACT）
+        max_nodes: 总节点数上限（默认 EXPAND_MAX_NODES）
+        max_per_level: 每层新增节点上限（默认 EXPAND_MAX_PER_LEVEL），超出时保留联系最紧密的节点
+        hub_degree: 度数超过该值的节点标记为 collapsed，不再向外扩展（默认 EXPAND_HUB_DEGREE）
+
+    Yields:
+        {"type": "level", "level": n, "nodes": [...], "relationships": [...]}，每层一条；
+        最后一条为 {"type": "done", ...} 汇总（是否找到目标、是否被截断、耗时等）
+    """
+    started = time.monotonic()
+    label = "Phone" if node_type == "Phone" else "WeChat"
+    rel_types = parse_rel_types(rel_types)
+    max_nodes = settings.EXPAND_MAX_NODES if max_nodes is None else max_nodes
+    max_per_level = settings.EXPAND_MAX_PER_LEVEL if max_per_level is None else max_per_level
+    hub_degree = settings.EXPAND_HUB_DEGREE if hub_degree is None else hub_degree
+
+    projection = graph_projection.fresh_projection()
+    source = _ProjectionSource(projection, rel_types) if projection is not None else _CypherSource(rel_types)
+
+    summary = {"type": "done", "target": target_id, "depth": depth, "engine": source.engine,
+               "found": False, "truncated": False, "total_nodes": 0, "total_relationships": 0, "collapsed": 0}
+    root = source.resolve(target_id, label)
+    if root is None:
+        summary["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        yield summary
+        return
+
+    root_key, root_degree = root
+    root_node = {"id": target_id, "type": label, "level": 0, "degree": root_degree,
+                 "collapsed": bool(hub_degree) and root_degree > hub_degree}
+    yield {"type": "level", "level": 0, "nodes": [root_node], "relationships": []}
+
+    seen = {root_key}
+    emitted = set()
+    # 目标本身即使是枢纽也扩展一层（受每层上限约束）
+    frontier = [root_key]
+    summary.update(found=True, total_nodes=1, collapsed=int(root_node["collapsed"]))
+
+    for level in range(1, depth + 1):
+        if not frontier:
+            break
+        hops, clipped = source.expand(frontier, settings.EXPAND_MAX_EDGES_PER_LEVEL)
+        summary["truncated"] |= clipped
+
+        # 未访问过的邻居按与前沿的联系强度排序，超出上限的截断
+        strength: Dict[object, int] = {}
+        first_hop: Dict[object, Hop] = {}
+        for hop in hops:
+            if hop.to_key in seen:
+                continue
+            strength[hop.to_key] = strength.get(hop.to_key, 0) + hop.count
+            first_hop.setdefault(hop.to_key, hop)
+        budget = max(min(max_per_level, max_nodes - len(seen)), 0)
+        ranked = sorted(strength, key=lambda key: -strength[key])
+        accepted = ranked[:budget]
+        summary["truncated"] |= len(ranked) > budget
+        seen.update(accepted)
+
+        nodes = []
+        frontier = []
+        for key in accepted:
+            hop = first_hop[key]
+            collapsed = bool(hub_degree) and hop.to_degree > hub_degree
+            nodes.append({"id": hop.to_id, "type": hop.to_type, "level": level,
+                          "degree": hop.to_degree, "collapsed": collapsed})
+            if collapsed:
+                summary["collapsed"] += 1
+            else:
+                frontier.append(key)
+
+        relationships = []
+        for hop in hops:
+            if hop.to_key in seen and hop.edge_key not in emitted:
+                emitted.add(hop.edge_key)
+                relationships.append({"source": hop.source, "target": hop.target, "type": hop.rel_type,
+                                      "count": hop.count, "total_duration": hop.total_duration})
+
+        summary["total_nodes"] += len(nodes)
+        summary["total_relationships"] += len(relationships)
+        yield {"type": "level", "level": level, "nodes": nodes, "relationships": relationships}
+
+        if len(seen) >= max_nodes:
+            break
+
+    summary["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+    logger.info(
+        f"🔍 Expanded network for {target_id} to depth {depth}: {summary['total_nodes']} nodes, "
+        f"{summary['collapsed']} collapsed hubs, truncated={summary['truncated']} ({source.engine})"
+    )
+    yield summary
@@ -0,0 +1,86 @@
+"""
+流式文件读取
+按固定行数分块读取 CSV / Excel，每次只在内存中保留一个 DataFrame 分块
+"""
+import logging
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def iter_csv_frames(file_path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    分块读取 CSV
+
+    所有列按字符串读取：逐块推断类型会导致同一列在不同分块中类型不一致，
+    号码列一旦出现空值也会被推断成浮点数（13800138001 -> 13800138001.0）
+    """
+    reader = pd.read_csv(file_path, chunksize=chunk_rows, dtype=str, encoding_errors="replace")
+    with reader:
+        for frame in reader:
+            yield frame
+
+
+def _cell(value):
+    # openpyxl 将数值单元格统一读为 float，整数号码需还原，否则会多出 ".0"
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def iter_xlsx_frames(file_path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """使用 openpyxl 只读模式逐行迭代 .xlsx（首个工作表），不加载整个工作簿"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [
+            str(name).strip() if name is not None else f"column_{i}"
+            for i, name in enumerate(header)
+        ]
+
+        buffer: List[tuple] = []
+        for row in rows:
+            if row is None or all(v is None for v in row):
+                continue
+            buffer.append(tuple(_cell(v) for v in row[:len(columns)]))
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        workbook.close()
+
+
+def iter_xls_frames(file_path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """旧版 .xls 无法流式读取，整表读入后分块产出"""
+    df = pd.read_excel(file_path)
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def iter_frames(file_path: str, chunk_rows: int, file_format: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """
+    按文件格式选择分块读取器
+
+    Args:
+        file_path: 文件路径
+        chunk_rows: 每个分块的行数
+        file_format: 'csv' | 'xlsx' | 'xls'，为空时根据扩展名判断
+    """
+    fmt = (file_format or Path(file_path).suffix.lstrip(".")).lower()
+    if fmt == "csv":
+        return iter_csv_frames(file_path, chunk_rows)
+    if fmt == "xlsx":
+        return iter_xlsx_frames(file_path, chunk_rows)
+    if fmt == "xls":
+        return iter_xls_frames(file_path, chunk_rows)
+    raise ValueError(f"不支持的文件格式: {fmt}")
@@ -0,0 +1,451 @@
+"""
+内存图投影
+一次性从 Neo4j 拉取 Phone / WeChat / Person 节点及 CALL / FRIEND / HAS_CONTACT 关系，
+节点 ID 映射为连续整数，邻接关系以 NumPy CSR 数组存储，供中心性、社区发现及邻域查询在进程内计算。
+
+快照以图版本号（GraphMeta 节点，导入和清空数据时递增）标识：版本前进后快照即过期，
+有 Cypher 实现的分析函数在快照过期期间回退到 Cypher，同时在后台重新加载
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app import query_metrics
+from app.config import settings
+from app.database import async_db, db
+
+logger = logging.getLogger(__name__)
+
+# 节点标签及其业务主键
+LABELS = ["Phone", "WeChat", "Person"]
+LABEL_KEYS = {"Phone": "number", "WeChat": "wxid", "Person": "name"}
+
+# 关系类型：(类型, 起点标签, 终点标签, 权重表达式, 时长表达式)
+EDGE_TYPES = ["CALL", "FRIEND", "HAS_CONTACT"]
+_EDGE_SOURCES = [
+    ("CALL", "Phone", "Phone", "COALESCE(r.count, 1)", "COALESCE(r.total_duration, 0)"),
+    ("FRIEND", "WeChat", "WeChat", "1", "0"),
+    ("HAS_CONTACT", "Person", "Phone", "1", "0"),
+]
+
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    批量取一组节点的全部邻接项（向量化，无 Python 循环）
+
+    Returns:
+        (重复的源节点, 邻居节点, 邻接项在 CSR 中的位置)
+    """
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    sources = np.repeat(nodes, counts)
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+    return sources, indices[offsets], offsets
+
+
+@dataclass
+class GraphProjection:
+    """
+    图投影快照（只读）
+
+    - 节点：keys[i] 为业务主键，labels[i] 为标签编码（LABELS 下标）
+    - 边：src / dst / etype / weight / duration 列式存储，保留原始方向
+    - CSR：把每条边按两个方向展开的无向邻接表，adj_edge[k] 指回边列下标
+    """
+    version: int
+    keys: np.ndarray
+    labels: np.ndarray
+    src: np.ndarray
+    dst: np.ndarray
+    etype: np.ndarray
+    weight: np.ndarray
+    duration: np.ndarray
+    indptr: np.ndarray = None
+    indices: np.ndarray = None
+    adj_edge: np.ndarray = None
+    loaded_at: float = field(default_factory=time.time)
+    load_seconds: float = 0.0
+    # 基于本快照的计算结果缓存（快照不可变，结果随快照一起失效）
+    cache: Dict = field(default_factory=dict)
+    _index: Dict[Tuple[int, str], int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if not self._index:
+            self._index = {(int(l), k): i for i, (l, k) in enumerate(zip(self.labels, self.keys))}
+        if self.indptr is None:
+            self._build_csr()
+
+    def _build_csr(self):
+        n = len(self.keys)
+        m = len(self.src)
+        rows = np.concatenate([self.src, self.dst])
+        cols = np.concatenate([self.dst, self.src])
+        edge_ids = np.concatenate([np.arange(m), np.arange(m)]).astype(np.int64)
+        order = np.argsort(rows, kind="stable")
+        self.indices = cols[order]
+        self.adj_edge = edge_ids[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=self.indptr[1:])
+
+    # ==================== 基本属性 ====================
+
+    @property
+    def node_count(self) -> int:
+        return len(self.keys)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.src)
+
+    def lookup(self, key: str, label: Optional[str] = None) -> Optional[int]:
+        """业务主键 -> 节点下标；未指定标签时按 Phone、WeChat、Person 顺序查找"""
+        for name in ([label] if label else LABELS):
+            index = self._index.get((LABELS.index(name), key))
+            if index is not None:
+                return index
+        return None
+
+    def label_of(self, node: int) -> str:
+        return LABELS[int(self.labels[node])]
+
+    def label_mask(self, label: str) -> np.ndarray:
+        return self.labels == LABELS.index(label)
+
+    def edge_mask(self, rel_types: Optional[Sequence[str]] = None) -> np.ndarray:
+        """按关系类型筛选边（为空表示全部类型）"""
+        if not rel_types:
+            return np.ones(self.edge_count, dtype=bool)
+        codes = [EDGE_TYPES.index(t) for t in rel_types if t in EDGE_TYPES]
+        return np.isin(self.etype, codes)
+
+    def incident(self, node: int, rel_types: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        节点的邻接项（无向，可按关系类型筛选）
+
+        Returns:
+            (邻居下标, 对应的边列下标)，两个节点间有多条关系时邻居重复出现
+        """
+        start, end = self.indptr[node], self.indptr[node + 1]
+        nbrs, edges = self.indices[start:end], self.adj_edge[start:end]
+        if rel_types:
+            keep = np.isin(self.etype[edges], [EDGE_TYPES.index(t) for t in rel_types if t in EDGE_TYPES])
+            nbrs, edges = nbrs[keep], edges[keep]
+        return nbrs, edges
+
+    def neighbors(self, node: int, rel_types: Optional[Sequence[str]] = None) -> np.ndarray:
+        """节点的邻居下标（去重）"""
+        return np.unique(self.incident(node, rel_types)[0])
+
+    def degrees(self, rel_types: Optional[Sequence[str]] = None, weighted: bool = False) -> np.ndarray:
+        """所有节点的度（或以 weight 加权的度），向量化计算"""
+        mask = self.edge_mask(rel_types)
+        weights = self.weight[mask] if weighted else None
+        n = self.node_count
+        return (np.bincount(self.src[mask], weights=weights, minlength=n)
+                + np.bincount(self.dst[mask], weights=weights, minlength=n))
+
+    def simple_csr(self) -> Tuple[np.ndarray, np.ndarray]:
+        """去掉重复边（双向通话、多种关系）和自环后的无向 CSR，用于最短路径类计算"""
+        cached = self.cache.get("simple_csr")
+        if cached is not None:
+            return cached
+        n = self.node_count
+        rows = np.concatenate([self.src, self.dst])
+        cols = np.concatenate([self.dst, self.src])
+        keep = rows != cols
+        pairs = np.unique(rows[keep] * n + cols[keep])
+        rows, cols = pairs // n, pairs % n
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        self.cache["simple_csr"] = (indptr, cols)
+        return indptr, cols
+
+    def summary(self) -> Dict:
+        return {
+            "version": self.version,
+            "nodes": self.node_count,
+            "edges": self.edge_count,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 3)
+        }
+
+
+# ==================== 从 Neo4j 加载 ====================
+
+def _stream(query: str) -> Iterable[list]:
+    for row in db.stream(query):
+        yield list(row.values())
+
+
+def load_projection(version: int = 0) -> GraphProjection:
+    """从 Neo4j 全量加载一次图投影"""
+    started = time.perf_counter()
+    keys: List[str] = []
+    labels: List[int] = []
+    index: Dict[Tuple[int, str], int] = {}
+
+    for code, label in enumerate(LABELS):
+        prop = LABEL_KEYS[label]
+        for (key,) in _stream(f"MATCH (n:{label}) WHERE n.{prop} IS NOT NULL RETURN n.{prop}"):
+            index[(code, key)] = len(keys)
+            keys.append(key)
+            labels.append(code)
+
+    src: List[int] = []
+    dst: List[int] = []
+    etype: List[int] = []
+    weight: List[float] = []
+    duration: List[float] = []
+    for code, (rel, from_label, to_label, weight_expr, duration_expr) in enumerate(_EDGE_SOURCES):
+        from_code, to_code = LABELS.index(from_label), LABELS.index(to_label)
+        query = (
+            f"MATCH (a:{from_label})-[r:{rel}]->(b:{to_label}) "
+            f"RETURN a.{LABEL_KEYS[from_label]}, b.{LABEL_KEYS[to_label]}, {weight_expr}, {duration_expr}"
+        )
+        for a, b, w, d in _stream(query):
+            i, j = index.get((from_code, a)), index.get((to_code, b))
+            if i is None or j is None:
+                continue
+            src.append(i)
+            dst.append(j)
+            etype.append(code)
+            weight.append(w or 1)
+            duration.append(d or 0)
+
+    projection = GraphProjection(
+        version=version,
+        keys=np.array(keys, dtype=object),
+        labels=np.array(labels, dtype=np.int8),
+        src=np.array(src, dtype=np.int64),
+        dst=np.array(dst, dtype=np.int64),
+        etype=np.array(etype, dtype=np.int8),
+        weight=np.array(weight, dtype=np.float64),
+        duration=np.array(duration, dtype=np.float64),
+        _index=index
+    )
+    projection.load_seconds = time.perf_counter() - started
+    logger.info(
+        f"🧠 Loaded graph projection v{version}: {projection.node_count} nodes, "
+        f"{projection.edge_count} edges in {projection.load_seconds:.2f}s"
+    )
+    return projection
+
+
+# ==================== 图版本（导入和清空数据时递增） ====================
+
+GRAPH_VERSION_QUERY = "MATCH (m:GraphMeta {key: 'graph'}) RETURN m.version as version"
+
+BUMP_GRAPH_VERSION_QUERY = """
+MERGE (m:GraphMeta {key: 'graph'})
+SET m.version = COALESCE(m.version, 0) + 1,
+    m.updated_at = datetime()
+RETURN m.version as version
+"""
+
+_version_lock = threading.Lock()
+_known_version: Optional[int] = None
+_version_checked_at = 0.0
+
+
+def _record_version(version: int):
+    global _known_version, _version_checked_at
+    with _version_lock:
+        _known_version, _version_checked_at = version, time.monotonic()
+
+
+def _cached_version(max_age: Optional[float]) -> Optional[int]:
+    max_age = settings.PROJECTION_VERSION_CHECK_INTERVAL if max_age is None else max_age
+    if _known_version is not None and time.monotonic() - _version_checked_at <= max_age:
+        return _known_version
+    return None
+
+
+def current_graph_version(max_age: Optional[float] = None) -> int:
+    """
+    读取数据库中的图版本号
+
+    max_age 秒（默认 PROJECTION_VERSION_CHECK_INTERVAL）内重复调用直接返回上次读取的值，
+    避免每次分析请求都访问一次数据库
+    """
+    cached = _cached_version(max_age)
+    if cached is not None:
+        return cached
+    results = db.execute_read(GRAPH_VERSION_QUERY)
+    version = (results[0]["version"] or 0) if results else 0
+    _record_version(version)
+    return version
+
+
+async def current_graph_version_async(max_age: Optional[float] = None) -> int:
+    """current_graph_version 的异步版本（通过 async_db 读取，不阻塞事件循环）"""
+    cached = _cached_version(max_age)
+    if cached is not None:
+        return cached
+    results = await async_db.execute_read(GRAPH_VERSION_QUERY)
+    version = (results[0]["version"] or 0) if results else 0
+    _record_version(version)
+    return version
+
+
+def bump_graph_version() -> int:
+    """图数据发生变化后递增版本号，内存投影随之失效（其他进程在下次检查版本时感知）"""
+    results = db.execute_write(BUMP_GRAPH_VERSION_QUERY)
+    version = results[0]["version"]
+    _record_version(version)
+    logger.info(f"🔖 Graph version bumped to {version}")
+    return version
+
+
+async def bump_graph_version_async() -> int:
+    """bump_graph_version 的异步版本"""
+    results = await async_db.execute_write(BUMP_GRAPH_VERSION_QUERY)
+    version = results[0]["version"]
+    _record_version(version)
+    logger.info(f"🔖 Graph version bumped to {version}")
+    return version
+
+
+class BumpSchedule:
+    """
+    导入期间递增图版本号的节奏：首个批次提交后立即递增，之后至多每 GRAPH_VERSION_BUMP_INTERVAL 秒一次
+
+    调用返回 True 表示本次应当递增；导入结束时调用方总是再递增一次
+    """
+
+    def __init__(self):
+        self._last: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def __call__(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self._last is not None and now - self._last < settings.GRAPH_VERSION_BUMP_INTERVAL:
+                return False
+            self._last = now
+            return True
+
+
+# ==================== 快照管理 ====================
+
+_projection: Optional[GraphProjection] = None
+_load_lock = threading.Lock()
+_loader: Optional[threading.Thread] = None
+_last_error: Optional[str] = None
+
+
+def _reload(version: int) -> GraphProjection:
+    """加载指定版本的快照（加载期间的写入会使版本继续前进，下次检查时再刷新）"""
+    global _projection, _last_error
+    with _load_lock:
+        current = _projection
+        if current is not None and current.version >= version:
+            return current
+        try:
+            _projection = load_projection(version=version)
+            _last_error = None
+        except Exception as e:
+            _last_error = str(e)
+            logger.error(f"❌ Failed to load graph projection: {str(e)}")
+            raise
+        return _projection
+
+
+def refresh_in_background():
+    """在后台线程刷新快照（已有刷新在进行时不重复启动）"""
+    global _loader
+    if _loader is not None and _loader.is_alive():
+        return
+
+    def _run():
+        try:
+            _reload(current_graph_version(max_age=0))
+        except Exception:
+            pass
+
+    _loader = threading.Thread(target=_run, name="graph-projection-loader", daemon=True)
+    _loader.start()
+
+
+def get_projection(wait: bool = True) -> Optional[GraphProjection]:
+    """
+    获取与当前图版本一致的快照
+
+    Args:
+        wait: 快照过期或尚未加载时是否同步等待加载；
+              为 False 时立即返回 None（调用方回退到 Cypher 查询），同时在后台刷新
+
+    Returns:
+        最新快照；未启用投影或 wait=False 且快照不是最新时返回 None
+    """
+    if not settings.PROJECTION_ENABLED:
+        if wait:
+            raise RuntimeError("内存图投影未启用（PROJECTION_ENABLED=false）")
+        return None
+    version = current_graph_version()
+    current = _projection
+    if current is not None and current.version == version:
+        return current
+    if not wait:
+        refresh_in_background()
+        return None
+    return _reload(version)
+
+
+def fresh_projection() -> Optional[GraphProjection]:
+    """供有 Cypher 回退路径的分析函数使用：只返回最新快照，不等待加载"""
+    try:
+        return get_projection(wait=False)
+    except Exception as e:
+        logger.warning(f"⚠️  Graph projection unavailable, falling back to Cypher: {str(e)}")
+        return None
+
+
+async def fresh_projection_async() -> Optional[GraphProjection]:
+    """fresh_projection 的异步版本：版本检查走 async_db，快照过期时同样只在后台刷新"""
+    if not settings.PROJECTION_ENABLED:
+        return None
+    try:
+        version = await current_graph_version_async()
+    except Exception as e:
+        logger.warning(f"⚠️  Graph projection unavailable, falling back to Cypher: {str(e)}")
+        return None
+    current = _projection
+    if current is not None and current.version == version:
+        return current
+    refresh_in_background()
+    return None
+
+
+def start():
+    """应用启动时在后台加载快照"""
+    if settings.PROJECTION_ENABLED and settings.PROJECTION_LOAD_ON_STARTUP:
+        refresh_in_background()
+
+
+def invalidate():
+    """丢弃当前快照，下次访问时重新加载"""
+    global _projection
+    _projection = None
+
+
+def status() -> Dict:
+    """快照状态（用于健康检查）"""
+    current = _projection
+    return {
+        "enabled": settings.PROJECTION_ENABLED,
+        "graph_version": _known_version,
+        "loading": _loader is not None and _loader.is_alive(),
+        "snapshot": current.summary() if current is not None else None,
+        "error": _last_error
+    }
+
+
+query_metrics.register_queries(__name__, globals())
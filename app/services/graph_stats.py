@@ -0,0 +1,92 @@
+"""
+图统计计数器
+导入时在同一事务中增量维护派生统计（主叫号码数、通话次数、通话总时长、热点号码数），
+统计接口只读取计数器节点，不再扫描全图。
+
+计数器分散在 SHARDS 个 (:GraphStats {shard}) 节点上，每个写事务随机累加到其中一个，
+并行导入时不会争抢同一个节点的锁；读取时对所有分片求和
+"""
+import logging
+from typing import Dict
+
+from app import query_metrics
+
+logger = logging.getLogger(__name__)
+
+SHARDS = 16
+
+# 与话单写入语句在同一事务中执行，$batch 为话单写入批次。
+# 主叫标记先对号码加写锁（SET / REMOVE 临时属性）再读取 is_caller：并发事务（并行分区、多个导入任务）
+# 遇到同一个新主叫时，后拿到锁的事务读到已提交的 true，只有从空变为 true 的事务计数
+CDR_STATS_QUERY = f"""
+UNWIND $batch AS row
+WITH collect(DISTINCT row.caller) AS callers,
+     sum(COALESCE(row.duration, 0)) AS duration,
+     count(*) AS calls
+CALL {{
+    WITH callers
+    UNWIND callers AS caller
+    MATCH (p:Phone {{number: caller}})
+    SET p._lock = true
+    REMOVE p._lock
+    WITH p WHERE p.is_caller IS NULL
+    SET p.is_caller = true
+    RETURN count(p) AS new_callers
+}}
+WITH calls, duration, new_callers, toInteger(rand() * {SHARDS}) AS shard
+MERGE (s:GraphStats {{shard: shard}})
+SET s.calls = COALESCE(s.calls, 0) + calls,
+    s.call_duration = COALESCE(s.call_duration, 0) + duration,
+    s.callers = COALESCE(s.callers, 0) + new_callers,
+    s.updated_at = datetime()
+"""
+
+# 热点号码：hot_owner_count 跨过阈值（2 个机主）时增减计数，见 collision_service
+HOT_NUMBERS_DELTA = f"""
+WITH sum(CASE
+         WHEN after >= 2 AND before < 2 THEN 1
+         WHEN after < 2 AND before >= 2 THEN -1
+         ELSE 0
+     END) AS hot_delta
+WHERE hot_delta <> 0
+WITH hot_delta, toInteger(rand() * {SHARDS}) AS shard
+MERGE (s:GraphStats {{shard: shard}})
+SET s.hot_numbers = COALESCE(s.hot_numbers, 0) + hot_delta,
+    s.updated_at = datetime()
+"""
+
+STATS_QUERY = """
+OPTIONAL MATCH (s:GraphStats)
+RETURN COALESCE(sum(s.callers), 0) as distinct_callers,
+       COALESCE(sum(s.calls), 0) as total_calls,
+       COALESCE(sum(s.call_duration), 0) as total_call_duration,
+       COALESCE(sum(s.hot_numbers), 0) as hot_numbers
+"""
+
+
+def rebuild(session) -> Dict:
+    """
+    根据现有数据重新计算全部计数器（Schema 迁移 v5；计数器与数据不一致时也可手动执行）
+
+    主叫标记用 CALL { } IN TRANSACTIONS 分批写入，必须在自动提交事务中运行
+    """
+    session.run("""
+    MATCH (p:Phone) WHERE p.is_caller IS NULL AND EXISTS { (p)-[:CALL]->() }
+    CALL { WITH p SET p.is_caller = true } IN TRANSACTIONS OF 10000 ROWS
+    """).consume()
+    session.run("MATCH (s:GraphStats) DELETE s").consume()
+    record = session.run("""
+    CALL { MATCH (p:Phone) WHERE p.is_caller RETURN count(p) AS callers }
+    CALL { MATCH ()-[r:CALL]->() RETURN COALESCE(sum(r.count), 0) AS calls, COALESCE(sum(r.total_duration), 0) AS duration }
+    CALL { MATCH (p:Phone) WHERE p.hot_owner_count >= 2 RETURN count(p) AS hot }
+    MERGE (s:GraphStats {shard: 0})
+    SET s.callers = callers, s.calls = calls, s.call_duration = duration,
+        s.hot_numbers = hot, s.updated_at = datetime()
+    RETURN callers, calls, duration, hot
+    """).single()
+    counters = dict(record) if record else {}
+    logger.info(f"✅ Rebuilt graph statistics counters: {counters}")
+    return counters
+
+
+query_metrics.register_queries(__name__, globals())
@@ -0,0 +1,342 @@
+"""
+导入清单（幂等导入）
+
+话单写入是累加的（CALL.count、CALL_DAY、统计计数器），同一文件重复上传会把通话次数和时长翻倍。
+清单保存在本地 SQLite（INGEST_MANIFEST_PATH）中，服务重启后仍然有效：
+
+- imports：每次文件导入一条记录，含文件内容的 SHA-256；内容相同且已成功导入的文件直接跳过（按索引查找）
+- row_fingerprints：每个交给写入引擎的行一条记录（导入 ID、行序号、64 位指纹：清洗后全部列的哈希，含数据类型）。
+  每个分块清洗后先与清单做反连接，只把新行交给写入引擎，部分重叠的重发导出不会重复累加
+
+反连接和登记新行在同一个 SQLite 写事务（BEGIN IMMEDIATE）中完成，多个导入任务（线程或进程）并发时互斥。
+其他导入的行在以下情况视为已导入：该导入正在进行或已成功，或该行已提交。
+同时导入的两个重叠文件中，重叠的行只由先登记的导入写入；先登记的导入失败时这些行随之删除，
+失败的文件重新导入时再写入。
+
+行的提交进度：单线程写入（INGEST_WORKERS=1）时批次按顺序提交，已提交的行数（committed_rows）随批次推进；
+并行写入时批次提交顺序不定，写入行带上清单行序号（SEQ_FIELD），批次提交后逐行标记 committed。
+导入失败或被中断时只删除未提交行的记录，重新导入只写入未提交的部分。
+同一文件内的重复行保持原样写入，每一行都有自己的记录
+"""
+import hashlib
+import logging
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 导入状态
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS imports (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    data_type TEXT NOT NULL,
+    source_name TEXT NOT NULL,
+    file_size INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    rows_parsed INTEGER NOT NULL DEFAULT 0,
+    rows_new INTEGER NOT NULL DEFAULT 0,
+    rows_duplicate INTEGER NOT NULL DEFAULT 0,
+    committed_rows INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_imports_file ON imports (sha256, data_type, status);
+CREATE TABLE IF NOT EXISTS row_fingerprints (
+    import_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    fp INTEGER NOT NULL,
+    committed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (import_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_row_fingerprints_fp ON row_fingerprints (fp);
+"""
+
+# 清单库版本（PRAGMA user_version）：2 起每个写入行一条记录（v1 以指纹为主键），3 起逐行记录并行写入的提交
+_STORE_VERSION = 3
+
+# 并行写入时写入行中携带清单行序号的字段（批次提交后据此标记）
+SEQ_FIELD = "_manifest_seq"
+
+# 反连接判断：指纹属于其他导入，且该导入正在进行、已成功，或该行已提交
+_KNOWN_QUERY = """
+SELECT DISTINCT p.fp FROM temp.probe p
+JOIN row_fingerprints r ON r.fp = p.fp
+JOIN imports i ON i.id = r.import_id
+WHERE r.import_id != ? AND (i.status IN ('running', 'succeeded') OR r.seq < i.committed_rows OR r.committed)
+"""
+
+_ready = False
+
+
+# ==================== SQLite 存储 ====================
+
+def _connect() -> sqlite3.Connection:
+    global _ready
+    if not _ready:
+        init_store()
+    conn = sqlite3.connect(settings.INGEST_MANIFEST_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_store():
+    """创建清单表（WAL 模式，导入任务可在多个进程中并发写入），旧版本的清单库原地升级"""
+    global _ready
+    Path(settings.INGEST_MANIFEST_PATH).parent.mkdir(parents=True, exist_ok=True)
+    with closing(sqlite3.connect(settings.INGEST_MANIFEST_PATH, timeout=30)) as conn, conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < _STORE_VERSION:
+            _upgrade(conn)
+        conn.executescript(_SCHEMA)
+    _ready = True
+
+
+def _upgrade(conn: sqlite3.Connection):
+    """
+    v1 -> v2：row_fingerprints 由指纹主键改为 (导入 ID, 行序号) 主键，保留已有记录；
+    v2 -> v3：增加逐行提交标记 committed
+    """
+    columns = {row[1]: row[5] for row in conn.execute("PRAGMA table_info(row_fingerprints)")}
+    if columns and "committed" not in columns and columns.get("fp") != 1:
+        conn.execute("ALTER TABLE row_fingerprints ADD COLUMN committed INTEGER NOT NULL DEFAULT 0")
+    if columns.get("fp") == 1:
+        conn.executescript("""
+        DROP INDEX IF EXISTS idx_row_fingerprints_import;
+        ALTER TABLE row_fingerprints RENAME TO row_fingerprints_v1;
+        """ + _SCHEMA + """
+        INSERT INTO row_fingerprints (import_id, seq, fp) SELECT import_id, seq, fp FROM row_fingerprints_v1;
+        DROP TABLE row_fingerprints_v1;
+        """)
+        # v1 在下一次导入开始时才清理失败导入的未提交记录，升级时一次清理
+        conn.execute(
+            """
+            DELETE FROM row_fingerprints WHERE EXISTS (
+                SELECT 1 FROM imports i WHERE i.id = row_fingerprints.import_id
+                AND i.status IN (?, ?) AND row_fingerprints.seq >= i.committed_rows
+            )
+            """,
+            (FAILED, INTERRUPTED)
+        )
+        logger.info("📝 Upgraded ingest manifest to one fingerprint record per written row")
+    conn.execute(f"PRAGMA user_version = {_STORE_VERSION}")
+
+
+def start():
+    """
+    服务启动时调用：上次运行中被打断的导入标记为 interrupted
+
+    这些导入已提交的行（committed_rows 之前）仍计入清单，其余指纹删除
+    """
+    now = time.time()
+    purged = 0
+    with closing(_connect()) as conn, conn:
+        conn.execute("BEGIN IMMEDIATE")
+        running = conn.execute("SELECT id, committed_rows FROM imports WHERE status = ?", (RUNNING,)).fetchall()
+        conn.execute(
+            "UPDATE imports SET status = ?, finished_at = ? WHERE status = ?", (INTERRUPTED, now, RUNNING)
+        )
+        for row in running:
+            purged += _purge_uncommitted(conn, row["id"], row["committed_rows"])
+    if purged:
+        logger.info(f"📝 Purged {purged} uncommitted row fingerprints from interrupted imports")
+
+
+def _purge_uncommitted(conn: sqlite3.Connection, import_id: int, committed_rows: int) -> int:
+    """删除失败、中断导入中未提交行的指纹（与状态更新在同一事务中），这些行重新导入时按新行写入"""
+    return conn.execute(
+        "DELETE FROM row_fingerprints WHERE import_id = ? AND seq >= ? AND NOT committed", (import_id, committed_rows)
+    ).rowcount
+
+
+def clear():
+    """清空清单（清空数据库时调用，之后同样的文件可以重新导入）"""
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM row_fingerprints")
+        conn.execute("DELETE FROM imports")
+    logger.warning("⚠️  Ingest manifest has been cleared")
+
+
+# ==================== 文件与行指纹 ====================
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(8 * 1024 * 1024)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprints(df: pd.DataFrame, data_type: str) -> np.ndarray:
+    """
+    每行的 64 位指纹（int64，可直接存为 SQLite 整数）
+
+    列按名称排序、统一转为文本后再哈希，同一行在不同分块中推断出的类型不同也得到相同指纹
+    """
+    columns = sorted(df.columns)
+    text = df[columns].astype(str).assign(_data_type=data_type)
+    return pd.util.hash_pandas_object(text, index=False).to_numpy().view(np.int64)
+
+
+def find_import(sha256: str, data_type: str) -> Optional[Dict]:
+    """内容相同、类型相同且已成功导入的文件"""
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT * FROM imports WHERE sha256 = ? AND data_type = ? AND status = ? ORDER BY id LIMIT 1",
+            (sha256, data_type, SUCCEEDED)
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def list_imports(limit: int = 50) -> List[Dict]:
+    """最近的导入记录（按时间倒序）"""
+    with closing(_connect()) as conn:
+        rows = conn.execute("SELECT * FROM imports ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def _known(conn: sqlite3.Connection, fps: np.ndarray, import_id: int) -> np.ndarray:
+    """fps 中已被其他导入登记的指纹（见 _KNOWN_QUERY）"""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS probe (fp INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.probe")
+    conn.executemany("INSERT INTO temp.probe (fp) VALUES (?)", ((int(fp),) for fp in np.unique(fps)))
+    return np.fromiter((row[0] for row in conn.execute(_KNOWN_QUERY, (import_id,))), dtype=np.int64)
+
+
+def known(fps: np.ndarray) -> np.ndarray:
+    """每行是否已导入（只读，不登记；批量导入的 prepare 使用，装载完成后再 register）"""
+    if not len(fps):
+        return np.zeros(0, dtype=bool)
+    with closing(_connect()) as conn, conn:
+        return np.isin(fps, _known(conn, fps, 0))
+
+
+def register(sha256: str, data_type: str, source_name: str, file_size: int, fps: np.ndarray,
+             rows_parsed: int, rows_duplicate: int) -> int:
+    """
+    登记一次在写入引擎之外完成的导入（批量导入装载后调用）：状态直接为 succeeded，
+    fps 为写入的行的指纹，之后同样的文件跳过、重叠的行不再写入
+
+    Returns:
+        导入 ID
+    """
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        conn.execute("BEGIN IMMEDIATE")
+        import_id = conn.execute(
+            """
+            INSERT INTO imports (sha256, data_type, source_name, file_size, status, rows_parsed, rows_new,
+                                 rows_duplicate, committed_rows, created_at, finished_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (sha256, data_type, source_name, file_size, SUCCEEDED, rows_parsed, len(fps),
+             rows_duplicate, len(fps), now, now)
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO row_fingerprints (import_id, seq, fp) VALUES (?, ?, ?)",
+            ((import_id, seq, int(fp)) for seq, fp in enumerate(fps))
+        )
+    return import_id
+
+
+class ImportRecord:
+    """一次文件导入在清单中的记录：过滤已导入的行，随写入进度登记新行"""
+
+    def __init__(self, import_id: int, data_type: str, ordered: bool):
+        self.import_id = import_id
+        self.data_type = data_type
+        self.ordered = ordered
+        self.staged = 0
+        self.duplicates = 0
+
+    @classmethod
+    def begin(cls, sha256: str, data_type: str, source_name: str, file_size: int) -> "ImportRecord":
+        with closing(_connect()) as conn, conn:
+            import_id = conn.execute(
+                """
+                INSERT INTO imports (sha256, data_type, source_name, file_size, status, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (sha256, data_type, source_name, file_size, RUNNING, time.time())
+            ).lastrowid
+        return cls(import_id, data_type, ordered=settings.INGEST_WORKERS == 1)
+
+    def filter(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+        """
+        反连接：去掉清单中已有的行，其余行按写入顺序逐行登记（每行一条记录）
+
+        反连接与登记在同一个写事务中，并发的导入不会把同一行都当作新行
+
+        Returns:
+            (新行, 重复行数)
+        """
+        if df.empty:
+            return df, 0
+        fps = fingerprints(df, self.data_type)
+        with closing(_connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            fresh = ~np.isin(fps, _known(conn, fps, self.import_id))
+            fresh_fps = fps[fresh]
+            conn.executemany(
+                "INSERT INTO row_fingerprints (import_id, seq, fp) VALUES (?, ?, ?)",
+                ((self.import_id, self.staged + i, int(fp)) for i, fp in enumerate(fresh_fps))
+            )
+        duplicates = int(len(fps) - len(fresh_fps))
+        self.staged += len(fresh_fps)
+        self.duplicates += duplicates
+        return df[fresh], duplicates
+
+    def tag(self, rows: List[Dict]) -> List[Dict]:
+        """并行写入时给 filter 刚登记的行带上清单行序号（rows 与最近一次 filter 返回的新行一一对应）"""
+        if not self.ordered:
+            for seq, row in enumerate(rows, self.staged - len(rows)):
+                row[SEQ_FIELD] = seq
+        return rows
+
+    def committed(self, rows_written: int):
+        """批次提交后调用：按顺序写入时前 rows_written 行的指纹生效"""
+        if self.ordered:
+            with closing(_connect()) as conn, conn:
+                self._update(conn, committed_rows=rows_written)
+
+    def committed_chunk(self, rows: List[Dict]):
+        """并行写入时批次提交后调用（BatchWriter 的 on_commit）：按行序号标记该批次的行已提交"""
+        seqs = [(self.import_id, row[SEQ_FIELD]) for row in rows if SEQ_FIELD in row]
+        if seqs:
+            with closing(_connect()) as conn, conn:
+                conn.executemany("UPDATE row_fingerprints SET committed = 1 WHERE import_id = ? AND seq = ?", seqs)
+
+    def finish(self, rows_parsed: int):
+        with closing(_connect()) as conn, conn:
+            self._update(conn, status=SUCCEEDED, committed_rows=self.staged, rows_parsed=rows_parsed,
+                         rows_new=self.staged, rows_duplicate=self.duplicates, finished_at=time.time())
+
+    def fail(self, rows_parsed: int, error: str):
+        """标记失败并删除未提交行的记录（同一事务），其他导入和重新导入时这些行按新行写入"""
+        with closing(_connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._update(conn, status=FAILED, rows_parsed=rows_parsed, rows_new=self.staged,
+                         rows_duplicate=self.duplicates, error=error, finished_at=time.time())
+            committed = conn.execute("SELECT committed_rows FROM imports WHERE id = ?", (self.import_id,)).fetchone()[0]
+            _purge_uncommitted(conn, self.import_id, committed)
+
+    def _update(self, conn: sqlite3.Connection, **fields):
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        conn.execute(f"UPDATE imports SET {assignments} WHERE id = ?", (*fields.values(), self.import_id))
@@ -3,103 +3,240 @@
 支持 JSON、Excel、CSV 格式的数据导入
 """
 import pandas as pd
-from typing import List, Dict
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Dict, List, Optional, Tuple
+from app import query_metrics
+from app.config import settings
 from app.database import db
+from app.services import (
+    call_buckets, collision_service, event_store, graph_projection, graph_stats, ingest_manifest, name_match
+)
+from app.services.batch_writer import AsyncBatchWriter, BatchWriter, ChunkStats
+from app.services.file_reader import iter_frames
 import logging
+import os
+from itertools import chain
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
 
-def import_cdr_data(call_records: List[Dict]) -> Dict:
+# ==================== 写入语句（每个批次一个事务） ====================
+
+CDR_QUERY = """
+UNWIND $batch AS row
+MERGE (p1:Phone {number: row.caller})
+MERGE (p2:Phone {number: row.callee})
+MERGE (p1)-[r:CALL]->(p2)
+ON CREATE SET r.count = 1, r.total_duration = row.duration
+ON MATCH SET r.count = r.count + 1, r.total_duration = r.total_duration + row.duration
+SET r.last_call = CASE
+        WHEN row.ts IS NULL THEN COALESCE(r.last_call, localdatetime())
+        WHEN r.last_call IS NULL OR row.ts > r.last_call THEN row.ts
+        ELSE r.last_call
+    END,
+    r.updated_at = datetime()
+"""
+
+WECHAT_QUERY = """
+UNWIND $batch AS row
+MERGE (u1:WeChat {wxid: row.user})
+MERGE (u2:WeChat {wxid: row.friend})
+ON CREATE SET u2.nickname = COALESCE(row.nickname, row.friend)
+MERGE (u1)-[r:FRIEND]-(u2)
+SET r.created_at = COALESCE(r.created_at, datetime())
+"""
+
+# 新建的通讯录关系带 uncounted 标记，由碰撞物化的刷新语句在同一事务内计数后移除（见 collision_service）
+CONTACTS_QUERY = """
+UNWIND $batch AS row
+MERGE (owner:Person {name: row.owner})
+MERGE (contact:Phone {number: row.phone})
+ON CREATE SET contact.name = COALESCE(row.name, row.phone)
+ON MATCH SET contact.name = COALESCE(row.name, contact.name)
+MERGE (owner)-[r:HAS_CONTACT]->(contact)
+ON CREATE SET r.uncounted = true
+SET r.remark = COALESCE(row.remark, ''),
+    r.updated_at = datetime()
+"""
+
+
+# ==================== 写入方式（同步与异步导入共用） ====================
+
+@dataclass(frozen=True)
+class WriterSpec:
+    """
+    一种数据类型的写入方式
+
+    - queries：每个批次在同一事务内依次执行的语句（写入 + 同事务维护的派生数据）
+    - partition_key：并行写入时的分区键，同一分区键的行串行写入
+    - prepare：写入前对行迭代器的预处理（附加分桶字段、名称分词等）
+    """
+    label: str
+    queries: Tuple[str, ...]
+    partition_key: Callable[[Dict], Tuple]
+    prepare: Callable[[Iterable[Dict]], Iterator[Dict]]
+
+    def writer(self, on_commit: Optional[Callable[[List[Dict]], None]] = None) -> BatchWriter:
+        return BatchWriter(self.queries, label=self.label, partition_key=self.partition_key, on_commit=on_commit)
+
+    def async_writer(self, on_commit: Optional[Callable] = None) -> AsyncBatchWriter:
+        return AsyncBatchWriter(self.queries, label=self.label, partition_key=self.partition_key, on_commit=on_commit)
+
+
+def writer_spec(data_type: str) -> WriterSpec:
+    """数据类型（cdr / wechat / contacts）的写入方式"""
+    if data_type == "cdr":
+        # 同一 (主叫, 被叫) 对总是分配到同一个写入分区，并行时不会争抢同一条 CALL / CALL_DAY 关系；
+        # 同一事务内累加按天分桶聚合和统计计数器（原始话单在批次提交后追加到本地事件存储，见 import_cdr_data）
+        return WriterSpec(
+            label="cdr",
+            queries=(CDR_QUERY, call_buckets.CALL_DAY_QUERY, graph_stats.CDR_STATS_QUERY),
+            partition_key=lambda row: (row["caller"], row["callee"]),
+            prepare=call_buckets.annotate,
+        )
+    if data_type == "wechat":
+        # FRIEND 为无向关系，分区键与方向无关；同一事务内维护好友昵称的名称分词
+        return WriterSpec(
+            label="wechat",
+            queries=(WECHAT_QUERY, name_match.WECHAT_TOKENS_QUERY),
+            partition_key=lambda row: tuple(sorted((str(row["user"]), str(row["friend"])))),
+            prepare=lambda rows: name_match.annotate(rows, "nickname"),
+        )
+    if data_type == "contacts":
+        # 同一事务内维护联系人姓名分词，并增量刷新本批次号码的碰撞物化结果（热点计数、共同联系人关系）
+        return WriterSpec(
+            label="contacts",
+            queries=(CONTACTS_QUERY, name_match.PHONE_TOKENS_QUERY, *collision_service.REFRESH_QUERIES),
+            partition_key=lambda row: (row["owner"], row["phone"]),
+            prepare=lambda rows: name_match.annotate(rows, "name"),
+        )
+    raise ValueError(f"未知的数据类型: {data_type}")
+
+
+def _mark_graph_changed():
+    """递增图版本号，使内存图投影失效（失败只记录日志，不影响导入结果）"""
+    try:
+        graph_projection.bump_graph_version()
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to bump graph version: {str(e)}")
+
+
+def _bumping(on_chunk: Optional[Callable[[ChunkStats], None]]) -> Callable[[ChunkStats], None]:
+    """
+    包装批次回调：批次提交后按 BumpSchedule 递增图版本号，
+    长时间导入过程中缓存结果和内存图投影随已提交的批次失效，而不是等到整个文件导入完成
+    """
+    due = graph_projection.BumpSchedule()
+
+    def wrapped(stats: ChunkStats):
+        if due():
+            _mark_graph_changed()
+        if on_chunk:
+            on_chunk(stats)
+    return wrapped
+
+
+def _committing(*callbacks: Optional[Callable[[List[Dict]], None]]) -> Callable[[List[Dict]], None]:
+    """依次调用多个 on_commit 回调（跳过 None）"""
+    callbacks = [callback for callback in callbacks if callback]
+
+    def wrapped(rows: List[Dict]):
+        for callback in callbacks:
+            callback(rows)
+    return wrapped
+
+
+def import_cdr_data(
+    call_records: Iterable[Dict],
+    on_chunk: Optional[Callable[[ChunkStats], None]] = None,
+    on_commit: Optional[Callable[[List[Dict]], None]] = None
+) -> Dict:
     """
     导入话单数据（Call Detail Records）
     
     Args:
-        call_records: 话单列表，格式: [{"caller": "138001", "callee": "138002", "duration": 60, "timestamp": "2024-01-01 10:00:00"}]
+        call_records: 话单列表或行迭代器，格式: [{"caller": "138001", "callee": "138002", "duration": 60, "timestamp": "2024-01-01 10:00:00"}]
+        on_chunk: 每个批次提交后的回调（进度上报、取消检查）
+        on_commit: 每个批次提交后以该批次的行调用（导入清单标记已提交的行）
     
     Returns:
-        导入结果统计
+        导入结果统计（chunk_stats 为每个批次的行数、耗时、重试次数和吞吐量）
     """
-    query = """
-    UNWIND $batch AS row
-    MERGE (p1:Phone {number: row.caller})
-    MERGE (p2:Phone {number: row.callee})
-    MERGE (p1)-[r:CALL]->(p2)
-    ON CREATE SET r.count = 1, r.total_duration = row.duration
-    ON MATCH SET r.count = r.count + 1, r.total_duration = r.total_duration + row.duration
-    SET r.last_call = COALESCE(row.timestamp, datetime()),
-        r.updated_at = datetime()
-    """
-    
+    spec = writer_spec("cdr")
+    # 只有已提交的批次追加到事件存储，失败后重新导入不会重复追加
+    events = event_store.Appender()
     try:
-        with db.get_session() as session:
-            session.run(query, batch=call_records)
-        logger.info(f"✅ Imported {len(call_records)} call records")
-        return {"status": "success", "count": len(call_records)}
+        report = spec.writer(on_commit=_committing(on_commit, events.add)).write(
+            spec.prepare(call_records), on_chunk=_bumping(on_chunk)
+        )
+        logger.info(f"✅ Imported {report.rows} call records")
+        return {"status": "success", **report.to_dict(include_chunks=True)}
     except Exception as e:
         logger.error(f"❌ Failed to import CDR data: {str(e)}")
         raise
+    finally:
+        # 中途失败时已提交的批次同样改变了图，其事件同样写入事件存储
+        events.flush()
+        _mark_graph_changed()
 
 
-def import_wechat_friends(friend_list: List[Dict]) -> Dict:
+def import_wechat_friends(
+    friend_list: Iterable[Dict],
+    on_chunk: Optional[Callable[[ChunkStats], None]] = None,
+    on_commit: Optional[Callable[[List[Dict]], None]] = None
+) -> Dict:
     """
     导入微信好友关系
     
     Args:
-        friend_list: 好友列表，格式: [{"user": "wx_alice", "friend": "wx_bob", "nickname": "Bob"}]
+        friend_list: 好友列表或行迭代器，格式: [{"user": "wx_alice", "friend": "wx_bob", "nickname": "Bob"}]
+        on_chunk: 每个批次提交后的回调
+        on_commit: 每个批次提交后以该批次的行调用
     
     Returns:
-        导入结果统计
-    """
-    query = """
-    UNWIND $batch AS row
-    MERGE (u1:WeChat {wxid: row.user})
-    MERGE (u2:WeChat {wxid: row.friend})
-    ON CREATE SET u2.nickname = COALESCE(row.nickname, row.friend)
-    MERGE (u1)-[r:FRIEND]-(u2)
-    SET r.created_at = COALESCE(r.created_at, datetime())
+        导入结果统计（chunk_stats 为每个批次的行数、耗时、重试次数和吞吐量）
     """
-    
+    spec = writer_spec("wechat")
     try:
-        with db.get_session() as session:
-            session.run(query, batch=friend_list)
-        logger.info(f"✅ Imported {len(friend_list)} WeChat friend relationships")
-        return {"status": "success", "count": len(friend_list)}
+        report = spec.writer(on_commit=on_commit).write(spec.prepare(friend_list), on_chunk=_bumping(on_chunk))
+        logger.info(f"✅ Imported {report.rows} WeChat friend relationships")
+        return {"status": "success", **report.to_dict(include_chunks=True)}
     except Exception as e:
         logger.error(f"❌ Failed to import WeChat data: {str(e)}")
         raise
+    finally:
+        # 中途失败时已提交的批次同样改变了图
+        _mark_graph_changed()
 
 
-def import_contacts(contact_list: List[Dict]) -> Dict:
+def import_contacts(
+    contact_list: Iterable[Dict],
+    on_chunk: Optional[Callable[[ChunkStats], None]] = None,
+    on_commit: Optional[Callable[[List[Dict]], None]] = None
+) -> Dict:
     """
     导入手机通讯录数据
     
     Args:
-        contact_list: 通讯录列表，格式: [{"owner": "张三", "name": "李四", "phone": "13800138001"}]
+        contact_list: 通讯录列表或行迭代器，格式: [{"owner": "张三", "name": "李四", "phone": "13800138001"}]
+        on_chunk: 每个批次提交后的回调
+        on_commit: 每个批次提交后以该批次的行调用
     
     Returns:
-        导入结果统计
+        导入结果统计（chunk_stats 为每个批次的行数、耗时、重试次数和吞吐量）
     """
-    query = """
-    UNWIND $batch AS row
-    MERGE (owner:Person {name: row.owner})
-    MERGE (contact:Phone {number: row.phone})
-    ON CREATE SET contact.name = COALESCE(row.name, row.phone)
-    ON MATCH SET contact.name = COALESCE(row.name, contact.name)
-    MERGE (owner)-[r:HAS_CONTACT]->(contact)
-    SET r.remark = COALESCE(row.remark, ''),
-        r.updated_at = datetime()
-    """
-    
+    spec = writer_spec("contacts")
     try:
-        with db.get_session() as session:
-            session.run(query, batch=contact_list)
-        logger.info(f"✅ Imported {len(contact_list)} phone contacts")
-        return {"status": "success", "count": len(contact_list), "type": "contacts"}
+        report = spec.writer(on_commit=on_commit).write(spec.prepare(contact_list), on_chunk=_bumping(on_chunk))
+        logger.info(f"✅ Imported {report.rows} phone contacts")
+        return {"status": "success", **report.to_dict(include_chunks=True), "type": "contacts"}
     except Exception as e:
         logger.error(f"❌ Failed to import contacts: {str(e)}")
         raise
+    finally:
+        # 中途失败时已提交的批次同样改变了图
+        _mark_graph_changed()
 
 
 def detect_data_type(df: pd.DataFrame, file_path: str) -> str:
@@ -130,166 +267,241 @@ def detect_data_type(df: pd.DataFrame, file_path: str) -> str:
     return 'unknown'
 
 
-def import_from_excel(file_path: str, data_type: str = "auto") -> Dict:
+# ==================== 分块清洗（向量化，逐个 DataFrame 分块执行） ====================
+
+CDR_COLUMN_MAPPING = {
+    '主叫': 'caller', '主叫号码': 'caller',
+    '被叫': 'callee', '被叫号码': 'callee',
+    '通话时长': 'duration', '时长': 'duration', '时长(秒)': 'duration',
+    '通话时间': 'timestamp', '时间': 'timestamp'
+}
+
+WECHAT_COLUMN_MAPPING = {
+    '微信ID': 'friend', '微信号': 'friend', 'wxid': 'friend',
+    '微信昵称': 'nickname', '昵称': 'nickname',
+    '备注': 'remark',
+    '联系人UID': 'uid'
+}
+
+CONTACTS_COLUMN_MAPPING = {
+    '姓名': 'name', '联系人': 'name', '名称': 'name',
+    '电话号码': 'phone', '电话': 'phone', '手机号': 'phone', '手机': 'phone',
+    '备注': 'remark',
+    '联系人UID': 'uid'
+}
+
+
+def _name_from_file(source_name: str) -> str:
+    """从文件名提取机主/用户名，如 "张三_通讯录.xlsx" -> "张三" """
+    file_name = Path(source_name).stem
+    return file_name.split('_')[0] if '_' in file_name else file_name
+
+
+def clean_cdr_frame(df: pd.DataFrame, source_name: str) -> pd.DataFrame:
+    """话单分块清洗：列名映射、号码只保留数字、时长转整数"""
+    df = df.rename(columns=CDR_COLUMN_MAPPING)
+    
+    required_fields = ["caller", "callee"]
+    if not all(field in df.columns for field in required_fields):
+        raise ValueError(f"话单数据缺少必要字段: {required_fields}，当前列: {list(df.columns)}")
+    
+    df = df.dropna(subset=['caller', 'callee'])
+    df['caller'] = df['caller'].astype(str).str.replace(r'\D', '', regex=True)
+    df['callee'] = df['callee'].astype(str).str.replace(r'\D', '', regex=True)
+    df = df[(df['caller'] != '') & (df['callee'] != '')]
+    if 'duration' not in df.columns:
+        df['duration'] = 0
+    df['duration'] = pd.to_numeric(df['duration'], errors='coerce').fillna(0).astype(int)
+    if 'timestamp' in df.columns:
+        # 通话时间统一解析为时间值，无法解析的置空（该行仍导入，只是不进入按天分桶）
+        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce', format='mixed')
+    return df
+
+
+def clean_wechat_frame(df: pd.DataFrame, source_name: str) -> pd.DataFrame:
+    """微信好友分块清洗：缺少 user 列时从文件名提取用户"""
+    df = df.rename(columns=WECHAT_COLUMN_MAPPING)
+    
+    if 'user' not in df.columns:
+        df['user'] = _name_from_file(source_name)
+    
+    if 'friend' not in df.columns:
+        raise ValueError(f"微信数据缺少好友ID字段，当前列: {list(df.columns)}")
+    
+    df = df.dropna(subset=['user', 'friend'])
+    df['user'] = df['user'].astype(str).str.strip()
+    df['friend'] = df['friend'].astype(str).str.strip()
+    df = df[(df['user'] != '') & (df['friend'] != '')]
+    if 'nickname' in df.columns:
+        df['nickname'] = df['nickname'].fillna('').astype(str).str.strip()
+    return df
+
+
+def clean_contacts_frame(df: pd.DataFrame, source_name: str) -> pd.DataFrame:
+    """通讯录分块清洗：机主取自文件名，号码只保留数字"""
+    df = df.rename(columns=CONTACTS_COLUMN_MAPPING)
+    df['owner'] = _name_from_file(source_name)
+    
+    if 'phone' not in df.columns:
+        raise ValueError(f"通讯录数据缺少电话号码字段，当前列: {list(df.columns)}")
+    
+    df = df.dropna(subset=['phone'])
+    df['phone'] = df['phone'].astype(str).str.replace(r'\D', '', regex=True)
+    df = df[df['phone'] != '']
+    if 'name' in df.columns:
+        df['name'] = df['name'].fillna('').astype(str).str.strip()
+    else:
+        df['name'] = df['phone']
+    if 'remark' in df.columns:
+        df['remark'] = df['remark'].fillna('').astype(str).str.strip()
+    return df
+
+
+def frame_to_records(df: pd.DataFrame) -> List[Dict]:
+    """DataFrame 转为写入行，缺失值统一为 None（Cypher 中的 null）"""
+    return df.astype(object).where(pd.notna(df), None).to_dict('records')
+
+
+# 数据类型 -> (分块清洗函数, 写入函数)
+IMPORTERS = {
+    "cdr": (clean_cdr_frame, import_cdr_data),
+    "wechat": (clean_wechat_frame, import_wechat_friends),
+    "contacts": (clean_contacts_frame, import_contacts),
+}
+
+
+def import_file(
+    file_path: str,
+    data_type: str = "auto",
+    source_name: Optional[str] = None,
+    file_format: Optional[str] = None,
+    progress: Optional[Callable[[Dict], None]] = None
+) -> Dict:
+    """
+    流式导入 CSV / Excel 文件
+    
+    文件按 IMPORT_CHUNK_ROWS 行分块读取，每块清洗后直接交给批量写入引擎，
+    内存占用与文件大小无关。
+    启用导入清单时，内容相同的文件已成功导入过则直接跳过；每块清洗后先与清单反连接，
+    以前导入过的行不再写入（见 ingest_manifest）
+    
+    Args:
+        file_path: 文件路径
+        data_type: 数据类型，可选值: 'auto', 'cdr', 'wechat', 'contacts'
+        source_name: 原始文件名（用于提取机主/用户名及类型检测），默认取 file_path
+        file_format: 'csv' | 'xlsx' | 'xls'，默认根据扩展名判断
+        progress: 每个批次写入后的进度回调，参数为 rows_parsed / rows_rejected / rows_written；
+                  回调抛出的异常会中止导入（已提交的批次保留）
+    
+    Returns:
+        导入结果（含解析行数、清洗剔除行数、与以前导入重复的行数及每个批次的 chunk_stats）
+    """
+    source_name = source_name or file_path
+    digest = ingest_manifest.file_sha256(file_path) if settings.INGEST_MANIFEST_ENABLED else None
+    frames = iter_frames(file_path, settings.IMPORT_CHUNK_ROWS, file_format)
+    first = next(frames, None)
+    if first is None:
+        logger.info(f"📊 {source_name} is empty, nothing to import")
+        return {"status": "success", "count": 0, "rows_parsed": 0, "rows_rejected": 0}
+    logger.info(f"📊 Streaming {source_name} in chunks of {settings.IMPORT_CHUNK_ROWS} rows, columns: {list(first.columns)}")
+    
+    # 自动检测数据类型（基于首个分块）
+    if data_type == "auto":
+        data_type = detect_data_type(first, source_name)
+        logger.info(f"🔍 Auto-detected data type: {data_type}")
+    
+    if data_type not in IMPORTERS:
+        raise ValueError(f"无法识别的数据类型。检测到的列: {list(first.columns)}。"
+                       f"请确保文件包含正确的列名，或在上传时选择正确的数据类型。"
+                       f"\n支持的格式:\n"
+                       f"- 话单: caller/主叫, callee/被叫\n"
+                       f"- 微信: 微信ID, 微信昵称\n"
+                       f"- 通讯录: 姓名, 电话号码")
+    clean, write = IMPORTERS[data_type]
+    
+    record = None
+    if digest is not None:
+        previous = ingest_manifest.find_import(digest, data_type)
+        if previous is not None:
+            logger.info(f"⏭️  {source_name} was already imported as {previous['source_name']} (sha256 {digest[:12]}), skipped")
+            return {"status": "skipped", "count": 0, "rows_parsed": 0, "rows_rejected": 0, "rows_written": 0,
+                    "rows_duplicate": 0, "data_type": data_type, "sha256": digest, "duplicate_of": previous}
+        record = ingest_manifest.ImportRecord.begin(digest, data_type, source_name, os.path.getsize(file_path))
+    
+    counters = {"rows_parsed": 0, "rows_rejected": 0, "rows_written": 0, "rows_duplicate": 0}
+    
+    def records():
+        for frame in chain([first], frames):
+            cleaned = clean(frame, source_name)
+            counters["rows_parsed"] += len(frame)
+            counters["rows_rejected"] += len(frame) - len(cleaned)
+            if record is None:
+                yield from frame_to_records(cleaned)
+                continue
+            cleaned, duplicates = record.filter(cleaned)
+            counters["rows_duplicate"] += duplicates
+            yield from record.tag(frame_to_records(cleaned))
+    
+    def on_chunk(stats: ChunkStats):
+        counters["rows_written"] += stats.rows
+        if record is not None:
+            record.committed(counters["rows_written"])
+        if progress:
+            progress(dict(counters))
+    
+    try:
+        # 并行写入时批次提交顺序不定，按行标记已提交（见 ingest_manifest）
+        on_commit = record.committed_chunk if record is not None and not record.ordered else None
+        result = write(records(), on_chunk=on_chunk, on_commit=on_commit)
+    except BaseException as e:
+        if record is not None:
+            record.fail(counters["rows_parsed"], str(e) or type(e).__name__)
+        raise
+    if record is not None:
+        record.finish(counters["rows_parsed"])
+        result["sha256"] = digest
+    result.update(counters, data_type=data_type)
+    logger.info(
+        f"✅ Imported {source_name}: {counters['rows_parsed']} parsed, {counters['rows_rejected']} rejected, "
+        f"{counters['rows_duplicate']} already imported"
+    )
+    return result
+
+
+def import_from_excel(
+    file_path: str,
+    data_type: str = "auto",
+    source_name: Optional[str] = None,
+    progress: Optional[Callable[[Dict], None]] = None
+) -> Dict:
     """
     从 Excel 文件导入数据并进行清洗
     
     Args:
         file_path: Excel 文件路径
         data_type: 数据类型，可选值: 'auto', 'cdr', 'wechat', 'contacts'
+        source_name: 原始文件名（默认取 file_path）
+        progress: 进度回调，见 import_file
     
     Returns:
         导入结果
     """
     try:
-        df = pd.read_excel(file_path)
-        logger.info(f"📊 Loaded Excel file with {len(df)} rows, columns: {list(df.columns)}")
-        
-        # 自动检测数据类型
-        if data_type == "auto":
-            data_type = detect_data_type(df, file_path)
-            logger.info(f"🔍 Auto-detected data type: {data_type}")
-        
-        # ==================== 话单数据 (CDR) ====================
-        if data_type == "cdr":
-            # 中文列名映射
-            column_mapping = {
-                '主叫': 'caller', '主叫号码': 'caller',
-                '被叫': 'callee', '被叫号码': 'callee',
-                '通话时长': 'duration', '时长': 'duration', '时长(秒)': 'duration',
-                '通话时间': 'timestamp', '时间': 'timestamp'
-            }
-            df = df.rename(columns=column_mapping)
-            
-            required_fields = ["caller", "callee"]
-            if not all(field in df.columns for field in required_fields):
-                raise ValueError(f"话单数据缺少必要字段: {required_fields}，当前列: {list(df.columns)}")
-            
-            # 数据清洗
-            df = df.dropna(subset=['caller', 'callee'])
-            df['caller'] = df['caller'].astype(str).str.replace(r'\D', '', regex=True)
-            df['callee'] = df['callee'].astype(str).str.replace(r'\D', '', regex=True)
-            df = df[(df['caller'] != '') & (df['callee'] != '')]
-            if 'duration' not in df.columns:
-                df['duration'] = 0
-            df['duration'] = pd.to_numeric(df['duration'], errors='coerce').fillna(0).astype(int)
-            
-            return import_cdr_data(df.to_dict('records'))
-        
-        # ==================== 微信好友 ====================
-        elif data_type == "wechat":
-            # 中文列名映射
-            column_mapping = {
-                '微信ID': 'friend', '微信号': 'friend', 'wxid': 'friend',
-                '微信昵称': 'nickname', '昵称': 'nickname',
-                '备注': 'remark',
-                '联系人UID': 'uid'
-            }
-            df = df.rename(columns=column_mapping)
-            
-            # 从文件名提取用户
-            if 'user' not in df.columns:
-                file_name = Path(file_path).stem
-                user_name = file_name.split('_')[0] if '_' in file_name else file_name
-                df['user'] = user_name
-                logger.info(f"📝 从文件名提取用户: {user_name}")
-            
-            if 'friend' not in df.columns:
-                raise ValueError(f"微信数据缺少好友ID字段，当前列: {list(df.columns)}")
-            
-            # 数据清洗
-            df = df.dropna(subset=['friend'])
-            df['user'] = df['user'].astype(str).str.strip()
-            df['friend'] = df['friend'].astype(str).str.strip()
-            if 'nickname' in df.columns:
-                df['nickname'] = df['nickname'].fillna('').astype(str).str.strip()
-            
-            return import_wechat_friends(df.to_dict('records'))
-        
-        # ==================== 手机通讯录 ====================
-        elif data_type == "contacts":
-            # 中文列名映射
-            column_mapping = {
-                '姓名': 'name', '联系人': 'name', '名称': 'name',
-                '电话号码': 'phone', '电话': 'phone', '手机号': 'phone', '手机': 'phone',
-                '备注': 'remark',
-                '联系人UID': 'uid'
-            }
-            df = df.rename(columns=column_mapping)
-            
-            # 从文件名提取机主
-            file_name = Path(file_path).stem
-            owner_name = file_name.split('_')[0] if '_' in file_name else file_name
-            df['owner'] = owner_name
-            logger.info(f"📝 从文件名提取机主: {owner_name}")
-            
-            if 'phone' not in df.columns:
-                raise ValueError(f"通讯录数据缺少电话号码字段，当前列: {list(df.columns)}")
-            
-            # 数据清洗
-            df = df.dropna(subset=['phone'])
-            df['phone'] = df['phone'].astype(str).str.replace(r'\D', '', regex=True)
-            df = df[df['phone'] != '']
-            if 'name' in df.columns:
-                df['name'] = df['name'].fillna('').astype(str).str.strip()
-            else:
-                df['name'] = df['phone']
-            if 'remark' in df.columns:
-                df['remark'] = df['remark'].fillna('').astype(str).str.strip()
-            
-            return import_contacts(df.to_dict('records'))
-        
-        # ==================== 未知类型 ====================
-        else:
-            raise ValueError(f"无法识别的数据类型。检测到的列: {list(df.columns)}。"
-                           f"请确保文件包含正确的列名，或在上传时选择正确的数据类型。"
-                           f"\n支持的格式:\n"
-                           f"- 话单: caller/主叫, callee/被叫\n"
-                           f"- 微信: 微信ID, 微信昵称\n"
-                           f"- 通讯录: 姓名, 电话号码")
-            
+        return import_file(file_path, data_type, source_name, progress=progress)
     except Exception as e:
         logger.error(f"❌ Failed to import from Excel: {str(e)}")
         raise
 
 
-def import_from_csv(file_path: str, data_type: str = "cdr") -> Dict:
+def import_from_csv(
+    file_path: str,
+    data_type: str = "cdr",
+    source_name: Optional[str] = None,
+    progress: Optional[Callable[[Dict], None]] = None
+) -> Dict:
     """从 CSV 文件导入数据并进行清洗"""
     try:
-        df = pd.read_csv(file_path)
-        logger.info(f"📊 Loaded CSV file with {len(df)} rows")
-        
-        if data_type == "cdr":
-            required_fields = ["caller", "callee", "duration"]
-            if not all(field in df.columns for field in required_fields):
-                raise ValueError(f"CSV 缺少必要字段: {required_fields}")
-            
-            # --- 数据清洗 (CDR) ---
-            df = df.dropna(subset=['caller', 'callee'])
-            df['caller'] = df['caller'].astype(str).str.replace(r'\D', '', regex=True)
-            df['callee'] = df['callee'].astype(str).str.replace(r'\D', '', regex=True)
-            df = df[(df['caller'] != '') & (df['callee'] != '')]
-            df['duration'] = pd.to_numeric(df['duration'], errors='coerce').fillna(0).astype(int)
-            # ---------------------
-            
-            return import_cdr_data(df.to_dict('records'))
-        
-        elif data_type == "wechat":
-            required_fields = ["user", "friend"]
-            if not all(field in df.columns for field in required_fields):
-                raise ValueError(f"CSV 缺少必要字段: {required_fields}")
-            
-            # --- 数据清洗 (WeChat) ---
-            df = df.dropna(subset=['user', 'friend'])
-            df['user'] = df['user'].astype(str).str.strip()
-            df['friend'] = df['friend'].astype(str).str.strip()
-            # -------------------------
-            
-            return import_wechat_friends(df.to_dict('records'))
-        
-        else:
-            raise ValueError(f"不支持的数据类型: {data_type}")
-            
+        return import_file(file_path, data_type, source_name, file_format="csv", progress=progress)
     except Exception as e:
         logger.error(f"❌ Failed to import from CSV: {str(e)}")
         raise
@@ -302,16 +514,24 @@ def clear_all_data() -> Dict:
     Returns:
         清空结果
     """
+    # 保留 Schema 迁移记录和图版本节点；分批删除，避免大图一次性删除撑爆事务内存
     query = """
     MATCH (n)
-    DETACH DELETE n
+    WHERE NOT n:SchemaMigration AND NOT n:GraphMeta
+    CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS
     """
     
     try:
         with db.get_session() as session:
-            session.run(query)
+            session.run(query).consume()
+        _mark_graph_changed()
+        event_store.store.clear()
+        ingest_manifest.clear()
         logger.warning("⚠️  All data has been cleared from the database")
         return {"status": "success", "message": "All data cleared"}
     except Exception as e:
         logger.error(f"❌ Failed to clear data: {str(e)}")
         raise
+
+
+query_metrics.register_queries(__name__, globals())
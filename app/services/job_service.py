@@ -0,0 +1,337 @@
+"""
+后台导入任务服务
+上传文件落盘后登记为任务立即返回任务 ID，由有界 worker 池在后台执行导入；
+任务状态与进度保存在本地 SQLite 中，服务重启、多进程 worker 均可读取
+"""
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLING = "cancelling"
+CANCELLED = "cancelled"
+INTERRUPTING = "interrupting"   # 服务关闭中，任务将在当前批次后停止
+INTERRUPTED = "interrupted"     # 服务关闭或重启时未完成（已提交的批次保留）
+
+TERMINAL_STATES = {SUCCEEDED, FAILED, CANCELLED, INTERRUPTED}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    file_format TEXT NOT NULL,
+    data_type TEXT NOT NULL,
+    source_name TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    file_size INTEGER NOT NULL DEFAULT 0,
+    rows_total_estimate INTEGER,
+    rows_parsed INTEGER NOT NULL DEFAULT 0,
+    rows_written INTEGER NOT NULL DEFAULT 0,
+    rows_rejected INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    updated_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_created ON ingest_jobs (created_at);
+"""
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """任务被取消或因服务关闭而中断"""
+
+
+# ==================== SQLite 存储 ====================
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(settings.JOB_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_store():
+    """创建任务表（WAL 模式，允许 worker 进程并发写进度）"""
+    Path(settings.JOB_DB_PATH).parent.mkdir(parents=True, exist_ok=True)
+    with closing(_connect()) as conn, conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+
+def _update(job_id: str, **fields):
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{k} = ?" for k in fields)
+    with closing(_connect()) as conn, conn:
+        conn.execute(f"UPDATE ingest_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+
+def _transition(job_id: str, expected: Sequence[str], **fields) -> bool:
+    """
+    条件更新：只有任务当前状态在 expected 中时才更新，返回是否更新成功
+
+    状态变更都通过它完成（先读后写会与并发的取消、完成互相覆盖）
+    """
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{k} = ?" for k in fields)
+    placeholders = ", ".join("?" * len(expected))
+    with closing(_connect()) as conn, conn:
+        return conn.execute(
+            f"UPDATE ingest_jobs SET {assignments} WHERE id = ? AND status IN ({placeholders})",
+            (*fields.values(), job_id, *expected)
+        ).rowcount == 1
+
+
+def _get_row(job_id: str) -> Optional[sqlite3.Row]:
+    with closing(_connect()) as conn:
+        return conn.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def _to_dict(row: sqlite3.Row) -> Dict:
+    """任务记录转为接口返回格式，附带吞吐量与预计剩余时间"""
+    job = dict(row)
+    job.pop("file_path", None)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+
+    end = job["finished_at"] or time.time()
+    elapsed = end - job["started_at"] if job["started_at"] else 0.0
+    throughput = job["rows_written"] / elapsed if elapsed > 0 else 0.0
+    job["elapsed_seconds"] = round(elapsed, 1)
+    job["rows_per_sec"] = round(throughput, 1)
+
+    eta = None
+    if job["status"] == RUNNING and throughput > 0 and job["rows_total_estimate"]:
+        remaining = max(job["rows_total_estimate"] - job["rows_parsed"], 0)
+        # 已解析未写入的行也在剩余工作量内
+        remaining += job["rows_parsed"] - job["rows_written"] - job["rows_rejected"]
+        eta = round(max(remaining, 0) / throughput, 1)
+    job["eta_seconds"] = eta
+    if job["rows_total_estimate"]:
+        job["progress"] = round(min(job["rows_parsed"] / job["rows_total_estimate"], 1.0) * 100, 1)
+    else:
+        job["progress"] = 100.0 if job["status"] == SUCCEEDED else None
+    return job
+
+
+# ==================== 任务执行（可在子进程中运行） ====================
+
+def estimate_total_rows(file_path: str, file_format: str) -> Optional[int]:
+    """估算数据行数，用于计算进度和 ETA"""
+    try:
+        if file_format == "csv":
+            lines = 0
+            last = b"\n"
+            with open(file_path, "rb") as f:
+                while True:
+                    block = f.read(8 * 1024 * 1024)
+                    if not block:
+                        break
+                    lines += block.count(b"\n")
+                    last = block[-1:]
+            if last != b"\n":
+                lines += 1
+            return max(lines - 1, 0)  # 去掉表头
+        if file_format == "xlsx":
+            from openpyxl import load_workbook
+            workbook = load_workbook(file_path, read_only=True)
+            try:
+                max_row = workbook.active.max_row
+            finally:
+                workbook.close()
+            return max(max_row - 1, 0) if max_row else None
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to estimate rows of {file_path}: {str(e)}")
+    return None
+
+
+def run_job(job_id: str):
+    """
+    执行一个导入任务（worker 线程或子进程中调用）
+
+    每个批次提交后写入进度，并检查任务是否已被请求取消
+    """
+    # 子进程中需要自行导入服务模块并建立数据库连接
+    from app.services import ingest_service
+
+    row = _get_row(job_id)
+    # 与 cancel_job 竞争：只有仍在排队的任务才开始执行
+    if row is None or not _transition(job_id, (QUEUED,), status=RUNNING, started_at=time.time(), error=None):
+        return
+    _update(job_id, rows_total_estimate=estimate_total_rows(row["file_path"], row["file_format"]))
+
+    def progress(counters: Dict):
+        _update(job_id, **counters)
+        current = _get_row(job_id)["status"]
+        if current in (CANCELLING, INTERRUPTING):
+            raise JobCancelled(current)
+
+    importer = ingest_service.import_from_csv if row["file_format"] == "csv" else ingest_service.import_from_excel
+    try:
+        result = importer(row["file_path"], row["data_type"], row["source_name"], progress=progress)
+        # 最后一个批次之后才到达的取消、关闭请求不再生效：数据已全部导入
+        _transition(
+            job_id,
+            (RUNNING, CANCELLING, INTERRUPTING),
+            status=SUCCEEDED,
+            result=json.dumps(result, ensure_ascii=False, default=str),
+            rows_parsed=result.get("rows_parsed", 0),
+            rows_written=result.get("rows_written", result.get("count", 0)),
+            rows_rejected=result.get("rows_rejected", 0),
+            finished_at=time.time()
+        )
+        logger.info(f"✅ Ingest job {job_id} finished: {result.get('count', 0)} rows")
+    except JobCancelled as e:
+        final = CANCELLED if str(e) == CANCELLING else INTERRUPTED
+        _transition(job_id, (str(e),), status=final, finished_at=time.time())
+        logger.warning(f"⚠️  Ingest job {job_id} {final}")
+    except Exception as e:
+        _transition(job_id, (RUNNING, CANCELLING, INTERRUPTING), status=FAILED, error=str(e),
+                    finished_at=time.time())
+        logger.error(f"❌ Ingest job {job_id} failed: {str(e)}")
+    finally:
+        if _get_row(job_id)["status"] in TERMINAL_STATES:
+            Path(row["file_path"]).unlink(missing_ok=True)
+
+
+# ==================== 任务管理 ====================
+
+def _get_executor() -> Executor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = max(1, settings.INGEST_JOB_WORKERS)
+            if settings.INGEST_JOB_EXECUTOR == "process":
+                # spawn：子进程不继承父进程的驱动连接和线程
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-job")
+        return _executor
+
+
+def submit_job(file_path: str, file_format: str, data_type: str, source_name: str) -> Dict:
+    """
+    登记并提交导入任务
+
+    Args:
+        file_path: 已落盘的上传文件（任务结束后删除）
+        file_format: 'csv' | 'xlsx' | 'xls'
+        data_type: 数据类型
+        source_name: 原始文件名
+
+    Returns:
+        任务信息
+    """
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            """
+            INSERT INTO ingest_jobs (id, status, file_format, data_type, source_name, file_path,
+                                     file_size, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (job_id, QUEUED, file_format, data_type, source_name, str(file_path),
+             os.path.getsize(file_path), now, now)
+        )
+    _get_executor().submit(run_job, job_id)
+    logger.info(f"📋 Queued ingest job {job_id} for {source_name}")
+    return get_job(job_id)
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """查询任务状态与进度"""
+    row = _get_row(job_id)
+    return _to_dict(row) if row else None
+
+
+def list_jobs(limit: int = 50) -> List[Dict]:
+    """最近的任务列表（按创建时间倒序）"""
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            "SELECT * FROM ingest_jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+    return [_to_dict(r) for r in rows]
+
+
+def cancel_job(job_id: str) -> Optional[Dict]:
+    """
+    取消任务：排队中的任务直接取消；运行中的任务在当前批次提交后停止
+
+    状态按条件更新，与 run_job 的开始、完成并发时只有一方生效；
+    只有排队中的任务被成功取消后才删除上传文件
+    """
+    row = _get_row(job_id)
+    if row is None:
+        return None
+    if _transition(job_id, (QUEUED,), status=CANCELLED, finished_at=time.time()):
+        Path(row["file_path"]).unlink(missing_ok=True)
+    else:
+        _transition(job_id, (RUNNING,), status=CANCELLING)
+    return get_job(job_id)
+
+
+def start():
+    """
+    服务启动时调用：初始化任务表，恢复上次未完成的任务
+
+    - 排队中的任务重新提交
+    - 运行中被打断的任务标记为 interrupted（部分批次已写入，需人工确认后重新上传）
+    """
+    init_store()
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "UPDATE ingest_jobs SET status = ?, finished_at = ?, updated_at = ? WHERE status IN (?, ?)",
+            (INTERRUPTED, now, now, RUNNING, INTERRUPTING)
+        )
+        conn.execute(
+            "UPDATE ingest_jobs SET status = ?, finished_at = ?, updated_at = ? WHERE status = ?",
+            (CANCELLED, now, now, CANCELLING)
+        )
+        queued = conn.execute(
+            "SELECT id, file_path FROM ingest_jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+        ).fetchall()
+
+    for row in queued:
+        if Path(row["file_path"]).exists():
+            _get_executor().submit(run_job, row["id"])
+        else:
+            _transition(row["id"], (QUEUED,), status=FAILED, error="上传文件已丢失", finished_at=now)
+    if queued:
+        logger.info(f"📋 Resumed {len(queued)} queued ingest jobs")
+
+
+def shutdown():
+    """服务关闭时调用：通知运行中的任务在当前批次后停止，不再启动排队任务"""
+    global _executor
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "UPDATE ingest_jobs SET status = ?, updated_at = ? WHERE status = ?",
+            (INTERRUPTING, time.time(), RUNNING)
+        )
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,165 @@
+"""
+跨源名称匹配
+通讯录联系人姓名（Phone.name）与微信昵称（WeChat.nickname）的归一化与分词。
+
+导入时为每个名称计算归一化键和分词，写入 (n)-[:HAS_NAME_TOKEN]->(:NameToken {value}) 查找索引；
+跨源关联通过共享分词做键连接，并以分词集合的 Jaccard 相似度过滤，
+取代逐对 CONTAINS 子串扫描
+"""
+import logging
+import re
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from app import query_metrics
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:  # 拼音匹配为可选功能
+    lazy_pinyin = None
+
+# 连续汉字 / 连续字母（不含汉字）/ 连续数字
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_RUN_PATTERN = re.compile(rf"[{_CJK}]+|[^\W\d_{_CJK}]+|\d+")
+_CJK_PATTERN = re.compile(rf"[{_CJK}]")
+
+
+def _fold(text: str) -> str:
+    """全角转半角（NFKC）+ 大小写折叠"""
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def normalize_name(text: Optional[str]) -> Optional[str]:
+    """
+    名称归一化键：全半角、大小写折叠，去掉空白、标点和符号
+
+    "Ｚhang San " -> "zhangsan"，"张三-公司" -> "张三公司"
+    """
+    if not text:
+        return None
+    key = "".join(_RUN_PATTERN.findall(_fold(str(text))))
+    return key or None
+
+
+def name_tokens(text: Optional[str]) -> List[str]:
+    """
+    名称分词
+
+    - 按汉字 / 字母 / 数字连续片段切分（标点、空白、emoji 视为分隔符）
+    - 不超过 2 个字的汉字片段整体作为一个词，更长的片段切为相邻二字组（"北京张三" -> 北京 京张 张三）
+    - 字母、数字片段至少 2 个字符
+    - 开启 NAME_MATCH_PINYIN 且安装了 pypinyin 时，汉字先转为拼音音节再分词
+      （"张三" -> zhang san，可与 "Zhang San" 及同音字匹配）
+    """
+    if not text:
+        return []
+    folded = _fold(str(text))
+    if settings.NAME_MATCH_PINYIN and lazy_pinyin is not None:
+        folded = " ".join(lazy_pinyin(folded))
+
+    tokens = []
+    for run in _RUN_PATTERN.findall(folded):
+        if _CJK_PATTERN.match(run) and len(run) > 2:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        elif _CJK_PATTERN.match(run) or len(run) >= 2:
+            tokens.append(run)
+
+    # 去重并保持顺序
+    return list(dict.fromkeys(tokens))
+
+
+def is_meaningful(text: Optional[str]) -> bool:
+    """纯数字（如缺省时以号码充当姓名）不参与名称匹配"""
+    key = normalize_name(text)
+    return bool(key) and not key.isdigit()
+
+
+def annotate(rows: Iterable[Dict], field: str) -> Iterator[Dict]:
+    """为写入行附加 name_key / name_tokens（field 为姓名或昵称列）"""
+    for row in rows:
+        value = row.get(field)
+        if is_meaningful(value):
+            row["name_key"] = normalize_name(value)
+            row["name_tokens"] = name_tokens(value)
+        else:
+            row["name_key"] = None
+            row["name_tokens"] = []
+        yield row
+
+
+# ==================== 写入语句（与导入语句在同一事务中执行） ====================
+
+def _index_tokens_query(match_clause: str, condition: str) -> str:
+    """
+    生成维护名称分词的语句：名称未变化的节点跳过，变化时先删旧分词再建新分词；
+    新名称不参与匹配（如改为号码）时只删除旧分词并清除 name_key
+    """
+    return f"""
+    UNWIND $batch AS row
+    {match_clause}
+    WITH n, row
+    WHERE {condition} AND COALESCE(n.name_key, '') <> COALESCE(row.name_key, '')
+    SET n.name_key = row.name_key,
+        n.name_token_count = CASE WHEN row.name_key IS NULL THEN null ELSE size(row.name_tokens) END
+    WITH DISTINCT n, row.name_tokens AS tokens
+    CALL {{
+        WITH n
+        MATCH (n)-[old:HAS_NAME_TOKEN]->(:NameToken)
+        DELETE old
+    }}
+    WITH n, tokens
+    UNWIND tokens AS token
+    MERGE (t:NameToken {{value: token}})
+    MERGE (n)-[:HAS_NAME_TOKEN]->(t)
+    """
+
+
+# 通讯录：联系人号码的当前姓名与本行一致时才索引（姓名以最后一次导入为准）
+PHONE_TOKENS_QUERY = _index_tokens_query("MATCH (n:Phone {number: row.phone})", "n.name = row.name")
+
+# 微信：昵称只在好友节点创建时写入，与本行昵称一致时才索引
+WECHAT_TOKENS_QUERY = _index_tokens_query("MATCH (n:WeChat {wxid: row.friend})", "n.nickname = row.nickname")
+
+
+# ==================== 跨源匹配查询 ====================
+
+# 先按出现频率过滤分词（每个分词只计算一次度数），再展开号码 × 微信号
+CROSS_SOURCE_QUERY = """
+MATCH (t:NameToken)
+WHERE COUNT { (t)<-[:HAS_NAME_TOKEN]-() } <= $max_token_freq
+MATCH (phone:Phone)-[:HAS_NAME_TOKEN]->(t)<-[:HAS_NAME_TOKEN]-(friend:WeChat)
+WITH phone, friend, count(DISTINCT t) as shared
+WITH phone, friend,
+     shared * 1.0 / (phone.name_token_count + friend.name_token_count - shared) as score
+WHERE score >= $threshold
+MATCH (p:Person)-[:HAS_CONTACT]->(phone)
+WITH p.name as owner, phone.number as phone, phone.name as contact_name,
+     collect(DISTINCT friend.wxid) as matched_wxids, max(score) as score
+RETURN owner, phone, contact_name, matched_wxids, score
+ORDER BY score DESC, size(matched_wxids) DESC
+LIMIT $limit
+"""
+
+
+def backfill(session=None):
+    """
+    为已有的 Phone / WeChat 节点补建名称分词（Schema 迁移 v3）
+
+    读取和写入都使用独立会话（写入走批量写入引擎），迁移传入的会话不使用
+    """
+    from app.database import db
+    from app.services.batch_writer import BatchWriter
+
+    phones = BatchWriter(PHONE_TOKENS_QUERY, label="name-tokens-phone").write(
+        annotate(db.stream("MATCH (n:Phone) WHERE n.name IS NOT NULL RETURN n.number as phone, n.name as name"), "name")
+    )
+    wechats = BatchWriter(WECHAT_TOKENS_QUERY, label="name-tokens-wechat").write(
+        annotate(db.stream("MATCH (n:WeChat) WHERE n.nickname IS NOT NULL RETURN n.wxid as friend, n.nickname as nickname"), "nickname")
+    )
+    logger.info(f"✅ Backfilled name tokens for {phones.rows} phones and {wechats.rows} WeChat accounts")
+
+
+query_metrics.register_queries(__name__, globals())
@@ -0,0 +1,301 @@
+"""
+路径分析引擎
+端点通过唯一约束索引定位；最短路径在内存图投影上做双向 BFS（快照过期时回退到有界的 Cypher shortestPath），
+支持限定关系类型、跳过超级节点（度数超过上限的中间节点）、用 Yen 算法返回前 k 条不同路径，
+以及超时预算：到时间后返回已找到的路径并标记 partial，而不是一直阻塞
+"""
+import heapq
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from neo4j import READ_ACCESS
+from neo4j.exceptions import Neo4jError
+
+from app import query_metrics
+from app.config import settings
+from app.database import db, run_instrumented
+from app.services import graph_projection
+from app.services.graph_projection import EDGE_TYPES, GraphProjection, _gather
+
+logger = logging.getLogger(__name__)
+
+# 一条路径：(节点下标列表, 边列下标列表)
+Path = Tuple[List[int], List[int]]
+
+
+class PathTimeout(Exception):
+    """超出路径搜索的时间预算"""
+
+
+def parse_rel_types(rel_types: Optional[Sequence[str]]) -> List[str]:
+    """校验关系类型（为空表示全部类型）"""
+    if not rel_types:
+        return list(EDGE_TYPES)
+    unknown = [t for t in rel_types if t not in EDGE_TYPES]
+    if unknown:
+        raise ValueError(f"不支持的关系类型: {', '.join(unknown)}，可选: {', '.join(EDGE_TYPES)}")
+    return list(dict.fromkeys(rel_types))
+
+
+# ==================== 内存投影：双向 BFS + Yen ====================
+
+def _bidirectional_bfs(projection: GraphProjection, source: int, target: int, max_depth: int,
+                       edge_ok: np.ndarray, blocked: np.ndarray, deadline: float) -> Optional[Path]:
+    """
+    双向 BFS：每次扩展较小的一侧的整层，两侧相遇时取总距离最短的相遇点
+
+    Args:
+        edge_ok: 允许经过的边（按边列下标）
+        blocked: 不允许经过的节点（起点、终点不应在其中）
+        deadline: time.monotonic() 截止时间
+    """
+    if source == target:
+        return [source], []
+    n = projection.node_count
+    dist = [np.full(n, -1, dtype=np.int64), np.full(n, -1, dtype=np.int64)]
+    parent = [np.full(n, -1, dtype=np.int64), np.full(n, -1, dtype=np.int64)]
+    parent_edge = [np.full(n, -1, dtype=np.int64), np.full(n, -1, dtype=np.int64)]
+    dist[0][source], dist[1][target] = 0, 0
+    frontiers = [np.array([source]), np.array([target])]
+    depth = [0, 0]
+
+    while depth[0] + depth[1] < max_depth:
+        if time.monotonic() > deadline:
+            raise PathTimeout()
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        if len(frontiers[side]) == 0:
+            return None
+        parents, children, offsets = _gather(projection.indptr, projection.indices, frontiers[side])
+        edges = projection.adj_edge[offsets]
+        keep = edge_ok[edges] & ~blocked[children] & (dist[side][children] == -1)
+        parents, children, edges = parents[keep], children[keep], edges[keep]
+        children, first = np.unique(children, return_index=True)
+        depth[side] += 1
+        dist[side][children] = depth[side]
+        parent[side][children] = parents[first]
+        parent_edge[side][children] = edges[first]
+
+        met = children[dist[1 - side][children] >= 0]
+        if len(met):
+            meet = int(met[np.argmin(dist[1 - side][met])])
+            return _join(meet, parent, parent_edge)
+        frontiers[side] = children
+    return None
+
+
+def _join(meet: int, parent: List[np.ndarray], parent_edge: List[np.ndarray]) -> Path:
+    """从相遇点沿两侧的父指针拼出完整路径"""
+    head_nodes, head_edges = [meet], []
+    node = meet
+    while parent[0][node] >= 0:
+        head_edges.append(int(parent_edge[0][node]))
+        node = int(parent[0][node])
+        head_nodes.append(node)
+    head_nodes.reverse()
+    head_edges.reverse()
+
+    node = meet
+    while parent[1][node] >= 0:
+        head_edges.append(int(parent_edge[1][node]))
+        node = int(parent[1][node])
+        head_nodes.append(node)
+    return head_nodes, head_edges
+
+
+def _edges_between(projection: GraphProjection, u: int, v: int) -> np.ndarray:
+    neighbors, edges = projection.incident(u)
+    return edges[neighbors == v]
+
+
+def k_shortest_paths(projection: GraphProjection, source: int, target: int, max_depth: int, k: int,
+                     edge_ok: np.ndarray, blocked: np.ndarray, deadline: float) -> Tuple[List[Path], bool]:
+    """
+    Yen 算法：前 k 条节点序列互不相同的无环最短路径
+
+    Returns:
+        (路径列表, 是否因超时而不完整)
+    """
+    try:
+        first = _bidirectional_bfs(projection, source, target, max_depth, edge_ok, blocked, deadline)
+    except PathTimeout:
+        return [], True
+    if first is None:
+        return [], False
+
+    found: List[Path] = [first]
+    candidates: List[Tuple[int, Tuple[int, ...], List[int]]] = []
+    seen = {tuple(first[0])}
+    try:
+        while len(found) < k:
+            previous_nodes, previous_edges = found[-1]
+            for i in range(len(previous_nodes) - 1):
+                spur, root = previous_nodes[i], previous_nodes[:i + 1]
+                spur_edge_ok = edge_ok.copy()
+                for nodes, _ in found:
+                    if nodes[:i + 1] == root:
+                        spur_edge_ok[_edges_between(projection, nodes[i], nodes[i + 1])] = False
+                spur_blocked = blocked.copy()
+                spur_blocked[root[:-1]] = True
+                spur_path = _bidirectional_bfs(
+                    projection, spur, target, max_depth - i, spur_edge_ok, spur_blocked, deadline
+                )
+                if spur_path is None:
+                    continue
+                nodes = root[:-1] + spur_path[0]
+                if tuple(nodes) in seen:
+                    continue
+                seen.add(tuple(nodes))
+                heapq.heappush(candidates, (len(nodes), tuple(nodes), previous_edges[:i] + spur_path[1]))
+            if not candidates:
+                break
+            _, nodes, edges = heapq.heappop(candidates)
+            found.append((list(nodes), edges))
+    except PathTimeout:
+        return found, True
+    return found, False
+
+
+def _paths_in_memory(projection: GraphProjection, source_id: str, target_id: str, max_depth: int,
+                     rel_types: List[str], max_degree: int, k: int, deadline: float) -> Dict:
+    source, target = projection.lookup(source_id), projection.lookup(target_id)
+    if source is None or target is None:
+        return {"paths": [], "partial": False}
+
+    edge_ok = projection.edge_mask(rel_types)
+    blocked = np.zeros(projection.node_count, dtype=bool)
+    if max_degree:
+        blocked = projection.degrees(rel_types) > max_degree
+        blocked[[source, target]] = False
+
+    paths, partial = k_shortest_paths(projection, source, target, max_depth, k, edge_ok, blocked, deadline)
+    return {
+        "paths": [
+            {
+                "path_nodes": [projection.keys[i] for i in nodes],
+                "node_types": [projection.label_of(i) for i in nodes],
+                "relationship_types": [EDGE_TYPES[projection.etype[e]] for e in edges],
+                "hops": len(edges)
+            }
+            for nodes, edges in paths
+        ],
+        "partial": partial
+    }
+
+
+# ==================== Cypher 回退 ====================
+
+# 依次按 Phone.number / WeChat.wxid / Person.name 的唯一约束索引查找端点
+ENDPOINT_QUERY = """
+CALL {
+    MATCH (n:Phone {number: $id}) RETURN n, 0 as priority
+    UNION
+    MATCH (n:WeChat {wxid: $id}) RETURN n, 1 as priority
+    UNION
+    MATCH (n:Person {name: $id}) RETURN n, 2 as priority
+}
+RETURN elementId(n) as element_id
+ORDER BY priority
+LIMIT 1
+"""
+
+
+def resolve_endpoint(identifier: str) -> Optional[str]:
+    """通过索引定位端点，返回 elementId"""
+    results = db.execute_read(ENDPOINT_QUERY, {"id": identifier})
+    return results[0]["element_id"] if results else None
+
+
+def _paths_cypher(source_id: str, target_id: str, max_depth: int, rel_types: List[str],
+                  max_degree: int, k: int, deadline: float) -> Dict:
+    """有界 Cypher 扩展：k > 1 时返回等长的全部最短路径（最多 k 条）"""
+    source, target = resolve_endpoint(source_id), resolve_endpoint(target_id)
+    if source is None or target is None:
+        return {"paths": [], "partial": False}
+
+    types = "|".join(rel_types)
+    function = "allShortestPaths" if k > 1 else "shortestPath"
+    degree_filter = (
+        f"WHERE all(n IN nodes(path)[1..-1] WHERE COUNT {{ (n)-[:{types}]-() }} <= $max_degree)"
+        if max_degree else ""
+    )
+    query = f"""
+    MATCH (start) WHERE elementId(start) = $source
+    MATCH (end) WHERE elementId(end) = $target
+    MATCH path = {function}((start)-[:{types}*1..{int(max_depth)}]-(end))
+    {degree_filter}
+    RETURN [n in nodes(path) | COALESCE(n.number, n.wxid, n.name)] as path_nodes,
+           [n in nodes(path) | labels(n)[0]] as node_types,
+           [r in relationships(path) | type(r)] as relationship_types,
+           length(path) as hops
+    LIMIT $k
+    """
+    query_metrics.register(f"path_engine.{function.lower()}", query)
+    timeout = max(deadline - time.monotonic(), 0.001)
+    try:
+        with db.get_session(READ_ACCESS) as session:
+            paths = run_instrumented(
+                session, query,
+                {"source": source, "target": target, "max_degree": max_degree, "k": k},
+                timeout=timeout
+            )
+            return {"paths": paths, "partial": False}
+    except Neo4jError as e:
+        if "TransactionTimedOut" in (e.code or ""):
+            return {"paths": [], "partial": True}
+        raise
+
+
+# ==================== 入口 ====================
+
+def find_paths(source_id: str, target_id: str, max_depth: int = 5,
+               rel_types: Optional[Sequence[str]] = None, max_degree: Optional[int] = None,
+               k: int = 1, timeout_ms: Optional[int] = None) -> Dict:
+    """
+    查找两个目标之间的最短路径
+
+    Args:
+        source_id: 起点 ID（号码 / wxid / 姓名）
+        target_id: 终点 ID
+        max_depth: 最大跳数
+        rel_types: 允许经过的关系类型（默认全部）
+        max_degree: 中间节点的度数上限（默认 PATH_MAX_DEGREE，0 表示不限制）
+        k: 返回的路径条数（最多 PATH_MAX_K）
+        timeout_ms: 时间预算（默认 PATH_TIMEOUT_MS）
+
+    Returns:
+        首条路径的 path_nodes / node_types / relationship_types / hops，
+        以及 paths（全部路径）、partial（是否因超时不完整）、engine（projection / cypher）
+    """
+    rel_types = parse_rel_types(rel_types)
+    max_depth = max(1, min(int(max_depth), settings.PATH_MAX_DEPTH))
+    max_degree = settings.PATH_MAX_DEGREE if max_degree is None else max_degree
+    k = max(1, min(int(k), settings.PATH_MAX_K))
+    timeout_ms = settings.PATH_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    started = time.monotonic()
+    deadline = started + timeout_ms / 1000
+
+    projection = graph_projection.fresh_projection()
+    if projection is not None:
+        engine = "projection"
+        result = _paths_in_memory(projection, source_id, target_id, max_depth, rel_types, max_degree, k, deadline)
+    else:
+        engine = "cypher"
+        result = _paths_cypher(source_id, target_id, max_depth, rel_types, max_degree, k, deadline)
+
+    paths = result["paths"]
+    best = paths[0] if paths else {"path_nodes": [], "node_types": [], "relationship_types": [], "hops": -1}
+    response = {
+        **best,
+        "paths": paths,
+        "partial": result["partial"],
+        "engine": engine,
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+    }
+    if not paths:
+        response["message"] = "Search timed out" if result["partial"] else "No path found"
+    return response
+
+
+query_metrics.register_queries(__name__, globals())
@@ -0,0 +1,211 @@
+"""
+分析结果缓存
+以 (函数名, 参数, 图版本号) 为键缓存分析接口的结果：导入和清空数据都会递增图版本号，
+版本变化后旧结果不会再被命中。导入过程中版本号在批次提交后递增（至多每 GRAPH_VERSION_BUMP_INTERVAL 秒一次），
+缓存结果落后于已提交数据的时间不超过该间隔加上 PROJECTION_VERSION_CHECK_INTERVAL。
+
+- 进程内 LRU 存储，条目数上限 CACHE_MAX_ENTRIES，超过 CACHE_TTL 秒的条目视为失效
+- 可选的磁盘存储（CACHE_DISK_PATH，SQLite），服务重启或多个 worker 进程之间共享结果
+- 结果以 JSON 文本保存，命中时反序列化为新对象，调用方修改返回值不会污染缓存
+"""
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from app.config import settings
+from app.services import graph_projection
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS result_cache (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    value TEXT NOT NULL
+);
+"""
+
+
+def make_key(name: str, signature: inspect.Signature, args: tuple, kwargs: dict) -> str:
+    """函数名 + 参数的稳定文本表示（按签名补齐默认值，位置参数和关键字参数得到相同的键）"""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return name + ":" + json.dumps(sorted(bound.arguments.items()), ensure_ascii=False, default=str)
+
+
+class ResultCache:
+    """按图版本号失效的 LRU / TTL 结果缓存"""
+
+    def __init__(self, max_entries: int, ttl: float, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self._entries: "OrderedDict[str, Tuple[int, float, str]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            with closing(self._connect()) as conn, conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.disk_path, timeout=30)
+
+    def _observe_version(self, version: int):
+        """图版本前进后丢弃旧版本的全部条目（调用方持有锁；读到较旧的版本号时不做处理）"""
+        if self._version is not None and version <= self._version:
+            return
+        if self._version is not None:
+            self.evictions += len(self._entries)
+            self._entries.clear()
+            if self.disk_path:
+                with closing(self._connect()) as conn, conn:
+                    conn.execute("DELETE FROM result_cache WHERE version < ?", (version,))
+        self._version = version
+
+    def get(self, key: str, version: int):
+        """命中时返回结果，未命中返回 None"""
+        now = time.time()
+        with self._lock:
+            self._observe_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and now - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[2])
+            if entry is not None and entry[0] <= version:
+                # 过期或旧版本的条目；较新版本的条目留给读到新版本号的请求
+                del self._entries[key]
+
+        if self.disk_path:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT stored_at, value FROM result_cache WHERE key = ? AND version = ?", (key, version)
+                ).fetchone()
+            if row is not None and now - row[0] <= self.ttl:
+                with self._lock:
+                    self._store(key, version, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                return json.loads(row[1])
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, version: int, value):
+        payload = json.dumps(value, ensure_ascii=False, default=str)
+        now = time.time()
+        with self._lock:
+            if self._version is not None and version < self._version:
+                return
+            self._observe_version(version)
+            self._store(key, version, now, payload)
+        if self.disk_path:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO result_cache (key, version, stored_at, value) VALUES (?, ?, ?, ?)",
+                    (key, version, now, payload)
+                )
+
+    def _store(self, key: str, version: int, stored_at: float, payload: str):
+        self._entries[key] = (version, stored_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk_path:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM result_cache")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": settings.CACHE_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "graph_version": self._version,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "disk_store": self.disk_path,
+            }
+
+
+cache = ResultCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL, settings.CACHE_DISK_PATH)
+
+
+def cached(name: str) -> Callable:
+    """
+    缓存装饰器（同步函数），同名的同步、异步实现共享缓存条目
+
+    图版本号在执行函数之前读取：执行期间提交的导入批次会递增版本号（按 GRAPH_VERSION_BUMP_INTERVAL 限频），
+    本次结果记在旧版本下，之后的请求不会命中它
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not settings.CACHE_ENABLED:
+                return func(*args, **kwargs)
+            key = make_key(name, signature, args, kwargs)
+            version = graph_projection.current_graph_version()
+            result = cache.get(key, version)
+            if result is not None:
+                return result
+            result = func(*args, **kwargs)
+            cache.put(key, version, result)
+            return result
+        return wrapper
+    return decorator
+
+
+def cached_async(name: str) -> Callable:
+    """缓存装饰器（async 函数），见 cached"""
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not settings.CACHE_ENABLED:
+                return await func(*args, **kwargs)
+            key = make_key(name, signature, args, kwargs)
+            version = await graph_projection.current_graph_version_async()
+            # 磁盘存储的读写是阻塞调用，放到线程池执行
+            if cache.disk_path:
+                result = await asyncio.to_thread(cache.get, key, version)
+            else:
+                result = cache.get(key, version)
+            if result is not None:
+                return result
+            result = await func(*args, **kwargs)
+            if cache.disk_path:
+                await asyncio.to_thread(cache.put, key, version, result)
+            else:
+                cache.put(key, version, result)
+            return result
+        return wrapper
+    return decorator
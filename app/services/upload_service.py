@@ -0,0 +1,69 @@
+"""
+上传文件落盘服务
+以固定大小的分块把上传内容复制到唯一命名的临时文件，边写边检查大小上限
+"""
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLargeError(ValueError):
+    """上传文件超过 MAX_UPLOAD_SIZE"""
+
+
+def safe_filename(filename: str) -> str:
+    """去掉客户端文件名中的目录部分，只保留文件名本身（用于提取机主/用户名）"""
+    return Path((filename or "").replace("\\", "/")).name or "upload"
+
+
+async def save_upload(file: UploadFile, max_size: int = None) -> Path:
+    """
+    流式保存上传文件
+
+    文件名由 mkstemp 生成，不使用客户端文件名，避免并发上传同名文件互相覆盖及路径穿越；
+    磁盘写入在线程池中执行，不阻塞事件循环。
+
+    Args:
+        file: 上传文件
+        max_size: 大小上限（字节），默认 MAX_UPLOAD_SIZE
+
+    Returns:
+        临时文件路径（由调用方负责删除）
+
+    Raises:
+        UploadTooLargeError: 文件超过大小上限（已写入的部分会被删除）
+    """
+    max_size = settings.MAX_UPLOAD_SIZE if max_size is None else max_size
+    upload_dir = Path(settings.UPLOAD_DIR)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+
+    suffix = Path(safe_filename(file.filename)).suffix.lower()
+    fd, tmp_name = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=upload_dir)
+    tmp_path = Path(tmp_name)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(
+                        f"文件过大，最大支持 {max_size / 1024 / 1024:.0f}MB"
+                    )
+                await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    logger.info(f"📥 Saved upload {safe_filename(file.filename)} ({size} bytes) to {tmp_path}")
+    return tmp_path
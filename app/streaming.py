@@ -0,0 +1,75 @@
+"""
+流式 JSON 响应
+列表类接口边查询边输出：结果逐条序列化写出，内存占用与数据库 fetch size 成正比，
+首字节在第一条记录到达时即发出；返回的 JSON 结构与一次性返回时相同
+"""
+import json
+import logging
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _close(fields: Dict) -> str:
+    """结束列表并输出其后的字段"""
+    return "]" + ("," + _dumps(fields)[1:] if fields else "}")
+
+
+async def _prime(items: AsyncIterator[Dict]):
+    """先取第一条：查询出错时在开始输出前以正常的 HTTP 错误返回"""
+    try:
+        return await items.__anext__()
+    except StopAsyncIteration:
+        return _END
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def json_list_response(
+    head: Dict,
+    key: str,
+    items: AsyncIterator[Dict],
+    tail: Optional[Callable[[int], Dict]] = None
+) -> StreamingResponse:
+    """
+    流式输出 {**head, key: [...items], **tail(条数)}
+
+    Args:
+        head: 列表之前的字段
+        key: 列表字段名
+        items: 列表元素（异步迭代器）
+        tail: 列表之后的字段，参数为元素个数，默认 {"count": 条数}；
+              在全部元素输出后调用，可以返回迭代过程中累计的统计值
+    """
+    tail = tail or (lambda count: {"count": count})
+    first = await _prime(items)
+
+    async def _body():
+        yield _dumps(head)[:-1] + ("," if head else "") + f"{_dumps(key)}:["
+        count = 0
+        try:
+            if first is not _END:
+                yield _dumps(first)
+                count = 1
+                async for item in items:
+                    yield "," + _dumps(item)
+                    count += 1
+        except Exception as e:
+            # 响应头已发出，只能在 JSON 中附带错误信息
+            logger.error(f"❌ Streaming {key} failed: {str(e)}")
+            yield _close({"error": str(e), "count": count})
+            return
+        yield _close(tail(count))
+
+    return StreamingResponse(_body(), media_type="application/json")
@@ -0,0 +1,6 @@
+"""
+基准测试
+
+- generator：按种子确定性生成幂律分布的话单 / 微信好友 / 通讯录数据
+- harness：对导入和分析函数计时，结果写成 JSON，用于不同提交之间对比
+"""
@@ -0,0 +1,317 @@
+"""
+合成数据生成器（话单 / 微信好友 / 通讯录）
+
+按随机种子确定性生成，同样的参数（含 end_date）在任何机器、任何提交上得到完全相同的数据。
+end_date 默认取今天（分析接口的时间窗口按今天计算），不指定时不同日期生成的通话时间不同；
+结果文件记录实际使用的 end_date，复现或跨日对比时用 --end-date 固定：
+- 号码活跃度服从幂律分布（按排名的 Zipf 权重），少数号码承担大部分通话
+- 客服热线等枢纽号码（400 开头）：HUB_SHARE 比例的通话与其中一个枢纽相连，呼入呼出各半
+- 预置社区：号码按幂律大小划入社区，INTRA_SHARE 比例的通话、通讯录、好友关系落在社区内部，
+  真实划分写入 communities.csv，可用来检验社区发现结果
+- 通话时间分布在最近 days 天内，小时分布带昼夜规律；通话时长为对数正态分布
+- 通讯录姓名与微信昵称部分一致，跨源名称匹配有真实的命中
+
+数据分块生成，内存占用与 chunk_rows 成正比，支持 1 万到 5000 万行话单。
+命令行：python -m benchmarks.generator --rows 1m --out ./bench_data
+"""
+import argparse
+import json
+import logging
+import re
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 行数简写
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000, "50m": 50_000_000}
+
+# 每小时的相对通话量（0 点到 23 点）
+DIURNAL = np.array([2, 1, 1, 1, 1, 2, 4, 7, 9, 10, 10, 9, 8, 9, 10, 10, 9, 9, 8, 8, 7, 6, 4, 3], dtype=float)
+
+SURNAMES = list("王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈")
+GIVEN_NAMES = list("伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰萍红鹏辉建国志文斌宇浩凯晨雪琳倩婷")
+
+
+def parse_rows(value: str) -> int:
+    """行数参数：整数或 10k / 1m / 50M 形式"""
+    text = str(value).strip().lower().replace("_", "")
+    if text in SIZES:
+        return SIZES[text]
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([km]?)", text)
+    if not match:
+        raise argparse.ArgumentTypeError(f"无法识别的行数: {value}")
+    scale = {"": 1, "k": 1_000, "m": 1_000_000}[match.group(2)]
+    return int(float(match.group(1)) * scale)
+
+
+@dataclass
+class DatasetSpec:
+    """数据集参数（未指定的规模参数按话单行数推算）"""
+    cdr_rows: int = 10_000
+    wechat_rows: Optional[int] = None     # 默认 cdr_rows // 5
+    contact_rows: Optional[int] = None    # 默认 cdr_rows // 5
+    phones: Optional[int] = None          # 默认 cdr_rows // 10（至少 100）
+    communities: Optional[int] = None     # 默认 phones // 50
+    hubs: Optional[int] = None            # 默认 phones // 20000（至少 3）
+    owners: Optional[int] = None          # 通讯录机主数，默认 contact_rows // 200
+    hub_share: float = 0.05               # 与枢纽号码相连的通话占比
+    intra_share: float = 0.8              # 社区内部通话占比
+    alpha: float = 2.2                    # 度分布的幂律指数
+    days: int = 30                        # 通话时间跨度（截至 end_date）
+    end_date: Optional[str] = None        # 默认今天（分析接口的时间窗口按今天计算）
+    seed: int = 42
+
+    def resolved(self) -> "DatasetSpec":
+        wechat_rows = self.cdr_rows // 5 if self.wechat_rows is None else self.wechat_rows
+        contact_rows = self.cdr_rows // 5 if self.contact_rows is None else self.contact_rows
+        phones = max(100, self.cdr_rows // 10) if self.phones is None else self.phones
+        return replace(
+            self,
+            wechat_rows=wechat_rows,
+            contact_rows=contact_rows,
+            phones=phones,
+            communities=max(1, phones // 50) if self.communities is None else self.communities,
+            hubs=max(3, phones // 20000) if self.hubs is None else self.hubs,
+            owners=max(1, contact_rows // 200) if self.owners is None else self.owners,
+            end_date=self.end_date or date.today().isoformat(),
+        )
+
+
+def _zipf_weights(n: int, alpha: float, rng: np.random.Generator) -> np.ndarray:
+    """随机排列的 Zipf 权重：按排名 r 的权重为 r^(-1/(alpha-1))，期望度数服从指数为 alpha 的幂律"""
+    weights = np.arange(1, n + 1, dtype=float) ** (-1.0 / (alpha - 1.0))
+    return weights[rng.permutation(n)]
+
+
+def phone_number(index) -> np.ndarray:
+    """普通号码：13x 开头的 11 位号码"""
+    index = np.asarray(index, dtype=np.int64)
+    prefix = 130 + index % 10
+    return np.char.add(prefix.astype(str), np.char.zfill((index // 10).astype(str), 8)).astype(object)
+
+
+def hub_number(index) -> np.ndarray:
+    """枢纽号码：400 开头的 10 位客服热线"""
+    return np.char.add("400", np.char.zfill(np.asarray(index, dtype=np.int64).astype(str), 7)).astype(object)
+
+
+class Population:
+    """号码、社区、活跃度和姓名（由 spec 和种子完全确定）"""
+
+    def __init__(self, spec: DatasetSpec):
+        self.spec = spec = spec.resolved()
+        rng = np.random.default_rng([spec.seed, 0])
+        n = spec.phones
+
+        self.activity = _zipf_weights(n, spec.alpha, rng)
+        # 社区大小同样是幂律：按权重把号码分配到社区
+        community_weights = _zipf_weights(spec.communities, spec.alpha, rng)
+        self.community = rng.choice(spec.communities, size=n, p=community_weights / community_weights.sum())
+
+        # 按社区排序后的累计活跃度：全局抽样和社区内抽样都是一次 searchsorted
+        self.order = np.argsort(self.community, kind="stable")
+        self.cumulative = np.cumsum(self.activity[self.order])
+        self.prefix = np.concatenate([[0.0], self.cumulative])
+        sorted_community = self.community[self.order]
+        self.community_start = np.searchsorted(sorted_community, np.arange(spec.communities), "left")
+        self.community_end = np.searchsorted(sorted_community, np.arange(spec.communities), "right")
+
+        self.numbers = phone_number(np.arange(n))
+        self.hubs = hub_number(np.arange(spec.hubs))
+        self.hub_weights = _zipf_weights(spec.hubs, spec.alpha, rng)
+        self.hub_weights /= self.hub_weights.sum()
+        surnames = np.array(SURNAMES, dtype=object)[rng.integers(0, len(SURNAMES), n)]
+        given = np.array(GIVEN_NAMES, dtype=object)[rng.integers(0, len(GIVEN_NAMES), (n, 2))]
+        two_chars = rng.random(n) < 0.6
+        self.names = surnames + given[:, 0] + np.where(two_chars, given[:, 1], "")
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """按活跃度抽样号码下标"""
+        u = rng.random(size) * self.cumulative[-1]
+        return self.order[np.minimum(np.searchsorted(self.cumulative, u, "right"), len(self.order) - 1)]
+
+    def sample_peers(self, rng: np.random.Generator, of: np.ndarray, intra_share: float) -> np.ndarray:
+        """为每个号码抽一个联系对象：intra_share 概率在同一社区内（按活跃度），否则全局抽样"""
+        size = len(of)
+        community = self.community[of]
+        lo = self.prefix[self.community_start[community]]
+        hi = self.prefix[self.community_end[community]]
+        intra = rng.random(size) < intra_share
+        u = np.where(intra, lo + rng.random(size) * (hi - lo), rng.random(size) * self.cumulative[-1])
+        peers = self.order[np.minimum(np.searchsorted(self.cumulative, u, "right"), len(self.order) - 1)]
+        # 避免自己呼叫自己
+        return np.where(peers == of, (peers + 1) % len(self.numbers), peers)
+
+    def wxid(self, index) -> np.ndarray:
+        return np.char.add("wxid_", np.char.zfill(np.asarray(index).astype(str), 8)).astype(object)
+
+    def owner_names(self) -> np.ndarray:
+        """通讯录机主（Person.name）：活跃度最高的号码的姓名加编号，保证唯一"""
+        owners = np.argsort(-self.activity, kind="stable")[:self.spec.owners]
+        return np.char.add(self.names[owners].astype(str), np.arange(len(owners)).astype(str)).astype(object), owners
+
+    def top_numbers(self, count: int) -> list:
+        """活跃度最高的号码（基准测试的分析目标）"""
+        return list(self.numbers[np.argsort(-self.activity, kind="stable")[:count]])
+
+
+def iter_cdr(spec: DatasetSpec, chunk_rows: int = 1_000_000,
+             population: Optional[Population] = None) -> Iterator[pd.DataFrame]:
+    """分块产出话单：caller, callee, duration, timestamp"""
+    population = population or Population(spec)
+    spec = population.spec
+    rng = np.random.default_rng([spec.seed, 1])
+    end = np.datetime64(spec.end_date, "s") + np.timedelta64(1, "D")
+    hour_p = DIURNAL / DIURNAL.sum()
+    remaining = spec.cdr_rows
+    while remaining > 0:
+        size = min(chunk_rows, remaining)
+        remaining -= size
+        caller = population.sample(rng, size)
+        callee = population.sample_peers(rng, caller, spec.intra_share)
+        callers = population.numbers[caller]
+        callees = population.numbers[callee]
+
+        hub = rng.random(size) < spec.hub_share
+        hubs = population.hubs[rng.choice(len(population.hubs), size=size, p=population.hub_weights)]
+        inbound = rng.random(size) < 0.5
+        callees = np.where(hub & inbound, hubs, callees)
+        callers = np.where(hub & ~inbound, hubs, callers)
+
+        duration = np.where(hub, rng.lognormal(np.log(30), 0.8, size), rng.lognormal(np.log(60), 1.0, size))
+        day = rng.integers(1, spec.days + 1, size)
+        seconds = rng.choice(24, size=size, p=hour_p) * 3600 + rng.integers(0, 3600, size)
+        timestamp = end - day.astype("timedelta64[D]") + seconds.astype("timedelta64[s]")
+        yield pd.DataFrame({
+            "caller": callers,
+            "callee": callees,
+            "duration": duration.astype(np.int64),
+            "timestamp": np.char.replace(np.datetime_as_string(timestamp, unit="s"), "T", " "),
+        })
+
+
+def iter_wechat(spec: DatasetSpec, chunk_rows: int = 1_000_000,
+                population: Optional[Population] = None) -> Iterator[pd.DataFrame]:
+    """分块产出微信好友：user, friend, nickname（每个号码对应一个微信号，70% 的昵称与通讯录姓名一致）"""
+    population = population or Population(spec)
+    spec = population.spec
+    rng = np.random.default_rng([spec.seed, 2])
+    remaining = spec.wechat_rows
+    while remaining > 0:
+        size = min(chunk_rows, remaining)
+        remaining -= size
+        user = population.sample(rng, size)
+        friend = population.sample_peers(rng, user, 0.9)
+        same_name = rng.random(size) < 0.7
+        other = population.names[rng.integers(0, len(population.names), size)]
+        yield pd.DataFrame({
+            "user": population.wxid(user),
+            "friend": population.wxid(friend),
+            "nickname": np.where(same_name, population.names[friend], other),
+        })
+
+
+def iter_contacts(spec: DatasetSpec, population: Optional[Population] = None) -> Iterator[tuple]:
+    """
+    逐个机主产出通讯录：(机主名, DataFrame[姓名, 电话号码])
+
+    每个机主的联系人数按活跃度分配，联系人以同社区为主，部分存的是客服热线
+    """
+    population = population or Population(spec)
+    spec = population.spec
+    rng = np.random.default_rng([spec.seed, 3])
+    owner_names, owners = population.owner_names()
+    weights = population.activity[owners]
+    counts = rng.multinomial(spec.contact_rows, weights / weights.sum())
+    for name, owner, count in zip(owner_names, owners, counts):
+        if count == 0:
+            continue
+        peers = population.sample_peers(rng, np.full(count, owner), spec.intra_share)
+        phones = population.numbers[peers]
+        names = population.names[peers]
+        hub = rng.random(count) < spec.hub_share
+        if hub.any():
+            phones = np.where(hub, population.hubs[rng.integers(0, len(population.hubs), count)], phones)
+            names = np.where(hub, "客服热线", names)
+        yield name, pd.DataFrame({"姓名": names, "电话号码": phones})
+
+
+def write_dataset(spec: DatasetSpec, out: str, chunk_rows: int = 1_000_000) -> Dict:
+    """
+    生成数据集文件
+
+    目录结构：cdr.csv、wechat.csv、contacts/<机主>_通讯录.csv、communities.csv（真实社区划分）、
+    dataset.json（参数、行数、生成耗时）
+
+    Returns:
+        dataset.json 的内容
+    """
+    started = time.perf_counter()
+    population = Population(spec)
+    spec = population.spec
+    root = Path(out)
+    (root / "contacts").mkdir(parents=True, exist_ok=True)
+
+    counts = {"cdr": 0, "wechat": 0, "contacts": 0, "owners": 0}
+    for name, iterator in (("cdr", iter_cdr(spec, chunk_rows, population)),
+                           ("wechat", iter_wechat(spec, chunk_rows, population))):
+        with open(root / f"{name}.csv", "w", encoding="utf-8", newline="") as f:
+            for i, frame in enumerate(iterator):
+                frame.to_csv(f, index=False, header=i == 0)
+                counts[name] += len(frame)
+    for owner, frame in iter_contacts(spec, population):
+        frame.to_csv(root / "contacts" / f"{owner}_通讯录.csv", index=False)
+        counts["contacts"] += len(frame)
+        counts["owners"] += 1
+    pd.DataFrame({"number": population.numbers, "community": population.community}).to_csv(
+        root / "communities.csv", index=False
+    )
+
+    info = {
+        "spec": asdict(spec),
+        "rows": counts,
+        "hubs": list(population.hubs),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    (root / "dataset.json").write_text(json.dumps(info, indent=2, ensure_ascii=False), encoding="utf-8")
+    logger.info(f"✅ Generated {counts} into {root} in {info['seconds']}s")
+    return info
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--rows", type=parse_rows, default=10_000, help="话单行数（如 10k、1m、50m）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--phones", type=parse_rows, default=None, help="号码数，默认 rows / 10")
+    parser.add_argument("--communities", type=int, default=None)
+    parser.add_argument("--hubs", type=int, default=None)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--alpha", type=float, default=2.2, help="度分布的幂律指数")
+    parser.add_argument("--end-date", default=None, help="最后一天（YYYY-MM-DD），默认今天；复现数据集时需要固定")
+
+
+def spec_from_args(args: argparse.Namespace) -> DatasetSpec:
+    return DatasetSpec(cdr_rows=args.rows, seed=args.seed, phones=args.phones, communities=args.communities,
+                       hubs=args.hubs, days=args.days, alpha=args.alpha, end_date=args.end_date)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.generator", description="生成合成话单、微信、通讯录数据")
+    add_spec_arguments(parser)
+    parser.add_argument("--out", required=True, help="输出目录")
+    parser.add_argument("--chunk-rows", type=parse_rows, default=1_000_000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    info = write_dataset(spec_from_args(args), args.out, args.chunk_rows)
+    print(json.dumps({key: info[key] for key in ("rows", "seconds")}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
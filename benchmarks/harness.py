@@ -0,0 +1,417 @@
+"""
+导入与分析基准测试
+
+两种后端：
+- memory：不需要 Neo4j，计时进程内的部分——分块清洗、行指纹、批量导入的 pandas 汇总、
+  本地事件存储的追加 / 扫描 / 通话模式、内存图投影的构建、中心性、社区发现和邻域分析
+- neo4j：对 NEO4J_URI 指向的本地 Neo4j 容器，逐个计时 ingest_service 的导入函数
+  和 analysis_service 的分析函数（结果缓存关闭，每次都真正执行查询）
+
+每项测试重复 --repeat 次，记录每次耗时、中位数、单次调用耗时和行吞吐量；结果连同提交号、
+数据集参数和运行环境写入 JSON（默认 benchmarks/results/），compare 子命令对比两次结果：
+
+    python -m benchmarks.harness run --backend memory --rows 100k
+    python -m benchmarks.harness run --backend neo4j --rows 10k --reset
+    python -m benchmarks.harness compare base.json head.json --threshold 0.1
+"""
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generator import (DatasetSpec, Population, add_spec_arguments, iter_cdr, iter_contacts,
+                                  iter_wechat, spec_from_args, write_dataset)
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+class Runner:
+    """计时并收集结果"""
+
+    def __init__(self, repeat: int, only: Optional[List[str]] = None):
+        self.repeat = repeat
+        self.only = only
+        self.results: List[Dict] = []
+
+    def selected(self, name: str) -> bool:
+        return not self.only or any(name.startswith(prefix) for prefix in self.only)
+
+    def bench(self, name: str, func: Callable[[], object], calls: int = 1, rows: int = 0,
+              repeat: Optional[int] = None, setup: Optional[Callable[[], None]] = None):
+        """
+        重复执行 func 并记录耗时
+
+        Args:
+            calls: 每次执行包含的调用次数（用于计算单次调用耗时）
+            rows: 每次执行处理的行数（用于计算吞吐量）
+            setup: 每次执行前调用，不计入耗时
+        """
+        if not self.selected(name):
+            return
+        samples = []
+        for _ in range(repeat or self.repeat):
+            if setup:
+                setup()
+            started = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - started)
+        median = statistics.median(samples)
+        result = {
+            "name": name,
+            "calls": calls,
+            "rows": rows,
+            "samples": [round(s, 6) for s in samples],
+            "median_seconds": round(median, 6),
+            "min_seconds": round(min(samples), 6),
+            "per_call_ms": round(median / calls * 1000, 3) if calls else None,
+            "rows_per_sec": round(rows / median, 1) if rows and median > 0 else None,
+        }
+        self.results.append(result)
+        throughput = f", {result['rows_per_sec']} rows/s" if result["rows_per_sec"] else ""
+        logger.info(f"⏱️  {name}: {median:.4f}s median of {len(samples)} ({result['per_call_ms']} ms/call{throughput})")
+
+
+# ==================== memory 后端 ====================
+
+def projection_from_tables(tables: Dict[str, pd.DataFrame]):
+    """由批量导入汇总出的节点、关系表直接构建内存图投影（与从 Neo4j 加载的结构相同）"""
+    from app.services.graph_projection import GraphProjection, LABELS
+
+    keys = [tables["phones.csv"]["number"], tables["wechat.csv"]["wxid"], tables["persons.csv"]["name"]]
+    labels = np.concatenate([np.full(len(k), code, dtype=np.int8) for code, k in enumerate(keys)])
+    keys = pd.concat(keys, ignore_index=True)
+    offsets = np.cumsum([0] + [int((labels == code).sum()) for code in range(len(LABELS))])
+    index = {LABELS[code]: pd.Series(np.arange(offsets[code], offsets[code + 1]),
+                                     index=keys.iloc[offsets[code]:offsets[code + 1]].to_numpy())
+             for code in range(len(LABELS))}
+
+    calls, friends, contacts = tables["calls.csv"], tables["friends.csv"], tables["contacts.csv"]
+    edges = [
+        (index["Phone"][calls["caller"]].to_numpy(), index["Phone"][calls["callee"]].to_numpy(), 0,
+         calls["count"].to_numpy(float), calls["total_duration"].to_numpy(float)),
+        (index["WeChat"][friends["user"]].to_numpy(), index["WeChat"][friends["friend"]].to_numpy(), 1,
+         np.ones(len(friends)), np.zeros(len(friends))),
+        (index["Person"][contacts["owner"]].to_numpy(), index["Phone"][contacts["phone"]].to_numpy(), 2,
+         np.ones(len(contacts)), np.zeros(len(contacts))),
+    ]
+    return GraphProjection(
+        version=0,
+        keys=keys.to_numpy(dtype=object),
+        labels=labels,
+        src=np.concatenate([e[0] for e in edges]).astype(np.int64),
+        dst=np.concatenate([e[1] for e in edges]).astype(np.int64),
+        etype=np.concatenate([np.full(len(e[0]), e[2], dtype=np.int8) for e in edges]),
+        weight=np.concatenate([e[3] for e in edges]),
+        duration=np.concatenate([e[4] for e in edges]),
+    )
+
+
+def run_memory(spec: DatasetSpec, runner: Runner, targets: int):
+    from app.config import settings
+    from app.services import analysis_service, centrality, community, ingest_manifest, ingest_service
+    from app.services.bulk_import import BulkPreparer
+    from app.services.event_store import EventStore
+
+    population = Population(spec)
+    spec = population.spec
+    cdr = list(iter_cdr(spec, population=population))
+    wechat = list(iter_wechat(spec, population=population))
+    contacts = list(iter_contacts(spec, population=population))
+    numbers = population.top_numbers(targets)
+    cdr_rows, wechat_rows = spec.cdr_rows, spec.wechat_rows
+    contact_rows = sum(len(frame) for _, frame in contacts)
+
+    runner.bench("clean.cdr", lambda: [ingest_service.clean_cdr_frame(f.copy(), "cdr.csv") for f in cdr],
+                 rows=cdr_rows)
+    runner.bench("clean.wechat", lambda: [ingest_service.clean_wechat_frame(f.copy(), "wechat.csv") for f in wechat],
+                 rows=wechat_rows)
+    runner.bench("clean.contacts", lambda: [ingest_service.clean_contacts_frame(f.copy(), f"{owner}_通讯录.csv")
+                                            for owner, f in contacts], rows=contact_rows)
+
+    cleaned = [ingest_service.clean_cdr_frame(f.copy(), "cdr.csv") for f in cdr]
+    runner.bench("manifest.fingerprints", lambda: [ingest_manifest.fingerprints(f, "cdr") for f in cleaned],
+                 rows=cdr_rows)
+
+    # 批量导入的 pandas 汇总（事件存储单独计时）
+    settings.EVENT_STORE_ENABLED = False
+    state = {}
+
+    def aggregate():
+        preparer = BulkPreparer()
+        for frame in cleaned:
+            preparer.add_cdr(frame)
+        for frame in wechat:
+            preparer.add_wechat(ingest_service.clean_wechat_frame(frame.copy(), "wechat.csv"))
+        for owner, frame in contacts:
+            preparer.add_contacts(ingest_service.clean_contacts_frame(frame.copy(), f"{owner}_通讯录.csv"))
+        state["tables"] = preparer.tables()
+
+    runner.bench("bulk.aggregate", aggregate, rows=cdr_rows + wechat_rows + contact_rows)
+    if "tables" not in state:
+        aggregate()
+
+    with tempfile.TemporaryDirectory(prefix="bench-events-") as root:
+        stores = []
+
+        def new_store():
+            stores.append(EventStore(str(Path(root) / f"run{len(stores)}")))
+
+        def append():
+            for frame in cleaned:
+                stores[-1].append(frame["caller"], frame["callee"], frame["timestamp"], frame["duration"])
+
+        runner.bench("event_store.append", append, rows=cdr_rows, setup=new_store)
+        if not stores:
+            new_store()
+            append()
+        store = stores[-1]
+        runner.bench("event_store.scan", lambda: [list(store.scan(n)) for n in numbers], calls=len(numbers))
+        runner.bench("event_store.call_pattern",
+                     lambda: [store.call_pattern(n, spec.days) for n in numbers], calls=len(numbers))
+
+    tables = state["tables"]
+    edges = sum(len(tables[name]) for name in ("calls.csv", "friends.csv", "contacts.csv"))
+    runner.bench("projection.build", lambda: state.update(projection=projection_from_tables(tables)), rows=edges)
+    projection = state.get("projection") or projection_from_tables(tables)
+    clear_cache = projection.cache.clear
+
+    runner.bench("centrality.compute_all", lambda: centrality.compute_all(projection), setup=clear_cache)
+    for algorithm in ("louvain", "label_propagation"):
+        runner.bench(f"community.{algorithm}", lambda: community.detect(projection, algorithm), setup=clear_cache)
+    runner.bench("analysis.frequent_contacts",
+                 lambda: [analysis_service._frequent_contacts_in_memory(projection, n, "Phone", 10) for n in numbers],
+                 calls=len(numbers))
+    pairs = list(zip(numbers[::2], numbers[1::2]))
+    runner.bench("analysis.common_contacts",
+                 lambda: [analysis_service._common_contacts_in_memory(projection, a, b, "Phone") for a, b in pairs],
+                 calls=len(pairs))
+
+
+# ==================== neo4j 后端 ====================
+
+def run_neo4j(spec: DatasetSpec, runner: Runner, targets: int, data_dir: Optional[str], reset: bool):
+    from app import schema
+    from app.config import settings
+    from app.database import db
+    from app.services import analysis_service, event_store, graph_projection, ingest_service
+    from app.services.event_store import EventStore
+
+    # 每次都真正执行查询和写入：关闭结果缓存和导入清单，事件存储写到临时目录
+    settings.CACHE_ENABLED = False
+    settings.INGEST_MANIFEST_ENABLED = False
+    events_dir = tempfile.TemporaryDirectory(prefix="bench-events-")
+    event_store.store = EventStore(events_dir.name)
+
+    db.connect()
+    try:
+        schema.migrate()
+        schema.wait_for_indexes()
+        stats = analysis_service.get_statistics()
+        if stats.get("total_nodes") and not reset:
+            raise SystemExit("❌ 数据库中已有数据，基准测试会清空数据库；确认后加 --reset 重新运行")
+        ingest_service.clear_all_data()
+
+        population = Population(spec)
+        spec = population.spec
+        data = Path(data_dir) if data_dir else Path(tempfile.mkdtemp(prefix="bench-data-"))
+        if not (data / "dataset.json").exists():
+            write_dataset(spec, str(data))
+        contact_files = sorted((data / "contacts").glob("*.csv"))
+
+        # 导入只执行一次（重复导入会累加计数，不是同一个工作量）
+        runner.bench("ingest.import_file.cdr", lambda: ingest_service.import_file(str(data / "cdr.csv"), "cdr"),
+                     rows=spec.cdr_rows, repeat=1)
+        runner.bench("ingest.import_file.wechat", lambda: ingest_service.import_file(str(data / "wechat.csv"), "wechat"),
+                     rows=spec.wechat_rows, repeat=1)
+        runner.bench("ingest.import_file.contacts",
+                     lambda: [ingest_service.import_file(str(path), "contacts") for path in contact_files],
+                     rows=spec.contact_rows, calls=len(contact_files), repeat=1)
+        # JSON 导入路径：另一份种子生成的小批话单
+        extra = DatasetSpec(cdr_rows=min(spec.cdr_rows, 20_000), phones=spec.phones, seed=spec.seed + 1,
+                            end_date=spec.end_date, days=spec.days)
+        records = [row for frame in iter_cdr(extra) for row in ingest_service.frame_to_records(
+            ingest_service.clean_cdr_frame(frame, "cdr.csv"))]
+        runner.bench("ingest.import_cdr_data", lambda: ingest_service.import_cdr_data(records),
+                     rows=len(records), repeat=1)
+
+        runner.bench("projection.load", lambda: graph_projection.load_projection(graph_projection.current_graph_version()))
+        graph_projection.get_projection(wait=True)
+
+        numbers = population.top_numbers(targets)
+        pairs = list(zip(numbers[::2], numbers[1::2]))
+        calls = len(numbers)
+        runner.bench("analysis.analyze_target", lambda: [analysis_service.analyze_target(n) for n in numbers], calls=calls)
+        runner.bench("analysis.analyze_targets", lambda: analysis_service.analyze_targets(numbers))
+        runner.bench("analysis.auto_collision_analysis", analysis_service.auto_collision_analysis)
+        runner.bench("analysis.find_common_contacts",
+                     lambda: [analysis_service.find_common_contacts(a, b) for a, b in pairs], calls=len(pairs))
+        runner.bench("analysis.find_shortest_path",
+                     lambda: [analysis_service.find_shortest_path(a, b) for a, b in pairs], calls=len(pairs))
+        runner.bench("analysis.find_frequent_contacts",
+                     lambda: [analysis_service.find_frequent_contacts(n) for n in numbers], calls=calls)
+        runner.bench("analysis.find_central_nodes", lambda: analysis_service.find_central_nodes(metric="pagerank"))
+        runner.bench("analysis.find_communities", analysis_service.find_communities)
+        runner.bench("analysis.expand_network", lambda: [analysis_service.expand_network(n) for n in numbers],
+                     calls=calls)
+        runner.bench("analysis.analyze_call_pattern",
+                     lambda: [analysis_service.analyze_call_pattern(n, spec.days) for n in numbers], calls=calls)
+        runner.bench("analysis.get_statistics", analysis_service.get_statistics)
+    finally:
+        db.close()
+        events_dir.cleanup()
+
+
+# ==================== 结果 ====================
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict:
+    from app.config import settings
+
+    try:
+        import neo4j
+        driver = neo4j.__version__
+    except ImportError:
+        driver = None
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "neo4j_driver": driver,
+        "settings": {key: getattr(settings, key) for key in
+                     ("INGEST_BATCH_SIZE", "INGEST_WORKERS", "IMPORT_CHUNK_ROWS", "NEO4J_FETCH_SIZE")},
+    }
+
+
+def run(args: argparse.Namespace) -> Dict:
+    spec = spec_from_args(args).resolved()
+    runner = Runner(args.repeat, args.only)
+    started = time.perf_counter()
+    if args.backend == "memory":
+        run_memory(spec, runner, args.targets)
+    else:
+        run_neo4j(spec, runner, args.targets, args.data, args.reset)
+    report = {
+        "backend": args.backend,
+        "spec": asdict(spec),
+        "repeat": args.repeat,
+        "environment": environment(),
+        "seconds": round(time.perf_counter() - started, 3),
+        "results": runner.results,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"{args.backend}-{spec.cdr_rows}-{(report['environment']['commit'] or 'nogit')[:8]}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    logger.info(f"✅ {len(runner.results)} benchmarks written to {output}")
+    return report
+
+
+def _differences(base: Dict, head: Dict) -> List[str]:
+    """两次结果的数据集参数（含实际使用的 end_date）和后端差异"""
+    differences = [f"backend: {base['backend']} -> {head['backend']}"] if base["backend"] != head["backend"] else []
+    for key in sorted(set(base["spec"]) | set(head["spec"])):
+        if base["spec"].get(key) != head["spec"].get(key):
+            differences.append(f"{key}: {base['spec'].get(key)} -> {head['spec'].get(key)}")
+    return differences
+
+
+def compare(base_path: str, head_path: str, threshold: float, allow_mismatch: bool = False) -> int:
+    """
+    按测试名称对比两次结果的中位耗时
+
+    两次结果的数据集参数或后端不同时数据不同，耗时不可比，默认抛出 ValueError
+    （常见原因是未指定 --end-date 的两次运行不在同一天）；allow_mismatch 时只给出提示
+
+    Returns:
+        变慢超过 threshold（相对比例）的测试数
+    """
+    base = json.loads(Path(base_path).read_text(encoding="utf-8"))
+    head = json.loads(Path(head_path).read_text(encoding="utf-8"))
+    differences = _differences(base, head)
+    if differences and not allow_mismatch:
+        raise ValueError(
+            f"数据集参数或后端不同（{'; '.join(differences)}），"
+            f"请用相同参数（含 --end-date）重新运行，或加 --allow-spec-mismatch 强制对比"
+        )
+    if differences:
+        print(f"⚠️  数据集参数或后端不同，对比结果仅供参考: {'; '.join(differences)}")
+    before = {r["name"]: r for r in base["results"]}
+    regressions = 0
+    print(f"{'benchmark':<40} {'base':>10} {'head':>10} {'ratio':>8}")
+    for result in head["results"]:
+        old = before.get(result["name"])
+        if old is None or not old["median_seconds"]:
+            print(f"{result['name']:<40} {'-':>10} {result['median_seconds']:>10.4f} {'new':>8}")
+            continue
+        ratio = result["median_seconds"] / old["median_seconds"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions += 1
+            flag = "  ⚠️  slower"
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{result['name']:<40} {old['median_seconds']:>10.4f} {result['median_seconds']:>10.4f} {ratio:>8.2f}{flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.harness", description="导入与分析基准测试")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="运行基准测试并写入 JSON 结果")
+    add_spec_arguments(run_parser)
+    run_parser.add_argument("--backend", choices=["memory", "neo4j"], default="memory")
+    run_parser.add_argument("--repeat", type=int, default=3, help="每项测试的重复次数")
+    run_parser.add_argument("--targets", type=int, default=20, help="分析测试使用的目标号码数（活跃度最高的号码）")
+    run_parser.add_argument("--only", nargs="*", help="只运行名称以这些前缀开头的测试")
+    run_parser.add_argument("--data", help="neo4j 后端：数据集目录（不存在时生成），默认临时目录")
+    run_parser.add_argument("--reset", action="store_true", help="neo4j 后端：允许清空已有数据的数据库")
+    run_parser.add_argument("--output", help="结果文件，默认 benchmarks/results/<后端>-<行数>-<提交>.json")
+
+    compare_parser = commands.add_parser("compare", help="对比两次结果")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="判定变慢的相对比例")
+    compare_parser.add_argument("--allow-spec-mismatch", action="store_true",
+                                help="数据集参数或后端不同时仍然对比（结果仅供参考）")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == "run":
+        run(args)
+    else:
+        try:
+            regressions = compare(args.base, args.head, args.threshold, args.allow_spec_mismatch)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(2)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
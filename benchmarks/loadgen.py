@@ -0,0 +1,399 @@
+"""
+接口压测（模拟研判人员的真实请求组合）
+
+对本地启动的服务（uvicorn app.main:app，连接本地 Neo4j）发起并发请求：
+- 按权重随机选择场景：大量单目标分析，少量批量分析、路径、通话模式和时间线，偶尔一键碰撞分析，
+  以及后台上传话单（上传接口立即返回 202，导入任务在服务端与查询争用数据库）
+- 并发用户数固定（闭环模型，每个用户收到响应后再发下一个请求，可加思考时间），
+  启动阶段在 --ramp-up 秒内线性增加到 --concurrency 个用户，只统计全部用户启动之后的请求
+- 目标号码来自与已导入数据集相同参数生成的号码，按活跃度加权抽取（热点号码被查得更多）
+
+按接口输出请求数、错误率、吞吐量和 p50 / p95 / p99 延迟，结果写入 JSON（默认 benchmarks/results/）：
+
+    python -m benchmarks.generator --rows 1m --out ./bench_data
+    python -m app.services.bulk_import run ./bench_data/cdr.csv ./bench_data/wechat.csv ./bench_data/contacts/*.csv
+    python -m benchmarks.loadgen --data ./bench_data --concurrency 50 --ramp-up 30 --duration 120
+
+需要 httpx（pip install httpx）
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.generator import DatasetSpec, Population, add_spec_arguments, iter_cdr, spec_from_args
+from benchmarks.harness import RESULTS_DIR, environment
+
+try:
+    import httpx
+except ImportError:  # 压测为可选功能，服务本身不依赖 httpx
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+# (method, url, httpx 请求参数)
+Request = Tuple[str, str, Dict]
+
+
+class Context:
+    """场景共享的数据：目标号码（按活跃度加权）和上传文件池"""
+
+    def __init__(self, spec: DatasetSpec, targets: int, batch_size: int):
+        population = Population(spec)
+        self.spec = population.spec
+        top = np.argsort(-population.activity, kind="stable")[:targets]
+        self.numbers = list(population.numbers[top])
+        self.weights = list(np.cumsum(population.activity[top]))
+        self.batch_size = batch_size
+        self.uploads: List[bytes] = []
+        self.upload_index = 0
+        self.job_ids: List[str] = []
+
+    def target(self, rng: random.Random) -> str:
+        return rng.choices(self.numbers, cum_weights=self.weights)[0]
+
+    def targets(self, rng: random.Random, count: int) -> List[str]:
+        return rng.choices(self.numbers, cum_weights=self.weights, k=count)
+
+    def prepare_uploads(self, pool: int, rows: int):
+        """
+        预先生成 pool 份内容各不相同的话单 CSV（另一个种子，号码与数据集相同）
+
+        上传次数超过 pool 后循环使用，重复的文件由导入清单直接跳过
+        """
+        extra = replace(self.spec, cdr_rows=pool * rows, seed=self.spec.seed + 1000)
+        self.uploads = [frame.to_csv(index=False).encode("utf-8") for frame in iter_cdr(extra, chunk_rows=rows)]
+        logger.info(f"📦 Prepared {len(self.uploads)} upload files of {rows} rows")
+
+    def next_upload(self) -> Tuple[str, bytes]:
+        index = self.upload_index % len(self.uploads)
+        self.upload_index += 1
+        return f"loadgen_{self.spec.seed}_{index}.csv", self.uploads[index]
+
+
+# ==================== 场景 ====================
+
+@dataclass
+class Scenario:
+    name: str
+    endpoint: str                                      # 统计分组（路由模板）
+    build: Callable[[Context, random.Random], Request]
+
+
+def _target(ctx: Context, rng: random.Random) -> Request:
+    return "GET", f"/analysis/target/{ctx.target(rng)}", {}
+
+
+def _targets_batch(ctx: Context, rng: random.Random) -> Request:
+    return "POST", "/analysis/targets", {"json": {"targets": ctx.targets(rng, ctx.batch_size)}}
+
+
+def _auto_collision(ctx: Context, rng: random.Random) -> Request:
+    return "GET", "/analysis/auto-collision", {}
+
+
+def _frequent_contacts(ctx: Context, rng: random.Random) -> Request:
+    return "GET", "/analysis/frequent-contacts", {"params": {"target_id": ctx.target(rng), "top_n": 10}}
+
+
+def _common_contacts(ctx: Context, rng: random.Random) -> Request:
+    a, b = ctx.targets(rng, 2)
+    return "POST", "/analysis/common-contacts", {"json": {"target_a": a, "target_b": b}}
+
+
+def _path(ctx: Context, rng: random.Random) -> Request:
+    a, b = ctx.targets(rng, 2)
+    return "GET", "/analysis/path", {"params": {"source": a, "target": b}}
+
+
+def _call_pattern(ctx: Context, rng: random.Random) -> Request:
+    return "GET", "/analysis/call-pattern", {
+        "params": {"target_id": ctx.target(rng), "time_window_days": ctx.spec.days}
+    }
+
+
+def _timeline(ctx: Context, rng: random.Random) -> Request:
+    return "GET", "/analysis/timeline", {"params": {"target_id": ctx.target(rng), "limit": 200, "order": "desc"}}
+
+
+def _upload(ctx: Context, rng: random.Random) -> Request:
+    name, body = ctx.next_upload()
+    return "POST", "/ingest/upload/csv", {"files": {"file": (name, body, "text/csv")}, "data": {"data_type": "cdr"}}
+
+
+SCENARIOS = {s.name: s for s in [
+    Scenario("target", "GET /analysis/target/{target_number}", _target),
+    Scenario("targets_batch", "POST /analysis/targets", _targets_batch),
+    Scenario("auto_collision", "GET /analysis/auto-collision", _auto_collision),
+    Scenario("frequent_contacts", "GET /analysis/frequent-contacts", _frequent_contacts),
+    Scenario("common_contacts", "POST /analysis/common-contacts", _common_contacts),
+    Scenario("path", "GET /analysis/path", _path),
+    Scenario("call_pattern", "GET /analysis/call-pattern", _call_pattern),
+    Scenario("timeline", "GET /analysis/timeline", _timeline),
+    Scenario("upload", "POST /ingest/upload/csv", _upload),
+]}
+
+# 默认请求组合（相对权重）
+DEFAULT_MIX = {
+    "target": 60,
+    "frequent_contacts": 10,
+    "call_pattern": 8,
+    "timeline": 8,
+    "common_contacts": 5,
+    "path": 4,
+    "targets_batch": 2,
+    "auto_collision": 2,
+    "upload": 1,
+}
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """请求组合参数：target=80,auto_collision=5,upload=2（未列出的场景不执行）"""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"未知场景: {name}（可选: {', '.join(SCENARIOS)}）")
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"无效的权重: {item}")
+    return mix
+
+
+# ==================== 统计 ====================
+
+@dataclass
+class EndpointStats:
+    endpoint: str
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, seconds: float, status: str, ok: bool):
+        self.latencies.append(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self, name: str, elapsed: float) -> Dict:
+        count = len(self.latencies)
+        ms = np.asarray(self.latencies) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if count else (None, None, None)
+        return {
+            "scenario": name,
+            "endpoint": self.endpoint,
+            "requests": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "throughput_rps": round(count / elapsed, 2) if elapsed > 0 else None,
+            "mean_ms": round(float(ms.mean()), 2) if count else None,
+            "p50_ms": round(float(p50), 2) if count else None,
+            "p95_ms": round(float(p95), 2) if count else None,
+            "p99_ms": round(float(p99), 2) if count else None,
+            "max_ms": round(float(ms.max()), 2) if count else None,
+            "statuses": self.statuses,
+        }
+
+
+# ==================== 执行 ====================
+
+async def wait_ready(client, timeout: float):
+    """等待 /ready 返回 200（Schema 索引上线前为 503），并提示数据库为空的情况"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            response = await client.get("/ready")
+            if response.status_code == 200:
+                break
+            reason = response.text[:200]
+        except httpx.HTTPError as e:
+            reason = f"{type(e).__name__}: {e}"
+        if time.monotonic() >= deadline:
+            raise SystemExit(f"❌ 服务未就绪（{client.base_url}）: {reason}")
+        await asyncio.sleep(1.0)
+    response = await client.get("/statistics")
+    if response.status_code == 200 and not response.json().get("total_nodes"):
+        logger.warning("⚠️  数据库为空，分析接口只会返回空结果；先导入与 --data / --rows 参数相同的数据集")
+
+
+async def run_load(args: argparse.Namespace, ctx: Context, mix: Dict[str, float]) -> Dict:
+    names = [name for name, weight in mix.items() if weight > 0]
+    cum_weights = list(np.cumsum([mix[name] for name in names]))
+    stats = {name: EndpointStats(SCENARIOS[name].endpoint) for name in names}
+    ramp_stats = EndpointStats("ramp-up")
+    state = {"sent": 0}
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        await wait_ready(client, args.ready_timeout)
+
+        started = time.perf_counter()
+        measure_from = started + args.ramp_up
+        deadline = measure_from + args.duration if args.duration else None
+
+        def done() -> bool:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return True
+            return args.requests is not None and state["sent"] >= args.requests
+
+        async def user(index: int):
+            rng = random.Random(args.seed * 100_003 + index)
+            await asyncio.sleep(args.ramp_up * index / args.concurrency)
+            while not done():
+                name = rng.choices(names, cum_weights=cum_weights)[0]
+                method, url, kwargs = SCENARIOS[name].build(ctx, rng)
+                state["sent"] += 1
+                sent_at = time.perf_counter()
+                try:
+                    response = await client.request(method, url, **kwargs)
+                    status, ok = str(response.status_code), response.status_code < 400
+                except httpx.HTTPError as e:
+                    response, status, ok = None, type(e).__name__, False
+                elapsed = time.perf_counter() - sent_at
+                (stats[name] if sent_at >= measure_from else ramp_stats).record(elapsed, status, ok)
+                if name == "upload" and ok:
+                    ctx.job_ids.append(response.json().get("id"))
+                if args.think_time:
+                    await asyncio.sleep(rng.expovariate(1.0 / args.think_time))
+
+        logger.info(f"🔍 {args.concurrency} users against {args.base_url}, ramp-up {args.ramp_up}s, "
+                    f"{f'{args.duration}s' if args.duration else f'{args.requests} requests'}")
+        await asyncio.gather(*(user(i) for i in range(args.concurrency)))
+        elapsed = max(0.0, time.perf_counter() - max(measure_from, started))
+
+        jobs = await upload_job_statuses(client, ctx.job_ids)
+
+    endpoints = [stats[name].summary(name, elapsed) for name in names]
+    total = EndpointStats("total")
+    for s in stats.values():
+        total.latencies += s.latencies
+        total.errors += s.errors
+    return {
+        "measured_seconds": round(elapsed, 3),
+        "ramp_up_requests": len(ramp_stats.latencies),
+        "endpoints": endpoints,
+        "total": {k: v for k, v in total.summary("total", elapsed).items() if k not in ("scenario", "statuses")},
+        "upload_jobs": jobs,
+    }
+
+
+async def upload_job_statuses(client, job_ids: List[str]) -> Dict[str, int]:
+    """压测结束时上传任务的状态分布（任务在后台执行，不计入延迟）"""
+    counts: Dict[str, int] = {}
+    for job_id in job_ids:
+        try:
+            response = await client.get(f"/ingest/jobs/{job_id}")
+            status = response.json().get("status", "unknown") if response.status_code == 200 else "missing"
+        except httpx.HTTPError:
+            status = "unreachable"
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def spawn_server(args: argparse.Namespace) -> subprocess.Popen:
+    """在本机启动服务（uvicorn，关闭自动重载），--base-url 指向它"""
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+               "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"]
+    args.base_url = f"http://127.0.0.1:{args.port}"
+    logger.info(f"📦 Starting {' '.join(command[2:])}")
+    return subprocess.Popen(command, cwd=Path(__file__).resolve().parent.parent)
+
+
+def print_report(report: Dict):
+    header = f"{'endpoint':<40} {'reqs':>7} {'err%':>6} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"
+    print(header)
+    print("-" * len(header))
+
+    def ms(value):
+        return f"{value:.1f}" if value is not None else "-"
+
+    for row in report["endpoints"] + [dict(report["total"], endpoint="total")]:
+        print(f"{row['endpoint']:<40} {row['requests']:>7} {row['error_rate'] * 100:>6.2f} "
+              f"{row['throughput_rps'] or 0:>8.2f} {ms(row['p50_ms']):>9} {ms(row['p95_ms']):>9} "
+              f"{ms(row['p99_ms']):>9} {ms(row['max_ms']):>9}")
+    if report["upload_jobs"]:
+        print(f"upload jobs: {report['upload_jobs']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadgen", description="接口压测（加权请求组合）")
+    add_spec_arguments(parser)
+    parser.add_argument("--data", help="已导入的数据集目录（读取 dataset.json 中的参数，覆盖 --rows 等参数）")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--spawn", action="store_true", help="在本机启动 uvicorn 服务后压测，结束时关闭")
+    parser.add_argument("--port", type=int, default=8765, help="--spawn：服务端口")
+    parser.add_argument("--workers", type=int, default=1, help="--spawn：uvicorn 进程数")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发用户数")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="在多少秒内逐步启动全部用户（这段时间不计入统计）")
+    parser.add_argument("--duration", type=float, default=60.0, help="全部用户启动后的压测时长（秒），0 表示按 --requests")
+    parser.add_argument("--requests", type=int, default=None, help="发送的请求总数上限")
+    parser.add_argument("--think-time", type=float, default=0.0, help="用户两次请求之间的平均思考时间（秒，指数分布）")
+    parser.add_argument("--mix", type=parse_mix, default=None,
+                        help=f"请求组合，如 target=80,auto_collision=5,upload=2（默认 {DEFAULT_MIX}）")
+    parser.add_argument("--targets", type=int, default=1000, help="目标号码池大小（活跃度最高的号码）")
+    parser.add_argument("--batch-size", type=int, default=200, help="批量目标分析每次提交的号码数")
+    parser.add_argument("--upload-rows", type=int, default=1000, help="每个上传文件的话单行数")
+    parser.add_argument("--upload-pool", type=int, default=20, help="预先生成的不同上传文件数")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单个请求的超时时间（秒）")
+    parser.add_argument("--ready-timeout", type=float, default=60.0, help="等待服务就绪的时间（秒）")
+    parser.add_argument("--output", help="结果文件，默认 benchmarks/results/load-<并发数>-<提交>.json")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if httpx is None:
+        raise SystemExit("❌ 压测需要 httpx：pip install httpx")
+    if not args.duration and args.requests is None:
+        parser.error("--duration 为 0 时需要指定 --requests")
+
+    if args.data:
+        info = json.loads((Path(args.data) / "dataset.json").read_text(encoding="utf-8"))
+        spec = DatasetSpec(**info["spec"])
+    else:
+        spec = spec_from_args(args)
+    mix = args.mix or DEFAULT_MIX
+    ctx = Context(spec, args.targets, args.batch_size)
+    if mix.get("upload"):
+        ctx.prepare_uploads(args.upload_pool, args.upload_rows)
+
+    server = spawn_server(args) if args.spawn else None
+    try:
+        result = asyncio.run(run_load(args, ctx, mix))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = {
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "ramp_up": args.ramp_up,
+        "duration": args.duration,
+        "requests": args.requests,
+        "think_time": args.think_time,
+        "mix": mix,
+        "spec": asdict(ctx.spec),
+        "environment": environment(),
+        **result,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"load-{args.concurrency}-{(report['environment']['commit'] or 'nogit')[:8]}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    print_report(report)
+    logger.info(f"✅ Load test report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ API 测试脚本
 """
 import requests
 import json
+import time
 
 # API 基础地址
 BASE_URL = "http://localhost:8000"
@@ -37,7 +38,13 @@ def test_upload_csv():
         response = requests.post(url, files=files, data=data)
     
     print(f"状态码: {response.status_code}")
-    print(f"返回结果: {json.dumps(response.json(), indent=2, ensure_ascii=False)}")
+    job = response.json()
+    
+    # 上传后在后台导入，轮询任务直到结束
+    while job.get("status") in ("queued", "running"):
+        time.sleep(1)
+        job = requests.get(f"{BASE_URL}/ingest/jobs/{job['id']}").json()
+    print(f"返回结果: {json.dumps(job, indent=2, ensure_ascii=False)}")
 
 
 def test_common_contacts():
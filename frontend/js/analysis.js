@@ -383,7 +383,8 @@ const analysisModule = {
     const container = document.getElementById('path-result');
     if (!container) return;
 
-    if (!result.path || result.path.length === 0) {
+    const path = result.path_nodes || [];
+    if (path.length === 0) {
       container.innerHTML = `
         <div class="empty-state">
           <i class="fas fa-route"></i>
@@ -394,15 +395,15 @@ const analysisModule = {
       return;
     }
 
-    const pathStr = result.path.join(' → ');
+    const pathStr = path.join(' → ');
     container.innerHTML = `
       <div class="result-header">
-        <span class="badge badge-primary">路径长度: ${result.path.length - 1}</span>
+        <span class="badge badge-primary">路径长度: ${result.hops}</span>
       </div>
       <div class="path-display">
         <p style="font-size: 1.1rem; word-break: break-all;">${utils.escapeHtml(pathStr)}</p>
       </div>
-      <button class="btn btn-secondary" onclick="analysisModule.highlightPathOnGraph('${result.path.join(',')}')">
+      <button class="btn btn-secondary" onclick="analysisModule.highlightPathOnGraph('${path.join(',')}')">
         <i class="fas fa-eye"></i> 在图谱中显示
       </button>
     `;
@@ -64,6 +64,16 @@ const api = {
         return this.request(`/analysis/target/${encodeURIComponent(targetNumber)}`);
     },
 
+    /**
+     * 批量目标分析（多个号码一次提交）
+     */
+    async analyzeTargets(targetNumbers) {
+        return this.request('/analysis/targets', {
+            method: 'POST',
+            body: JSON.stringify({ targets: targetNumbers })
+        });
+    },
+
     // ==================== 数据导入接口 ====================
 
     /**
@@ -87,14 +97,14 @@ const api = {
     },
 
     /**
-     * 上传 Excel 文件
+     * 上传文件并等待后台导入任务完成
      */
-    async uploadExcel(file, dataType = 'cdr') {
+    async uploadFile(endpoint, file, dataType, onProgress) {
         const formData = new FormData();
         formData.append('file', file);
         formData.append('data_type', dataType);
 
-        const url = `${API_BASE}/ingest/upload/excel`;
+        const url = `${API_BASE}${endpoint}`;
         const response = await fetch(url, {
             method: 'POST',
             body: formData
@@ -105,29 +115,56 @@ const api = {
             throw new Error(error.detail || `HTTP ${response.status}`);
         }
 
-        return response.json();
+        const job = await response.json();
+        return this.waitForJob(job.id, onProgress);
+    },
+
+    /**
+     * 上传 Excel 文件
+     */
+    async uploadExcel(file, dataType = 'cdr', onProgress = null) {
+        return this.uploadFile('/ingest/upload/excel', file, dataType, onProgress);
     },
 
     /**
      * 上传 CSV 文件
      */
-    async uploadCSV(file, dataType = 'cdr') {
-        const formData = new FormData();
-        formData.append('file', file);
-        formData.append('data_type', dataType);
+    async uploadCSV(file, dataType = 'cdr', onProgress = null) {
+        return this.uploadFile('/ingest/upload/csv', file, dataType, onProgress);
+    },
 
-        const url = `${API_BASE}/ingest/upload/csv`;
-        const response = await fetch(url, {
-            method: 'POST',
-            body: formData
+    /**
+     * 查询导入任务
+     */
+    async getJob(jobId) {
+        return this.request(`/ingest/jobs/${encodeURIComponent(jobId)}`);
+    },
+
+    /**
+     * 取消导入任务
+     */
+    async cancelJob(jobId) {
+        return this.request(`/ingest/jobs/${encodeURIComponent(jobId)}/cancel`, {
+            method: 'POST'
         });
+    },
 
-        if (!response.ok) {
-            const error = await response.json().catch(() => ({}));
-            throw new Error(error.detail || `HTTP ${response.status}`);
-        }
+    /**
+     * 轮询导入任务直到结束，返回导入结果
+     */
+    async waitForJob(jobId, onProgress = null, intervalMs = 1000) {
+        while (true) {
+            const job = await this.getJob(jobId);
+            if (onProgress) onProgress(job);
 
-        return response.json();
+            if (job.status === 'succeeded') {
+                return job.result || {};
+            }
+            if (['failed', 'cancelled', 'interrupted'].includes(job.status)) {
+                throw new Error(job.error || `导入任务 ${job.status}`);
+            }
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
     },
 
     /**
@@ -182,10 +219,11 @@ const api = {
     /**
      * 中心节点分析
      */
-    async centralNodes(nodeType = 'Phone', topN = 10) {
+    async centralNodes(nodeType = 'Phone', topN = 10, metric = 'degree') {
         const params = new URLSearchParams({
             node_type: nodeType,
-            top_n: topN
+            top_n: topN,
+            metric: metric
         });
         return this.request(`/analysis/central-nodes?${params}`);
     },
@@ -193,10 +231,11 @@ const api = {
     /**
      * 社区发现
      */
-    async communities(nodeType = 'Phone', minSize = 3) {
+    async communities(nodeType = 'Phone', minSize = 3, algorithm = 'louvain') {
         const params = new URLSearchParams({
             node_type: nodeType,
-            min_size: minSize
+            min_size: minSize,
+            algorithm: algorithm
         });
         return this.request(`/analysis/communities?${params}`);
     },
@@ -215,6 +254,50 @@ const api = {
         });
     },
 
+    /**
+     * 网络扩展（NDJSON 流式），每扩展完一层回调一次 onEvent
+     */
+    async expandNetworkStream(targetId, depth = 2, nodeType = 'Phone', onEvent = null) {
+        const response = await fetch(`${API_BASE}/analysis/expand-network/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                target_id: targetId,
+                depth: depth,
+                node_type: nodeType
+            })
+        });
+
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.detail || `HTTP ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let summary = null;
+
+        const handleLine = (line) => {
+            if (!line.trim()) return;
+            const event = JSON.parse(line);
+            if (event.type === 'error') throw new Error(event.detail);
+            if (event.type === 'done') summary = event;
+            if (onEvent) onEvent(event);
+        };
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffer);
+        return summary;
+    },
+
     /**
      * 通话模式分析
      */
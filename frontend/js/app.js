@@ -122,11 +122,22 @@ const app = {
         try {
             this.showLoading(`正在上传 ${file.name}...`);
 
+            // 后台导入任务进度
+            const onProgress = (job) => {
+                if (job.status === 'queued') {
+                    this.showLoading(`${file.name} 排队中...`);
+                } else if (job.status === 'running') {
+                    const progress = job.progress != null ? ` ${job.progress}%` : '';
+                    const eta = job.eta_seconds != null ? `，预计剩余 ${Math.ceil(job.eta_seconds)} 秒` : '';
+                    this.showLoading(`正在导入 ${file.name}${progress}（已写入 ${job.rows_written} 行${eta}）`);
+                }
+            };
+
             let result;
             if (ext === 'csv') {
-                result = await api.uploadCSV(file, dataType);
+                result = await api.uploadCSV(file, dataType, onProgress);
             } else {
-                result = await api.uploadExcel(file, dataType);
+                result = await api.uploadExcel(file, dataType, onProgress);
             }
 
             this.hideLoading();
@@ -190,36 +190,18 @@ const graphModule = {
     },
 
     /**
-     * 加载网络数据
+     * 加载网络数据（流式：每扩展完一层立即渲染）
      */
     async loadNetworkData(targetId, depth = 2, nodeType = 'Phone') {
         try {
             this.clear();
             app.showLoading('加载网络数据...');
 
-            const result = await api.expandNetwork(targetId, depth, nodeType);
-
-            if (result.nodes && result.nodes.length > 0) {
-                const newNodes = result.nodes.map(node => ({
-                    id: node.id || node.number || node.wxid,
-                    label: node.id || node.number || node.wxid,
-                    title: `${node.type || nodeType}: ${node.id || node.number || node.wxid}`,
-                    color: this.getNodeColor(node.type || nodeType),
-                    nodeType: node.type || nodeType
-                }));
-                this.nodes.add(newNodes);
-            }
-
-            if (result.relationships && result.relationships.length > 0) {
-                const newEdges = result.relationships.map(rel => ({
-                    from: rel.source || rel.from,
-                    to: rel.target || rel.to,
-                    label: rel.type || '',
-                    title: rel.type || '',
-                    properties: { count: rel.count, duration: rel.total_duration }
-                }));
-                this.edges.add(newEdges);
-            }
+            const summary = await api.expandNetworkStream(targetId, depth, nodeType, (event) => {
+                if (event.type !== 'level') return;
+                this.addLevel(event, nodeType);
+                app.showLoading(`已加载第 ${event.level} 层，共 ${this.nodes.length} 个节点...`);
+            });
 
             // 如果没有数据从expandNetwork，尝试从统计接口构建
             if (this.nodes.length === 0) {
@@ -228,7 +210,10 @@ const graphModule = {
 
             this.fit();
             app.hideLoading();
-            app.showToast(`已加载 ${this.nodes.length} 个节点`, 'success');
+            let message = `已加载 ${this.nodes.length} 个节点`;
+            if (summary && summary.collapsed > 0) message += `，${summary.collapsed} 个枢纽节点未展开`;
+            if (summary && summary.truncated) message += '（结果已截断）';
+            app.showToast(message, 'success');
 
         } catch (error) {
             app.hideLoading();
@@ -236,6 +221,42 @@ const graphModule = {
         }
     },
 
+    /**
+     * 添加一层扩展结果（枢纽节点以虚线边框标出）
+     */
+    addLevel(event, nodeType = 'Phone') {
+        if (event.nodes && event.nodes.length > 0) {
+            const newNodes = event.nodes.map(node => {
+                const type = node.type || nodeType;
+                const item = {
+                    id: node.id,
+                    label: node.id,
+                    title: `${type}: ${node.id}`,
+                    color: this.getNodeColor(type),
+                    nodeType: type
+                };
+                if (node.collapsed) {
+                    item.title += `\n枢纽节点：${node.degree} 条关系，未展开`;
+                    item.borderWidth = 3;
+                    item.shapeProperties = { borderDashes: [4, 4] };
+                }
+                return item;
+            });
+            this.nodes.add(newNodes);
+        }
+
+        if (event.relationships && event.relationships.length > 0) {
+            const newEdges = event.relationships.map(rel => ({
+                from: rel.source,
+                to: rel.target,
+                label: rel.type || '',
+                title: rel.type || '',
+                properties: { count: rel.count, duration: rel.total_duration }
+            }));
+            this.edges.add(newEdges);
+        }
+    },
+
     /**
      * 从统计数据构建图谱（备用方案）
      */
@@ -0,0 +1,61 @@
+"""测试公用 fixture：直接用数组构造小型图投影"""
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pytest
+
+from app.services import graph_projection
+from app.services.graph_projection import EDGE_TYPES, LABELS, GraphProjection
+
+
+def _build_projection(n: int, edges: Sequence[Tuple[int, int]], label: str = "Phone",
+                      rel_type: str = "CALL", weights: Optional[Sequence[float]] = None) -> GraphProjection:
+    """节点主键为 "0".."n-1"，全部为同一标签，边为同一关系类型"""
+    pairs = np.array(edges, dtype=np.int64).reshape(-1, 2)
+    m = len(pairs)
+    return GraphProjection(
+        version=1,
+        keys=np.array([str(i) for i in range(n)], dtype=object),
+        labels=np.full(n, LABELS.index(label), dtype=np.int8),
+        src=pairs[:, 0].copy(),
+        dst=pairs[:, 1].copy(),
+        etype=np.full(m, EDGE_TYPES.index(rel_type), dtype=np.int8),
+        weight=np.ones(m) if weights is None else np.array(weights, dtype=float),
+        duration=np.zeros(m),
+    )
+
+
+def _clique(nodes: Sequence[int]):
+    return [(a, b) for i, a in enumerate(nodes) for b in nodes[i + 1:]]
+
+
+@pytest.fixture
+def make_projection():
+    return _build_projection
+
+
+@pytest.fixture
+def use_projection(monkeypatch):
+    """把给定投影作为最新快照，分析入口直接走内存投影"""
+    def use(projection):
+        monkeypatch.setattr(graph_projection, "fresh_projection", lambda: projection)
+        return projection
+    return use
+
+
+@pytest.fixture
+def path5():
+    """路径图 0-1-2-3-4"""
+    return _build_projection(5, [(i, i + 1) for i in range(4)])
+
+
+@pytest.fixture
+def star():
+    """星形图：0 为中心，1-4 为叶子"""
+    return _build_projection(5, [(0, i) for i in range(1, 5)])
+
+
+@pytest.fixture
+def barbell():
+    """两个 4 节点完全图（0-3、4-7），由 3-4 一条桥连接"""
+    return _build_projection(8, _clique([0, 1, 2, 3]) + _clique([4, 5, 6, 7]) + [(3, 4)])
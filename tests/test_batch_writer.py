@@ -0,0 +1,141 @@
+"""批量写入引擎：切分、分区与瞬时错误重试（用假会话代替 Neo4j）"""
+import threading
+from contextlib import contextmanager
+
+import pytest
+from neo4j.exceptions import ClientError, TransientError
+
+from app.config import settings
+from app.services import batch_writer
+from app.services.batch_writer import BatchWriter, iter_chunks, partition_of
+
+
+class FakeNeo4j:
+    """记录每个提交的批次；failures 中的异常按顺序在 execute_write 时抛出"""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.committed = []
+        self.attempts = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def get_session(self):
+        yield self
+
+    def execute_write(self, work):
+        with self._lock:
+            self.attempts += 1
+            if self.failures:
+                raise self.failures.pop(0)
+        tx = []
+        work(tx)
+        with self._lock:
+            self.committed.append((threading.current_thread().name, tx))
+
+
+@pytest.fixture
+def neo4j(monkeypatch):
+    def install(failures=()):
+        fake = FakeNeo4j(failures)
+        monkeypatch.setattr(batch_writer.db, "get_session", fake.get_session)
+        return fake
+    monkeypatch.setattr(batch_writer, "run_instrumented", lambda tx, query, params: tx.append((query, params["batch"])))
+    monkeypatch.setattr(settings, "INGEST_RETRY_BACKOFF", 0)
+    return install
+
+
+def rows(n):
+    return [{"caller": f"1380000{i % 7:04d}", "callee": f"1390000{i % 5:04d}", "seq": i} for i in range(n)]
+
+
+def test_iter_chunks_is_lazy_and_keeps_remainder():
+    consumed = []
+
+    def source():
+        for i in range(7):
+            consumed.append(i)
+            yield i
+
+    chunks = iter_chunks(source(), 3)
+    assert next(chunks) == [0, 1, 2]
+    assert consumed == [0, 1, 2]
+    assert list(chunks) == [[3, 4, 5], [6]]
+    assert list(iter_chunks([], 3)) == []
+
+
+def test_partition_of_is_stable():
+    assert partition_of(("13800000001", "13900000001"), 4) == partition_of(("13800000001", "13900000001"), 4)
+    assert {partition_of((str(i), None), 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_sequential_write_runs_every_query_per_chunk(neo4j):
+    fake = neo4j()
+    committed = []
+    report = BatchWriter(["Q1", "Q2"], batch_size=4, workers=1, on_commit=committed.append).write(rows(10))
+
+    assert [len(tx) for _, tx in fake.committed] == [2, 2, 2]
+    assert [[query for query, _ in tx] for _, tx in fake.committed] == [["Q1", "Q2"]] * 3
+    assert [len(batch) for batch in committed] == [4, 4, 2]
+    assert (report.rows, len(report.chunks), report.retries) == (10, 3, 0)
+
+
+def test_partitioned_write_never_splits_a_pair_across_workers(neo4j):
+    fake = neo4j()
+    report = BatchWriter("Q", batch_size=3, workers=3,
+                         partition_key=lambda row: (row["caller"], row["callee"])).write(rows(200))
+
+    owner = {}
+    for thread, tx in fake.committed:
+        for row in tx[0][1]:
+            assert owner.setdefault((row["caller"], row["callee"]), thread) == thread
+    assert len(set(owner.values())) > 1
+    assert sorted(row["seq"] for _, tx in fake.committed for row in tx[0][1]) == list(range(200))
+    assert report.rows == 200
+    # 每个批次只含同一分区的行
+    for _, tx in fake.committed:
+        assert len({partition_of((r["caller"], r["callee"]), 3) for r in tx[0][1]}) == 1
+
+
+def test_transient_error_is_retried(neo4j):
+    fake = neo4j([TransientError("deadlock"), TransientError("lock timeout")])
+    report = BatchWriter("Q", batch_size=5, workers=1, max_retries=3).write(rows(5))
+
+    assert fake.attempts == 3
+    assert len(fake.committed) == 1
+    assert report.retries == 2
+    assert report.chunks[0].retries == 2
+
+
+def test_retries_are_bounded(neo4j):
+    fake = neo4j([TransientError("deadlock")] * 3)
+    committed = []
+
+    with pytest.raises(TransientError):
+        BatchWriter("Q", batch_size=5, workers=1, max_retries=2, on_commit=committed.append).write(rows(5))
+    assert fake.attempts == 3
+    assert committed == []
+
+
+def test_client_error_is_not_retried(neo4j):
+    fake = neo4j([ClientError("syntax error")])
+
+    with pytest.raises(ClientError):
+        BatchWriter("Q", batch_size=5, workers=1, max_retries=3).write(rows(5))
+    assert fake.attempts == 1
+
+
+def test_parallel_failure_stops_the_write(neo4j):
+    fake = neo4j([ClientError("constraint violation")])
+
+    with pytest.raises(ClientError):
+        BatchWriter("Q", batch_size=2, workers=2, partition_key=lambda row: (row["caller"],)).write(rows(100))
+    assert sum(len(tx[0][1]) for _, tx in fake.committed) < 100
+
+
+def test_report_includes_chunk_stats_on_request(neo4j):
+    neo4j()
+    report = BatchWriter("Q", batch_size=4, workers=1).write(rows(6))
+
+    assert "chunk_stats" not in report.to_dict()
+    assert [c["rows"] for c in report.to_dict(include_chunks=True)["chunk_stats"]] == [4, 2]
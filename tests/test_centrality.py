@@ -0,0 +1,79 @@
+"""中心性：在手工构造的小图上与手算值比对"""
+import pytest
+
+from app.services import centrality
+
+
+def test_pagerank_of_star_matches_closed_form(star):
+    # 中心 c = 0.15/5 + 0.85 * 4l，叶子 l = 0.15/5 + 0.85 * c/4，且 c + 4l = 1
+    center = 0.132 / 0.2775
+    rank = centrality.pagerank(star, tol=1e-12)
+
+    assert rank[0] == pytest.approx(center, abs=1e-6)
+    assert rank[1:] == pytest.approx([(1 - center) / 4] * 4, abs=1e-6)
+
+
+def test_pagerank_spreads_isolated_node_rank_over_graph(make_projection):
+    # 节点 2 孤立：r = 0.15/3 + 0.85 * r/3
+    rank = centrality.pagerank(make_projection(3, [(0, 1)]), tol=1e-12)
+
+    assert rank.sum() == pytest.approx(1.0)
+    assert rank[2] == pytest.approx(0.05 / (1 - 0.85 / 3), abs=1e-6)
+    assert rank[0] == pytest.approx(rank[1])
+
+
+def test_pagerank_is_symmetric_on_path(path5):
+    rank = centrality.pagerank(path5)
+
+    assert rank[0] == pytest.approx(rank[4])
+    assert rank[1] == pytest.approx(rank[3])
+    assert rank[0] < rank[1]
+
+
+def test_betweenness_on_path(path5):
+    # 节点 1 位于 (0,2)(0,3)(0,4) 之间，节点 2 位于 (0,3)(0,4)(1,3)(1,4) 之间
+    assert centrality.betweenness(path5, samples=5) == pytest.approx([0, 3, 4, 3, 0])
+
+
+def test_betweenness_of_star_center(star):
+    assert centrality.betweenness(star, samples=5) == pytest.approx([6, 0, 0, 0, 0])
+
+
+def test_betweenness_of_bridge_endpoints(barbell):
+    # 每个桥端点位于另一侧团内 3 个节点与本侧 4 个节点之间：3 * 4 = 12
+    assert centrality.betweenness(barbell, samples=8) == pytest.approx([0, 0, 0, 12, 12, 0, 0, 0])
+
+
+def test_betweenness_splits_between_equal_shortest_paths(make_projection):
+    # 环 0-1-2-3-0：0 与 2 之间有两条最短路径，1 和 3 各得一半；1 与 3 之间同理
+    scores = centrality.betweenness(make_projection(4, [(0, 1), (1, 2), (2, 3), (3, 0)]), samples=4)
+
+    assert scores == pytest.approx([0.5, 0.5, 0.5, 0.5])
+
+
+def test_betweenness_of_disconnected_pairs_is_zero(make_projection):
+    scores = centrality.betweenness(make_projection(4, [(0, 1), (2, 3)]), samples=4)
+
+    assert not scores.any()
+
+
+def test_top_nodes_ranks_star_center_first(star):
+    top = centrality.top_nodes("Phone", top_n=2, metric="degree", projection=star)
+
+    assert len(top) == 2
+    assert top[0]["node_id"] == "0"
+    assert top[0]["degree"] == 4
+    assert top[0]["centrality_score"] == pytest.approx(1.0)
+    assert top[0]["betweenness"] == pytest.approx(6)
+
+
+def test_top_nodes_rejects_unknown_metric(star):
+    with pytest.raises(ValueError):
+        centrality.top_nodes(metric="closeness", projection=star)
+
+
+def test_top_nodes_skips_isolated_nodes(make_projection):
+    top = centrality.top_nodes("Phone", top_n=10, projection=make_projection(3, [(0, 1)]))
+
+    assert sorted(row["node_id"] for row in top) == ["0", "1"]
+    assert [row["degree"] for row in top] == [1, 1]
@@ -0,0 +1,83 @@
+"""社区发现：Louvain 与标签传播在小图上的划分结果"""
+import numpy as np
+import pytest
+
+from app.services import community
+
+
+def groups(labels):
+    """社区划分 -> 与编号无关的节点集合"""
+    return {frozenset(np.flatnonzero(labels == c).tolist()) for c in np.unique(labels)}
+
+
+BARBELL_GROUPS = {frozenset({0, 1, 2, 3}), frozenset({4, 5, 6, 7})}
+
+
+def test_weighted_adjacency_merges_parallel_edges_and_drops_self_loops(make_projection):
+    projection = make_projection(3, [(0, 1), (1, 0), (1, 1), (1, 2)], weights=[2, 3, 7, 1])
+    indptr, indices, weights = community.weighted_adjacency(projection)
+
+    assert indptr.tolist() == [0, 1, 3, 4]
+    assert indices.tolist() == [1, 0, 2, 1]
+    assert weights.tolist() == [5, 5, 1, 1]
+
+    _, _, unweighted = community.weighted_adjacency(projection, weighted=False)
+    assert unweighted.tolist() == [1, 1, 1, 1]
+
+
+def test_modularity_of_barbell_split(barbell):
+    indptr, indices, weights = community.weighted_adjacency(barbell)
+    labels = np.array([0, 0, 0, 0, 1, 1, 1, 1])
+
+    # 13 条边：每侧内部 6 条，强度 3+3+3+4 = 13；Q = 12/13 - 2 * (13/26)^2
+    assert community.modularity(labels, indptr, indices, weights) == pytest.approx(12 / 13 - 0.5)
+    assert community.modularity(np.zeros(8, dtype=int), indptr, indices, weights) == pytest.approx(0.0)
+
+
+@pytest.mark.parametrize("algorithm", community.ALGORITHMS)
+def test_barbell_splits_at_bridge(barbell, algorithm):
+    result = community.detect(barbell, algorithm=algorithm)
+
+    assert groups(result["labels"]) == BARBELL_GROUPS
+    assert result["modularity"] == pytest.approx(12 / 13 - 0.5)
+
+
+@pytest.mark.parametrize("algorithm", community.ALGORITHMS)
+def test_disconnected_pairs_form_separate_communities(make_projection, algorithm):
+    result = community.detect(make_projection(4, [(0, 1), (2, 3)]), algorithm=algorithm)
+
+    assert groups(result["labels"]) == {frozenset({0, 1}), frozenset({2, 3})}
+
+
+def test_louvain_keeps_path_communities_connected(path5):
+    indptr, indices, weights = community.weighted_adjacency(path5)
+    labels = community.split_disconnected(community.louvain(indptr, indices, weights), indptr, indices)
+
+    for members in groups(labels):
+        members = sorted(members)
+        assert members == list(range(members[0], members[-1] + 1))
+
+
+def test_split_disconnected_separates_components_sharing_a_label(make_projection):
+    indptr, indices, _ = community.weighted_adjacency(make_projection(4, [(0, 1), (2, 3)]))
+    labels = community.split_disconnected(np.zeros(4, dtype=int), indptr, indices)
+
+    assert groups(labels) == {frozenset({0, 1}), frozenset({2, 3})}
+
+
+def test_louvain_without_edges_keeps_singletons(make_projection):
+    indptr, indices, weights = community.weighted_adjacency(make_projection(3, []))
+
+    assert community.louvain(indptr, indices, weights).tolist() == [0, 1, 2]
+
+
+def test_detect_caches_result_per_snapshot(barbell):
+    first = community.detect(barbell, algorithm="louvain")
+
+    assert community.detect(barbell, algorithm="louvain") is first
+    assert community.detect(barbell, algorithm="label_propagation") is not first
+
+
+def test_detect_rejects_unknown_algorithm(barbell):
+    with pytest.raises(ValueError):
+        community.detect(barbell, algorithm="girvan_newman")
@@ -0,0 +1,188 @@
+"""本地通话事件存储：按天分段写入、合并与时间范围扫描"""
+import threading
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+import pytest
+
+from app.config import settings
+from app.services import event_store
+from app.services.event_store import EventStore
+
+A, B, C = "13800000001", "13800000002", "13800000003"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EVENT_STORE_MAX_SEGMENTS", 100)
+    return EventStore(str(tmp_path / "events"))
+
+
+def at(text: str) -> datetime:
+    return datetime.fromisoformat(text)
+
+
+def times(events):
+    return [event["time"] for event in events]
+
+
+def test_append_writes_one_sorted_segment_per_day(store):
+    written = store.append(
+        [A, B, A, C],
+        [B, A, C, A],
+        ["2024-03-02 08:00:00", "2024-03-01 23:59:59", "not a time", "2024-03-01 00:00:00"],
+        [30, None, 10, 5],
+    )
+
+    assert written == 3
+    assert store.days() == [date(2024, 3, 1), date(2024, 3, 2)]
+    assert [len(store._segments(day)) for day in store.days()] == [1, 1]
+    assert list(store.scan()) == [
+        {"time": "2024-03-01T00:00:00", "caller": C, "callee": A, "duration": 5},
+        {"time": "2024-03-01T23:59:59", "caller": B, "callee": A, "duration": 0},
+        {"time": "2024-03-02T08:00:00", "caller": A, "callee": B, "duration": 30},
+    ]
+    assert store.stats()["events"] == 3
+
+
+def test_append_drops_timezone(store):
+    store.append([A], [B], [pd.Timestamp("2024-03-01 23:30:00+08:00")], [1])
+
+    assert times(store.scan()) == ["2024-03-01T23:30:00"]
+
+
+def test_each_append_adds_a_segment(store):
+    for hour in (9, 8, 10):
+        store.append([A], [B], [f"2024-03-01 {hour:02d}:00:00"], [1])
+
+    assert len(store._segments(date(2024, 3, 1))) == 3
+    assert times(store.scan()) == ["2024-03-01T08:00:00", "2024-03-01T09:00:00", "2024-03-01T10:00:00"]
+
+
+def test_scan_days_window_is_start_inclusive_end_exclusive(store):
+    store.append(
+        [A] * 5, [B] * 5,
+        ["2024-03-01 09:59:59", "2024-03-01 10:00:00", "2024-03-02 12:00:00",
+         "2024-03-03 07:59:59", "2024-03-03 08:00:00"],
+        [1] * 5,
+    )
+    days = list(store.scan_days(A, start=at("2024-03-01 10:00:00"), end=at("2024-03-03 08:00:00")))
+
+    assert [day for day, _ in days] == [date(2024, 3, 1), date(2024, 3, 2), date(2024, 3, 3)]
+    assert [columns["second"].tolist() for _, columns in days] == [[36000], [43200], [28799]]
+
+
+def test_scan_days_within_one_day(store):
+    store.append([A] * 3, [B] * 3, ["2024-03-01 08:00:00", "2024-03-01 12:00:00", "2024-03-01 18:00:00"], [1] * 3)
+    days = list(store.scan_days(start=at("2024-03-01 09:00:00"), end=at("2024-03-01 18:00:00")))
+
+    assert len(days) == 1
+    assert days[0][1]["second"].tolist() == [43200]
+
+
+def test_scan_filters_number_and_peer(store):
+    store.append([A, B, C], [B, C, A], ["2024-03-01 08:00:00", "2024-03-01 09:00:00", "2024-03-01 10:00:00"], [1] * 3)
+
+    events = list(store.scan(A))
+    assert [(e["caller"], e["callee"], e["direction"]) for e in events] == [(A, B, "outgoing"), (C, A, "incoming")]
+    assert [e["callee"] for e in store.scan(A, peer=C)] == [A]
+    assert times(store.scan(A, descending=True)) == ["2024-03-01T10:00:00", "2024-03-01T08:00:00"]
+    assert list(store.scan("13900000000")) == []
+
+
+def test_compact_merges_segments_and_keeps_events(store):
+    day = date(2024, 3, 1)
+    for minute in range(5):
+        store.append([A], [B], [f"2024-03-01 08:{minute:02d}:00"], [minute])
+
+    assert store.compact(day) == 5
+    assert len(store._segments(day)) == 1
+    assert [e["duration"] for e in store.scan()] == [0, 1, 2, 3, 4]
+    assert store.compact(day) == 1
+
+
+def test_append_compacts_when_day_exceeds_segment_limit(store, monkeypatch):
+    monkeypatch.setattr(settings, "EVENT_STORE_MAX_SEGMENTS", 2)
+    for minute in range(3):
+        store.append([A], [B], [f"2024-03-01 08:{minute:02d}:00"], [1])
+
+    assert len(store._segments(date(2024, 3, 1))) == 1
+    assert store.stats()["events"] == 3
+
+
+def test_compact_with_concurrent_appenders(store):
+    day = date(2024, 3, 1)
+    writers, per_writer = 4, 25
+    done = threading.Event()
+
+    def append(worker):
+        for i in range(per_writer):
+            second = worker * per_writer + i
+            store.append([A], [B], [datetime.combine(day, time()) + timedelta(seconds=second)], [second])
+
+    def compact():
+        while not done.is_set():
+            store.compact(day)
+
+    threads = [threading.Thread(target=append, args=(worker,)) for worker in range(writers)]
+    compactor = threading.Thread(target=compact)
+    compactor.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    compactor.join()
+
+    # 合并期间发布的段不会被删除，被合并的段也不会重复读取
+    expected = list(range(writers * per_writer))
+    assert [e["duration"] for e in store.scan()] == expected
+    store.compact(day)
+    assert [e["duration"] for e in store.scan()] == expected
+    stats = store.stats()
+    assert (stats["segments"], stats["events"]) == (1, len(expected))
+
+
+def test_call_pattern_window_starts_at_midnight(store):
+    start = datetime.combine(date.today() - timedelta(days=5), time())
+    store.append(
+        [A, B, A, A],
+        [B, A, C, B],
+        [start - timedelta(seconds=1), start, start + timedelta(days=1, hours=3), start + timedelta(days=2, hours=3)],
+        [400, 50, 70, 60],
+    )
+    rows = store.call_pattern(A, 5)
+
+    assert [row["contact_id"] for row in rows] == [B, C]
+    peer = rows[0]
+    assert peer["call_count"] == 2
+    assert peer["outgoing_calls"] == 1
+    assert peer["incoming_calls"] == 1
+    assert peer["total_duration"] == 110
+    assert peer["active_days"] == 2
+    assert peer["first_call_time"] == start.isoformat()
+    assert peer["last_call_time"] == (start + timedelta(days=2, hours=3)).isoformat()
+    assert peer["hours"][0] == 1 and peer["hours"][3] == 1 and sum(peer["hours"]) == 2
+    assert peer["weekdays"][start.weekday()] == 1
+    assert peer["avg_duration_category"] == "short"
+    assert rows[1]["avg_duration_category"] == "medium"
+
+
+def test_call_pattern_of_unknown_number(store):
+    assert store.call_pattern("13900000000", 30) == []
+
+
+def test_appender_buffers_committed_rows(store, monkeypatch):
+    monkeypatch.setattr(event_store, "store", store)
+    monkeypatch.setattr(settings, "EVENT_STORE_ENABLED", True)
+    monkeypatch.setattr(settings, "EVENT_STORE_FLUSH_ROWS", 3)
+    appender = event_store.Appender()
+    row = {"caller": A, "callee": B, "ts": at("2024-03-01 08:00:00"), "duration": 1}
+
+    appender.add([row, {**row, "ts": None}])
+    assert store.days() == []
+    appender.add([row, row])
+    assert store.stats()["events"] == 3
+    appender.add([row])
+    appender.flush()
+    assert store.stats()["events"] == 4
@@ -0,0 +1,108 @@
+"""网络扩展：内存投影上的逐层扩展、枢纽折叠与上限截断"""
+import pytest
+
+from app.config import settings
+from app.services import expansion
+from app.services.graph_projection import EDGE_TYPES
+
+
+def expand(target_id, **kwargs):
+    events = list(expansion.iter_expansion(target_id, **kwargs))
+    return [e for e in events if e["type"] == "level"], events[-1]
+
+
+def ids(level):
+    return sorted(node["id"] for node in level["nodes"])
+
+
+def test_levels_follow_path_graph(use_projection, path5):
+    use_projection(path5)
+    levels, summary = expand("0", depth=3, hub_degree=0)
+
+    assert [ids(level) for level in levels] == [["0"], ["1"], ["2"], ["3"]]
+    assert levels[1]["relationships"] == [
+        {"source": "0", "target": "1", "type": "CALL", "count": 1, "total_duration": 0}
+    ]
+    assert summary["engine"] == "projection"
+    assert summary["found"] is True
+    assert summary["truncated"] is False
+    assert summary["total_nodes"] == 4
+    assert summary["total_relationships"] == 3
+
+
+def test_relationships_inside_a_level_are_emitted_once(use_projection, barbell):
+    use_projection(barbell)
+    levels, summary = expand("0", depth=1, hub_degree=0)
+
+    # 0 的邻居 1、2、3 之间的边不在第一层的扩展范围内，只有与 0 相连的 3 条边
+    assert ids(levels[1]) == ["1", "2", "3"]
+    assert summary["total_relationships"] == 3
+
+
+def test_hub_is_shown_but_not_expanded(use_projection, make_projection):
+    # 5-1-0，0 是带 4 个叶子的枢纽
+    use_projection(make_projection(6, [(0, 1), (0, 2), (0, 3), (0, 4), (1, 5)]))
+    levels, summary = expand("5", depth=3, hub_degree=3)
+
+    assert [ids(level) for level in levels] == [["5"], ["1"], ["0"]]
+    assert levels[2]["nodes"][0]["collapsed"] is True
+    assert levels[2]["nodes"][0]["degree"] == 4
+    assert summary["collapsed"] == 1
+    assert summary["total_nodes"] == 3
+
+    levels, _ = expand("5", depth=3, hub_degree=0)
+    assert ids(levels[3]) == ["2", "3", "4"]
+
+
+def test_target_hub_is_still_expanded_once(use_projection, star):
+    use_projection(star)
+    levels, summary = expand("0", depth=2, hub_degree=3)
+
+    assert levels[0]["nodes"][0]["collapsed"] is True
+    assert ids(levels[1]) == ["1", "2", "3", "4"]
+    assert summary["collapsed"] == 1
+
+
+def test_per_level_limit_keeps_strongest_contacts(use_projection, make_projection):
+    use_projection(make_projection(5, [(0, 1), (0, 2), (0, 3), (0, 4)], weights=[1, 5, 3, 2]))
+    levels, summary = expand("0", depth=1, max_per_level=2, hub_degree=0)
+
+    assert ids(levels[1]) == ["2", "3"]
+    assert summary["truncated"] is True
+    # 只输出已接纳节点的关系
+    assert {(r["source"], r["target"]) for r in levels[1]["relationships"]} == {("0", "2"), ("0", "3")}
+
+
+def test_max_nodes_stops_expansion(use_projection, path5):
+    use_projection(path5)
+    levels, summary = expand("0", depth=4, max_nodes=3, hub_degree=0)
+
+    assert [ids(level) for level in levels] == [["0"], ["1"], ["2"]]
+    assert summary["total_nodes"] == 3
+
+
+def test_edge_limit_marks_result_truncated(use_projection, star, monkeypatch):
+    use_projection(star)
+    monkeypatch.setattr(settings, "EXPAND_MAX_EDGES_PER_LEVEL", 2)
+    levels, summary = expand("0", depth=1, hub_degree=0)
+
+    assert len(levels[1]["nodes"]) == 2
+    assert summary["truncated"] is True
+
+
+def test_unknown_target(use_projection, path5):
+    use_projection(path5)
+    levels, summary = expand("13800000000")
+
+    assert levels == []
+    assert summary["found"] is False
+    assert summary["total_nodes"] == 0
+
+
+@pytest.mark.parametrize("rel_types, expected", [(None, ["1", "2"]), (["CALL"], ["2"])])
+def test_rel_types_filter_neighbors(use_projection, make_projection, rel_types, expected):
+    projection = use_projection(make_projection(3, [(0, 1), (0, 2)]))
+    projection.etype[0] = EDGE_TYPES.index("FRIEND")
+    levels, _ = expand("0", depth=1, rel_types=rel_types, hub_degree=0)
+
+    assert ids(levels[1]) == expected
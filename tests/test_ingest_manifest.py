@@ -0,0 +1,157 @@
+"""导入清单：并发导入重叠文件、失败后重新导入"""
+import sqlite3
+import threading
+from contextlib import closing
+
+import pandas as pd
+import pytest
+
+from app.config import settings
+from app.services import ingest_manifest
+from app.services.ingest_manifest import ImportRecord
+
+
+@pytest.fixture(autouse=True)
+def manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MANIFEST_PATH", str(tmp_path / "manifest.sqlite3"))
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 1)
+    monkeypatch.setattr(ingest_manifest, "_ready", False)
+
+
+def calls(start: int, stop: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "caller": [f"138{i:08d}" for i in range(start, stop)],
+        "callee": "13900000000",
+        "duration": range(start, stop),
+    })
+
+
+def begin(name: str) -> ImportRecord:
+    return ImportRecord.begin(name, "cdr", f"{name}.csv", 0)
+
+
+def fingerprint_owners() -> pd.Series:
+    with closing(sqlite3.connect(settings.INGEST_MANIFEST_PATH)) as conn:
+        return pd.read_sql("SELECT fp FROM row_fingerprints", conn)["fp"].value_counts()
+
+
+def test_overlapping_import_skips_rows_of_running_import():
+    first, second = begin("a"), begin("b")
+    fresh, duplicates = first.filter(calls(0, 100))
+    assert (len(fresh), duplicates) == (100, 0)
+
+    # 第一个导入还没有提交任何批次，重叠的行也不再交给第二个导入写入
+    fresh, duplicates = second.filter(calls(50, 150))
+    assert (len(fresh), duplicates) == (50, 50)
+    assert fresh["duration"].min() == 100
+    assert (fingerprint_owners() == 1).all()
+
+
+def test_concurrent_filters_write_each_row_once():
+    records = [begin(f"job{i}") for i in range(4)]
+    written = []
+    lock = threading.Lock()
+
+    def run(record: ImportRecord):
+        for start in range(0, 400, 50):
+            fresh, _ = record.filter(calls(start, start + 50))
+            with lock:
+                written.extend(fresh["duration"])
+
+    threads = [threading.Thread(target=run, args=(record,)) for record in records]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(written) == list(range(400))
+    assert len(fingerprint_owners()) == 400
+
+
+def test_rows_of_failed_import_are_written_by_overlapping_import():
+    first, second = begin("a"), begin("b")
+    first.filter(calls(0, 100))
+    first.committed(30)
+    first.fail(100, "neo4j unavailable")
+
+    # 失败导入未提交的行不再视为已导入
+    fresh, duplicates = second.filter(calls(0, 100))
+    assert (len(fresh), duplicates) == (70, 30)
+    assert (fingerprint_owners() == 1).all()
+
+
+def test_retry_after_failure_writes_only_uncommitted_rows():
+    first = begin("a")
+    first.filter(calls(0, 60))
+    first.committed(20)
+    first.fail(60, "neo4j unavailable")
+
+    retry = begin("a")
+    fresh, duplicates = retry.filter(calls(0, 60))
+    assert (len(fresh), duplicates) == (40, 20)
+    assert fresh["duration"].tolist() == list(range(20, 60))
+    retry.finish(60)
+
+    fresh, duplicates = begin("a").filter(calls(0, 60))
+    assert (len(fresh), duplicates) == (0, 60)
+
+
+def test_interrupted_import_keeps_committed_rows():
+    first = begin("a")
+    first.filter(calls(0, 50))
+    first.committed(10)
+
+    ingest_manifest.start()
+
+    fresh, duplicates = begin("a").filter(calls(0, 50))
+    assert (len(fresh), duplicates) == (40, 10)
+
+
+def test_duplicate_rows_within_a_file_each_own_a_record():
+    record = begin("a")
+    frame = pd.concat([calls(0, 10), calls(0, 10)], ignore_index=True)
+    fresh, duplicates = record.filter(frame)
+    assert (len(fresh), duplicates) == (20, 0)
+    assert (fingerprint_owners() == 2).all()
+
+
+def test_registered_bulk_import_is_known_to_later_imports():
+    frame = calls(0, 40)
+    fps = ingest_manifest.fingerprints(frame, "cdr")
+    assert not ingest_manifest.known(fps).any()
+
+    ingest_manifest.register("bulk", "cdr", "bulk.csv", 0, fps[:30], rows_parsed=40, rows_duplicate=0)
+    assert ingest_manifest.known(fps).tolist() == [True] * 30 + [False] * 10
+    assert ingest_manifest.find_import("bulk", "cdr")["rows_new"] == 30
+
+    fresh, duplicates = begin("a").filter(frame)
+    assert (len(fresh), duplicates) == (10, 30)
+
+
+def test_parallel_retry_keeps_rows_of_committed_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 4)
+    first = begin("a")
+    fresh, _ = first.filter(calls(0, 60))
+    rows = first.tag(fresh.to_dict("records"))
+    # 并行写入时批次乱序提交：只有第 2、4 个批次提交后导入失败
+    first.committed_chunk(rows[10:20])
+    first.committed_chunk(rows[30:40])
+    first.committed(20)
+    first.fail(60, "neo4j unavailable")
+
+    fresh, duplicates = begin("a").filter(calls(0, 60))
+    assert (len(fresh), duplicates) == (40, 20)
+    assert set(fresh["duration"]) == set(range(0, 10)) | set(range(20, 30)) | set(range(40, 60))
+
+
+def test_upgrade_from_v2_adds_commit_flags(tmp_path):
+    with closing(sqlite3.connect(settings.INGEST_MANIFEST_PATH)) as conn, conn:
+        conn.executescript("""
+        CREATE TABLE row_fingerprints (import_id INTEGER NOT NULL, seq INTEGER NOT NULL, fp INTEGER NOT NULL,
+                                       PRIMARY KEY (import_id, seq)) WITHOUT ROWID;
+        INSERT INTO row_fingerprints VALUES (1, 0, 7);
+        PRAGMA user_version = 2;
+        """)
+    ingest_manifest.init_store()
+    with closing(sqlite3.connect(settings.INGEST_MANIFEST_PATH)) as conn:
+        assert conn.execute("SELECT import_id, seq, fp, committed FROM row_fingerprints").fetchall() == [(1, 0, 7, 0)]
@@ -0,0 +1,63 @@
+"""后台导入任务：取消与执行并发时的状态变更"""
+import pytest
+
+from app.config import settings
+from app.services import ingest_service, job_service
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    job_service.init_store()
+
+
+@pytest.fixture
+def upload(tmp_path, monkeypatch):
+    # 只登记任务，不提交到 worker 池，由测试直接调用 run_job
+    monkeypatch.setattr(job_service, "_get_executor", lambda: type("Idle", (), {"submit": lambda *args: None})())
+    path = tmp_path / "calls.csv"
+    path.write_text("caller,callee\n13800000001,13800000002\n", encoding="utf-8")
+    return path
+
+
+def submit(upload) -> str:
+    return job_service.submit_job(str(upload), "csv", "cdr", "calls.csv")["id"]
+
+
+def test_cancelled_queued_job_is_not_started(upload, monkeypatch):
+    job_id = submit(upload)
+    monkeypatch.setattr(ingest_service, "import_from_csv", lambda *args, **kwargs: pytest.fail("job was started"))
+
+    assert job_service.cancel_job(job_id)["status"] == job_service.CANCELLED
+    assert not upload.exists()
+    job_service.run_job(job_id)
+    assert job_service.get_job(job_id)["status"] == job_service.CANCELLED
+
+
+def test_cancel_after_last_batch_keeps_job_succeeded(upload, monkeypatch):
+    job_id = submit(upload)
+
+    def importer(*args, **kwargs):
+        # 最后一个批次已提交，取消请求在导入函数返回前到达
+        job_service.cancel_job(job_id)
+        return {"status": "success", "count": 1, "rows_parsed": 1, "rows_written": 1}
+
+    monkeypatch.setattr(ingest_service, "import_from_csv", importer)
+    job_service.run_job(job_id)
+    assert job_service.get_job(job_id)["status"] == job_service.SUCCEEDED
+    assert job_service.cancel_job(job_id)["status"] == job_service.SUCCEEDED
+    assert not upload.exists()
+
+
+def test_cancel_running_job_stops_after_current_batch(upload, monkeypatch):
+    job_id = submit(upload)
+
+    def importer(*args, progress=None, **kwargs):
+        job_service.cancel_job(job_id)
+        progress({"rows_parsed": 1, "rows_written": 1, "rows_rejected": 0})
+        pytest.fail("progress did not stop the import")
+
+    monkeypatch.setattr(ingest_service, "import_from_csv", importer)
+    job_service.run_job(job_id)
+    job = job_service.get_job(job_id)
+    assert (job["status"], job["rows_written"]) == (job_service.CANCELLED, 1)
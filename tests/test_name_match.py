@@ -0,0 +1,61 @@
+"""名称归一化与分词"""
+import pytest
+
+from app.config import settings
+from app.services import name_match
+
+
+@pytest.fixture(autouse=True)
+def no_pinyin(monkeypatch):
+    monkeypatch.setattr(settings, "NAME_MATCH_PINYIN", False)
+
+
+@pytest.mark.parametrize("text, key", [
+    ("Ｚhang San ", "zhangsan"),
+    ("张三-公司", "张三公司"),
+    ("ＡＢＣ１２３", "abc123"),
+    ("Straße", "strasse"),
+    ("张三😀", "张三"),
+    ("--", None),
+    ("", None),
+    (None, None),
+])
+def test_normalize_name_folds_width_and_case(text, key):
+    assert name_match.normalize_name(text) == key
+
+
+@pytest.mark.parametrize("text, tokens", [
+    # 全角、大小写折叠后按字母 / 数字片段切分
+    ("Ｚhang San", ["zhang", "san"]),
+    ("ＺＨＡＮＧ　ＳＡＮ", ["zhang", "san"]),
+    ("ＡＢＣ１２３", ["abc", "123"]),
+    # 不超过 2 个字的汉字片段整体成词，更长的切为相邻二字组
+    ("王", ["王"]),
+    ("张三", ["张三"]),
+    ("北京张三", ["北京", "京张", "张三"]),
+    ("张三-公司", ["张三", "公司"]),
+    # emoji、标点是分隔符，汉字与字母之间也切开
+    ("张三😀李四", ["张三", "李四"]),
+    ("ＺＨＡＮＧ三", ["zhang", "三"]),
+    # 单个字母丢弃，重复的词只保留一次
+    ("A b", []),
+    ("张三 张三", ["张三"]),
+])
+def test_name_tokens(text, tokens):
+    assert name_match.name_tokens(text) == tokens
+
+
+def test_full_and_half_width_names_share_tokens():
+    assert name_match.name_tokens("ｗａｎｇ ｗｅｉ") == name_match.name_tokens("Wang Wei")
+
+
+def test_numeric_names_are_not_matched():
+    rows = list(name_match.annotate([{"name": "张三"}, {"name": "13800000000"}, {"name": None}], "name"))
+
+    assert name_match.is_meaningful("张三")
+    assert not name_match.is_meaningful("138 0000 0000")
+    assert rows == [
+        {"name": "张三", "name_key": "张三", "name_tokens": ["张三"]},
+        {"name": "13800000000", "name_key": None, "name_tokens": []},
+        {"name": None, "name_key": None, "name_tokens": []},
+    ]
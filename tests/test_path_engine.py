@@ -0,0 +1,96 @@
+"""路径引擎：内存投影上的双向 BFS、Yen k 条最短路径与超级节点过滤"""
+import pytest
+
+from app.services import path_engine
+from app.services.graph_projection import EDGE_TYPES
+
+
+def test_shortest_path_along_path_graph(use_projection, path5):
+    use_projection(path5)
+    result = path_engine.find_paths("0", "4", max_degree=0)
+
+    assert result["engine"] == "projection"
+    assert result["path_nodes"] == ["0", "1", "2", "3", "4"]
+    assert result["relationship_types"] == ["CALL"] * 4
+    assert result["node_types"] == ["Phone"] * 5
+    assert result["hops"] == 4
+    assert result["partial"] is False
+
+
+def test_path_longer_than_max_depth_is_not_found(use_projection, path5):
+    use_projection(path5)
+    result = path_engine.find_paths("0", "4", max_depth=3, max_degree=0)
+
+    assert result["paths"] == []
+    assert result["hops"] == -1
+    assert result["message"] == "No path found"
+
+
+def test_no_path_between_disconnected_pairs(use_projection, make_projection):
+    use_projection(make_projection(4, [(0, 1), (2, 3)]))
+    result = path_engine.find_paths("0", "3", max_degree=0)
+
+    assert result["paths"] == []
+    assert result["partial"] is False
+
+
+def test_path_through_bridge(use_projection, barbell):
+    use_projection(barbell)
+
+    assert path_engine.find_paths("0", "7", max_degree=0)["path_nodes"] == ["0", "3", "4", "7"]
+
+
+def test_k_shortest_paths_in_order(use_projection, barbell):
+    use_projection(barbell)
+    paths = path_engine.find_paths("0", "7", max_degree=0, k=5)["paths"]
+
+    # 1 条 3 跳路径，之后是在任一侧团内多绕一个节点的 4 条 4 跳路径
+    assert [p["hops"] for p in paths] == [3, 4, 4, 4, 4]
+    assert {tuple(p["path_nodes"]) for p in paths[1:]} == {
+        ("0", "1", "3", "4", "7"), ("0", "2", "3", "4", "7"),
+        ("0", "3", "4", "5", "7"), ("0", "3", "4", "6", "7"),
+    }
+
+
+def test_k_larger_than_available_paths(use_projection, make_projection):
+    # 环 0-1-2-3-0：0 到 2 只有两条无环路径
+    use_projection(make_projection(4, [(0, 1), (1, 2), (2, 3), (3, 0)]))
+    result = path_engine.find_paths("0", "2", max_degree=0, k=5)
+
+    assert sorted(tuple(p["path_nodes"]) for p in result["paths"]) == [("0", "1", "2"), ("0", "3", "2")]
+    assert result["partial"] is False
+
+
+def test_hub_filter_routes_around_super_node(use_projection, make_projection):
+    # 0-1-2 经过枢纽 1（另有叶子 5、6、7），0-3-4-2 绕开它
+    use_projection(make_projection(8, [(0, 1), (1, 2), (0, 3), (3, 4), (4, 2), (1, 5), (1, 6), (1, 7)]))
+
+    assert path_engine.find_paths("0", "2", max_degree=0)["path_nodes"] == ["0", "1", "2"]
+    assert path_engine.find_paths("0", "2", max_degree=3)["path_nodes"] == ["0", "3", "4", "2"]
+    # 端点本身是枢纽时不受限制
+    assert path_engine.find_paths("1", "2", max_degree=3)["path_nodes"] == ["1", "2"]
+
+
+def test_rel_types_restrict_edges(use_projection, make_projection):
+    projection = use_projection(make_projection(4, [(0, 3), (0, 1), (1, 2), (2, 3)]))
+    projection.etype[0] = EDGE_TYPES.index("FRIEND")
+
+    assert path_engine.find_paths("0", "3", max_degree=0)["path_nodes"] == ["0", "3"]
+    assert path_engine.find_paths("0", "3", max_degree=0, rel_types=["CALL"])["path_nodes"] == ["0", "1", "2", "3"]
+    with pytest.raises(ValueError):
+        path_engine.find_paths("0", "3", rel_types=["KNOWS"])
+
+
+def test_expired_deadline_returns_partial(use_projection, path5):
+    use_projection(path5)
+    result = path_engine.find_paths("0", "4", max_degree=0, timeout_ms=-1)
+
+    assert result["paths"] == []
+    assert result["partial"] is True
+    assert result["message"] == "Search timed out"
+
+
+def test_unknown_endpoint(use_projection, path5):
+    use_projection(path5)
+
+    assert path_engine.find_paths("0", "13800000000")["paths"] == []
@@ -0,0 +1,135 @@
+"""分析结果缓存：图版本失效、TTL、LRU 淘汰与磁盘存储"""
+import pytest
+
+from app.config import settings
+from app.services import graph_projection, result_cache
+from app.services.result_cache import ResultCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache, "time", clock)
+    return clock
+
+
+def test_hit_returns_a_fresh_copy(clock):
+    cache = ResultCache(max_entries=10, ttl=60)
+    cache.put("k", 1, {"rows": [1, 2]})
+
+    first = cache.get("k", 1)
+    first["rows"].append(3)
+    assert cache.get("k", 1) == {"rows": [1, 2]}
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_version_bump_invalidates_entries(clock):
+    cache = ResultCache(max_entries=10, ttl=60)
+    cache.put("a", 1, "old")
+    cache.put("b", 1, "old")
+
+    assert cache.get("a", 2) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["graph_version"] == 2
+    # 版本前进后，执行较早开始的请求写回的旧版本结果被丢弃
+    cache.put("a", 1, "stale")
+    assert cache.get("a", 2) is None
+    cache.put("a", 2, "new")
+    assert cache.get("a", 2) == "new"
+
+
+def test_older_version_lookup_does_not_flush_newer_entries(clock):
+    cache = ResultCache(max_entries=10, ttl=60)
+    cache.put("a", 2, "new")
+
+    assert cache.get("a", 1) is None
+    assert cache.get("a", 2) == "new"
+    assert cache.stats()["graph_version"] == 2
+
+
+def test_ttl_expiry(clock):
+    cache = ResultCache(max_entries=10, ttl=60)
+    cache.put("k", 1, "value")
+
+    clock.now += 60
+    assert cache.get("k", 1) == "value"
+    clock.now += 1
+    assert cache.get("k", 1) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction(clock):
+    cache = ResultCache(max_entries=2, ttl=60)
+    cache.put("a", 1, "a")
+    cache.put("b", 1, "b")
+    cache.get("a", 1)
+    cache.put("c", 1, "c")
+
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) == "a"
+    assert cache.get("c", 1) == "c"
+    assert cache.evictions == 1
+
+
+def test_disk_store_is_shared_between_instances(clock, tmp_path):
+    path = str(tmp_path / "cache" / "results.sqlite3")
+    ResultCache(max_entries=10, ttl=60, disk_path=path).put("k", 1, [1, 2])
+
+    other = ResultCache(max_entries=10, ttl=60, disk_path=path)
+    assert other.get("k", 1) == [1, 2]
+    assert other.disk_hits == 1
+    # 读回后进入内存，不再访问磁盘
+    assert other.get("k", 1) == [1, 2]
+    assert other.disk_hits == 1
+
+
+def test_disk_store_respects_ttl_and_version(clock, tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    ResultCache(max_entries=10, ttl=60, disk_path=path).put("k", 1, "value")
+
+    clock.now += 61
+    assert ResultCache(max_entries=10, ttl=60, disk_path=path).get("k", 1) is None
+    clock.now -= 61
+    newer = ResultCache(max_entries=10, ttl=60, disk_path=path)
+    newer.get("other", 1)
+    assert newer.get("k", 2) is None
+    # 版本前进时旧版本的磁盘条目被删除
+    assert ResultCache(max_entries=10, ttl=60, disk_path=path).get("k", 1) is None
+
+
+def test_make_key_binds_defaults():
+    def analysis(target, depth=2):
+        pass
+
+    signature = result_cache.inspect.signature(analysis)
+    assert (result_cache.make_key("f", signature, ("x",), {})
+            == result_cache.make_key("f", signature, (), {"target": "x", "depth": 2}))
+    assert result_cache.make_key("f", signature, ("x", 3), {}) != result_cache.make_key("f", signature, ("x",), {})
+
+
+def test_cached_decorator_recomputes_after_version_bump(clock, monkeypatch):
+    version = {"value": 1}
+    calls = []
+    monkeypatch.setattr(settings, "CACHE_ENABLED", True)
+    monkeypatch.setattr(result_cache, "cache", ResultCache(max_entries=10, ttl=60))
+    monkeypatch.setattr(graph_projection, "current_graph_version", lambda: version["value"])
+
+    @result_cache.cached("analysis")
+    def analysis(target, depth=2):
+        calls.append((target, depth))
+        return {"target": target, "depth": depth}
+
+    assert analysis("x") == {"target": "x", "depth": 2}
+    assert analysis("x", depth=2) == {"target": "x", "depth": 2}
+    assert calls == [("x", 2)]
+    version["value"] = 2
+    analysis("x")
+    assert calls == [("x", 2), ("x", 2)]